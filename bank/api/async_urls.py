@@ -0,0 +1,16 @@
+from django.urls import path
+from api import async_views
+
+app_name = "async"
+
+urlpatterns = [
+    path("pessoa/<int:id>/", async_views.pessoas_detail, name="pessoa-detail"),
+    path("conta/<int:id>/", async_views.contas_detail, name="conta-detail"),
+    path("conta/<int:id>/deposito/", async_views.deposito, name="deposito"),
+    path("conta/<int:id>/saldo/", async_views.saldo, name="saldo"),
+    path("conta/<int:id>/saque/", async_views.saque, name="saque"),
+    path("conta/<int:id>/transferencia/", async_views.transferencia, name="transferencia"),
+    path("conta/<int:id>/transacoes/", async_views.transacoes, name="transacoes"),
+    path("transacoes/lote/", async_views.transacoes_lote, name="transacoes-lote"),
+    path("eventos/", async_views.eventos, name="eventos"),
+]
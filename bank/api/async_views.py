@@ -0,0 +1,245 @@
+"""Versões assíncronas (ASGI) das views de leitura e de movimentação.
+
+O Django 3.2 ainda não tem ORM assíncrono, então cada view assíncrona roda
+a view correspondente de api.views em um pool de threads limitado por
+settings.ASYNC_DB_THREADS. Sob ASGI, as views síncronas rodam todas em uma
+única thread (sync_to_async com thread_sensitive=True); por aqui até
+ASYNC_DB_THREADS requisições usam o banco ao mesmo tempo, e o event loop
+fica livre enquanto elas esperam.
+
+O conteúdo das respostas em streaming é gerado em um pool próprio, de
+settings.ASYNC_STREAM_THREADS threads, e chega ao event loop aos poucos
+(_Partes): um download lento não ocupa as threads das demais views. O handler ASGI do Django
+3.2 itera streaming_content de forma síncrona, dentro do event loop; o
+ASGIHandler daqui, usado em bank.asgi, itera essas partes sem bloqueá-lo."""
+import asyncio
+import contextvars
+import functools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers import asgi
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import eventos as eventos_api
+from . import metricas, views
+
+_trava = threading.Lock()
+_pool = None
+_pool_streaming = None
+
+
+def executor() -> ThreadPoolExecutor:
+    global _pool
+    with _trava:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_DB_THREADS, thread_name_prefix="api-async"
+            )
+        return _pool
+
+
+def executor_streaming() -> ThreadPoolExecutor:
+    global _pool_streaming
+    with _trava:
+        if _pool_streaming is None:
+            _pool_streaming = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_STREAM_THREADS, thread_name_prefix="api-stream"
+            )
+        return _pool_streaming
+
+
+# Partes geradas à frente do envio, por resposta em streaming
+PARTES_NA_FILA = 4
+
+# Segundos entre as verificações de cancelamento de quem espera pela fila
+INTERVALO_CANCELAMENTO = 0.1
+
+
+class _Partes:
+    """Itera streaming_content em uma única thread de executor_streaming(),
+    onde o ORM pode ser usado, passando as partes por uma fila limitada: a
+    resposta nunca fica inteira em memória. A geração começa na primeira
+    parte pedida. close(), chamado pelo handler ao fechar a resposta,
+    interrompe quem gera e quem espera se o cliente desistir antes do fim"""
+
+    _FIM = object()
+
+    def __init__(self, conteudo):
+        self._conteudo = conteudo
+        self._contexto = contextvars.copy_context()
+        self._fila = queue.Queue(maxsize=PARTES_NA_FILA)
+        self._cancelada = threading.Event()
+        self._iniciada = False
+
+    def _produzir(self) -> None:
+        try:
+            for parte in self._conteudo:
+                if not self._colocar(parte):
+                    return
+            self._colocar(self._FIM)
+        except Exception as e:
+            self._colocar(e)
+        finally:
+            close_old_connections()
+
+    def _colocar(self, item) -> bool:
+        while not self._cancelada.is_set():
+            try:
+                self._fila.put(item, timeout=INTERVALO_CANCELAMENTO)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _iniciar(self) -> None:
+        if not self._iniciada:
+            self._iniciada = True
+            executor_streaming().submit(self._contexto.run, self._produzir)
+
+    def _tirar(self):
+        while True:
+            try:
+                return self._fila.get(timeout=INTERVALO_CANCELAMENTO)
+            except queue.Empty:
+                if self._cancelada.is_set():
+                    return self._FIM
+
+    def _parte(self, item):
+        if item is self._FIM:
+            raise StopIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._iniciar()
+        return self._parte(self._tirar())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self._iniciar()
+        item = await asyncio.get_running_loop().run_in_executor(None, self._tirar)
+        try:
+            return self._parte(item)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    def close(self) -> None:
+        self._cancelada.set()
+        try:
+            # Acorda logo quem espera com a fila vazia
+            self._fila.put_nowait(self._FIM)
+        except queue.Full:
+            pass
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """Handler ASGI que envia as respostas em streaming de api.async_views
+    iterando _Partes de forma assíncrona. As demais respostas seguem o
+    caminho do Django"""
+
+    async def send_response(self, response, send):
+        partes = getattr(response, "partes", None)
+        if not isinstance(partes, _Partes):
+            return await super().send_response(response, send)
+
+        async def enviar(mensagem):
+            # A mensagem final, sem more_body, fecha o corpo: antes dela
+            # vão as partes, que o handler original não vê
+            if mensagem["type"] == "http.response.body" and not mensagem.get("more_body"):
+                async for parte in partes:
+                    for chunk, _ in self.chunk_bytes(parte):
+                        await send(
+                            {"type": "http.response.body", "body": chunk, "more_body": True}
+                        )
+            await send(mensagem)
+
+        response.streaming_content = ()
+        await super().send_response(response, enviar)
+
+
+def _executar_view(view, request, **kwargs):
+    """Roda a view síncrona e renderiza a resposta ainda na thread do pool,
+    tratando as conexões do banco como no início e no fim de um request"""
+    close_old_connections()
+    try:
+        response = view(request, **kwargs)
+        if hasattr(response, "render"):
+            with metricas.serializacao():
+                response.render()
+        elif response.streaming:
+            # O ORM não pode ser usado no event loop, onde o handler ASGI
+            # itera o conteúdo
+            response.partes = _Partes(response.streaming_content)
+            response.streaming_content = response.partes
+        return response
+    finally:
+        close_old_connections()
+
+
+def _assincrona(view):
+    """Cria a versão assíncrona de uma view de api.views"""
+
+    async def view_assincrona(request, **kwargs):
+        loop = asyncio.get_running_loop()
+        # run_in_executor não leva a ContextVar da medição de api.metricas
+        contexto = contextvars.copy_context()
+        return await loop.run_in_executor(
+            executor(),
+            functools.partial(contexto.run, _executar_view, view, request, **kwargs),
+        )
+
+    # Como nas views do DRF; o decorator csrf_exempt do Django 3.2 não
+    # preserva views assíncronas
+    view_assincrona.csrf_exempt = True
+    view_assincrona.__name__ = view.__name__
+    view_assincrona.__doc__ = view.__doc__
+    return view_assincrona
+
+
+pessoas_detail = _assincrona(views.pessoas_detail)
+contas_detail = _assincrona(views.contas_detail)
+saldo = _assincrona(views.saldo)
+transacoes = _assincrona(views.transacoes)
+deposito = _assincrona(views.deposito)
+saque = _assincrona(views.saque)
+transferencia = _assincrona(views.transferencia)
+transacoes_lote = _assincrona(views.transacoes_lote)
+
+
+def _ler_eventos(cursor: int, limite: int) -> list:
+    close_old_connections()
+    try:
+        return eventos_api.ler(cursor, limite)
+    finally:
+        close_old_connections()
+
+
+async def eventos(request):
+    """Feed de eventos como em views.eventos, mas a espera por eventos
+    novos acontece no event loop: só as leituras, a cada
+    settings.EVENTOS_INTERVALO, usam uma thread do pool"""
+    try:
+        cursor, limite, espera = eventos_api.parametros(request.GET)
+    except ValueError as e:
+        return JsonResponse(e.args[0], status=400)
+    loop = asyncio.get_running_loop()
+    fim = loop.time() + espera
+    while True:
+        lista = await loop.run_in_executor(
+            executor(), functools.partial(_ler_eventos, cursor, limite)
+        )
+        restante = fim - loop.time()
+        if lista or restante <= 0:
+            return JsonResponse(eventos_api.feed(lista, cursor), encoder=JSONEncoder)
+        await asyncio.sleep(min(restante, settings.EVENTOS_INTERVALO))
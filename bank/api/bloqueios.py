@@ -0,0 +1,117 @@
+"""Contas bloqueadas (flagAtivo desligado) em um bitset no processo.
+
+As views de movimentação consultam `bloqueadas` antes de chamar api.ledger
+e recusam na hora, sem ir ao banco, as contas marcadas. O bitset é
+carregado do banco no primeiro uso e atualizado no commit de cada
+bloqueio/desbloqueio do próprio processo; os feitos por outros processos
+chegam a cada settings.BLOQUEADAS_INTERVALO segundos, lendo os eventos de
+bloqueio e desbloqueio gravados em cada shard desde a última leitura.
+
+O bitset é só um atalho: o UPDATE condicional de api.ledger continua
+recusando contas bloqueadas que ainda não foram marcadas aqui. Uma conta
+desbloqueada em outro processo pode ser recusada por até
+BLOQUEADAS_INTERVALO segundos."""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+
+from .models import Conta, Evento
+
+
+class Bitset:
+    """Conjunto de inteiros não negativos, um bit por valor possível"""
+
+    __slots__ = ("_bits",)
+
+    def __init__(self):
+        self._bits = bytearray()
+
+    def __contains__(self, valor: int) -> bool:
+        indice = valor >> 3
+        return indice < len(self._bits) and bool(self._bits[indice] & (1 << (valor & 7)))
+
+    def adicionar(self, valor: int) -> None:
+        indice = valor >> 3
+        if indice >= len(self._bits):
+            self._bits.extend(bytes(max(indice + 1, 2 * len(self._bits)) - len(self._bits)))
+        self._bits[indice] |= 1 << (valor & 7)
+
+    def remover(self, valor: int) -> None:
+        indice = valor >> 3
+        if indice < len(self._bits):
+            self._bits[indice] &= ~(1 << (valor & 7)) & 0xFF
+
+
+class Bloqueadas:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._bits = None
+        self._ultimos_eventos = {}
+        self._lido = 0.0
+
+    def __contains__(self, conta_id: int) -> bool:
+        if time.monotonic() - self._lido >= settings.BLOQUEADAS_INTERVALO:
+            self._atualizar()
+        return conta_id in self._bits
+
+    def marcar(self, conta_id: int, bloqueada: bool) -> None:
+        with self._trava:
+            self._marcar(conta_id, bloqueada)
+
+    def _marcar(self, conta_id: int, bloqueada: bool) -> None:
+        if self._bits is None:
+            return
+        if bloqueada:
+            self._bits.adicionar(conta_id)
+        else:
+            self._bits.remover(conta_id)
+
+    def _atualizar(self) -> None:
+        with self._trava:
+            if time.monotonic() - self._lido < settings.BLOQUEADAS_INTERVALO:
+                return
+            # O último evento é lido antes das contas, então um bloqueio
+            # gravado entre as duas leituras é aplicado de novo na próxima
+            ultimos = {
+                banco: Evento.objects.using(banco).aggregate(ultimo=Max("id"))["ultimo"] or 0
+                for banco in settings.SHARDS
+            }
+            if self._bits is None:
+                self._bits = Bitset()
+                for banco in settings.SHARDS:
+                    for conta_id in (
+                        Conta.objects.using(banco)
+                        .filter(flagAtivo=False)
+                        .values_list("id", flat=True)
+                    ):
+                        self._bits.adicionar(conta_id)
+            else:
+                for banco, ultimo in ultimos.items():
+                    anterior = self._ultimos_eventos.get(banco, 0)
+                    if ultimo <= anterior:
+                        continue
+                    for tipo, conta_id in (
+                        Evento.objects.using(banco)
+                        .filter(
+                            pk__gt=anterior,
+                            pk__lte=ultimo,
+                            tipo__in=(Evento.Tipo.BLOQUEIO, Evento.Tipo.DESBLOQUEIO),
+                        )
+                        .order_by("id")
+                        .values_list("tipo", "conta_id")
+                    ):
+                        self._marcar(conta_id, tipo == Evento.Tipo.BLOQUEIO)
+            self._ultimos_eventos = ultimos
+            self._lido = time.monotonic()
+
+    def limpar(self) -> None:
+        """Descarta o bitset, recarregado do banco no próximo uso"""
+        with self._trava:
+            self._bits = None
+            self._ultimos_eventos = {}
+            self._lido = 0.0
+
+
+bloqueadas = Bloqueadas()
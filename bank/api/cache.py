@@ -0,0 +1,98 @@
+"""Cache de leitura das contas (snapshot serializado + ETag).
+
+O backend é o alias settings.CONTAS_CACHE de CACHES. As escritas em
+api.ledger invalidam o snapshot depois do commit, e o TIMEOUT do alias
+limita quanto tempo um snapshot pode sobreviver a uma invalidação perdida.
+Cada conta tem uma geração em cache, que faz parte da chave do snapshot e
+que invalidar incrementa: uma leitura que começou antes da escrita grava
+o snapshot velho na chave da geração anterior, que ninguém mais lê.
+Só leituras do default entram no cache: um snapshot lido de uma réplica
+atrasada seria servido também a quem acabou de escrever."""
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import shards
+from .models import Conta
+from .replicas import replica_atual
+
+_trava = threading.Lock()
+_estatisticas = {"hits": 0, "misses": 0}
+
+
+def _cache():
+    return caches[settings.CONTAS_CACHE]
+
+
+def _chave_da_geracao(conta_id: int) -> str:
+    return f"conta:{conta_id}:geracao"
+
+
+def _geracao(cache, conta_id: int) -> int:
+    """Geração atual da conta. Se ela saiu do cache, começa uma nova a partir
+    do relógio, que não repete a de nenhum snapshot ainda guardado"""
+    chave = _chave_da_geracao(conta_id)
+    geracao = cache.get(chave)
+    if geracao is None:
+        cache.add(chave, time.time_ns())
+        geracao = cache.get(chave, 0)
+    return geracao
+
+
+def _chave(conta_id: int, geracao: int) -> str:
+    return f"conta:{conta_id}:{geracao}"
+
+
+def _contar(evento: str) -> None:
+    with _trava:
+        _estatisticas[evento] += 1
+
+
+def snapshot(conta: Conta) -> dict:
+    """Serializa a conta e calcula o ETag do conteúdo"""
+    from .serializers import conta_leitura
+
+    dados = conta_leitura.serializar(conta)
+    conteudo = json.dumps(dados, cls=JSONEncoder, sort_keys=True).encode()
+    return {"dados": dados, "etag": f'"{hashlib.md5(conteudo).hexdigest()}"'}
+
+
+def obter(conta_id: int) -> dict:
+    """Retorna o snapshot da conta, lendo do banco apenas se não estiver
+    em cache. Levanta Conta.DoesNotExist se a conta não existir"""
+    cache = _cache()
+    chave = _chave(conta_id, _geracao(cache, conta_id))
+    atual = cache.get(chave)
+    if atual is not None:
+        _contar("hits")
+        return atual
+    _contar("misses")
+    atual = snapshot(Conta.objects.get(pk=conta_id))
+    if replica_atual() is None:
+        cache.set(chave, atual)
+    return atual
+
+
+def invalidar(*contas: int) -> None:
+    """Avança a geração das contas assim que a transação atual fizer commit,
+    o que descarta os snapshots guardados e os que ainda estão sendo lidos"""
+    shards.apos_commit(lambda: _avancar(contas))
+
+
+def _avancar(contas) -> None:
+    cache = _cache()
+    for conta_id in contas:
+        try:
+            cache.incr(_chave_da_geracao(conta_id))
+        except ValueError:
+            pass  # sem geração em cache, a próxima leitura começa uma nova
+
+
+def estatisticas() -> dict:
+    with _trava:
+        return dict(_estatisticas)
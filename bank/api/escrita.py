@@ -0,0 +1,151 @@
+"""Fila única de escrita com commits em grupo (settings.ESCRITA_EM_FILA).
+
+No SQLite só uma transação escreve por vez: com várias threads escrevendo,
+cada uma espera pelo lock do banco e paga um commit próprio. Com a fila, as
+funções decoradas com @na_fila (as operações de api.ledger) são executadas
+por uma única thread escritora. Ela junta as operações que chegaram enquanto
+o grupo anterior era gravado, até settings.ESCRITA_GRUPO_MAXIMO, executa
+cada uma em um savepoint e faz um único commit para o grupo. Uma operação
+que levanta exceção desfaz apenas o próprio savepoint. Quem chamou fica
+bloqueado até o commit do grupo e recebe o resultado ou a exceção da sua
+operação, como se a tivesse executado."""
+import contextvars
+import functools
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+
+class FilaDeEscrita:
+    def __init__(self, grupo_maximo: int):
+        self.grupo_maximo = grupo_maximo
+        self.operacoes = 0
+        self.commits = 0
+        self._fila = queue.SimpleQueue()
+        self._trava = threading.Lock()
+        self._escritora = None
+
+    def na_escritora(self) -> bool:
+        return threading.current_thread() is self._escritora
+
+    def executar(self, funcao, *args, **kwargs):
+        """Executa funcao(*args, **kwargs) na thread escritora e retorna o
+        resultado depois do commit do grupo em que ela entrou"""
+        if self._escritora is None:
+            with self._trava:
+                if self._escritora is None:
+                    self._escritora = threading.Thread(
+                        target=self._trabalhar, name="escrita", daemon=True
+                    )
+                    self._escritora.start()
+        futuro = Future()
+        # O contexto de quem chamou, para que as consultas da operação
+        # entrem nas métricas da requisição (api.metricas)
+        contexto = contextvars.copy_context()
+        self._fila.put((futuro, contexto, funcao, args, kwargs))
+        return futuro.result()
+
+    def parar(self) -> None:
+        """Termina a thread escritora depois das operações já enfileiradas"""
+        with self._trava:
+            escritora, self._escritora = self._escritora, None
+        if escritora is not None:
+            self._fila.put(None)
+            escritora.join()
+
+    def _trabalhar(self) -> None:
+        try:
+            while True:
+                item = self._fila.get()
+                if item is None:
+                    return
+                grupo = [item]
+                while len(grupo) < self.grupo_maximo:
+                    try:
+                        item = self._fila.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._fila.put(None)
+                        break
+                    grupo.append(item)
+                self._gravar(grupo)
+        finally:
+            # Inclusive as conexões com os shards abertas pelas operações
+            connections.close_all()
+
+    def _gravar(self, grupo: list) -> None:
+        close_old_connections()
+        resultados = []
+        try:
+            with transaction.atomic():
+                for futuro, contexto, funcao, args, kwargs in grupo:
+                    try:
+                        with transaction.atomic():
+                            resultado = contexto.run(funcao, *args, **kwargs)
+                    except Exception as erro:
+                        resultados.append((futuro, None, erro))
+                    else:
+                        resultados.append((futuro, resultado, None))
+        except Exception as erro:
+            # O commit do grupo falhou: nenhuma operação foi gravada
+            for futuro, *_ in grupo:
+                futuro.set_exception(erro)
+            return
+
+        self.operacoes += len(grupo)
+        self.commits += 1
+        for futuro, resultado, erro in resultados:
+            if erro is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(erro)
+
+
+_fila = None
+_trava = threading.Lock()
+
+
+def fila() -> Optional[FilaDeEscrita]:
+    """A fila do processo, criada no primeiro uso, ou None se
+    settings.ESCRITA_EM_FILA estiver desligado"""
+    global _fila
+    if not settings.ESCRITA_EM_FILA:
+        return None
+    if _fila is None:
+        with _trava:
+            if _fila is None:
+                _fila = FilaDeEscrita(settings.ESCRITA_GRUPO_MAXIMO)
+    return _fila
+
+
+def parar() -> None:
+    """Termina a fila do processo, se existir; o próximo uso cria outra"""
+    global _fila
+    with _trava:
+        atual, _fila = _fila, None
+    if atual is not None:
+        atual.parar()
+
+
+def na_fila(funcao):
+    """Executa funcao pela fila de escrita, se ligada. Chamadas de dentro
+    de um transaction.atomic são executadas direto, na transação de quem
+    chamou"""
+
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        atual = fila()
+        if (
+            atual is None
+            or atual.na_escritora()
+            or transaction.get_connection().in_atomic_block
+        ):
+            return funcao(*args, **kwargs)
+        return atual.executar(funcao, *args, **kwargs)
+
+    return executar
@@ -0,0 +1,268 @@
+"""Outbox de eventos dos movimentos das contas (api.models.Evento).
+
+api.ledger grava o Evento na mesma transação do banco que altera a conta,
+então um evento existe se e somente se o movimento fez commit. A partir
+daí os eventos chegam aos consumidores de duas formas:
+
+- o comando publicar_eventos lê os eventos em lotes, pelo id, e os entrega
+  a um destino de settings.EVENTOS_DESTINOS (arquivo, socket local ou
+  cache). O id do último evento entregue (Entrega) só avança depois que o
+  destino aceitou o lote, então uma falha no meio repete o lote: a entrega
+  é pelo menos uma vez, e o id do evento permite descartar repetições;
+- o feed (api/eventos/?cursor=) retorna os eventos depois do cursor e,
+  se ainda não há nenhum, espera até ?espera= segundos por um novo.
+
+No SQLite as escritas são serializadas, então os ids fazem commit em
+ordem e ler "id > cursor" nunca pula um evento.
+
+Com shards (api.shards), cada shard tem os eventos das próprias contas e
+ids em uma faixa própria, então a leitura segue um cursor por shard: o
+cursor do feed é a lista, separada por vírgulas e na ordem de
+settings.SHARDS, do último id lido em cada um (com um único shard, o id
+sozinho), e cada shard guarda a Entrega dos próprios eventos. A ordem entre
+eventos de shards diferentes não é garantida, só a de cada conta."""
+import decimal
+import heapq
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from operator import attrgetter
+from typing import List, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import shards
+from .models import Entrega, Evento
+
+_novos = threading.Condition()
+
+
+def _notificar() -> None:
+    with _novos:
+        _novos.notify_all()
+
+
+def evento(tipo: str, conta_id: int, **dados) -> Evento:
+    """Evento ainda não gravado, com os valores em dinheiro como texto"""
+    return Evento(
+        tipo=tipo,
+        conta_id=conta_id,
+        dados={
+            chave: str(valor) if isinstance(valor, decimal.Decimal) else valor
+            for chave, valor in dados.items()
+        },
+    )
+
+
+def registrar(tipo: str, conta_id: int, **dados) -> Evento:
+    """Grava o evento na transação atual, no shard da operação"""
+    novo = evento(tipo, conta_id, **dados)
+    novo.save()
+    shards.apos_commit(_notificar)
+    return novo
+
+
+def registrar_varios(eventos: List[Evento]) -> None:
+    if eventos:
+        Evento.objects.bulk_create(eventos)
+        shards.apos_commit(_notificar)
+
+
+def _ler(desde: int, limite: int) -> List[Evento]:
+    return list(Evento.objects.filter(pk__gt=desde).order_by("id")[:limite])
+
+
+def ler(cursor: Tuple[int, ...], limite: int) -> List[Evento]:
+    """Até limite eventos depois do cursor de cada shard, intercalados pela
+    data"""
+    if not shards.distribuido():
+        return _ler(cursor[0], limite)
+    por_shard = []
+    for alias, desde in zip(settings.SHARDS, cursor):
+        with shards.usando(alias):
+            por_shard.append(_ler(desde, limite))
+    intercalados = heapq.merge(*por_shard, key=attrgetter("dataEvento", "pk"))
+    return list(itertools.islice(intercalados, limite))
+
+
+def aguardar(cursor: Tuple[int, ...], limite: int, espera: float) -> List[Evento]:
+    """Eventos depois do cursor, esperando até espera segundos se ainda não
+    houver nenhum. Os commits deste processo acordam a espera na hora; os
+    de outros processos são vistos a cada settings.EVENTOS_INTERVALO"""
+    fim = time.monotonic() + espera
+    while True:
+        eventos = ler(cursor, limite)
+        restante = fim - time.monotonic()
+        if eventos or restante <= 0:
+            return eventos
+        with _novos:
+            _novos.wait(min(restante, settings.EVENTOS_INTERVALO))
+
+
+def parametros(params) -> Tuple[Tuple[int, ...], int, int]:
+    """Lê ?cursor= (padrão 0, o início; com shards, um id por shard
+    separados por vírgula, e os que faltarem são 0), ?limite= (padrão e
+    máximo settings.EVENTOS_LOTE) e ?espera= (segundos, padrão 0, máximo
+    settings.EVENTOS_ESPERA). Levanta ValueError com o dict de erros"""
+    erros = {}
+    valores = {}
+    partes = (params.get("cursor") or "0").split(",")
+    if len(partes) <= len(settings.SHARDS) and all(parte.isdigit() for parte in partes):
+        partes += ["0"] * (len(settings.SHARDS) - len(partes))
+        valores["cursor"] = tuple(int(parte) for parte in partes)
+    else:
+        erros["cursor"] = "Cursor deve ser o cursor retornado pelo feed"
+    for nome, padrao in (("limite", settings.EVENTOS_LOTE), ("espera", 0)):
+        valor = params.get(nome) or str(padrao)
+        if valor.isdigit():
+            valores[nome] = int(valor)
+        else:
+            erros[nome] = f"{nome.capitalize()} deve ser um número inteiro"
+    if erros:
+        raise ValueError(erros)
+    return (
+        valores["cursor"],
+        max(1, min(valores["limite"], settings.EVENTOS_LOTE)),
+        min(valores["espera"], settings.EVENTOS_ESPERA),
+    )
+
+
+def feed(eventos: List[Evento], cursor: Tuple[int, ...]) -> dict:
+    """Resposta do feed: os eventos e o cursor da próxima leitura"""
+    from .serializers import evento_leitura
+
+    proximo = list(cursor)
+    for evento in eventos:
+        indice = settings.SHARDS.index(evento._state.db) if shards.distribuido() else 0
+        proximo[indice] = evento.pk
+    return {
+        "eventos": evento_leitura.serializar_lista(eventos),
+        "cursor": proximo[0] if len(proximo) == 1 else ",".join(map(str, proximo)),
+    }
+
+
+class Destino:
+    """Recebe os lotes de eventos já serializados. publicar() só deve
+    retornar depois que o lote estiver entregue; uma exceção faz o comando
+    publicar_eventos tentar o mesmo lote de novo"""
+
+    def publicar(self, eventos: List[dict]) -> None:
+        raise NotImplementedError
+
+    def fechar(self) -> None:
+        pass
+
+
+def _ndjson(eventos: List[dict]) -> bytes:
+    return "".join(
+        json.dumps(evento, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for evento in eventos
+    ).encode()
+
+
+class DestinoArquivo(Destino):
+    """Acrescenta os eventos, um JSON por linha, ao arquivo CAMINHO"""
+
+    def __init__(self, caminho):
+        self.arquivo = open(caminho, "ab")
+
+    def publicar(self, eventos: List[dict]) -> None:
+        self.arquivo.write(_ndjson(eventos))
+        self.arquivo.flush()
+        os.fsync(self.arquivo.fileno())
+
+    def fechar(self) -> None:
+        self.arquivo.close()
+
+
+class DestinoSocket(Destino):
+    """Envia os eventos, um JSON por linha, ao socket Unix CAMINHO,
+    reconectando no próximo lote se a conexão cair"""
+
+    def __init__(self, caminho, timeout=5):
+        self.caminho = caminho
+        self.timeout = timeout
+        self.conexao = None
+
+    def publicar(self, eventos: List[dict]) -> None:
+        if self.conexao is None:
+            self.conexao = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.conexao.settimeout(self.timeout)
+            self.conexao.connect(self.caminho)
+        try:
+            self.conexao.sendall(_ndjson(eventos))
+        except OSError:
+            self.fechar()
+            raise
+
+    def fechar(self) -> None:
+        if self.conexao is not None:
+            self.conexao.close()
+            self.conexao = None
+
+
+class DestinoCache(Destino):
+    """Grava cada evento em evento:<id> no alias ALIAS de CACHES (um Redis
+    com EVENTOS_REDIS) e o id do último em evento:ultimo"""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def publicar(self, eventos: List[dict]) -> None:
+        cache = caches[self.alias]
+        cache.set_many({f"evento:{evento['id']}": evento for evento in eventos})
+        cache.set("evento:ultimo", eventos[-1]["id"])
+
+
+def destino(nome: str) -> Destino:
+    """Instancia o destino nome de settings.EVENTOS_DESTINOS, passando as
+    demais chaves da configuração em minúsculas"""
+    configuracao = dict(settings.EVENTOS_DESTINOS[nome])
+    classe = import_string(configuracao.pop("CLASSE"))
+    return classe(**{chave.lower(): valor for chave, valor in configuracao.items()})
+
+
+def publicar(nome: str, destino: Destino, lote: int) -> int:
+    """Entrega ao destino o próximo lote de eventos de cada shard ainda não
+    entregues a ele e retorna quantos foram entregues"""
+    from .serializers import evento_leitura
+
+    publicados = 0
+    for alias in settings.SHARDS:
+        with shards.usando(alias):
+            entrega, _ = Entrega.objects.get_or_create(destino=nome)
+            eventos = _ler(entrega.ultimoEvento, lote)
+            if not eventos:
+                continue
+            destino.publicar(evento_leitura.serializar_lista(eventos))
+            Entrega.objects.filter(pk=entrega.pk).update(
+                ultimoEvento=eventos[-1].pk, dataEntrega=timezone.now()
+            )
+        publicados += len(eventos)
+    return publicados
+
+
+def atraso(nome: str) -> dict:
+    """Eventos ainda não entregues ao destino, somados em todos os shards, e
+    a idade, em segundos, do mais antigo deles"""
+    pendentes = 0
+    primeiros = []
+    for alias in settings.SHARDS:
+        with shards.usando(alias):
+            entrega = Entrega.objects.filter(destino=nome).first()
+            eventos = Evento.objects.filter(pk__gt=entrega.ultimoEvento if entrega else 0)
+            pendentes += eventos.count()
+            primeiro = eventos.order_by("id").values_list("dataEvento", flat=True).first()
+        if primeiro is not None:
+            primeiros.append(primeiro)
+    return {
+        "pendentes": pendentes,
+        "segundos": (timezone.now() - min(primeiros)).total_seconds() if primeiros else 0,
+    }
@@ -0,0 +1,80 @@
+"""Saldos passados das contas a partir dos checkpoints de SaldoDiario.
+
+O saldo no início de um dia é calculado a partir do ponto de partida mais
+próximo: o SaldoDiario anterior mais recente, somando as transações até
+o dia, ou o saldo atual da conta, descontando as transações desde o dia.
+As transações são lidas de TransacaoHistorico, então dias já arquivados
+entram no cálculo."""
+import datetime
+import decimal
+
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, When
+from django.utils import timezone
+
+from .functions import intervalo_do_dia
+from .models import Conta, SaldoDiario, Transacao, TransacaoHistorico
+
+UM_DIA = datetime.timedelta(days=1)
+
+# Datas aceitas nos períodos: o início do dia seguinte à última ainda cabe
+# em um datetime, mesmo convertido para UTC
+DATA_MINIMA = datetime.date(1900, 1, 1)
+DATA_MAXIMA = datetime.date.max - UM_DIA
+
+# Valor da transação com sinal: depósitos somam e saques subtraem
+VARIACAO = Case(
+    When(tipo=Transacao.Tipo.SAQ, then=-F("valor")),
+    default=F("valor"),
+    output_field=DecimalField(max_digits=11, decimal_places=2),
+)
+
+
+def inicio_do_dia(dia: datetime.date) -> datetime.datetime:
+    return intervalo_do_dia(dia)[0]
+
+
+def variacao(transacoes) -> decimal.Decimal:
+    """Retorna a soma com sinal das transações do queryset"""
+    return transacoes.aggregate(total=Sum(VARIACAO))["total"] or decimal.Decimal(0)
+
+
+def saldo_no_inicio_do_dia(conta_id: int, dia: datetime.date) -> decimal.Decimal:
+    """Retorna o saldo da conta à meia-noite (horário local) do dia"""
+    inicio = inicio_do_dia(dia)
+    checkpoint = (
+        SaldoDiario.objects.filter(conta_id=conta_id, data__lt=dia)
+        .order_by("-data")
+        .first()
+    )
+    if checkpoint and dia - checkpoint.data <= timezone.localdate() - dia:
+        return checkpoint.saldo + variacao(
+            TransacaoHistorico.objects.filter(
+                conta_id=conta_id,
+                dataTransacao__gte=inicio_do_dia(checkpoint.data + UM_DIA),
+                dataTransacao__lt=inicio,
+            )
+        )
+
+    # Saldo atual e soma posterior no mesmo comando, para que os dois
+    # valores sejam do mesmo instante
+    posteriores = (
+        TransacaoHistorico.objects.filter(conta=OuterRef("pk"), dataTransacao__gte=inicio)
+        .values("conta")
+        .annotate(total=Sum(VARIACAO))
+        .values("total")
+    )
+    saldo, posterior = (
+        Conta.objects.filter(pk=conta_id)
+        .annotate(posterior=Subquery(posteriores))
+        .values_list("saldo", "posterior")
+        .get()
+    )
+    return saldo - (posterior or 0)
+
+
+def saldos_do_periodo(conta_id: int, data_inicial: datetime.date, data_final: datetime.date):
+    """Retorna o saldo no início de data_inicial e no fim de data_final"""
+    return (
+        saldo_no_inicio_do_dia(conta_id, data_inicial),
+        saldo_no_inicio_do_dia(conta_id, data_final + UM_DIA),
+    )
@@ -1,4 +1,9 @@
+import datetime
 import decimal
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+from django.utils import timezone
 
 
 def is_decimal(num: str) -> bool:
@@ -7,3 +12,42 @@ def is_decimal(num: str) -> bool:
         return True
     except:
         return False
+
+
+def erros_cpf(cpfs: Sequence[str]) -> List[Optional[str]]:
+    """Valida um lote de CPFs e retorna, na mesma ordem, None para os
+    válidos ou a mensagem de erro. Usada pelo PessoaSerializer e pela
+    importação em lote, para que as duas sigam as mesmas regras"""
+    return [
+        None
+        if cpf.isdecimal() and len(cpf) == 11
+        else "CPF deve conter apenas números"
+        if not cpf.isdecimal()
+        else f"CPF deve conter 11 e não {len(cpf)} dígitos"
+        for cpf in cpfs
+    ]
+
+
+def intervalo_do_dia(data: datetime.date) -> Tuple[datetime.datetime, datetime.datetime]:
+    """Retorna o intervalo [início, fim) do dia no fuso horário atual,
+    para filtrar datas com um range que use índice em vez de __date"""
+    inicio = timezone.make_aware(datetime.datetime.combine(data, datetime.time.min))
+    fim = timezone.make_aware(
+        datetime.datetime.combine(data + datetime.timedelta(days=1), datetime.time.min)
+    )
+    return inicio, fim
+
+
+def normalizar_nome(nome: str) -> str:
+    """Nome sem acentos, em minúsculas e com os espaços simplificados, como
+    é gravado em Pessoa.nomeBusca e comparado nas buscas por prefixo"""
+    decomposto = unicodedata.normalize("NFKD", nome)
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
+
+
+def intervalo_do_prefixo(prefixo: str) -> Tuple[str, str]:
+    """Retorna o intervalo [início, fim) dos textos que começam com prefixo,
+    para filtrar com um range que use índice em vez de LIKE (que no SQLite
+    ignora o índice de uma coluna com a collation padrão)"""
+    return prefixo, prefixo + chr(0x10FFFF)
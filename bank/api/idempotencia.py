@@ -0,0 +1,147 @@
+"""Chaves de idempotência (header Idempotency-Key) para as views de
+movimentação.
+
+A primeira requisição com uma chave executa a view e guarda a resposta;
+as repetições recebem a resposta guardada sem tocar na conta. Repetições
+que chegam enquanto a primeira ainda executa esperam por ela. Cada chave
+vale só para o cliente que a enviou (api.limites.cliente), a operação e a
+conta da URL. As chaves ficam em memória no processo, em ordem de criação,
+e expiram após IDEMPOTENCIA_TTL segundos: com vários processos, uma
+repetição atendida por outro processo executa a operação de novo. Respostas 404 e de erro do servidor não são
+guardadas: nada foi gravado, e a conta pode aparecer em outro shard no
+meio de um rebalanceamento (api.shards.ShardsMiddleware)."""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .limites import cliente
+
+
+class _Entrada:
+    __slots__ = ("expira", "assinatura", "pronta", "status", "dados")
+
+    def __init__(self, expira: float, assinatura: bytes):
+        self.expira = expira
+        self.assinatura = assinatura
+        self.pronta = threading.Event()
+        self.status = None
+        self.dados = None
+
+
+class ArmazemIdempotencia:
+    """Respostas por chave com expiração. Como o TTL é o mesmo para todas,
+    a ordem de criação é a ordem de expiração e a limpeza só olha o início.
+    Entradas ainda em andamento nunca são removidas pela limpeza, nem
+    vencidas ou acima de IDEMPOTENCIA_MAXIMO: a chave só é liberada por
+    concluir ou descartar, senão uma repetição executaria a operação de
+    novo. Com muitas em andamento, o armazém pode passar do máximo"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._entradas = OrderedDict()
+
+    def _expirar(self, agora: float) -> None:
+        excesso = len(self._entradas) - settings.IDEMPOTENCIA_MAXIMO + 1
+        remover = []
+        for chave, entrada in self._entradas.items():
+            if not entrada.pronta.is_set():
+                continue
+            if entrada.expira > agora and len(remover) >= excesso:
+                break
+            remover.append(chave)
+        for chave in remover:
+            del self._entradas[chave]
+
+    def reservar(self, chave: str, assinatura: bytes):
+        """Retorna (entrada, primeira). primeira indica que quem chamou deve
+        executar a operação e depois chamar concluir ou descartar"""
+        agora = time.monotonic()
+        with self._trava:
+            self._expirar(agora)
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                return entrada, False
+            entrada = _Entrada(agora + settings.IDEMPOTENCIA_TTL, assinatura)
+            self._entradas[chave] = entrada
+            return entrada, True
+
+    def concluir(self, entrada: _Entrada, response) -> None:
+        entrada.status = response.status_code
+        entrada.dados = response.data
+        entrada.pronta.set()
+
+    def descartar(self, chave: str, entrada: _Entrada) -> None:
+        """Libera a chave quando a primeira execução falha, para que uma
+        nova tentativa possa executar a operação"""
+        with self._trava:
+            if self._entradas.get(chave) is entrada:
+                del self._entradas[chave]
+        entrada.pronta.set()
+
+    def limpar(self) -> None:
+        with self._trava:
+            self._entradas.clear()
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+armazem = ArmazemIdempotencia()
+
+
+def _assinatura(request) -> bytes:
+    """Resumo dos parâmetros, para recusar a mesma chave com outro corpo"""
+    dados = request.data
+    conteudo = repr(sorted(dados.items()) if hasattr(dados, "items") else dados)
+    return hashlib.blake2b(conteudo.encode(), digest_size=16).digest()
+
+
+def idempotente(view):
+    """Decorator para views do DRF que movimentam dinheiro. Deve ficar
+    abaixo de @api_view"""
+
+    @functools.wraps(view)
+    def view_idempotente(request, *args, **kwargs):
+        chave = request.headers.get("Idempotency-Key")
+        if not chave:
+            return view(request, *args, **kwargs)
+
+        chave = f"{cliente(request)}:{view.__name__}:{kwargs.get('id')}:{chave}"
+        assinatura = _assinatura(request)
+        entrada, primeira = armazem.reservar(chave, assinatura)
+
+        if not primeira:
+            if entrada.assinatura != assinatura:
+                return Response(
+                    {"Idempotency-Key": "Chave já usada com outros parâmetros"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if not entrada.pronta.wait(settings.IDEMPOTENCIA_ESPERA) or entrada.status is None:
+                return Response(
+                    {"Idempotency-Key": "A requisição original ainda não terminou"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response(
+                entrada.dados,
+                status=entrada.status,
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            armazem.descartar(chave, entrada)
+            raise
+        if response.status_code >= 500 or response.status_code == status.HTTP_404_NOT_FOUND:
+            armazem.descartar(chave, entrada)
+        else:
+            armazem.concluir(entrada, response)
+        return response
+
+    return view_idempotente
@@ -0,0 +1,337 @@
+"""Importação em lote de pessoas e contas (CSV ou NDJSON) e exportação
+de transações em streaming.
+
+Os registros são lidos um a um de qualquer iterável de linhas de texto
+(arquivo aberto, stdin ou o corpo da requisição), validados em blocos de
+`lote` registros, com uma consulta ao banco por bloco para CPFs repetidos
+e titulares, e gravados com bulk_create em uma transação por bloco. As
+linhas recusadas são entregues a `rejeitar(linha, erros)` e não impedem a
+gravação das demais; a memória usada depende do tamanho do bloco, e não
+do arquivo."""
+import csv
+import datetime
+import decimal
+import heapq
+import io
+import json
+from operator import attrgetter
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import shards
+from .extrato import UM_DIA, inicio_do_dia
+from .functions import erros_cpf, is_decimal
+from .ledger import BLOCO_IDS, VALOR_MAXIMO
+from .models import Conta, Lancamento, Pessoa, TransacaoHistorico
+from .razao import partidas_de_abertura
+from .serializers import transacao_leitura
+
+FORMATOS = ("csv", "ndjson")
+
+TIPOS_DE_CONTEUDO = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+CENTAVO = decimal.Decimal("0.01")
+
+Rejeitar = Callable[[int, dict], None]
+
+
+def formato_do_conteudo(content_type: str) -> Optional[str]:
+    """Formato correspondente ao Content-Type, ou None se não for suportado"""
+    tipo = content_type.split(";")[0].strip().lower()
+    if tipo in ("text/csv", "application/csv"):
+        return "csv"
+    if tipo in ("application/x-ndjson", "application/jsonl", "application/json-seq"):
+        return "ndjson"
+    return None
+
+
+def ler_registros(linhas: Iterable[str], formato: str) -> Iterator:
+    """Gera um registro por linha de dados: um dict, ou None para uma
+    linha NDJSON que não é JSON válido"""
+    if formato == "csv":
+        yield from csv.DictReader(linhas)
+        return
+    for texto in linhas:
+        if not texto.strip():
+            continue
+        try:
+            yield json.loads(texto)
+        except ValueError:
+            yield None
+
+
+def _em_blocos(registros: Iterable, lote: int) -> Iterator[List[Tuple[int, object]]]:
+    bloco = []
+    for linha, registro in enumerate(registros, 1):
+        bloco.append((linha, registro))
+        if len(bloco) >= lote:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def _em_blocos_de_ids(valores: list) -> Iterator[list]:
+    for inicio in range(0, len(valores), BLOCO_IDS):
+        yield valores[inicio : inicio + BLOCO_IDS]
+
+
+def _texto(registro: dict, campo: str) -> str:
+    valor = registro.get(campo)
+    return "" if valor is None else str(valor).strip()
+
+
+def _data(texto: str) -> Optional[datetime.date]:
+    try:
+        return datetime.date.fromisoformat(texto)
+    except ValueError:
+        return None
+
+
+def _dinheiro(texto: str) -> Optional[decimal.Decimal]:
+    if not is_decimal(texto):
+        return None
+    valor = decimal.Decimal(texto)
+    if not valor.is_finite() or abs(valor) > VALOR_MAXIMO:
+        return None
+    return valor.quantize(CENTAVO)
+
+
+def _importar(registros, lote: int, validar, gravar, rejeitar: Rejeitar) -> Tuple[int, int]:
+    importadas = rejeitadas = 0
+    for bloco in _em_blocos(registros, lote):
+        # Com shards, as pessoas vão para todos e as contas para o do id
+        with shards.transacao(*settings.SHARDS):
+            validos, erros = validar(bloco)
+            gravar(validos)
+        importadas += len(validos)
+        rejeitadas += len(erros)
+        for linha, erro in erros:
+            rejeitar(linha, erro)
+    return importadas, rejeitadas
+
+
+# ------------------ Pessoas ------------------------
+
+
+def _validar_pessoas(bloco) -> Tuple[List[Pessoa], list]:
+    erros = []
+    candidatos = []
+    registros = [(linha, r) for linha, r in bloco if isinstance(r, dict)]
+    erros += [
+        (linha, {"non_field_errors": "Linha deve ser um objeto"})
+        for linha, r in bloco
+        if not isinstance(r, dict)
+    ]
+    cpfs = [_texto(r, "cpf") for _, r in registros]
+    for (linha, registro), cpf, erro_cpf in zip(registros, cpfs, erros_cpf(cpfs)):
+        erro = {}
+        nome = _texto(registro, "nome")
+        if not nome:
+            erro["nome"] = "Este campo é obrigatório."
+        elif len(nome) > 50:
+            erro["nome"] = "Nome deve ter no máximo 50 caracteres"
+        if erro_cpf:
+            erro["cpf"] = erro_cpf
+        nascimento = _data(_texto(registro, "dataNascimento"))
+        if nascimento is None:
+            erro["dataNascimento"] = "Data deve estar no formato AAAA-MM-DD"
+        if erro:
+            erros.append((linha, erro))
+        else:
+            candidatos.append((linha, Pessoa(nome=nome, cpf=cpf, dataNascimento=nascimento)))
+
+    existentes = set()
+    for cpfs_bloco in _em_blocos_de_ids([pessoa.cpf for _, pessoa in candidatos]):
+        existentes.update(
+            Pessoa.objects.filter(cpf__in=cpfs_bloco).values_list("cpf", flat=True)
+        )
+    validos = []
+    for linha, pessoa in candidatos:
+        if pessoa.cpf in existentes:
+            erros.append((linha, {"cpf": "Já existe uma pessoa com este CPF"}))
+            continue
+        existentes.add(pessoa.cpf)
+        validos.append(pessoa)
+    return validos, sorted(erros, key=lambda erro: erro[0])
+
+
+def _ultimos_ids(modelo, objetos: list) -> None:
+    """Atribui aos objetos recém-gravados com bulk_create os ids que o
+    banco gerou.
+
+    Sem RETURNING no bulk_create (SQLite no Django 3.2): como a transação
+    tem o lock de escrita desde o INSERT, os objetos gravados são os
+    últimos, na ordem de inserção"""
+    ids = modelo.objects.order_by("-id").values_list("id", flat=True)[: len(objetos)]
+    for objeto, objeto_id in zip(objetos, reversed(list(ids))):
+        objeto.pk = objeto_id
+
+
+def _gravar_pessoas(pessoas: List[Pessoa]) -> None:
+    Pessoa.objects.bulk_create(pessoas)
+    if pessoas and shards.distribuido():
+        if pessoas[0].pk is None:
+            _ultimos_ids(Pessoa, pessoas)
+        shards.replicar_pessoas(pessoas)
+
+
+def importar_pessoas(registros: Iterable, lote: int, rejeitar: Rejeitar) -> Tuple[int, int]:
+    """Importa registros {nome, cpf, dataNascimento} e retorna a quantidade
+    de importadas e de rejeitadas"""
+    return _importar(registros, lote, _validar_pessoas, _gravar_pessoas, rejeitar)
+
+
+# ------------------ Contas ------------------------
+
+
+def _validar_contas(bloco) -> Tuple[List[Conta], list]:
+    erros = [
+        (linha, {"non_field_errors": "Linha deve ser um objeto"})
+        for linha, r in bloco
+        if not isinstance(r, dict)
+    ]
+    registros = [(linha, r) for linha, r in bloco if isinstance(r, dict)]
+
+    por_cpf = {}
+    cpfs = sorted({_texto(r, "cpf") for _, r in registros if _texto(r, "cpf")})
+    for cpfs_bloco in _em_blocos_de_ids(cpfs):
+        por_cpf.update(Pessoa.objects.filter(cpf__in=cpfs_bloco).values_list("cpf", "id"))
+    ids = sorted(
+        {int(_texto(r, "pessoa")) for _, r in registros if _texto(r, "pessoa").isdecimal()}
+    )
+    existentes = set()
+    for ids_bloco in _em_blocos_de_ids(ids):
+        existentes.update(Pessoa.objects.filter(pk__in=ids_bloco).values_list("id", flat=True))
+
+    validos = []
+    for linha, registro in registros:
+        erro = {}
+        cpf, pessoa = _texto(registro, "cpf"), _texto(registro, "pessoa")
+        if pessoa:
+            pessoa_id = int(pessoa) if pessoa.isdecimal() else None
+            if pessoa_id not in existentes:
+                erro["pessoa"] = "Pessoa não encontrada"
+        elif cpf:
+            pessoa_id = por_cpf.get(cpf)
+            if pessoa_id is None:
+                erro["cpf"] = "Nenhuma pessoa com este CPF"
+        else:
+            erro["pessoa"] = "Informe a pessoa (id) ou o cpf do titular"
+        saldo = _dinheiro(_texto(registro, "saldo"))
+        if saldo is None:
+            erro["saldo"] = "Saldo tem que existir e ser numérico"
+        limite = _dinheiro(_texto(registro, "limiteSaqueDiario"))
+        if limite is None:
+            erro["limiteSaqueDiario"] = "Limite tem que existir e ser numérico"
+        tipo = _texto(registro, "tipoConta") or "1"
+        if not tipo.isdecimal():
+            erro["tipoConta"] = "Tipo de conta deve ser um número inteiro"
+        if erro:
+            erros.append((linha, erro))
+            continue
+        validos.append(
+            Conta(saldo=saldo, limiteSaqueDiario=limite, tipoConta=int(tipo), pessoa_id=pessoa_id)
+        )
+    return validos, sorted(erros, key=lambda erro: erro[0])
+
+
+def _gravar_contas(contas: List[Conta]) -> None:
+    """Grava as contas e os saldos de abertura no livro razão, que o
+    bulk_create não gera (não há post_save)"""
+    if not contas:
+        return
+    if not shards.distribuido():
+        Conta.objects.bulk_create(contas)
+        if contas[0].pk is None:
+            _ultimos_ids(Conta, contas)
+        por_banco = {DEFAULT_DB_ALIAS: contas}
+    else:
+        for conta, conta_id in zip(contas, shards.proximos_ids(len(contas))):
+            conta.pk = conta_id
+        por_banco = shards.agrupar(contas, attrgetter("pk"))
+        for banco, grupo in por_banco.items():
+            Conta.objects.using(banco).bulk_create(grupo)
+    for banco, grupo in por_banco.items():
+        Lancamento.objects.using(banco).bulk_create(
+            [
+                partida
+                for conta in grupo
+                for partida in partidas_de_abertura(conta.pk, conta.saldo)
+            ],
+            batch_size=BLOCO_IDS,
+        )
+
+
+def importar_contas(registros: Iterable, lote: int, rejeitar: Rejeitar) -> Tuple[int, int]:
+    """Importa registros {pessoa ou cpf, saldo, limiteSaqueDiario, tipoConta}
+    e retorna a quantidade de importadas e de rejeitadas"""
+    return _importar(registros, lote, _validar_contas, _gravar_contas, rejeitar)
+
+
+IMPORTADORES = {"pessoas": importar_pessoas, "contas": importar_contas}
+
+
+# ------------------ Exportação ------------------------
+
+
+def transacoes_do_periodo(
+    data_inicial: Optional[datetime.date] = None,
+    data_final: Optional[datetime.date] = None,
+    conta_id: Optional[int] = None,
+):
+    transacoes = TransacaoHistorico.objects.order_by("dataTransacao", "id")
+    if data_inicial:
+        transacoes = transacoes.filter(dataTransacao__gte=inicio_do_dia(data_inicial))
+    if data_final:
+        transacoes = transacoes.filter(dataTransacao__lt=inicio_do_dia(data_final + UM_DIA))
+    if conta_id is not None:
+        transacoes = transacoes.filter(conta_id=conta_id)
+    return transacoes
+
+
+def exportar(linhas: Iterable[dict], nomes, formato: str, chunk_size: int) -> Iterator[str]:
+    """Gera as linhas já serializadas em CSV (com o cabeçalho nomes) ou
+    NDJSON em pedaços de chunk_size linhas"""
+    buffer = io.StringIO()
+    if formato == "csv":
+        escritor = csv.writer(buffer)
+        escritor.writerow(nomes)
+        escrever = lambda linha: escritor.writerow(linha.values())  # noqa: E731
+    else:
+        escrever = lambda linha: buffer.write(  # noqa: E731
+            json.dumps(linha, ensure_ascii=False, separators=(",", ":")) + "\n"
+        )
+    for indice, linha in enumerate(linhas, 1):
+        escrever(linha)
+        if indice % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ordem_da_transacao(linha: dict) -> tuple:
+    data = datetime.datetime.fromisoformat(linha["dataTransacao"].replace("Z", "+00:00"))
+    return data, linha["id"]
+
+
+def exportar_transacoes(formato: str, chunk_size: int, **periodo) -> Iterator[str]:
+    """Exporta as transações do período lendo chunk_size linhas do banco por
+    vez. Com shards, lê o shard da conta ou intercala as transações de todos
+    os shards, na mesma ordem de data e id"""
+    transacoes = transacoes_do_periodo(**periodo)
+    conta_id = periodo.get("conta_id")
+    bancos = [shards.banco(conta_id)] if conta_id is not None else settings.SHARDS
+    linhas = heapq.merge(
+        *(
+            shards.iterar_em(
+                alias, transacao_leitura.serializar_valores(transacoes, chunk_size=chunk_size)
+            )
+            for alias in bancos
+        ),
+        key=_ordem_da_transacao,
+    )
+    return exportar(linhas, transacao_leitura.nomes, formato, chunk_size)
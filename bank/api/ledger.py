@@ -0,0 +1,518 @@
+import datetime
+import decimal
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import cache as cache_contas
+from .bloqueios import bloqueadas
+from . import eventos
+from . import razao
+from . import shards
+from .escrita import na_fila
+from .functions import intervalo_do_dia, is_decimal
+from .models import (
+    Conta,
+    Evento,
+    Lancamento,
+    SaqueDiario,
+    Transacao,
+    TransferenciaPendente,
+)
+
+
+class SaldoInsuficiente(Exception):
+    """A conta não tem saldo para cobrir o saque"""
+
+
+class LimiteSaqueExcedido(Exception):
+    """O saque ultrapassaria o limiteSaqueDiario da conta"""
+
+
+class ContaBloqueada(Exception):
+    """A conta está com flagAtivo desligado"""
+
+
+class SaldoExcedido(Exception):
+    """O depósito levaria o saldo da conta acima de VALOR_MAXIMO"""
+
+
+class ValorInvalido(ValueError):
+    """O valor da operação não é um número positivo de até VALOR_MAXIMO"""
+
+
+Operacao = namedtuple("Operacao", ["conta_id", "tipo", "valor"])
+
+CENTAVO = decimal.Decimal("0.01")
+
+# Maior valor que cabe em DecimalField(max_digits=11, decimal_places=2)
+VALOR_MAXIMO = decimal.Decimal("999999999.99")
+
+# Máximo de ids por "pk__in", abaixo do limite de parâmetros do SQLite
+BLOCO_IDS = 500
+
+
+def _centavos(valor: decimal.Decimal) -> decimal.Decimal:
+    """Arredonda valor para as casas decimais usadas nas colunas de dinheiro,
+    como o DecimalField faria ao salvar"""
+    return valor.quantize(CENTAVO)
+
+
+def valor_da_operacao(valor) -> decimal.Decimal:
+    """Converte o valor de um depósito, saque ou transferência (texto,
+    número ou Decimal) para Decimal em centavos. Levanta ValorInvalido se
+    ele não for numérico, não for finito, não passar de zero depois do
+    arredondamento ou não couber nas colunas de dinheiro"""
+    if isinstance(valor, bool) or not isinstance(valor, (str, int, float, decimal.Decimal)):
+        raise ValorInvalido("Valor tem que existir e ser numérico")
+    if not is_decimal(str(valor).strip()):
+        raise ValorInvalido("Valor tem que existir e ser numérico")
+    valor = decimal.Decimal(str(valor).strip())
+    # Comparado antes do arredondamento, que levanta InvalidOperation para
+    # valores com mais dígitos que a precisão do contexto
+    if not valor.is_finite() or valor <= 0:
+        raise ValorInvalido("Valor tem que ser positivo")
+    if valor > VALOR_MAXIMO:
+        raise ValorInvalido(f"Valor deve ser no máximo {VALOR_MAXIMO}")
+    valor = _centavos(valor)
+    if valor <= 0:
+        raise ValorInvalido("Valor tem que ser positivo")
+    return valor
+
+
+def _em_blocos(ids: List[int]) -> Iterable[List[int]]:
+    for inicio in range(0, len(ids), BLOCO_IDS):
+        yield ids[inicio : inicio + BLOCO_IDS]
+
+
+def _recusa(conta_id: int, saldo=SaldoInsuficiente) -> Exception:
+    """Motivo pelo qual o UPDATE condicional de um depósito ou saque não
+    alterou a conta: a exceção saldo quando ela existe e está ativa. Só é
+    consultado quando a operação já foi recusada"""
+    ativa = Conta.objects.filter(pk=conta_id).values_list("flagAtivo", flat=True).first()
+    if ativa is None:
+        return Conta.DoesNotExist()
+    if not ativa:
+        return ContaBloqueada()
+    return saldo()
+
+
+def _travar_contas(ids: List[int]) -> Dict[int, Conta]:
+    """Trava as contas em ordem crescente de id e retorna {id: conta}.
+    Todas devem estar no banco da operação atual (api.shards).
+
+    No SQLite, que não tem SELECT ... FOR UPDATE, o lock de escrita do
+    banco é pego antes da leitura com um UPDATE sem efeito, para que a
+    transação não precise promover o lock depois."""
+    ids = sorted(ids)
+    if not connections[shards.atual() or DEFAULT_DB_ALIAS].features.has_select_for_update:
+        Conta.objects.filter(pk__in=ids[:1]).update(saldo=F("saldo"))
+    contas = {}
+    for bloco in _em_blocos(ids):
+        for conta in Conta.objects.select_for_update().filter(pk__in=bloco).order_by("id"):
+            contas[conta.id] = conta
+    return contas
+
+
+def gasto_diario(
+    conta_id: int, data: Optional[datetime.date] = None
+) -> decimal.Decimal:
+    """Retorna a soma das transações de saque da conta no dia (hoje, por padrão)"""
+    inicio, fim = intervalo_do_dia(data or timezone.localdate())
+    total = Transacao.objects.filter(
+        conta_id=conta_id,
+        tipo=Transacao.Tipo.SAQ,
+        dataTransacao__gte=inicio,
+        dataTransacao__lt=fim,
+    ).aggregate(total=Sum("valor"))["total"]
+    return total or decimal.Decimal(0)
+
+
+def _somar_saque_diario(conta: Conta, valor: decimal.Decimal) -> None:
+    """Soma valor ao SaqueDiario de hoje da conta, ou levanta
+    LimiteSaqueExcedido se o total passar do limiteSaqueDiario.
+
+    Deve ser chamada com a conta já travada pelo UPDATE do saldo."""
+    hoje = timezone.localdate()
+    atualizadas = SaqueDiario.objects.filter(
+        conta=conta, data=hoje, total__lte=conta.limiteSaqueDiario - valor
+    ).update(total=F("total") + valor)
+    if atualizadas:
+        return
+    if not SaqueDiario.objects.filter(conta=conta, data=hoje).exists():
+        # Primeiro saque do dia: o contador parte das transações que já
+        # existirem (ex.: registradas antes do backfill)
+        total = gasto_diario(conta.id, hoje) + valor
+        if total <= conta.limiteSaqueDiario:
+            SaqueDiario.objects.create(conta=conta, data=hoje, total=total)
+            return
+    raise LimiteSaqueExcedido
+
+
+@na_fila
+def depositar(conta_id: int, valor: decimal.Decimal) -> Tuple[Conta, Transacao]:
+    """Soma valor ao saldo da conta com um UPDATE atômico, condicionado à
+    conta estar ativa e ao saldo continuar cabendo na coluna, e registra a
+    Transacao e o Evento na mesma transação do banco. Levanta
+    ValorInvalido, Conta.DoesNotExist, ContaBloqueada ou SaldoExcedido"""
+    valor = valor_da_operacao(valor)
+    with shards.da_conta(conta_id) as banco, transaction.atomic(using=banco):
+        atualizadas = Conta.objects.filter(
+            pk=conta_id, flagAtivo=True, saldo__lte=VALOR_MAXIMO - valor
+        ).update(saldo=F("saldo") + valor)
+        if not atualizadas:
+            raise _recusa(conta_id, SaldoExcedido)
+        conta = Conta.objects.get(pk=conta_id)
+        transacao = Transacao.objects.create(
+            conta=conta, valor=valor, tipo=Transacao.Tipo.DEP
+        )
+        razao.lancar(razao.CAIXA, conta_id, valor)
+        eventos.registrar(Evento.Tipo.DEPOSITO, conta_id, valor=valor, saldo=conta.saldo)
+        cache_contas.invalidar(conta_id)
+    return conta, transacao
+
+
+@na_fila
+def sacar(conta_id: int, valor: decimal.Decimal) -> Tuple[Conta, Transacao]:
+    """Subtrai valor do saldo da conta com um UPDATE condicional
+    (conta ativa e saldo >= valor), soma o saque ao SaqueDiario verificando o limite
+    diário e registra a Transacao e o Evento, tudo na mesma transação do banco.
+
+    O UPDATE é o primeiro comando da transação: ele trava a linha da conta
+    (ou o banco inteiro, no SQLite) até o commit, então dois saques
+    concorrentes nunca passam juntos pela verificação de saldo ou de limite."""
+    valor = valor_da_operacao(valor)
+    with shards.da_conta(conta_id) as banco, transaction.atomic(using=banco):
+        atualizadas = Conta.objects.filter(
+            pk=conta_id, flagAtivo=True, saldo__gte=valor
+        ).update(saldo=F("saldo") - valor)
+        if not atualizadas:
+            raise _recusa(conta_id)
+        conta = Conta.objects.get(pk=conta_id)
+        _somar_saque_diario(conta, valor)
+        transacao = Transacao.objects.create(
+            conta=conta, valor=valor, tipo=Transacao.Tipo.SAQ
+        )
+        razao.lancar(conta_id, razao.CAIXA, valor)
+        eventos.registrar(Evento.Tipo.SAQUE, conta_id, valor=valor, saldo=conta.saldo)
+        cache_contas.invalidar(conta_id)
+    return conta, transacao
+
+
+@na_fila
+def transferir(
+    origem_id: int, destino_id: int, valor: decimal.Decimal
+) -> Tuple[Conta, Conta, Transacao, Transacao]:
+    """Debita valor da conta de origem e credita na de destino em uma única
+    transação do banco, registrando um saque na origem e um depósito no
+    destino. Retorna (origem, destino, saque, deposito).
+
+    As duas contas são travadas em ordem crescente de id, então
+    transferências concorrentes em sentidos opostos entre as mesmas contas
+    esperam uma pela outra em vez de entrar em deadlock. Levanta
+    ValorInvalido, Conta.DoesNotExist, ContaBloqueada, SaldoInsuficiente,
+    SaldoExcedido ou LimiteSaqueExcedido sem alterar nenhuma das contas.
+
+    Com as contas em shards diferentes, cada lado é gravado no seu shard,
+    com uma transação em cada um (api.shards.transacao), e as duas partidas
+    do movimento ficam separadas, cada uma com a sua conta. Os commits são
+    feitos um depois do outro: se o segundo falhar, só um lado fica gravado.
+    Por isso cada lado grava também uma TransferenciaPendente, apagada
+    depois dos dois commits, e reconciliar_transferencias estorna os lados
+    que ficarem sem contraparte."""
+    valor = valor_da_operacao(valor)
+    bancos = {origem_id: shards.banco(origem_id), destino_id: shards.banco(destino_id)}
+    with shards.transacao(*bancos.values()):
+        contas = {}
+        for banco in shards.ordenar(bancos.values()):
+            with shards.usando(banco):
+                contas.update(
+                    _travar_contas([conta for conta in bancos if bancos[conta] == banco])
+                )
+        if origem_id not in contas or destino_id not in contas:
+            raise Conta.DoesNotExist
+        origem, destino = contas[origem_id], contas[destino_id]
+        if not (origem.flagAtivo and destino.flagAtivo):
+            raise ContaBloqueada
+        if origem.saldo < valor:
+            raise SaldoInsuficiente
+        if destino.saldo + valor > VALOR_MAXIMO:
+            raise SaldoExcedido
+
+        with shards.usando(bancos[origem_id]):
+            _somar_saque_diario(origem, valor)
+            Conta.objects.filter(pk=origem_id).update(saldo=F("saldo") - valor)
+            saque = Transacao.objects.create(
+                conta=origem, valor=valor, tipo=Transacao.Tipo.SAQ
+            )
+        with shards.usando(bancos[destino_id]):
+            Conta.objects.filter(pk=destino_id).update(saldo=F("saldo") + valor)
+            deposito = Transacao.objects.create(
+                conta=destino, valor=valor, tipo=Transacao.Tipo.DEP
+            )
+        origem.saldo -= valor
+        destino.saldo += valor
+        partidas = razao.partidas(origem_id, destino_id, valor)
+        entre_shards = bancos[origem_id] != bancos[destino_id]
+        novos_eventos = [
+            eventos.evento(
+                Evento.Tipo.SAQUE,
+                origem_id,
+                valor=valor,
+                saldo=origem.saldo,
+                contraparte=destino_id,
+            ),
+            eventos.evento(
+                Evento.Tipo.DEPOSITO,
+                destino_id,
+                valor=valor,
+                saldo=destino.saldo,
+                contraparte=origem_id,
+            ),
+        ]
+        for banco in shards.ordenar(bancos.values()):
+            do_banco = [conta for conta in bancos if bancos[conta] == banco]
+            with shards.usando(banco):
+                Lancamento.objects.bulk_create(
+                    [partida for partida in partidas if partida.conta_id in do_banco]
+                )
+                eventos.registrar_varios(
+                    [evento for evento in novos_eventos if evento.conta_id in do_banco]
+                )
+                if entre_shards:
+                    TransferenciaPendente.objects.bulk_create(
+                        TransferenciaPendente(
+                            movimento=partida.movimento,
+                            conta_id=partida.conta_id,
+                            contraparte=contraparte,
+                            natureza=partida.natureza,
+                            valor=valor,
+                        )
+                        for partida, contraparte in zip(partidas, (destino_id, origem_id))
+                        if partida.conta_id in do_banco
+                    )
+                cache_contas.invalidar(*do_banco)
+    if entre_shards:
+        # Os dois lados fizeram commit. Se apagar falhar, a reconciliação
+        # encontra as duas partidas e só apaga os registros
+        for banco in bancos.values():
+            with shards.usando(banco):
+                TransferenciaPendente.objects.filter(movimento=partidas[0].movimento).delete()
+    return origem, destino, saque, deposito
+
+
+def _estornar(pendente: TransferenciaPendente) -> None:
+    """Desfaz na conta o lado de uma transferência cuja contraparte não foi
+    gravada, com uma partida inversa no mesmo movimento, que volta a somar
+    zero, uma Transacao e um Evento. Não depende da conta estar ativa e
+    pode deixar o saldo negativo, se o valor recebido já foi sacado"""
+    conta_id = pendente.conta_id
+    if pendente.natureza == Lancamento.Natureza.CRED:
+        variacao, tipo, natureza = -pendente.valor, Transacao.Tipo.SAQ, Lancamento.Natureza.DEB
+    else:
+        variacao, tipo, natureza = pendente.valor, Transacao.Tipo.DEP, Lancamento.Natureza.CRED
+        SaqueDiario.objects.filter(
+            conta_id=conta_id, data=timezone.localdate(pendente.dataCriacao)
+        ).update(total=F("total") - pendente.valor)
+    Conta.objects.filter(pk=conta_id).update(saldo=F("saldo") + variacao)
+    Transacao.objects.create(conta_id=conta_id, valor=pendente.valor, tipo=tipo)
+    Lancamento.objects.create(
+        movimento=pendente.movimento, conta_id=conta_id, natureza=natureza, valor=pendente.valor
+    )
+    saldo = Conta.objects.values_list("saldo", flat=True).get(pk=conta_id)
+    eventos.registrar(
+        Evento.Tipo.DEPOSITO if tipo == Transacao.Tipo.DEP else Evento.Tipo.SAQUE,
+        conta_id,
+        valor=pendente.valor,
+        saldo=saldo,
+        estorno=str(pendente.movimento),
+    )
+    cache_contas.invalidar(conta_id)
+
+
+def reconciliar_transferencias(antes_de: datetime.datetime) -> Tuple[int, int]:
+    """Resolve os lados de transferências entre shards gravados antes de
+    antes_de e ainda pendentes: se a partida da contraparte existe no shard
+    dela, os dois commits foram feitos e o registro é só apagado; senão, o
+    lado gravado é estornado. Retorna (concluidas, estornadas)"""
+    concluidas = estornadas = 0
+    for alias in settings.SHARDS:
+        pendentes = list(
+            TransferenciaPendente.objects.using(alias)
+            .filter(dataCriacao__lt=antes_de)
+            .order_by("id")
+        )
+        for pendente in pendentes:
+            with shards.da_conta(pendente.contraparte):
+                completa = Lancamento.objects.filter(
+                    movimento=pendente.movimento, conta_id=pendente.contraparte
+                ).exists()
+            with shards.usando(alias), transaction.atomic(using=alias):
+                # Apagar primeiro garante que o lado é resolvido uma vez só,
+                # mesmo com duas reconciliações ao mesmo tempo
+                if not TransferenciaPendente.objects.filter(pk=pendente.pk).delete()[0]:
+                    continue
+                if completa:
+                    concluidas += 1
+                else:
+                    _estornar(pendente)
+                    estornadas += 1
+    return concluidas, estornadas
+
+
+@na_fila
+def alterar_bloqueio(conta_id: int, ativo: bool) -> Conta:
+    """Grava apenas o flagAtivo da conta, sem sobrescrever um saldo
+    alterado por outra requisição desde a leitura, e o Evento de bloqueio
+    ou desbloqueio"""
+    with shards.da_conta(conta_id) as banco, transaction.atomic(using=banco):
+        if not Conta.objects.filter(pk=conta_id).update(flagAtivo=ativo):
+            raise Conta.DoesNotExist
+        conta = Conta.objects.get(pk=conta_id)
+        eventos.registrar(
+            Evento.Tipo.DESBLOQUEIO if ativo else Evento.Tipo.BLOQUEIO, conta_id
+        )
+        shards.apos_commit(lambda: bloqueadas.marcar(conta_id, not ativo))
+        cache_contas.invalidar(conta_id)
+    return conta
+
+
+def _sacado_hoje(contas: List[int], hoje: datetime.date) -> Tuple[Dict, Dict]:
+    """Retorna os SaqueDiario de hoje existentes e, para as contas sem
+    contador, o total já registrado em Transacao (como em _somar_saque_diario)"""
+    existentes = {}
+    for bloco in _em_blocos(contas):
+        for contador in SaqueDiario.objects.filter(conta_id__in=bloco, data=hoje):
+            existentes[contador.conta_id] = contador
+    faltando = [conta_id for conta_id in contas if conta_id not in existentes]
+    inicio, fim = intervalo_do_dia(hoje)
+    sementes = {}
+    for bloco in _em_blocos(faltando):
+        totais = (
+            Transacao.objects.filter(
+                conta_id__in=bloco,
+                tipo=Transacao.Tipo.SAQ,
+                dataTransacao__gte=inicio,
+                dataTransacao__lt=fim,
+            )
+            .values("conta_id")
+            .annotate(total=Sum("valor"))
+            .values_list("conta_id", "total")
+        )
+        sementes.update(totais)
+    return existentes, sementes
+
+
+@na_fila
+def aplicar_lote(operacoes: List[Operacao]) -> List[Optional[Exception]]:
+    """Aplica depósitos e saques de várias contas em uma única transação.
+
+    As contas são travadas em ordem crescente de id e as operações são
+    verificadas na ordem recebida contra o saldo e o total sacado no dia,
+    acumulados em memória. No fim, cada conta recebe um único UPDATE com a
+    variação líquida e as transações aceitas são gravadas com bulk_create.
+    Com contas em vários shards, as operações de cada shard são aplicadas
+    assim em uma transação dele (api.shards.transacao).
+
+    Retorna, na ordem das operações, None para as aceitas ou a exceção
+    (Conta.DoesNotExist, ContaBloqueada, SaldoInsuficiente, SaldoExcedido,
+    LimiteSaqueExcedido) que recusou cada uma."""
+    operacoes = [op._replace(valor=_centavos(op.valor)) for op in operacoes]
+    por_banco = shards.agrupar(range(len(operacoes)), lambda indice: operacoes[indice].conta_id)
+    resultados = [None] * len(operacoes)
+    with shards.transacao(*por_banco):
+        for banco, indices in por_banco.items():
+            with shards.usando(banco):
+                recusas = _aplicar_no_banco([operacoes[indice] for indice in indices])
+            for indice, recusa in zip(indices, recusas):
+                resultados[indice] = recusa
+    return resultados
+
+
+def _aplicar_no_banco(operacoes: List[Operacao]) -> List[Optional[Exception]]:
+    """aplicar_lote para operações de contas do banco atual, dentro da
+    transação aberta por ele"""
+    hoje = timezone.localdate()
+    resultados = []
+    contas = _travar_contas(list({op.conta_id for op in operacoes}))
+    com_saque = sorted(
+        {op.conta_id for op in operacoes if op.tipo == Transacao.Tipo.SAQ} & contas.keys()
+    )
+    contadores, sementes = _sacado_hoje(com_saque, hoje)
+
+    saldos = {conta_id: conta.saldo for conta_id, conta in contas.items()}
+    sacado = {
+        conta_id: contadores[conta_id].total
+        if conta_id in contadores
+        else sementes.get(conta_id) or decimal.Decimal(0)
+        for conta_id in com_saque
+    }
+    variacoes = defaultdict(decimal.Decimal)
+    transacoes = []
+    lancamentos = []
+    novos_eventos = []
+    for op in operacoes:
+        conta = contas.get(op.conta_id)
+        if conta is None:
+            resultados.append(Conta.DoesNotExist())
+            continue
+        if not conta.flagAtivo:
+            resultados.append(ContaBloqueada())
+            continue
+        if op.tipo == Transacao.Tipo.SAQ:
+            if op.valor > saldos[op.conta_id]:
+                resultados.append(SaldoInsuficiente())
+                continue
+            if sacado[op.conta_id] + op.valor > conta.limiteSaqueDiario:
+                resultados.append(LimiteSaqueExcedido())
+                continue
+            sacado[op.conta_id] += op.valor
+            variacao = -op.valor
+            lancamentos += razao.partidas(op.conta_id, razao.CAIXA, op.valor)
+        else:
+            # Os saldos projetados garantem que o UPDATE com a variação
+            # líquida da conta não passe do que cabe na coluna
+            if saldos[op.conta_id] + op.valor > VALOR_MAXIMO:
+                resultados.append(SaldoExcedido())
+                continue
+            variacao = op.valor
+            lancamentos += razao.partidas(razao.CAIXA, op.conta_id, op.valor)
+        saldos[op.conta_id] += variacao
+        variacoes[op.conta_id] += variacao
+        transacoes.append(Transacao(conta=conta, valor=op.valor, tipo=op.tipo))
+        novos_eventos.append(
+            eventos.evento(
+                Evento.Tipo.SAQUE if op.tipo == Transacao.Tipo.SAQ else Evento.Tipo.DEPOSITO,
+                op.conta_id,
+                valor=op.valor,
+                saldo=saldos[op.conta_id],
+            )
+        )
+        resultados.append(None)
+
+    for conta_id, variacao in variacoes.items():
+        if variacao:
+            Conta.objects.filter(pk=conta_id).update(saldo=F("saldo") + variacao)
+
+    atualizados = []
+    novos = []
+    for conta_id in com_saque:
+        if conta_id in contadores:
+            if contadores[conta_id].total != sacado[conta_id]:
+                contadores[conta_id].total = sacado[conta_id]
+                atualizados.append(contadores[conta_id])
+        elif sacado[conta_id]:
+            novos.append(
+                SaqueDiario(conta_id=conta_id, data=hoje, total=sacado[conta_id])
+            )
+    SaqueDiario.objects.bulk_update(atualizados, ["total"], batch_size=BLOCO_IDS)
+    SaqueDiario.objects.bulk_create(novos)
+    Transacao.objects.bulk_create(transacoes)
+    Lancamento.objects.bulk_create(lancamentos, batch_size=BLOCO_IDS)
+    eventos.registrar_varios(novos_eventos)
+    cache_contas.invalidar(*variacoes)
+    return resultados
@@ -0,0 +1,232 @@
+"""Limites de requisições e contrapressão nas views de movimentação.
+
+LimitePorCliente e LimitePorConta são throttles do DRF com baldes de fichas
+(token bucket): cada balde enche settings.LIMITE_*[0] fichas por segundo
+até a capacidade settings.LIMITE_*[1] e cada requisição gasta uma. O DRF
+verifica os throttles antes de executar a view, então uma requisição acima
+do limite recebe 429 com Retry-After sem nenhuma consulta ao banco. Uma
+requisição recusada por um dos limites não gasta ficha dos outros.
+
+Os baldes ficam em memória no processo, os menos usados descartados ao
+passar de settings.LIMITES_MAXIMO, ou, com settings.LIMITES_CACHE, em um
+alias de CACHES compartilhado entre processos. No cache a leitura e a
+gravação do balde não são atômicas, então requisições simultâneas da mesma
+chave podem passar um pouco do limite.
+
+@contrapressao recusa com 429 as movimentações que chegam com
+settings.MOVIMENTACAO_FILA_MAXIMA já em andamento no processo, e informa no
+header X-Fila-Movimentacao quantas estavam em andamento na chegada."""
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+HEADER_FILA = "X-Fila-Movimentacao"
+
+
+class Baldes:
+    """Baldes (fichas, instante) por chave, em ordem de uso"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._baldes = OrderedDict()
+
+    def consumir(
+        self,
+        chave: str,
+        taxa: float,
+        capacidade: float,
+        agora: Optional[float] = None,
+        gastar: bool = True,
+    ) -> float:
+        """Gasta uma ficha do balde da chave. Retorna 0 se havia ficha, ou
+        os segundos até a próxima. Com gastar=False, só confere"""
+        if agora is None:
+            agora = time.monotonic()
+        with self._trava:
+            balde = self._baldes.pop(chave, None)
+            fichas = capacidade if balde is None else min(
+                capacidade, balde[0] + (agora - balde[1]) * taxa
+            )
+            espera = 0.0 if fichas >= 1 else (1 - fichas) / taxa
+            if gastar and not espera:
+                fichas -= 1
+            self._baldes[chave] = (fichas, agora)
+            while len(self._baldes) > settings.LIMITES_MAXIMO:
+                self._baldes.popitem(last=False)
+        return espera
+
+    def devolver(self, chave: str, taxa: float, capacidade: float) -> None:
+        """Devolve a ficha gasta por consumir()"""
+        with self._trava:
+            balde = self._baldes.get(chave)
+            if balde is not None:
+                self._baldes[chave] = (min(capacidade, balde[0] + 1), balde[1])
+
+    def limpar(self) -> None:
+        with self._trava:
+            self._baldes.clear()
+
+    def __len__(self) -> int:
+        return len(self._baldes)
+
+
+class BaldesEmCache:
+    """Baldes em um alias de CACHES. Cada balde expira quando estaria cheio
+    de novo, o que equivale a não existir. O cache não informa quantos
+    baldes existem, então não há a métrica bank_limites_baldes"""
+
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    def consumir(
+        self,
+        chave: str,
+        taxa: float,
+        capacidade: float,
+        agora: Optional[float] = None,
+        gastar: bool = True,
+    ) -> float:
+        if agora is None:
+            agora = time.time()
+        cache = caches[self.alias]
+        chave = f"limite:{chave}"
+        balde = cache.get(chave)
+        fichas = capacidade if balde is None else min(
+            capacidade, balde[0] + (agora - balde[1]) * taxa
+        )
+        espera = 0.0 if fichas >= 1 else (1 - fichas) / taxa
+        if gastar and not espera:
+            fichas -= 1
+        self._gravar(cache, chave, fichas, agora, taxa, capacidade)
+        return espera
+
+    def devolver(self, chave: str, taxa: float, capacidade: float) -> None:
+        cache = caches[self.alias]
+        chave = f"limite:{chave}"
+        balde = cache.get(chave)
+        if balde is not None:
+            self._gravar(cache, chave, min(capacidade, balde[0] + 1), balde[1], taxa, capacidade)
+
+    def _gravar(self, cache, chave, fichas, instante, taxa, capacidade) -> None:
+        cache.set(chave, (fichas, instante), math.ceil((capacidade - fichas) / taxa) + 1)
+
+    def limpar(self) -> None:
+        pass
+
+
+_locais = Baldes()
+
+
+def baldes():
+    if settings.LIMITES_CACHE:
+        return BaldesEmCache(settings.LIMITES_CACHE)
+    return _locais
+
+
+def cliente(request) -> str:
+    """Quem fez a requisição: o usuário autenticado ou, sem autenticação,
+    o IP (atrás de proxies, conforme NUM_PROXIES do DRF)"""
+    if request.user and request.user.is_authenticated:
+        return f"usuario:{request.user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+class _Limite(BaseThrottle):
+    limite = None
+
+    def chave(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if getattr(request, "repetida", False):
+            # Repetida por api.shards.ShardsMiddleware: as fichas já foram
+            # gastas na primeira execução
+            return True
+        limite = getattr(settings, self.limite)
+        chave = self.chave(request, view)
+        if not limite or chave is None:
+            return True
+        # O DRF confere todos os throttles da view, mesmo depois de uma
+        # recusa. request.fichas guarda as fichas já gastas, devolvidas na
+        # primeira recusa; depois dela, os demais limites só conferem
+        fichas = getattr(request, "fichas", None)
+        if fichas is None:
+            fichas = request.fichas = {"gastas": [], "recusada": False}
+        self.espera = baldes().consumir(chave, *limite, gastar=not fichas["recusada"])
+        if not self.espera:
+            if not fichas["recusada"]:
+                fichas["gastas"].append((chave, limite))
+            return True
+        if not fichas["recusada"]:
+            fichas["recusada"] = True
+            for gasta, limite_gasto in fichas["gastas"]:
+                baldes().devolver(gasta, *limite_gasto)
+        return False
+
+    def wait(self):
+        return self.espera
+
+
+class LimitePorCliente(_Limite):
+    """Pelo usuário autenticado ou, sem autenticação, pelo IP"""
+
+    limite = "LIMITE_CLIENTE"
+
+    def chave(self, request, view):
+        return cliente(request)
+
+
+class LimitePorConta(_Limite):
+    """Pela conta da URL (conta/<id>/...)"""
+
+    limite = "LIMITE_CONTA"
+
+    def chave(self, request, view):
+        conta = view.kwargs.get("id")
+        return None if conta is None else f"conta:{conta}"
+
+
+LIMITES_MOVIMENTACAO = [LimitePorCliente, LimitePorConta]
+
+
+_trava = threading.Lock()
+_em_andamento = 0
+
+
+def em_andamento() -> int:
+    """Movimentações em execução no processo"""
+    return _em_andamento
+
+
+def contrapressao(view):
+    @functools.wraps(view)
+    def executar(request, *args, **kwargs):
+        global _em_andamento
+        with _trava:
+            fila = _em_andamento
+            if fila < settings.MOVIMENTACAO_FILA_MAXIMA:
+                _em_andamento += 1
+        if fila >= settings.MOVIMENTACAO_FILA_MAXIMA:
+            return Response(
+                {"detail": "Servidor sobrecarregado, tente novamente em instantes."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": "1", HEADER_FILA: str(fila)},
+            )
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            with _trava:
+                _em_andamento -= 1
+        response[HEADER_FILA] = str(fila)
+        return response
+
+    return executar
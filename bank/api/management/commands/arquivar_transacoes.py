@@ -0,0 +1,89 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from api import shards
+from api.extrato import inicio_do_dia
+from api.models import Transacao, TransacaoArquivada
+
+
+def inicio_do_mes(meses_atras: int) -> datetime.date:
+    hoje = timezone.localdate()
+    ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - meses_atras, 12)
+    return datetime.date(ano, mes + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move as transações anteriores ao corte de Transacao para "
+        "TransacaoArquivada, em lotes, mantendo os ids, em cada shard. Extratos "
+        "e listagens continuam vendo as duas tabelas por TransacaoHistorico."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses",
+            type=int,
+            default=settings.TRANSACOES_MESES_QUENTES,
+            help="meses, além do atual, mantidos em Transacao",
+        )
+        parser.add_argument(
+            "--antes-de",
+            type=datetime.date.fromisoformat,
+            help="arquiva as transações anteriores a esta data (AAAA-MM-DD), em vez de --meses",
+        )
+        parser.add_argument("--lote", type=int, default=5000, help="transações por transação do banco")
+
+    def handle(self, *args, **options):
+        dia = options["antes_de"] or inicio_do_mes(options["meses"])
+        if dia > timezone.localdate():
+            # As transações de hoje ficam em Transacao: a verificação do
+            # limite de saque diário só consulta a tabela recente
+            raise CommandError("o corte não pode ser posterior a hoje")
+        corte = inicio_do_dia(dia)
+
+        movidas = 0
+        for alias in settings.SHARDS:
+            with shards.usando(alias):
+                while True:
+                    quantidade = self.mover(alias, corte, options["lote"])
+                    if not quantidade:
+                        break
+                    movidas += quantidade
+        self.stdout.write(f"{movidas} transações anteriores a {dia} arquivadas")
+
+    def mover(self, alias: str, corte: datetime.datetime, lote: int) -> int:
+        """Move até lote transações do shard alias, as de menor id anteriores
+        ao corte.
+
+        O INSERT ... SELECT e o DELETE usam o mesmo filtro na mesma transação
+        e começam escrevendo, sem promover um lock de leitura no SQLite.
+        Transações novas têm id maior que o limite, então não entram."""
+        limite = (
+            Transacao.objects.filter(dataTransacao__lt=corte)
+            .order_by("id")
+            .values_list("id", flat=True)[lote - 1 : lote]
+        )
+        recentes = Transacao.objects.filter(dataTransacao__lt=corte)
+        if limite:
+            recentes = recentes.filter(id__lte=limite[0])
+        connection = connections[alias]
+        colunas = ", ".join(
+            connection.ops.quote_name(campo.column)
+            for campo in TransacaoArquivada._meta.concrete_fields
+        )
+        selecao, parametros = recentes.values_list(
+            *(campo.attname for campo in TransacaoArquivada._meta.concrete_fields)
+        ).query.get_compiler(using=alias).as_sql()
+        with transaction.atomic(using=alias):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {connection.ops.quote_name(TransacaoArquivada._meta.db_table)} "
+                    f"({colunas}) {selecao}",
+                    parametros,
+                )
+            quantidade, _ = recentes.delete()
+        return quantidade
@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia o banco default para os arquivos das réplicas de settings.REPLICAS "
+        "com a API de backup do SQLite, simulando a replicação localmente."
+    )
+
+    def handle(self, *args, **options):
+        if not settings.REPLICAS:
+            raise CommandError("nenhuma réplica configurada (BANK_DB_REPLICAS)")
+        if connection.vendor != "sqlite":
+            raise CommandError("a cópia das réplicas só é feita entre arquivos SQLite")
+
+        connection.ensure_connection()
+        for alias in settings.REPLICAS:
+            connections[alias].close()
+            nome = str(connections.databases[alias]["NAME"])
+            destino = sqlite3.connect(nome)
+            try:
+                connection.connection.backup(destino)
+            finally:
+                destino.close()
+            self.stdout.write(f"{alias}: {nome}")
@@ -0,0 +1,45 @@
+import contextlib
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import importacao
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta as transações de um período em CSV ou NDJSON, lendo o banco "
+        "em blocos, com memória constante."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-inicial", type=datetime.date.fromisoformat)
+        parser.add_argument("--data-final", type=datetime.date.fromisoformat)
+        parser.add_argument("--conta", type=int, help="apenas as transações desta conta")
+        parser.add_argument("--formato", choices=importacao.FORMATOS, default="csv")
+        parser.add_argument("--saida", help="arquivo de saída; padrão: saída padrão")
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=settings.STREAM_CHUNK_SIZE,
+            help="transações lidas do banco por vez",
+        )
+
+    def handle(self, *args, **options):
+        with contextlib.ExitStack() as pilha:
+            if options["saida"]:
+                arquivo = pilha.enter_context(
+                    open(options["saida"], "w", encoding="utf-8", newline="")
+                )
+                escrever = arquivo.write
+            else:
+                escrever = lambda pedaco: self.stdout.write(pedaco, ending="")  # noqa: E731
+            for pedaco in importacao.exportar_transacoes(
+                options["formato"],
+                options["lote"],
+                data_inicial=options["data_inicial"],
+                data_final=options["data_final"],
+                conta_id=options["conta"],
+            ):
+                escrever(pedaco)
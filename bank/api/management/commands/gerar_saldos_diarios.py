@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api import shards
+from api.extrato import UM_DIA, VARIACAO, inicio_do_dia
+from api.models import Conta, SaldoDiario, TransacaoHistorico
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava o SaldoDiario de cada dia encerrado com transações, continuando "
+        "a partir do último checkpoint de cada conta, em cada shard."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=500, help="contas por vez")
+
+    def handle(self, *args, **options):
+        fim = inicio_do_dia(timezone.localdate())
+        criados = 0
+        for alias in settings.SHARDS:
+            with shards.usando(alias):
+                ids = Conta.objects.order_by("id").values_list("id", flat=True)
+                bloco = []
+                for conta_id in ids.iterator(chunk_size=options["lote"]):
+                    bloco.append(conta_id)
+                    if len(bloco) >= options["lote"]:
+                        criados += self.processar(alias, bloco, fim)
+                        bloco = []
+                if bloco:
+                    criados += self.processar(alias, bloco, fim)
+        self.stdout.write(f"{criados} saldos diários gravados")
+
+    def processar(self, alias: str, contas, fim) -> int:
+        """Gera os checkpoints das contas do shard alias até o dia anterior
+        a fim"""
+        with transaction.atomic(using=alias):
+            ultimos = {
+                checkpoint.conta_id: checkpoint
+                for checkpoint in SaldoDiario.objects.filter(
+                    conta_id__in=contas,
+                    data=Subquery(
+                        SaldoDiario.objects.filter(conta=OuterRef("conta"))
+                        .order_by("-data")
+                        .values("data")[:1]
+                    ),
+                )
+            }
+            movimentos = TransacaoHistorico.objects.filter(
+                conta_id__in=contas, dataTransacao__lt=fim
+            )
+            if len(ultimos) == len(contas):
+                desde = min(checkpoint.data for checkpoint in ultimos.values())
+                movimentos = movimentos.filter(
+                    dataTransacao__gte=inicio_do_dia(desde + UM_DIA)
+                )
+
+            saldos = {
+                conta_id: checkpoint.saldo for conta_id, checkpoint in ultimos.items()
+            }
+            saldos.update(self.saldos_de_abertura(set(contas) - set(ultimos)))
+
+            novos = []
+            por_dia = (
+                movimentos.annotate(dia=TruncDate("dataTransacao"))
+                .values("conta_id", "dia")
+                .annotate(total=Sum(VARIACAO))
+                .order_by("conta_id", "dia")
+            )
+            for linha in por_dia.iterator():
+                conta_id, dia = linha["conta_id"], linha["dia"]
+                if conta_id in ultimos and dia <= ultimos[conta_id].data:
+                    continue
+                saldos[conta_id] += linha["total"]
+                novos.append(SaldoDiario(conta_id=conta_id, data=dia, saldo=saldos[conta_id]))
+            SaldoDiario.objects.bulk_create(novos)
+        return len(novos)
+
+    def saldos_de_abertura(self, contas) -> dict:
+        """Saldo de cada conta antes de sua primeira transação, lido junto
+        com a soma do histórico em um único comando"""
+        if not contas:
+            return {}
+        historico = (
+            TransacaoHistorico.objects.filter(conta=OuterRef("pk"))
+            .values("conta")
+            .annotate(total=Sum(VARIACAO))
+            .values("total")
+        )
+        return {
+            conta_id: saldo - (total or 0)
+            for conta_id, saldo, total in Conta.objects.filter(pk__in=contas)
+            .annotate(total=Subquery(historico))
+            .values_list("id", "saldo", "total")
+        }
@@ -0,0 +1,71 @@
+import contextlib
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import importacao
+
+EXTENSOES = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa pessoas ou contas de um arquivo CSV ou NDJSON (um registro por "
+        "linha), gravando em lotes e relatando as linhas rejeitadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("modelo", choices=sorted(importacao.IMPORTADORES))
+        parser.add_argument("arquivo", help='arquivo a importar; "-" lê da entrada padrão')
+        parser.add_argument(
+            "--formato",
+            choices=importacao.FORMATOS,
+            help="padrão: pela extensão do arquivo, ou csv",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=settings.IMPORTACAO_LOTE,
+            help="linhas validadas e gravadas por transação",
+        )
+        parser.add_argument(
+            "--rejeitadas",
+            help="grava as linhas rejeitadas, com os erros, neste arquivo NDJSON",
+        )
+
+    def handle(self, *args, **options):
+        arquivo = options["arquivo"]
+        formato = options["formato"]
+        if formato is None:
+            extensao = arquivo[arquivo.rfind(".") :].lower() if "." in arquivo else ""
+            formato = EXTENSOES.get(extensao, "csv")
+
+        with contextlib.ExitStack() as pilha:
+            if arquivo == "-":
+                entrada = sys.stdin
+            else:
+                try:
+                    entrada = pilha.enter_context(open(arquivo, encoding="utf-8", newline=""))
+                except OSError as erro:
+                    raise CommandError(f"não foi possível abrir {arquivo}: {erro}")
+            saida = (
+                pilha.enter_context(open(options["rejeitadas"], "w", encoding="utf-8"))
+                if options["rejeitadas"]
+                else None
+            )
+
+            def rejeitar(linha, erros):
+                if saida is None:
+                    self.stderr.write(f"linha {linha}: {erros}")
+                else:
+                    saida.write(
+                        json.dumps({"linha": linha, "erros": erros}, ensure_ascii=False) + "\n"
+                    )
+
+            importadas, rejeitadas = importacao.IMPORTADORES[options["modelo"]](
+                importacao.ler_registros(entrada, formato), options["lote"], rejeitar
+            )
+
+        self.stdout.write(f"{importadas} {options['modelo']} importadas, {rejeitadas} rejeitadas")
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import eventos
+
+
+class Command(BaseCommand):
+    help = (
+        "Publica os eventos do outbox em um destino de settings.EVENTOS_DESTINOS, "
+        "em lotes e na ordem dos ids, avançando o último evento entregue só "
+        "depois que o destino aceita o lote (entrega pelo menos uma vez)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("destino", choices=sorted(settings.EVENTOS_DESTINOS))
+        parser.add_argument("--lote", type=int, default=settings.EVENTOS_LOTE)
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=settings.EVENTOS_INTERVALO,
+            help="segundos entre as leituras quando não há eventos novos",
+        )
+        parser.add_argument(
+            "--uma-vez",
+            action="store_true",
+            help="publica os eventos pendentes e termina",
+        )
+
+    def handle(self, *args, **options):
+        nome = options["destino"]
+        destino = eventos.destino(nome)
+        publicados = 0
+        try:
+            while True:
+                try:
+                    quantidade = eventos.publicar(nome, destino, options["lote"])
+                except OSError as e:
+                    # O lote não foi entregue e será lido de novo
+                    self.stderr.write(f"falha ao publicar em {nome}: {e}")
+                    if options["uma_vez"]:
+                        raise
+                    time.sleep(options["intervalo"])
+                    continue
+                publicados += quantidade
+                if quantidade:
+                    atraso = eventos.atraso(nome)
+                    self.stdout.write(
+                        f"{quantidade} eventos publicados, {atraso['pendentes']} "
+                        f"pendentes, atraso de {atraso['segundos']:.1f} s"
+                    )
+                elif options["uma_vez"]:
+                    break
+                else:
+                    time.sleep(options["intervalo"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            destino.fechar()
+        self.stdout.write(f"{publicados} eventos publicados em {nome}")
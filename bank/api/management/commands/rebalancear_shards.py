@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Move para o shard dono de cada conta, pelo anel de settings.SHARDS, as "
+        "contas gravadas em outro shard, em lotes e com a API no ar. Antes, "
+        "copia as pessoas do default para os shards novos. Enquanto rodar, "
+        "BANK_DB_SHARDS_ANTERIORES deve indicar quantos shards havia antes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=100, help="contas movidas por transação")
+        parser.add_argument(
+            "--pausa",
+            type=float,
+            default=0.0,
+            help="segundos de espera entre os lotes, para não disputar o lock de escrita",
+        )
+
+    def handle(self, *args, **options):
+        if not shards.distribuido():
+            raise CommandError("nenhum shard além do default configurado (BANK_DB_SHARDS)")
+
+        for alias in settings.SHARDS[1:]:
+            copiadas = shards.copiar_pessoas(alias)
+            self.stdout.write(f"{alias}: {copiadas} pessoas copiadas")
+
+        movidas = 0
+        for origem in settings.SHARDS:
+            for destino, ids in shards.fora_do_lugar(origem, options["lote"]):
+                shards.mover_contas(ids, origem, destino)
+                movidas += len(ids)
+                self.stdout.write(f"{origem} -> {destino}: {len(ids)} contas")
+                if options["pausa"]:
+                    time.sleep(options["pausa"])
+        self.stdout.write(f"{movidas} contas movidas")
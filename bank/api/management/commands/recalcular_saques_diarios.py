@@ -0,0 +1,58 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+from api import shards
+from api.functions import intervalo_do_dia
+from api.models import SaqueDiario, Transacao, TransacaoHistorico
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os totais de SaqueDiario a partir das transações de saque, "
+        "em cada shard. "
+        "Usado para preencher o contador com o histórico existente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--desde",
+            type=datetime.date.fromisoformat,
+            help="recalcula apenas a partir desta data (AAAA-MM-DD)",
+        )
+        parser.add_argument("--lote", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        saques = TransacaoHistorico.objects.filter(tipo=Transacao.Tipo.SAQ).annotate(
+            data=TruncDate("dataTransacao")
+        )
+        contadores = SaqueDiario.objects.all()
+        if options["desde"]:
+            inicio, _ = intervalo_do_dia(options["desde"])
+            saques = saques.filter(dataTransacao__gte=inicio)
+            contadores = contadores.filter(data__gte=options["desde"])
+        totais = (
+            saques.values("conta_id", "data")
+            .annotate(total=Sum("valor"))
+            .order_by("conta_id", "data")
+        )
+
+        criados = 0
+        for alias in settings.SHARDS:
+            lote = []
+            with shards.usando(alias), transaction.atomic(using=alias):
+                contadores.delete()
+                for linha in totais.iterator(chunk_size=options["lote"]):
+                    lote.append(SaqueDiario(**linha))
+                    if len(lote) >= options["lote"]:
+                        SaqueDiario.objects.bulk_create(lote)
+                        criados += len(lote)
+                        lote = []
+                SaqueDiario.objects.bulk_create(lote)
+                criados += len(lote)
+
+        self.stdout.write(f"{criados} contadores de saque diário gravados")
@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve as transferências entre shards que ficaram pendentes: apaga "
+        "os registros das que fizeram commit nos dois shards e estorna o lado "
+        "gravado das que fizeram commit em um só."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--idade",
+            type=float,
+            default=300,
+            help="segundos desde a gravação para considerar uma transferência pendente",
+        )
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - datetime.timedelta(seconds=options["idade"])
+        concluidas, estornadas = ledger.reconciliar_transferencias(antes_de)
+        self.stdout.write(
+            f"{concluidas} transferências concluídas, {estornadas} lados estornados"
+        )
@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import razao, shards
+from api.ledger import BLOCO_IDS
+from api.models import SaldoConsolidado
+
+
+def _desbalanceados(movimentos=None) -> dict:
+    """Soma, por movimento, as diferenças entre débitos e créditos de todos
+    os shards e retorna as que não se anulam"""
+    diferencas = defaultdict(lambda: razao.ZERO)
+    for alias in settings.SHARDS:
+        with shards.usando(alias):
+            for movimento, diferenca in razao.movimentos_desbalanceados(movimentos):
+                diferencas[movimento] += diferenca
+    return {movimento: diferenca for movimento, diferenca in diferencas.items() if diferenca}
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere o livro razão: todo movimento deve ter débitos e créditos "
+        "iguais, somados em todos os shards, e o saldo derivado de cada conta "
+        "deve ser igual a Conta.saldo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=settings.STREAM_CHUNK_SIZE,
+            help="contas lidas do banco por vez",
+        )
+        parser.add_argument(
+            "--completo",
+            action="store_true",
+            help="soma todas as partidas, ignorando os SaldoConsolidado",
+        )
+        parser.add_argument(
+            "--consolidar",
+            action="store_true",
+            help="grava um SaldoConsolidado para cada conta conferida com partidas novas",
+        )
+
+    def handle(self, *args, **options):
+        contas = divergentes = consolidados = 0
+        for alias in settings.SHARDS:
+            # Uma única transação por shard, para que saldos e partidas de
+            # cada conta sejam lidos no mesmo estado do banco
+            with shards.usando(alias), transaction.atomic(using=alias):
+                novos = []
+                for conta_id, saldo, derivado, desde, ultimo in razao.saldos_derivados(
+                    options["completo"], options["lote"]
+                ):
+                    contas += 1
+                    if saldo != derivado:
+                        divergentes += 1
+                        self.stderr.write(
+                            f"conta {conta_id}: saldo {saldo}, razão {derivado}"
+                        )
+                    elif options["consolidar"] and ultimo is not None and ultimo > desde:
+                        novos.append(
+                            SaldoConsolidado(
+                                conta_id=conta_id, ultimoLancamento=ultimo, saldo=derivado
+                            )
+                        )
+                        if len(novos) >= options["lote"]:
+                            consolidados += len(SaldoConsolidado.objects.bulk_create(novos))
+                            novos = []
+                consolidados += len(SaldoConsolidado.objects.bulk_create(novos))
+
+        desbalanceados = _desbalanceados()
+        if desbalanceados and shards.distribuido():
+            # Os shards são lidos um depois do outro, então uma transferência
+            # entre shards pode ter feito commit entre duas leituras. Os
+            # candidatos são conferidos de novo, já com os dois lados gravados
+            candidatos = list(desbalanceados)
+            desbalanceados = {}
+            for inicio in range(0, len(candidatos), BLOCO_IDS):
+                desbalanceados.update(_desbalanceados(candidatos[inicio : inicio + BLOCO_IDS]))
+        for movimento, diferenca in desbalanceados.items():
+            self.stderr.write(f"movimento {movimento} desbalanceado em {diferenca}")
+
+        self.stdout.write(
+            f"{contas} contas conferidas, {divergentes} divergentes, "
+            f"{len(desbalanceados)} movimentos desbalanceados, "
+            f"{consolidados} saldos consolidados"
+        )
+        if divergentes or desbalanceados:
+            raise CommandError("o livro razão não confere")
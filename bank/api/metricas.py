@@ -0,0 +1,248 @@
+"""Métricas por requisição no formato texto do Prometheus (/api/_metrics).
+
+MetricasMiddleware conta todas as requisições por rota (o nome da rota em
+api/urls.py) e, em uma amostra de settings.METRICAS_AMOSTRAGEM delas, mede
+a latência, a quantidade e o tempo das consultas ao banco e o tempo de
+renderização da resposta. A medição da requisição atual fica em uma
+ContextVar, lida pelo execute wrapper instalado em toda conexão do banco e
+pelo callback de renderização; fora da amostra os dois só consultam a
+ContextVar. Respostas em streaming são serializadas depois do middleware e
+não entram no tempo de serialização."""
+import bisect
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Medicao:
+    __slots__ = ("consultas", "tempo_db", "tempo_serializacao")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.tempo_serializacao = 0.0
+
+
+_medicao = contextvars.ContextVar("medicao", default=None)
+
+
+class Histograma:
+    __slots__ = ("limites", "contagens", "soma")
+
+    def __init__(self, limites: tuple):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0
+
+    def observar(self, valor) -> None:
+        self.contagens[bisect.bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+
+
+class Registro:
+    """Contadores e histogramas por nome e rótulos, protegidos por uma trava"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+
+    def contar(self, nome: str, rotulos: tuple) -> None:
+        chave = (nome, rotulos)
+        with self._trava:
+            self._contadores[chave] = self._contadores.get(chave, 0) + 1
+
+    def observar(self, nome: str, rotulos: tuple, valor, limites: tuple = SEGUNDOS) -> None:
+        self.observar_varios([(nome, rotulos, valor, limites)])
+
+    def observar_varios(self, observacoes: list) -> None:
+        """Registra várias observações (nome, rótulos, valor, limites) com
+        uma única aquisição da trava"""
+        with self._trava:
+            for nome, rotulos, valor, limites in observacoes:
+                histograma = self._histogramas.get((nome, rotulos))
+                if histograma is None:
+                    histograma = self._histogramas[(nome, rotulos)] = Histograma(limites)
+                histograma.observar(valor)
+
+    def limpar(self) -> None:
+        with self._trava:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def exportar(self) -> str:
+        with self._trava:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted(
+                (chave, (h.limites, list(h.contagens), h.soma))
+                for chave, h in self._histogramas.items()
+            )
+
+        linhas = []
+        anterior = None
+        for (nome, rotulos), valor in contadores:
+            if nome != anterior:
+                linhas.append(f"# TYPE {nome} counter")
+                anterior = nome
+            linhas.append(f"{nome}{_rotulos(rotulos)} {valor}")
+        for (nome, rotulos), (limites, contagens, soma) in histogramas:
+            if nome != anterior:
+                linhas.append(f"# TYPE {nome} histogram")
+                anterior = nome
+            acumulado = 0
+            for limite, contagem in zip(limites + ("+Inf",), contagens):
+                acumulado += contagem
+                le = (("le", str(limite)),)
+                linhas.append(f"{nome}_bucket{_rotulos(rotulos + le)} {acumulado}")
+            linhas.append(f"{nome}_sum{_rotulos(rotulos)} {soma}")
+            linhas.append(f"{nome}_count{_rotulos(rotulos)} {acumulado}")
+        return "\n".join(linhas) + "\n"
+
+
+registro = Registro()
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(rotulos: tuple) -> str:
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + "}"
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.consultas += 1
+        medicao.tempo_db += time.perf_counter() - inicio
+
+
+@receiver(connection_created)
+def instalar_medicao_de_consultas(sender, connection, **kwargs):
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+@contextlib.contextmanager
+def serializacao():
+    """Soma o tempo do bloco ao tempo de serialização da requisição atual"""
+    medicao = _medicao.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if medicao is not None:
+            medicao.tempo_serializacao += time.perf_counter() - inicio
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        amostrada = random.random() < settings.METRICAS_AMOSTRAGEM
+        if amostrada:
+            medicao = Medicao()
+            token = _medicao.set(medicao)
+            inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if amostrada:
+                duracao = time.perf_counter() - inicio
+                _medicao.reset(token)
+
+        match = request.resolver_match
+        rota = (("rota", match.view_name if match else "nao_resolvida"),)
+        metodo = (("metodo", request.method),)
+        status = (("status", f"{response.status_code // 100}xx"),)
+        registro.contar("bank_http_requisicoes_total", rota + metodo + status)
+        if amostrada:
+            registro.observar_varios(
+                [
+                    ("bank_http_duracao_segundos", rota + metodo, duracao, SEGUNDOS),
+                    ("bank_db_consultas", rota, medicao.consultas, CONSULTAS),
+                    ("bank_db_duracao_segundos", rota, medicao.tempo_db, SEGUNDOS),
+                    (
+                        "bank_serializacao_duracao_segundos",
+                        rota,
+                        medicao.tempo_serializacao,
+                        SEGUNDOS,
+                    ),
+                ]
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """As respostas do DRF são renderizadas pelo handler do Django logo
+        depois deste método; o tempo até o callback é a serialização"""
+        medicao = _medicao.get()
+        if medicao is not None and not response.is_rendered:
+            inicio = time.perf_counter()
+
+            def medir(response):
+                medicao.tempo_serializacao += time.perf_counter() - inicio
+
+            response.add_post_render_callback(medir)
+        return response
+
+
+def exportar() -> str:
+    """Métricas do registro, do cache de contas, das chaves de idempotência,
+    dos limites de movimentação e da fila de escrita"""
+    from . import cache as cache_contas
+    from . import limites
+    from .idempotencia import armazem
+
+    from . import escrita
+
+    estatisticas = cache_contas.estatisticas()
+    fila = escrita.fila()
+    linhas = []
+    if fila is not None:
+        linhas = [
+            "# TYPE bank_escrita_operacoes_total counter",
+            f"bank_escrita_operacoes_total {fila.operacoes}",
+            "# TYPE bank_escrita_commits_total counter",
+            f"bank_escrita_commits_total {fila.commits}",
+        ]
+    baldes = limites.baldes()
+    if isinstance(baldes, limites.Baldes):
+        # Com LIMITES_CACHE a quantidade de baldes não é conhecida
+        linhas += [
+            "# TYPE bank_limites_baldes gauge",
+            f"bank_limites_baldes {len(baldes)}",
+        ]
+    return registro.exportar() + "\n".join(
+        linhas
+        + [
+            "# TYPE bank_metricas_amostragem gauge",
+            f"bank_metricas_amostragem {settings.METRICAS_AMOSTRAGEM}",
+            "# TYPE bank_cache_contas_total counter",
+            f'bank_cache_contas_total{{resultado="hit"}} {estatisticas["hits"]}',
+            f'bank_cache_contas_total{{resultado="miss"}} {estatisticas["misses"]}',
+            "# TYPE bank_idempotencia_chaves gauge",
+            f"bank_idempotencia_chaves {len(armazem)}",
+            "# TYPE bank_movimentacao_em_andamento gauge",
+            f"bank_movimentacao_em_andamento {limites.em_andamento()}",
+            "",
+        ]
+    )
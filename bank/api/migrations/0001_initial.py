@@ -0,0 +1,50 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('limiteSaqueDiario', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('flagAtivo', models.BooleanField(default=True)),
+                ('tipoConta', models.IntegerField(default=1)),
+                ('dataCriacao', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Pessoa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=50)),
+                ('cpf', models.CharField(max_length=11, unique=True)),
+                ('dataNascimento', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Transacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('tipo', models.CharField(choices=[('saque', 'Saq'), ('deposito', 'Dep')], default='saque', max_length=8)),
+                ('dataTransacao', models.DateTimeField(auto_now_add=True)),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.conta')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conta',
+            name='pessoa',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.pessoa'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaqueDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=11)),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.conta')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='saquediario',
+            constraint=models.UniqueConstraint(fields=('conta', 'data'), name='saque_diario_unico'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_saquediario'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transacao',
+            name='conta',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.conta'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['conta', 'dataTransacao'], name='transacao_conta_data'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['conta', 'tipo', 'dataTransacao'], name='transacao_conta_tipo_data'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_transacao_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.conta')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='saldodiario',
+            constraint=models.UniqueConstraint(fields=('conta', 'data'), name='saldo_diario_unico'),
+        ),
+    ]
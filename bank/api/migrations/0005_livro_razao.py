@@ -0,0 +1,67 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:59
+
+import uuid
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def lancar_saldos_de_abertura(apps, schema_editor):
+    """O saldo atual de cada conta existente entra no razão como um
+    depósito de abertura, para que o saldo derivado comece igual ao saldo"""
+    Conta = apps.get_model('api', 'Conta')
+    Lancamento = apps.get_model('api', 'Lancamento')
+    banco = schema_editor.connection.alias
+    lancamentos = []
+    for conta_id, saldo in Conta.objects.using(banco).exclude(saldo=0).values_list('id', 'saldo').iterator():
+        movimento = uuid.uuid4()
+        natureza_conta, natureza_caixa = ('C', 'D') if saldo > 0 else ('D', 'C')
+        lancamentos.append(Lancamento(movimento=movimento, conta_id=None, natureza=natureza_caixa, valor=abs(saldo)))
+        lancamentos.append(Lancamento(movimento=movimento, conta_id=conta_id, natureza=natureza_conta, valor=abs(saldo)))
+        if len(lancamentos) >= 1000:
+            Lancamento.objects.using(banco).bulk_create(lancamentos)
+            lancamentos = []
+    Lancamento.objects.using(banco).bulk_create(lancamentos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_saldodiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoConsolidado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimoLancamento', models.BigIntegerField()),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('conta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.conta')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Lancamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimento', models.UUIDField()),
+                ('natureza', models.CharField(choices=[('D', 'débito'), ('C', 'crédito')], max_length=1)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('dataLancamento', models.DateTimeField(auto_now_add=True)),
+                ('conta', models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='api.conta')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='saldoconsolidado',
+            constraint=models.UniqueConstraint(fields=('conta', 'ultimoLancamento'), name='saldo_consolidado_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamento',
+            index=models.Index(fields=['conta', 'id'], name='lancamento_conta'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamento',
+            index=models.Index(fields=['movimento'], name='lancamento_movimento'),
+        ),
+        migrations.RunPython(lancar_saldos_de_abertura, migrations.RunPython.noop),
+    ]
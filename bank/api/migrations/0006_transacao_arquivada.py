@@ -0,0 +1,50 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+HISTORICO = """
+CREATE VIEW api_transacao_historico AS
+SELECT id, valor, tipo, "dataTransacao", conta_id FROM api_transacao
+UNION ALL
+SELECT id, valor, tipo, "dataTransacao", conta_id FROM api_transacaoarquivada
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_livro_razao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransacaoHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('tipo', models.CharField(choices=[('saque', 'Saq'), ('deposito', 'Dep')], max_length=8)),
+                ('dataTransacao', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'api_transacao_historico',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TransacaoArquivada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('tipo', models.CharField(choices=[('saque', 'Saq'), ('deposito', 'Dep')], max_length=8)),
+                ('dataTransacao', models.DateTimeField()),
+                ('conta', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.conta')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transacaoarquivada',
+            index=models.Index(fields=['conta', 'dataTransacao'], name='transacao_arquivada_conta_data'),
+        ),
+        migrations.RunSQL(HISTORICO, 'DROP VIEW api_transacao_historico'),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.9 on 2026-10-18 17:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_transacao_arquivada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Entrega',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destino', models.CharField(max_length=50, unique=True)),
+                ('ultimoEvento', models.BigIntegerField(default=0)),
+                ('dataEntrega', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Evento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('deposito', 'Deposito'), ('saque', 'Saque'), ('bloqueio', 'Bloqueio'), ('desbloqueio', 'Desbloqueio')], max_length=11)),
+                ('dados', models.JSONField(default=dict)),
+                ('dataEvento', models.DateTimeField(auto_now_add=True)),
+                ('conta', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.conta')),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:10
+
+import api.models
+from api.functions import normalizar_nome
+from django.db import migrations, models
+
+
+def normalizar_nomes(apps, schema_editor):
+    """Preenche nomeBusca das pessoas existentes, em blocos pelo id"""
+    Pessoa = apps.get_model('api', 'Pessoa')
+    banco = schema_editor.connection.alias
+    ultimo = 0
+    while True:
+        pessoas = list(Pessoa.objects.using(banco).filter(pk__gt=ultimo).order_by('pk')[:5000])
+        if not pessoas:
+            return
+        for pessoa in pessoas:
+            pessoa.nomeBusca = normalizar_nome(pessoa.nome)
+        Pessoa.objects.using(banco).bulk_update(pessoas, ['nomeBusca'])
+        ultimo = pessoas[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_sequencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pessoa',
+            name='nomeBusca',
+            field=api.models.NomeBusca(default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(normalizar_nomes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pessoa',
+            index=models.Index(fields=['nomeBusca'], name='pessoa_nome_busca'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_pessoa_nome_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferenciaPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimento', models.UUIDField()),
+                ('contraparte', models.BigIntegerField()),
+                ('natureza', models.CharField(choices=[('D', 'débito'), ('C', 'crédito')], max_length=1)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=11)),
+                ('dataCriacao', models.DateTimeField(auto_now_add=True)),
+                ('conta', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.conta')),
+            ],
+        ),
+    ]
@@ -1,11 +1,27 @@
 from django.db import models
 from django.db.models.deletion import CASCADE
 
+from .functions import normalizar_nome
+
+
+class NomeBusca(models.CharField):
+    """Cópia normalizada (api.functions.normalizar_nome) do campo nome,
+    calculada a cada gravação, inclusive por bulk_create"""
+
+    def pre_save(self, model_instance, add):
+        valor = normalizar_nome(model_instance.nome)
+        setattr(model_instance, self.attname, valor)
+        return valor
+
 
 class Pessoa(models.Model):
     nome = models.CharField(max_length=50)
     cpf = models.CharField(max_length=11, unique=True)
     dataNascimento = models.DateField()
+    nomeBusca = NomeBusca(max_length=50, editable=False, default="")
+
+    class Meta:
+        indexes = [models.Index(fields=["nomeBusca"], name="pessoa_nome_busca")]
 
     def __str__(self) -> str:
         return f"{self.nome}"
@@ -28,4 +44,196 @@ class Transacao(models.Model):
     valor = models.DecimalField(max_digits=11, decimal_places=2)
     tipo = models.CharField(max_length=8,choices=Tipo.choices,default=Tipo.SAQ)
     dataTransacao = models.DateTimeField(auto_now_add=True)
+    # O índice (conta, dataTransacao) já atende as buscas só por conta
+    conta = models.ForeignKey(Conta, on_delete=CASCADE, db_index=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conta", "dataTransacao"], name="transacao_conta_data"),
+            models.Index(
+                fields=["conta", "tipo", "dataTransacao"],
+                name="transacao_conta_tipo_data",
+            ),
+        ]
+
+
+class TransacaoArquivada(models.Model):
+    """Transações antigas, movidas de Transacao pelo comando
+    arquivar_transacoes com o mesmo id. Só são lidas por extratos e
+    relatórios, então basta o índice (conta, dataTransacao)"""
+
+    valor = models.DecimalField(max_digits=11, decimal_places=2)
+    tipo = models.CharField(max_length=8, choices=Transacao.Tipo.choices)
+    dataTransacao = models.DateTimeField()
+    conta = models.ForeignKey(Conta, on_delete=CASCADE, db_index=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["conta", "dataTransacao"], name="transacao_arquivada_conta_data"
+            ),
+        ]
+
+
+class TransacaoHistorico(models.Model):
+    """Todas as transações, recentes e arquivadas: a view
+    api_transacao_historico, UNION ALL de Transacao e TransacaoArquivada.
+    Somente leitura; os filtros chegam às duas tabelas e usam os índices
+    (conta, dataTransacao) de cada uma"""
+
+    valor = models.DecimalField(max_digits=11, decimal_places=2)
+    tipo = models.CharField(max_length=8, choices=Transacao.Tipo.choices)
+    dataTransacao = models.DateTimeField()
+    conta = models.ForeignKey(
+        Conta, on_delete=models.DO_NOTHING, db_constraint=False, related_name="historico"
+    )
+
+    class Meta:
+        managed = False
+        db_table = "api_transacao_historico"
+
+
+class SaqueDiario(models.Model):
+    """Total sacado de uma conta em um dia, atualizado junto com cada saque
+    para que a verificação do limiteSaqueDiario não precise somar as transações"""
+
+    conta = models.ForeignKey(Conta, on_delete=CASCADE)
+    data = models.DateField()
+    total = models.DecimalField(max_digits=11, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["conta", "data"], name="saque_diario_unico")
+        ]
+
+
+class SaldoDiario(models.Model):
+    """Saldo da conta ao final de um dia já encerrado, usado como ponto de
+    partida para calcular saldos passados sem somar todo o histórico"""
+
     conta = models.ForeignKey(Conta, on_delete=CASCADE)
+    data = models.DateField()
+    saldo = models.DecimalField(max_digits=11, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["conta", "data"], name="saldo_diario_unico")
+        ]
+
+
+class Evento(models.Model):
+    """Outbox dos movimentos das contas: cada depósito, saque, bloqueio e
+    desbloqueio grava um Evento na mesma transação do banco que o altera.
+    O id crescente é o cursor do feed e da publicação pelo comando
+    publicar_eventos"""
+
+    class Tipo(models.TextChoices):
+        DEPOSITO = "deposito"
+        SAQUE = "saque"
+        BLOQUEIO = "bloqueio"
+        DESBLOQUEIO = "desbloqueio"
+
+    tipo = models.CharField(max_length=11, choices=Tipo.choices)
+    # O feed e a publicação leem pelo id, nunca pela conta
+    conta = models.ForeignKey(Conta, on_delete=CASCADE, db_index=False)
+    dados = models.JSONField(default=dict)
+    dataEvento = models.DateTimeField(auto_now_add=True)
+
+
+class Entrega(models.Model):
+    """Último Evento publicado em cada destino de settings.EVENTOS_DESTINOS.
+    Com shards, cada shard guarda a entrega dos próprios eventos"""
+
+    destino = models.CharField(max_length=50, unique=True)
+    ultimoEvento = models.BigIntegerField(default=0)
+    dataEntrega = models.DateTimeField(null=True)
+
+
+class Sequencia(models.Model):
+    """Último id alocado de um modelo cujas linhas são gravadas em vários
+    shards (api.shards), que por isso não pode usar o autoincremento de
+    nenhum deles. Fica só no default"""
+
+    nome = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField()
+
+
+class LancamentoImutavel(Exception):
+    """Lançamentos não podem ser alterados nem apagados, apenas estornados
+    com novos lançamentos"""
+
+
+class LancamentoQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise LancamentoImutavel
+
+    def delete(self):
+        raise LancamentoImutavel
+
+
+class Lancamento(models.Model):
+    """Partida do livro razão. Cada movimento grava um débito e um crédito
+    de mesmo valor com o mesmo uuid de movimento; conta nula é o caixa,
+    a contrapartida externa de depósitos e saques.
+
+    Para a conta, créditos somam e débitos subtraem. Todas as consultas
+    são por conta, então as partidas podem ser particionadas por conta."""
+
+    class Natureza(models.TextChoices):
+        DEB = "D", "débito"
+        CRED = "C", "crédito"
+
+    movimento = models.UUIDField()
+    conta = models.ForeignKey(
+        Conta, on_delete=models.PROTECT, null=True, db_index=False
+    )
+    natureza = models.CharField(max_length=1, choices=Natureza.choices)
+    valor = models.DecimalField(max_digits=11, decimal_places=2)
+    dataLancamento = models.DateTimeField(auto_now_add=True)
+
+    objects = LancamentoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conta", "id"], name="lancamento_conta"),
+            models.Index(fields=["movimento"], name="lancamento_movimento"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise LancamentoImutavel
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise LancamentoImutavel
+
+
+class SaldoConsolidado(models.Model):
+    """Saldo da conta somando todas as suas partidas até ultimoLancamento,
+    ponto de partida do saldo derivado do livro razão"""
+
+    conta = models.ForeignKey(Conta, on_delete=CASCADE)
+    ultimoLancamento = models.BigIntegerField()
+    saldo = models.DecimalField(max_digits=11, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conta", "ultimoLancamento"], name="saldo_consolidado_unico"
+            )
+        ]
+
+
+class TransferenciaPendente(models.Model):
+    """Lado de uma transferência entre contas de shards diferentes, gravado
+    no shard da conta junto com a partida do movimento. Cada shard faz o
+    commit do seu lado separadamente (api.shards.transacao): o registro é
+    apagado depois dos dois commits, e o comando reconciliar_transferencias
+    estorna o lado cuja contraparte nunca foi gravada"""
+
+    movimento = models.UUIDField()
+    conta = models.ForeignKey(Conta, on_delete=CASCADE, db_index=False)
+    contraparte = models.BigIntegerField()
+    natureza = models.CharField(max_length=1, choices=Lancamento.Natureza.choices)
+    valor = models.DecimalField(max_digits=11, decimal_places=2)
+    dataCriacao = models.DateTimeField(auto_now_add=True)
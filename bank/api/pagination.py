@@ -0,0 +1,149 @@
+import heapq
+import json
+from operator import itemgetter
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import shards
+
+
+class IdCursorPagination(CursorPagination):
+    """Paginação por cursor (keyset) pela chave primária"""
+
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "limite"
+    max_page_size = 1000
+
+
+class TransacaoCursorPagination(IdCursorPagination):
+    """Paginação por cursor pela data da transação, desempatando pelo id"""
+
+    ordering = ("dataTransacao", "id")
+
+
+class PessoaNomeCursorPagination(IdCursorPagination):
+    """Paginação por cursor pelo nome normalizado, desempatando pelo id, na
+    ordem do índice pessoa_nome_busca"""
+
+    ordering = ("nomeBusca", "id")
+
+
+def stream_json(queryset, projecao, chunk_size: int):
+    """Gera uma lista JSON a partir do queryset lendo chunk_size linhas
+    por vez do banco, sem carregar a tabela inteira em memória"""
+    return _lista_json(projecao.serializar_valores(queryset, chunk_size=chunk_size), chunk_size)
+
+
+def _lista_json(linhas: Iterable[dict], chunk_size: int) -> Iterator[str]:
+    yield "["
+    separador = ""
+    bloco = []
+    for indice, linha in enumerate(linhas, 1):
+        bloco.append(
+            separador
+            + json.dumps(
+                linha,
+                cls=JSONEncoder,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        )
+        separador = ","
+        if indice % chunk_size == 0:
+            yield "".join(bloco)
+            bloco = []
+    bloco.append("]")
+    yield "".join(bloco)
+
+
+def listar(request, queryset, projecao, paginacao_class=IdCursorPagination, paginar=False):
+    """Monta a resposta de um endpoint de listagem:
+       ?stream=1: exporta todas as linhas como JSON em streaming
+       ?cursor=/?limite=: retorna uma página e o link para a próxima
+       sem parâmetros: retorna a lista completa, ou a primeira página com
+       paginar=True"""
+    ordenacao = paginacao_class.ordering
+    if isinstance(ordenacao, str):
+        ordenacao = (ordenacao,)
+
+    if request.query_params.get("stream"):
+        return StreamingHttpResponse(
+            stream_json(
+                queryset.order_by(*ordenacao),
+                projecao,
+                settings.STREAM_CHUNK_SIZE,
+            ),
+            content_type="application/json",
+        )
+
+    paginacao = paginacao_class()
+    if (
+        paginar
+        or paginacao.cursor_query_param in request.query_params
+        or paginacao.page_size_query_param in request.query_params
+    ):
+        pagina = paginacao.paginate_queryset(queryset, request)
+        return paginacao.get_paginated_response(projecao.serializar_lista(pagina))
+
+    return Response(list(projecao.serializar_valores(queryset)))
+
+
+def listar_em_shards(request, queryset, projecao):
+    """listar() para um modelo distribuído entre os shards (api.shards),
+    ordenado pelo id: lê cada shard em paralelo e intercala as linhas. Uma
+    página lê no máximo limite + 1 linhas de cada shard"""
+    queryset = queryset.order_by("id")
+    por_id = itemgetter("id")
+
+    if request.query_params.get("stream"):
+        chunk_size = settings.STREAM_CHUNK_SIZE
+        linhas = heapq.merge(
+            *(
+                shards.iterar_em(alias, projecao.serializar_valores(queryset, chunk_size))
+                for alias in settings.SHARDS
+            ),
+            key=por_id,
+        )
+        return StreamingHttpResponse(
+            _lista_json(linhas, chunk_size), content_type="application/json"
+        )
+
+    paginacao = IdCursorPagination()
+    if not (
+        paginacao.cursor_query_param in request.query_params
+        or paginacao.page_size_query_param in request.query_params
+    ):
+        listas = shards.em_paralelo(lambda: list(projecao.serializar_valores(queryset)))
+        return Response(list(heapq.merge(*listas, key=por_id)))
+
+    limite = paginacao.get_page_size(request)
+    paginacao.base_url = request.build_absolute_uri()
+    cursor = paginacao.decode_cursor(request)
+    anteriores = cursor is not None and cursor.reverse
+    pagina = queryset
+    if cursor is not None and cursor.position is not None:
+        posicao = int(cursor.position)
+        pagina = pagina.filter(id__lt=posicao) if anteriores else pagina.filter(id__gt=posicao)
+    if anteriores:
+        pagina = pagina.reverse()
+    listas = shards.em_paralelo(lambda: projecao.serializar_lista(pagina[: limite + 1]))
+    linhas = list(heapq.merge(*listas, key=por_id, reverse=anteriores))
+    mais, linhas = len(linhas) > limite, linhas[:limite]
+    if anteriores:
+        linhas.reverse()
+
+    def link(reverso: bool, linha: dict):
+        return paginacao.encode_cursor(Cursor(offset=0, reverse=reverso, position=linha["id"]))
+
+    proxima = anterior = None
+    if linhas and (mais if not anteriores else cursor is not None):
+        proxima = link(False, linhas[-1])
+    if linhas and (mais if anteriores else cursor is not None):
+        anterior = link(True, linhas[0])
+    return Response({"next": proxima, "previous": anterior, "results": linhas})
@@ -0,0 +1,142 @@
+"""Livro razão de partidas dobradas (api.models.Lancamento).
+
+Cada movimento de api.ledger grava, na mesma transação do banco que altera
+Conta.saldo, um débito e um crédito de mesmo valor. As partidas nunca são
+alteradas. O saldo derivado de uma conta é o último SaldoConsolidado dela
+somado às partidas posteriores, e o comando verificar_razao compara esse
+saldo com Conta.saldo."""
+import decimal
+import uuid
+from typing import Iterator, List, Optional, Tuple
+
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Conta, Lancamento, SaldoConsolidado
+
+# Contrapartida de depósitos e saques, o dinheiro que entra e sai do banco
+CAIXA = None
+
+DINHEIRO = DecimalField(max_digits=11, decimal_places=2)
+ZERO = decimal.Decimal("0.00")
+
+# Valor da partida com sinal, do ponto de vista da conta: créditos somam
+# e débitos subtraem. Por movimento, a soma é sempre zero
+SINAL = Case(
+    When(natureza=Lancamento.Natureza.DEB, then=-F("valor")),
+    default=F("valor"),
+    output_field=DINHEIRO,
+)
+
+
+def partidas(
+    debito: Optional[int], credito: Optional[int], valor: decimal.Decimal
+) -> List[Lancamento]:
+    """Débito em uma conta e crédito na outra, no mesmo movimento"""
+    movimento = uuid.uuid4()
+    return [
+        Lancamento(
+            movimento=movimento,
+            conta_id=debito,
+            natureza=Lancamento.Natureza.DEB,
+            valor=valor,
+        ),
+        Lancamento(
+            movimento=movimento,
+            conta_id=credito,
+            natureza=Lancamento.Natureza.CRED,
+            valor=valor,
+        ),
+    ]
+
+
+def partidas_de_abertura(conta_id: int, saldo: decimal.Decimal) -> List[Lancamento]:
+    """Partidas que levam o saldo derivado de uma conta nova ao saldo inicial"""
+    if saldo > 0:
+        return partidas(CAIXA, conta_id, saldo)
+    if saldo < 0:
+        return partidas(conta_id, CAIXA, -saldo)
+    return []
+
+
+def lancar(debito: Optional[int], credito: Optional[int], valor: decimal.Decimal) -> None:
+    Lancamento.objects.bulk_create(partidas(debito, credito, valor))
+
+
+def _ultimo_consolidado(campo: str) -> Subquery:
+    return Subquery(
+        SaldoConsolidado.objects.filter(conta=OuterRef("pk"))
+        .order_by("-ultimoLancamento")
+        .values(campo)[:1]
+    )
+
+
+def saldo_derivado(conta_id: int) -> decimal.Decimal:
+    """Saldo da conta calculado pelo livro razão"""
+    consolidado = (
+        SaldoConsolidado.objects.filter(conta_id=conta_id)
+        .order_by("-ultimoLancamento")
+        .first()
+    )
+    base, desde = (
+        (consolidado.saldo, consolidado.ultimoLancamento)
+        if consolidado
+        else (ZERO, 0)
+    )
+    total = Lancamento.objects.filter(conta_id=conta_id, id__gt=desde).aggregate(
+        total=Sum(SINAL)
+    )["total"]
+    return base + (total or 0)
+
+
+def saldos_derivados(
+    completo: bool = False, chunk_size: int = 2000
+) -> Iterator[Tuple[int, decimal.Decimal, decimal.Decimal, int, Optional[int]]]:
+    """Percorre as contas em ordem de id, em blocos de chunk_size, e gera
+    (conta_id, saldo, derivado, consolidado_ate, ultimo_lancamento).
+
+    A soma das partidas de cada conta é feita pelo banco, usando o índice
+    (conta, id), então a memória usada não depende do tamanho do razão.
+    Com completo=True os SaldoConsolidado são ignorados e todas as partidas
+    são somadas."""
+    contas = Conta.objects.order_by("id").annotate(
+        desde=Coalesce(_ultimo_consolidado("ultimoLancamento"), Value(0)),
+        base=_ultimo_consolidado("saldo"),
+    )
+    partidas_da_conta = Lancamento.objects.filter(conta=OuterRef("pk"))
+    if not completo:
+        partidas_da_conta = partidas_da_conta.filter(id__gt=OuterRef("desde"))
+    contas = contas.annotate(
+        variacao=Subquery(
+            partidas_da_conta.values("conta").annotate(total=Sum(SINAL)).values("total")
+        ),
+        ultimo=Subquery(
+            Lancamento.objects.filter(conta=OuterRef("pk"))
+            .order_by("-id")
+            .values("id")[:1]
+        ),
+    )
+    linhas = contas.values_list("id", "saldo", "base", "variacao", "desde", "ultimo")
+    for conta_id, saldo, base, variacao, desde, ultimo in linhas.iterator(chunk_size):
+        if completo or base is None:
+            base = ZERO
+        yield conta_id, saldo, base + (variacao or 0), desde, ultimo
+
+
+def movimentos_desbalanceados(
+    movimentos: Optional[List[uuid.UUID]] = None,
+) -> Iterator[Tuple[uuid.UUID, decimal.Decimal]]:
+    """Movimentos (entre os de movimentos, se informados) cujos débitos e
+    créditos neste banco não somam o mesmo valor. Com shards, os dois lados
+    de uma transferência entre contas de shards diferentes ficam cada um
+    em um banco e só se anulam somados"""
+    partidas = Lancamento.objects.all()
+    if movimentos is not None:
+        partidas = partidas.filter(movimento__in=movimentos)
+    return (
+        partidas.values("movimento")
+        .annotate(diferenca=Sum(SINAL))
+        .exclude(diferenca=0)
+        .values_list("movimento", "diferenca")
+        .iterator()
+    )
@@ -0,0 +1,298 @@
+"""Relatórios das transações de um período (api/relatorios/...).
+
+agregados() agrupa as transações por conta, tipo e dia ou mês e calcula
+soma, quantidade, mínimo e máximo no próprio banco, com values/annotate.
+estatisticas() lê do banco as entradas e saídas por dia e as colunas de
+valores dos saques em lotes de settings.STREAM_CHUNK_SIZE, e calcula a
+média móvel do saldo líquido diário e os percentis dos saques com NumPy,
+quando instalado, ou em Python puro, com os mesmos resultados. Os valores
+em dinheiro são retornados como texto, como nas projeções de leitura, e só
+a média móvel e os percentis, que são estatísticas, como float.
+
+Com shards (api.shards), o relatório de uma conta é lido do shard dela e
+os demais somam os resultados de todos os shards, lidos em paralelo.
+
+Os relatórios de períodos já encerrados (data final antes de hoje) não
+mudam mais, então ficam no cache settings.RELATORIOS_CACHE e as repetições
+não consultam o banco."""
+import datetime
+import decimal
+import hashlib
+import itertools
+import json
+import math
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import (
+    Case,
+    Count,
+    DateField,
+    DecimalField,
+    Max,
+    Min,
+    Sum,
+    When,
+)
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from . import shards
+from .extrato import UM_DIA, inicio_do_dia, saldo_no_inicio_do_dia
+from .models import Transacao, TransacaoHistorico
+from .replicas import replica_atual
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+AGRUPAMENTOS = {
+    "conta": None,
+    "tipo": None,
+    "dia": TruncDate("dataTransacao"),
+    "mes": TruncMonth("dataTransacao", output_field=DateField()),
+}
+
+PERCENTIS = (50, 90, 99)
+
+CENTAVO = decimal.Decimal("0.01")
+
+# Somas de muitas transações passam dos 11 dígitos do campo valor
+_TOTAL = DecimalField(max_digits=20, decimal_places=2)
+
+
+def _transacoes(data_inicial: datetime.date, data_final: datetime.date, conta_id=None):
+    transacoes = TransacaoHistorico.objects.filter(
+        dataTransacao__gte=inicio_do_dia(data_inicial),
+        dataTransacao__lt=inicio_do_dia(data_final + UM_DIA),
+    )
+    if conta_id is not None:
+        transacoes = transacoes.filter(conta_id=conta_id)
+    return transacoes
+
+
+def _bancos(conta_id: Optional[int]) -> List[str]:
+    return list(settings.SHARDS) if conta_id is None else [shards.banco(conta_id)]
+
+
+def _nos_bancos(conta_id: Optional[int], funcao: Callable[[], list]) -> list:
+    """Resultados de funcao() no shard da conta ou, sem conta, em cada shard"""
+    if conta_id is None and shards.distribuido():
+        return shards.em_paralelo(funcao)
+    with shards.usando(_bancos(conta_id)[0]):
+        return [funcao()]
+
+
+def _somar(a, b):
+    return b if a is None else a if b is None else a + b
+
+
+def _do_tipo(tipo: str) -> Sum:
+    return Sum(Case(When(tipo=tipo, then="valor")), output_field=_TOTAL)
+
+
+def em_cache(data_final: datetime.date, partes: Sequence, calcular: Callable[[], dict]) -> dict:
+    """Retorna calcular(), guardado no cache quando o período já encerrou.
+    Como em api.cache, leituras de réplicas não entram no cache"""
+    if data_final >= timezone.localdate() or replica_atual() is not None:
+        return calcular()
+    chave = hashlib.md5(json.dumps(partes, default=str).encode()).hexdigest()
+    cache = caches[settings.RELATORIOS_CACHE]
+    relatorio = cache.get(f"relatorio:{chave}")
+    if relatorio is None:
+        relatorio = calcular()
+        cache.set(f"relatorio:{chave}", relatorio)
+    return relatorio
+
+
+def _agregados(
+    data_inicial: datetime.date,
+    data_final: datetime.date,
+    agrupar: Sequence[str],
+    conta_id: Optional[int],
+) -> List[dict]:
+    transacoes = _transacoes(data_inicial, data_final, conta_id).annotate(
+        **{nome: AGRUPAMENTOS[nome] for nome in agrupar if AGRUPAMENTOS[nome] is not None}
+    )
+    grupos = transacoes.values(*agrupar).annotate(
+        total=Sum("valor", output_field=_TOTAL),
+        quantidade=Count("id"),
+        minimo=Min("valor"),
+        maximo=Max("valor"),
+    )
+    resultados = _nos_bancos(conta_id, lambda: list(grupos.order_by(*agrupar)))
+    if len(resultados) == 1:
+        return resultados[0]
+
+    # O mesmo grupo (um tipo, um dia) pode ter transações em vários shards
+    combinados = {}
+    for grupo in itertools.chain.from_iterable(resultados):
+        chave = tuple(grupo[nome] for nome in agrupar)
+        anterior = combinados.get(chave)
+        if anterior is None:
+            combinados[chave] = grupo
+            continue
+        anterior["total"] += grupo["total"]
+        anterior["quantidade"] += grupo["quantidade"]
+        anterior["minimo"] = min(anterior["minimo"], grupo["minimo"])
+        anterior["maximo"] = max(anterior["maximo"], grupo["maximo"])
+    return [combinados[chave] for chave in sorted(combinados)]
+
+
+def agregados(
+    data_inicial: datetime.date,
+    data_final: datetime.date,
+    agrupar: Sequence[str],
+    conta_id: Optional[int] = None,
+) -> List[dict]:
+    """Soma, quantidade, mínimo e máximo dos valores das transações do
+    período para cada grupo, na ordem dos campos de agrupar"""
+    grupos = _agregados(data_inicial, data_final, agrupar, conta_id)
+    for grupo in grupos:
+        for campo in ("total", "minimo", "maximo"):
+            grupo[campo] = _dinheiro(grupo[campo])
+    return grupos
+
+
+def _lotes(queryset, campo: str, tamanho: int) -> Iterator[List[float]]:
+    """Lê a coluna campo do queryset em listas de até tamanho valores"""
+    valores = queryset.values_list(campo, flat=True).iterator(chunk_size=tamanho)
+    while True:
+        lote = [float(valor) for valor in itertools.islice(valores, tamanho)]
+        if not lote:
+            return
+        yield lote
+
+
+def percentis(lotes: Iterable[List[float]], ps: Sequence[float]) -> List[float]:
+    """Percentis com interpolação linear, como o padrão de numpy.percentile"""
+    if numpy is not None:
+        valores = numpy.concatenate([numpy.asarray(lote) for lote in lotes] or [[]])
+        if not len(valores):
+            return [None] * len(ps)
+        return [float(p) for p in numpy.percentile(valores, ps)]
+
+    valores = sorted(itertools.chain.from_iterable(lotes))
+    if not valores:
+        return [None] * len(ps)
+    resultado = []
+    for p in ps:
+        posicao = (len(valores) - 1) * p / 100
+        abaixo = math.floor(posicao)
+        acima = min(abaixo + 1, len(valores) - 1)
+        resultado.append(
+            valores[abaixo] + (valores[acima] - valores[abaixo]) * (posicao - abaixo)
+        )
+    return resultado
+
+
+def media_movel(valores: Sequence[float], janela: int) -> List[Optional[float]]:
+    """Média dos últimos janela valores em cada posição, ou None enquanto
+    ainda não há janela valores"""
+    if numpy is not None:
+        acumulado = numpy.concatenate(([0.0], numpy.cumsum(valores, dtype=float)))
+        medias = (acumulado[janela:] - acumulado[:-janela]) / janela
+        return [None] * min(janela - 1, len(valores)) + [float(m) for m in medias]
+
+    resultado = []
+    soma = 0.0
+    for indice, valor in enumerate(valores):
+        soma += valor
+        if indice >= janela:
+            soma -= valores[indice - janela]
+        resultado.append(soma / janela if indice >= janela - 1 else None)
+    return resultado
+
+
+def _dinheiro(valor: decimal.Decimal) -> str:
+    return "{:f}".format(valor.quantize(CENTAVO))
+
+
+def _arredondar(valor: Optional[float]) -> Optional[float]:
+    return None if valor is None else round(valor, 2)
+
+
+def estatisticas(
+    data_inicial: datetime.date,
+    data_final: datetime.date,
+    janela: int,
+    conta_id: Optional[int] = None,
+) -> dict:
+    """Entradas, saídas e saldo líquido de cada dia do período, com a média
+    móvel do líquido em janela dias, e a quantidade, a média e os percentis
+    dos valores dos saques.
+    Com conta_id também o saldo no fim de cada dia e o saldo médio"""
+    transacoes = _transacoes(data_inicial, data_final, conta_id)
+    linhas = (
+        transacoes.annotate(dia=AGRUPAMENTOS["dia"])
+        .values("dia")
+        .annotate(
+            entradas=_do_tipo(Transacao.Tipo.DEP),
+            saidas=_do_tipo(Transacao.Tipo.SAQ),
+            saques=Count(Case(When(tipo=Transacao.Tipo.SAQ, then="id"))),
+        )
+        .order_by()
+    )
+    por_dia = {}
+    for linha in itertools.chain.from_iterable(_nos_bancos(conta_id, lambda: list(linhas.all()))):
+        anterior = por_dia.setdefault(linha["dia"], linha)
+        if anterior is not linha:
+            for campo in ("entradas", "saidas", "saques"):
+                anterior[campo] = _somar(anterior[campo], linha[campo])
+
+    zero = decimal.Decimal(0)
+    dias = []
+    dia = data_inicial
+    while dia <= data_final:
+        linha = por_dia.get(dia, {})
+        entradas = linha.get("entradas") or zero
+        saidas = linha.get("saidas") or zero
+        dias.append(
+            {"dia": dia, "entradas": entradas, "saidas": saidas, "liquido": entradas - saidas}
+        )
+        dia += UM_DIA
+
+    medias = media_movel([float(d["liquido"]) for d in dias], janela)
+    for registro, media in zip(dias, medias):
+        registro["mediaMovel"] = _arredondar(media)
+
+    relatorio = {"dias": dias}
+    if conta_id is not None:
+        with shards.da_conta(conta_id):
+            saldo = saldo_no_inicio_do_dia(conta_id, data_inicial)
+        for registro in dias:
+            saldo += registro["liquido"]
+            registro["saldo"] = saldo
+        relatorio["saldoMedio"] = (
+            sum(registro["saldo"] for registro in dias) / len(dias)
+        ).quantize(CENTAVO)
+
+    quantidade = sum(linha["saques"] for linha in por_dia.values())
+    total = sum(registro["saidas"] for registro in dias)
+    relatorio["saques"] = {
+        "quantidade": quantidade,
+        "media": (total / quantidade).quantize(CENTAVO) if quantidade else None,
+    }
+    if quantidade:
+        saques = transacoes.filter(tipo=Transacao.Tipo.SAQ)
+        lotes = itertools.chain.from_iterable(
+            shards.iterar_em(alias, _lotes(saques, "valor", settings.STREAM_CHUNK_SIZE))
+            for alias in _bancos(conta_id)
+        )
+        valores = percentis(lotes, PERCENTIS)
+    else:
+        valores = [None] * len(PERCENTIS)
+    for p, valor in zip(PERCENTIS, valores):
+        relatorio["saques"][f"p{p}"] = _arredondar(valor)
+
+    for registro in dias:
+        for campo in ("entradas", "saidas", "liquido", "saldo"):
+            if campo in registro:
+                registro[campo] = _dinheiro(registro[campo])
+    if "saldoMedio" in relatorio:
+        relatorio["saldoMedio"] = _dinheiro(relatorio["saldoMedio"])
+    if relatorio["saques"]["media"] is not None:
+        relatorio["saques"]["media"] = _dinheiro(relatorio["saques"]["media"])
+    return relatorio
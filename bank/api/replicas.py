@@ -0,0 +1,87 @@
+"""Leituras em réplicas (settings.REPLICAS) com leitura das próprias escritas.
+
+ReplicasMiddleware escolhe, para GETs das rotas de settings.REPLICA_ROTAS,
+uma réplica sorteada e a guarda em uma ContextVar, que o Roteador usa em
+todas as leituras da requisição. Qualquer outra requisição, inclusive as de
+movimentação, lê e escreve no default. Depois de uma escrita o cliente
+recebe um cookie válido por settings.REPLICA_JANELA segundos, e enquanto
+ele existir suas leituras também vão para o default, então o cliente vê o
+que acabou de gravar mesmo com as réplicas atrasadas."""
+import contextvars
+import random
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+COOKIE = "bank_primario"
+
+LEITURAS = ("GET", "HEAD", "OPTIONS")
+
+_leitura = contextvars.ContextVar("replica", default=None)
+
+
+def replica_atual() -> Optional[str]:
+    """A réplica usada pelas leituras da requisição atual, ou None"""
+    return _leitura.get()
+
+
+class Roteador:
+    def db_for_read(self, model, **hints):
+        return _leitura.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # As réplicas são cópias do default
+        return True
+
+
+def _em_replica(alias: str, conteudo):
+    """Itera o conteúdo de uma resposta em streaming, gerado depois do
+    middleware, com as leituras ainda na réplica"""
+    iterador = iter(conteudo)
+    while True:
+        token = _leitura.set(alias)
+        try:
+            pedaco = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _leitura.reset(token)
+        yield pedaco
+
+
+class ReplicasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, "_token_replica", None)
+            if token is not None:
+                _leitura.reset(token)
+
+        if request.method not in LEITURAS:
+            response.set_cookie(
+                COOKIE, "1", max_age=settings.REPLICA_JANELA, httponly=True, samesite="Lax"
+            )
+        elif request.replica is not None and response.streaming:
+            response.streaming_content = _em_replica(
+                request.replica, response.streaming_content
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            settings.REPLICAS
+            and request.method in LEITURAS
+            and request.resolver_match.view_name in settings.REPLICA_ROTAS
+            and COOKIE not in request.COOKIES
+        ):
+            request.replica = random.choice(settings.REPLICAS)
+            request._token_replica = _leitura.set(request.replica)
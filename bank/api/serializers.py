@@ -1,7 +1,17 @@
+import decimal
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
 from rest_framework import serializers
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.utils import timezone
 
-from .models import Pessoa, Conta, Transacao
+from . import ledger, shards
+from .functions import erros_cpf
+from .ledger import Operacao
+from .models import Pessoa, Conta, Transacao, TransacaoHistorico
 
 
 class PessoaSerializer(serializers.ModelSerializer):
@@ -10,12 +20,19 @@ class PessoaSerializer(serializers.ModelSerializer):
         fields = ["id", "nome", "cpf", "dataNascimento"]
 
     def validate_cpf(self, cpf):
-        if not cpf.isdecimal():
-            raise ValidationError("CPF deve conter apenas números")
-        if len(cpf) != 11:
-            raise ValidationError(f"CPF deve conter 11 e não {len(cpf)} dígitos")
+        erro = erros_cpf([cpf])[0]
+        if erro:
+            raise ValidationError(erro)
         return cpf
 
+    def create(self, validated_data):
+        if not shards.distribuido():
+            return super().create(validated_data)
+        with shards.transacao(*settings.SHARDS):
+            pessoa = super().create(validated_data)
+            shards.replicar_pessoas([pessoa])
+        return pessoa
+
 
 class ContaSerializer(serializers.ModelSerializer):
     pessoa = serializers.SlugRelatedField(
@@ -27,6 +44,13 @@ class ContaSerializer(serializers.ModelSerializer):
         model = Conta
         fields = "__all__"
 
+    def create(self, validated_data):
+        if not shards.distribuido():
+            return super().create(validated_data)
+        validated_data["id"] = shards.proximos_ids(1)[0]
+        with shards.da_conta(validated_data["id"]) as banco, transaction.atomic(using=banco):
+            return super().create(validated_data)
+
 
 class TransacaoSerializer(serializers.ModelSerializer):
     conta = serializers.SlugRelatedField(queryset=Conta.objects.all(), slug_field="id")
@@ -34,3 +58,201 @@ class TransacaoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transacao
         fields = "__all__"
+
+
+# ------------------ Projeções de leitura ------------------------
+
+# Mesmo arredondamento do DecimalField do DRF (max_digits=11, decimal_places=2)
+_CONTEXTO_DECIMAL = decimal.Context(prec=11)
+_CENTAVO = decimal.Decimal(".01")
+
+
+# Como nos campos do DRF, valores ainda não lidos do banco (ex.: a string ou
+# o float passados para objects.create) também são aceitos
+
+
+def _dinheiro(valor) -> str:
+    if not isinstance(valor, decimal.Decimal):
+        valor = decimal.Decimal(str(valor).strip())
+    return "{:f}".format(valor.quantize(_CENTAVO, context=_CONTEXTO_DECIMAL))
+
+
+def _data(valor) -> str:
+    return valor if isinstance(valor, str) else valor.isoformat()
+
+
+def _data_hora(valor) -> str:
+    if isinstance(valor, str):
+        return valor
+    texto = timezone.localtime(valor).isoformat()
+    if texto.endswith("+00:00"):
+        texto = texto[:-6] + "Z"
+    return texto
+
+
+class ProjecaoLeitura:
+    """Serializador somente de leitura que gera o mesmo JSON do
+    ModelSerializer correspondente. Os campos e conversores são definidos
+    uma vez, sem a introspecção que o DRF faz para cada serializer."""
+
+    __slots__ = ("nomes", "atributos", "conversores")
+
+    def __init__(self, campos: Sequence[Tuple[str, str, Optional[Callable]]]):
+        self.nomes = tuple(nome for nome, _, _ in campos)
+        self.atributos = tuple(atributo for _, atributo, _ in campos)
+        self.conversores = tuple(conversor for _, _, conversor in campos)
+
+    def _converter(self, valores: Iterable) -> dict:
+        return {
+            nome: valor if conversor is None or valor is None else conversor(valor)
+            for nome, conversor, valor in zip(self.nomes, self.conversores, valores)
+        }
+
+    def serializar(self, objeto) -> dict:
+        return self._converter(getattr(objeto, atributo) for atributo in self.atributos)
+
+    def serializar_lista(self, objetos: Iterable) -> list:
+        return [self.serializar(objeto) for objeto in objetos]
+
+    def serializar_valores(self, queryset, chunk_size: Optional[int] = None) -> Iterator[dict]:
+        """Serializa o queryset lendo apenas as colunas necessárias, sem
+        instanciar os modelos"""
+        linhas = queryset.values_list(*self.atributos)
+        if chunk_size:
+            linhas = linhas.iterator(chunk_size=chunk_size)
+        for linha in linhas:
+            yield self._converter(linha)
+
+
+pessoa_leitura = ProjecaoLeitura(
+    [
+        ("id", "id", None),
+        ("nome", "nome", None),
+        ("cpf", "cpf", None),
+        ("dataNascimento", "dataNascimento", _data),
+    ]
+)
+
+conta_leitura = ProjecaoLeitura(
+    [
+        ("id", "id", None),
+        ("pessoa", "pessoa_id", None),
+        ("flagAtivo", "flagAtivo", None),
+        ("saldo", "saldo", _dinheiro),
+        ("limiteSaqueDiario", "limiteSaqueDiario", _dinheiro),
+        ("tipoConta", "tipoConta", None),
+        ("dataCriacao", "dataCriacao", _data_hora),
+    ]
+)
+
+transacao_leitura = ProjecaoLeitura(
+    [
+        ("id", "id", None),
+        ("conta", "conta_id", None),
+        ("valor", "valor", _dinheiro),
+        ("tipo", "tipo", None),
+        ("dataTransacao", "dataTransacao", _data_hora),
+    ]
+)
+
+evento_leitura = ProjecaoLeitura(
+    [
+        ("id", "id", None),
+        ("tipo", "tipo", None),
+        ("conta", "conta_id", None),
+        ("dados", "dados", None),
+        ("dataEvento", "dataEvento", _data_hora),
+    ]
+)
+
+
+class ContaExpandida:
+    """Projeção de Conta com os objetos pedidos em ?expand= embutidos: a
+    pessoa no lugar do id e as últimas settings.TRANSACOES_RECENTES
+    transações em transacoesRecentes, lidas de TransacaoHistorico como no
+    extrato, para incluir as já arquivadas. preparar() acrescenta ao queryset o
+    select_related e o Prefetch de cada expansão, então a quantidade de
+    consultas não depende de quantas contas são serializadas"""
+
+    EXPANSOES = ("pessoa", "transacoes_recentes")
+
+    def __init__(self, expansoes: Sequence[str]):
+        self.expansoes = frozenset(expansoes)
+
+    def preparar(self, queryset):
+        if "pessoa" in self.expansoes:
+            queryset = queryset.select_related("pessoa")
+        if "transacoes_recentes" in self.expansoes:
+            # Django 3.2 não aceita fatiar o queryset de um Prefetch, então
+            # o limite por conta fica em uma subconsulta correlacionada, que
+            # percorre o índice (conta, dataTransacao) de trás para frente
+            ordem = ("-dataTransacao", "-id")
+            recentes = TransacaoHistorico.objects.filter(conta=OuterRef("conta")).order_by(
+                *ordem
+            )
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "historico",
+                    queryset=TransacaoHistorico.objects.filter(
+                        pk__in=Subquery(
+                            recentes.values("pk")[: settings.TRANSACOES_RECENTES]
+                        )
+                    ).order_by(*ordem),
+                    to_attr="transacoes_recentes",
+                )
+            )
+        return queryset
+
+    def serializar(self, conta: Conta) -> dict:
+        dados = conta_leitura.serializar(conta)
+        if "pessoa" in self.expansoes:
+            dados["pessoa"] = pessoa_leitura.serializar(conta.pessoa)
+        if "transacoes_recentes" in self.expansoes:
+            dados["transacoesRecentes"] = transacao_leitura.serializar_lista(
+                conta.transacoes_recentes
+            )
+        return dados
+
+    def serializar_lista(self, contas: Iterable) -> list:
+        return [self.serializar(conta) for conta in contas]
+
+    def serializar_valores(self, queryset, chunk_size: Optional[int] = None) -> Iterator[dict]:
+        """Serializa o queryset preparado. Com chunk_size lê chunk_size
+        contas por vez, pelo id, já que iterator() ignora o prefetch"""
+        if not chunk_size:
+            yield from self.serializar_lista(queryset)
+            return
+        queryset = queryset.order_by("pk")
+        ultimo = None
+        while True:
+            bloco = queryset if ultimo is None else queryset.filter(pk__gt=ultimo)
+            bloco = list(bloco[:chunk_size])
+            yield from self.serializar_lista(bloco)
+            if len(bloco) < chunk_size:
+                return
+            ultimo = bloco[-1].pk
+
+
+def validar_operacoes(dados) -> list:
+    """Valida uma lista de operações {"conta", "tipo", "valor"} sem instanciar
+    um serializer por item. Retorna, na ordem recebida, uma Operacao para
+    cada item válido ou o dict de erros do item"""
+    tipos = set(Transacao.Tipo.values)
+    resultado = []
+    for item in dados:
+        if not isinstance(item, dict):
+            resultado.append({"non_field_errors": "Operação deve ser um objeto"})
+            continue
+        erros = {}
+        conta = item.get("conta")
+        if isinstance(conta, bool) or not isinstance(conta, int):
+            erros["conta"] = "Conta tem que existir e ser um id numérico"
+        tipo = item.get("tipo")
+        if tipo not in tipos:
+            erros["tipo"] = f"Tipo tem que ser um de: {', '.join(sorted(tipos))}"
+        try:
+            valor = ledger.valor_da_operacao(item.get("valor"))
+        except ledger.ValorInvalido as e:
+            erros["valor"] = str(e)
+        resultado.append(erros or Operacao(conta, tipo, valor))
+    return resultado
@@ -0,0 +1,481 @@
+"""Contas distribuídas entre vários bancos SQLite (settings.SHARDS).
+
+Cada conta fica no shard em que o id dela cai no anel de hash consistente
+(Anel), junto com suas transações, saques e saldos diários, partidas do
+livro razão e eventos. Acrescentar um shard muda o dono só das contas que
+passam a cair nos pontos dele. As pessoas são copiadas em todos os shards,
+então Conta.pessoa e o ?expand=pessoa são resolvidos dentro do shard da
+conta. O default é o primeiro shard e guarda também os dados globais
+(Sequencia). Os eventos de cada shard têm cursor e Entrega próprios
+(api.eventos).
+
+O Roteador manda as consultas para o shard da ContextVar _atual, definida
+por ShardsMiddleware nas rotas de uma conta (settings.SHARD_ROTAS) e por
+api.ledger em cada operação (da_conta, usando). Sem ela, as consultas
+seguem para api.replicas.Roteador. A listagem de contas lê todos os shards
+em paralelo (em_paralelo) e intercala as linhas pelo id.
+
+Rebalanceamento: enquanto settings.SHARDS_ANTERIORES tiver a lista de
+shards de antes do último acréscimo, uma conta cujo dono mudou é procurada
+primeiro no shard novo e, se ainda não estiver lá, no antigo. O comando
+rebalancear_shards move as contas em lotes (mover_contas) com o shard de
+origem travado durante a cópia, então nenhuma movimentação se perde entre
+os dois.
+
+Cada shard gera ids em uma faixa própria (reservar_faixa_de_ids), então
+transações, partidas e eventos nunca repetem um id de outro shard. Uma
+conta movida mantém o id; as linhas dela recebem ids novos, da faixa do
+destino e na mesma ordem."""
+import bisect
+import contextlib
+import contextvars
+import functools
+import hashlib
+import heapq
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import F, Max, Q, Subquery
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from .models import (
+    Conta,
+    Evento,
+    Lancamento,
+    Pessoa,
+    SaldoDiario,
+    SaqueDiario,
+    Sequencia,
+    Transacao,
+    TransacaoArquivada,
+    TransferenciaPendente,
+)
+
+# O shard de índice i em settings.SHARDS gera ids a partir de i * IDS_POR_SHARD
+IDS_POR_SHARD = 2 ** 40
+
+# Linhas movidas junto com a conta, além das partidas, agrupadas pela
+# sequência de ids que compartilham (as transações arquivadas mantêm o id
+# que tinham em Transacao). Os SaldoConsolidado ficam para trás, já que
+# apontam para ids de partidas: o saldo derivado volta a somar todas as
+# partidas da conta
+MOVIDOS_COM_A_CONTA = (
+    (Transacao, TransacaoArquivada),
+    (SaqueDiario,),
+    (SaldoDiario,),
+    (Evento,),
+    (TransferenciaPendente,),
+)
+
+# Linhas lidas por vez ao copiar entre shards
+LOTE_COPIA = 2000
+
+_atual = contextvars.ContextVar("shard", default=None)
+
+
+def distribuido() -> bool:
+    return len(settings.SHARDS) > 1
+
+
+def _hash(texto: str) -> int:
+    # Estável entre processos, ao contrário de hash()
+    return int.from_bytes(hashlib.md5(texto.encode()).digest()[:8], "big")
+
+
+class Anel:
+    """Anel de hash consistente: cada shard ocupa virtuais pontos, e a conta
+    pertence ao shard do primeiro ponto depois do hash do id"""
+
+    def __init__(self, shards: Iterable[str], virtuais: int):
+        pontos = sorted(
+            (_hash(f"{shard}#{indice}"), shard)
+            for shard in shards
+            for indice in range(virtuais)
+        )
+        self.pontos = [ponto for ponto, _ in pontos]
+        self.donos = [shard for _, shard in pontos]
+
+    def dono(self, conta_id: int) -> str:
+        indice = bisect.bisect(self.pontos, _hash(str(conta_id)))
+        return self.donos[indice % len(self.donos)]
+
+
+@functools.lru_cache(maxsize=8)
+def _anel(shards: Tuple[str, ...], virtuais: int) -> Anel:
+    return Anel(shards, virtuais)
+
+
+def dono(conta_id: int, shards: Optional[List[str]] = None) -> str:
+    """Shard da conta pelo anel de shards (padrão: settings.SHARDS)"""
+    shards = settings.SHARDS if shards is None else shards
+    if len(shards) == 1:
+        return shards[0]
+    return _anel(tuple(shards), settings.SHARDS_VIRTUAIS).dono(conta_id)
+
+
+def banco(conta_id: int) -> str:
+    """Alias do banco em que a conta está. Durante um rebalanceamento, a
+    conta que ainda não chegou ao shard novo está no do anel anterior"""
+    novo = dono(conta_id)
+    if not settings.SHARDS_ANTERIORES:
+        return novo
+    antigo = dono(conta_id, settings.SHARDS_ANTERIORES)
+    if antigo == novo or Conta.objects.using(novo).filter(pk=conta_id).exists():
+        return novo
+    return antigo
+
+
+def ordenar(bancos: Iterable[str]) -> List[str]:
+    """Os bancos, sem repetição, na ordem de settings.SHARDS, que é a ordem
+    em que as operações em mais de um shard os travam"""
+    return sorted(set(bancos), key=settings.SHARDS.index)
+
+
+def agrupar(objetos: Iterable, conta_id: Callable = lambda objeto: objeto) -> Dict[str, list]:
+    """Separa os objetos (por padrão, ids de contas) pelo banco da conta de
+    cada um, com os bancos na ordem de settings.SHARDS"""
+    grupos = {}
+    for objeto in objetos:
+        grupos.setdefault(banco(conta_id(objeto)), []).append(objeto)
+    return {alias: grupos[alias] for alias in ordenar(grupos)}
+
+
+def atual() -> Optional[str]:
+    """O shard das consultas da operação atual, ou None"""
+    return _atual.get()
+
+
+@contextlib.contextmanager
+def usando(alias: str):
+    """Manda para alias as consultas feitas dentro do bloco. Sem shards,
+    não altera o roteamento (nem as leituras em réplicas)"""
+    if not distribuido():
+        yield alias
+        return
+    token = _atual.set(alias)
+    try:
+        yield alias
+    finally:
+        _atual.reset(token)
+
+
+@contextlib.contextmanager
+def da_conta(conta_id: int):
+    """usando() o banco da conta, retornando o alias"""
+    with usando(banco(conta_id)) as alias:
+        yield alias
+
+
+@contextlib.contextmanager
+def transacao(*bancos: str):
+    """Uma transação em cada um dos bancos, abertas na ordem de
+    settings.SHARDS e com o commit na ordem inversa. Não é um commit em
+    duas fases: se o commit de um banco falhar, os dos bancos anteriores
+    são desfeitos, mas os dos seguintes já foram feitos. Quem grava em
+    mais de um banco precisa deixar em cada um o que permite reconciliar
+    depois (ex.: TransferenciaPendente, em api.ledger.transferir)"""
+    with contextlib.ExitStack() as pilha:
+        for alias in ordenar(bancos):
+            pilha.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def apos_commit(funcao: Callable) -> None:
+    """transaction.on_commit no banco da operação atual"""
+    transaction.on_commit(funcao, using=_atual.get())
+
+
+def em_paralelo(funcao: Callable) -> list:
+    """Executa funcao() em todos os shards ao mesmo tempo, cada um em uma
+    thread com a própria conexão, e retorna os resultados na ordem de
+    settings.SHARDS"""
+
+    def executar(alias):
+        try:
+            with usando(alias):
+                return funcao()
+        finally:
+            connections[alias].close()
+
+    with ThreadPoolExecutor(
+        max_workers=len(settings.SHARDS), thread_name_prefix="shards"
+    ) as pool:
+        # Uma cópia do contexto por thread, para que as consultas entrem
+        # nas métricas da requisição (api.metricas)
+        futuros = [
+            pool.submit(contextvars.copy_context().run, executar, alias)
+            for alias in settings.SHARDS
+        ]
+        return [futuro.result() for futuro in futuros]
+
+
+def iterar_em(alias: str, iteravel: Iterable) -> Iterator:
+    """Itera com as consultas no shard alias, inclusive as feitas sob
+    demanda por um gerador (ex.: o conteúdo de uma resposta em streaming)"""
+    iterador = iter(iteravel)
+    while True:
+        with usando(alias):
+            try:
+                item = next(iterador)
+            except StopIteration:
+                return
+        yield item
+
+
+# ------------------ Dados globais ------------------------
+
+
+def proximos_ids(quantidade: int) -> range:
+    """Aloca quantidade ids de contas novas, únicos entre todos os shards"""
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        sequencias = Sequencia.objects.using(DEFAULT_DB_ALIAS)
+        if not sequencias.filter(nome="conta").update(valor=F("valor") + quantidade):
+            # Primeira alocação: continua do maior id já gravado
+            maior = max(
+                Conta.objects.using(alias).aggregate(maior=Max("id"))["maior"] or 0
+                for alias in settings.SHARDS
+            )
+            sequencias.create(nome="conta", valor=maior + quantidade)
+        fim = sequencias.get(nome="conta").valor
+    return range(fim - quantidade + 1, fim + 1)
+
+
+def replicar_pessoas(pessoas: List[Pessoa]) -> None:
+    """Grava nos demais shards, com os mesmos ids, pessoas já gravadas no
+    default"""
+    for alias in settings.SHARDS[1:]:
+        Pessoa.objects.using(alias).bulk_create(pessoas)
+
+
+def copiar_pessoas(destino: str) -> int:
+    """Copia do default para destino as pessoas que ainda não estão nele e
+    retorna quantas foram copiadas"""
+    copiadas = 0
+    ultimo = 0
+    while True:
+        bloco = list(
+            Pessoa.objects.using(DEFAULT_DB_ALIAS)
+            .filter(pk__gt=ultimo)
+            .order_by("pk")[:LOTE_COPIA]
+        )
+        if not bloco:
+            return copiadas
+        existentes = set(
+            Pessoa.objects.using(destino)
+            .filter(pk__range=(bloco[0].pk, bloco[-1].pk))
+            .values_list("pk", flat=True)
+        )
+        faltando = [pessoa for pessoa in bloco if pessoa.pk not in existentes]
+        Pessoa.objects.using(destino).bulk_create(faltando)
+        copiadas += len(faltando)
+        ultimo = bloco[-1].pk
+
+
+@receiver(post_migrate)
+def reservar_faixa_de_ids(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Faz cada shard depois do default gerar ids a partir de
+    indice * IDS_POR_SHARD, ajustando o autoincremento do SQLite"""
+    if sender.name != "api" or using not in settings.SHARDS[1:]:
+        return
+    conexao = connections[using]
+    if conexao.vendor != "sqlite":
+        return
+    inicio = settings.SHARDS.index(using) * IDS_POR_SHARD
+    with conexao.cursor() as cursor:
+        for modelo in sender.get_models():
+            if not modelo._meta.managed or not isinstance(modelo._meta.pk, models.AutoField):
+                continue
+            tabela = modelo._meta.db_table
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s",
+                [inicio, tabela],
+            )
+            if not cursor.rowcount:
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                    [tabela, inicio],
+                )
+
+
+# ------------------ Rebalanceamento ------------------------
+
+
+def fora_do_lugar(origem: str, lote: int) -> Iterator[Tuple[str, List[int]]]:
+    """Gera (destino, ids) das contas gravadas em origem cujo dono pelo
+    anel de settings.SHARDS é outro shard, em lotes de até lote contas"""
+    ultimo = 0
+    while True:
+        ids = list(
+            Conta.objects.using(origem)
+            .filter(pk__gt=ultimo)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:LOTE_COPIA]
+        )
+        if not ids:
+            return
+        ultimo = ids[-1]
+        por_destino = {}
+        for conta_id in ids:
+            destino = dono(conta_id)
+            if destino != origem:
+                por_destino.setdefault(destino, []).append(conta_id)
+        for destino, contas in por_destino.items():
+            for inicio in range(0, len(contas), lote):
+                yield destino, contas[inicio : inicio + lote]
+
+
+def _ultimo_id(cursor, tabela: str) -> int:
+    """Maior id já gerado pelo autoincremento da tabela"""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [tabela])
+    sequencia = cursor.fetchone()
+    cursor.execute(f'SELECT MAX(id) FROM "{tabela}"')
+    return max(sequencia[0] if sequencia else 0, cursor.fetchone()[0] or 0)
+
+
+def _copiar(querysets: list, destino: str) -> None:
+    """Copia para destino as linhas dos querysets, de modelos que
+    compartilham a sequência de ids do primeiro, com ids novos gerados
+    depois dos que o destino já usou, na mesma ordem dos ids originais"""
+    tabela = querysets[0].model._meta.db_table
+    with connections[destino].cursor() as cursor:
+        proximo = max(_ultimo_id(cursor, qs.model._meta.db_table) for qs in querysets) + 1
+        linhas = heapq.merge(
+            *(qs.order_by("pk").iterator(chunk_size=LOTE_COPIA) for qs in querysets),
+            key=lambda objeto: objeto.pk,
+        )
+        blocos = defaultdict(list)
+        for objeto in linhas:
+            objeto.pk = proximo
+            proximo += 1
+            bloco = blocos[type(objeto)]
+            bloco.append(objeto)
+            if len(bloco) == LOTE_COPIA:
+                type(objeto).objects.using(destino).bulk_create(bloco)
+                bloco.clear()
+        for modelo, bloco in blocos.items():
+            modelo.objects.using(destino).bulk_create(bloco)
+        # Os ids usados pelos modelos que compartilham a sequência também
+        # não podem ser gerados de novo por ela
+        cursor.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s",
+            [proximo - 1, tabela],
+        )
+        if not cursor.rowcount:
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                [tabela, proximo - 1],
+            )
+
+
+def _partidas(banco: str, ids: List[int]):
+    """Partidas das contas em banco, com as do caixa nos mesmos movimentos"""
+    return Lancamento.objects.using(banco).filter(
+        Q(conta_id__in=ids)
+        | Q(
+            conta__isnull=True,
+            movimento__in=Subquery(
+                Lancamento.objects.filter(conta_id__in=ids).values("movimento")
+            ),
+        )
+    )
+
+
+def mover_contas(ids: List[int], origem: str, destino: str) -> None:
+    """Move as contas de origem para destino com as linhas de
+    MOVIDOS_COM_A_CONTA e as partidas delas (inclusive as do caixa, nos
+    depósitos e saques). Só o id das contas é mantido.
+
+    A transação em origem começa travando as contas e só faz commit depois
+    da cópia em destino, então nenhuma movimentação das contas acontece no
+    meio (no SQLite, nenhuma escrita em origem). Entre os dois commits as
+    contas estão nos dois shards com os mesmos dados. Se o commit em origem
+    falhar, as contas continuam nos dois, e banco() passa a usar as de
+    destino; movê-las de novo só apaga as cópias que ficaram em origem.
+
+    As partidas de uma transferência entre uma conta movida e outra que
+    fica em origem passam a ficar em shards diferentes, como as de uma
+    transferência entre shards."""
+    with transaction.atomic(using=origem):
+        contas = Conta.objects.using(origem).filter(pk__in=ids)
+        contas.update(saldo=F("saldo"))
+        movidas = set(
+            Conta.objects.using(destino).filter(pk__in=ids).values_list("pk", flat=True)
+        )
+        copiar = [conta_id for conta_id in ids if conta_id not in movidas]
+        with transaction.atomic(using=destino):
+            Conta.objects.using(destino).bulk_create(contas.filter(pk__in=copiar))
+            for modelos in MOVIDOS_COM_A_CONTA:
+                _copiar(
+                    [
+                        modelo.objects.using(origem).filter(conta_id__in=copiar)
+                        for modelo in modelos
+                    ],
+                    destino,
+                )
+            _copiar([_partidas(origem, copiar)], destino)
+        # LancamentoQuerySet.delete recusa apagar partidas; estas continuam
+        # existindo, no destino
+        models.QuerySet.delete(_partidas(origem, ids))
+        contas.delete()
+
+
+# ------------------ Roteamento ------------------------
+
+
+class Roteador:
+    """Manda leituras e escritas para o shard da operação atual. Sem shard
+    definido, a decisão fica com o próximo roteador (api.replicas)"""
+
+    def db_for_read(self, model, **hints):
+        return _atual.get()
+
+    def db_for_write(self, model, **hints):
+        return _atual.get()
+
+
+class ShardsMiddleware:
+    """Define o shard das rotas de settings.SHARD_ROTAS pelo id da conta
+    na URL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self._responder(request)
+        if (
+            response.status_code == 404
+            and request.shard is not None
+            and settings.SHARDS_ANTERIORES
+            and banco(request.conta_shard) != request.shard
+        ):
+            # A conta foi movida pelo rebalanceamento depois de localizada.
+            # Nada foi gravado para uma conta não encontrada, então a
+            # requisição pode ser repetida no shard novo. A repetição não
+            # gasta fichas dos limites (api.limites) de novo, e @idempotente
+            # não guarda respostas 404
+            request.repetida = True
+            response = self._responder(request)
+        return response
+
+    def _responder(self, request):
+        request.shard = None
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, "_token_shard", None)
+            if token is not None:
+                _atual.reset(token)
+                request._token_shard = None
+        if request.shard is not None and response.streaming:
+            response.streaming_content = iterar_em(request.shard, response.streaming_content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if distribuido() and request.resolver_match.url_name in settings.SHARD_ROTAS:
+            request.conta_shard = view_kwargs["id"]
+            request.shard = banco(request.conta_shard)
+            request._token_shard = _atual.set(request.shard)
@@ -0,0 +1,16 @@
+import decimal
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import razao
+from .models import Conta, Lancamento
+
+
+@receiver(post_save, sender=Conta)
+def lancar_saldo_de_abertura(sender, instance, created, raw=False, **kwargs):
+    """Toda conta nova entra no livro razão com o saldo com que foi criada"""
+    if not created or raw:
+        return
+    saldo = decimal.Decimal(str(instance.saldo)).quantize(decimal.Decimal("0.01"))
+    Lancamento.objects.bulk_create(razao.partidas_de_abertura(instance.id, saldo))
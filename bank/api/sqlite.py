@@ -0,0 +1,18 @@
+"""PRAGMAs de settings.SQLITE_PRAGMAS aplicados a toda conexão SQLite nova.
+
+journal_mode=wal deixa leitores e o escritor trabalharem ao mesmo tempo
+e fica gravado no arquivo do banco; synchronous=normal, seguro em WAL,
+dispensa o fsync a cada commit (só o checkpoint sincroniza) e mmap_size
+lê as páginas pelo mapeamento de memória em vez de read()."""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def aplicar_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for pragma, valor in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {valor}")
@@ -0,0 +1,112 @@
+import pytest
+import datetime
+import threading
+
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+
+from api import limites
+from api.bloqueios import bloqueadas
+from api.idempotencia import armazem
+from api.metricas import registro
+from api.models import Pessoa, Conta
+
+
+@pytest.fixture(autouse=True)
+def limpar_caches():
+    """Os ids das contas se repetem entre os testes, então nenhum snapshot
+    em cache, resposta idempotente, balde de limite, conta bloqueada ou
+    métrica pode sobreviver de um teste para o outro"""
+    yield
+    for cache in caches.all():
+        cache.clear()
+    armazem.limpar()
+    limites.baldes().limpar()
+    bloqueadas.limpar()
+    registro.limpar()
+
+
+@pytest.fixture(autouse=True)
+def sem_replicas(settings):
+    """As leituras dos testes vão para o banco de testes, mesmo com
+    BANK_DB_REPLICAS no ambiente; test_replicas configura a própria réplica"""
+    settings.REPLICAS = []
+
+
+@pytest.fixture(autouse=True)
+def sem_shards(settings):
+    """Um único banco, mesmo com BANK_DB_SHARDS no ambiente; test_shards
+    configura os próprios shards"""
+    settings.SHARDS = ["default"]
+    settings.SHARDS_ANTERIORES = []
+
+
+@pytest.fixture
+def pessoa(db) -> Pessoa:
+    return Pessoa.objects.create(
+        nome="João", cpf="12345678910", dataNascimento="1999-10-10"
+    )
+
+
+@pytest.fixture
+def limite_saque() -> int:
+    """limiteSaqueDiario da conta. Para outro valor, parametrize o teste:
+    @pytest.mark.parametrize("limite_saque", [50])"""
+    return 1000
+
+
+@pytest.fixture
+def conta(pessoa: Pessoa, limite_saque) -> Conta:
+    """Conta com saldo 100. Nos módulos marcados com
+    pytest.mark.django_db(transaction=True), é gravada fora da transação do
+    teste e fica visível para outras threads"""
+    return Conta.objects.create(saldo=100, limiteSaqueDiario=limite_saque, pessoa=pessoa)
+
+
+@pytest.fixture
+def contas(pessoa: Pessoa, limite_saque) -> list:
+    """Duas contas da mesma pessoa, como a de conta"""
+    return [
+        Conta.objects.create(saldo=100, limiteSaqueDiario=limite_saque, pessoa=pessoa)
+        for _ in range(2)
+    ]
+
+
+@pytest.fixture
+def dias_atras():
+    """Função que retorna a data de dias antes de hoje"""
+    hoje = timezone.localdate()
+
+    def data(dias: int) -> datetime.date:
+        return hoje - datetime.timedelta(days=dias)
+
+    return data
+
+
+@pytest.fixture
+def executar_em_paralelo():
+    """Função que dispara quantidade threads chamando funcao ao mesmo tempo
+    e retorna o resultado (ou a exceção) de cada uma"""
+
+    def executar(funcao, quantidade: int) -> list:
+        barreira = threading.Barrier(quantidade)
+        resultados = [None] * quantidade
+
+        def trabalho(indice):
+            barreira.wait()
+            try:
+                resultados[indice] = funcao()
+            except Exception as e:
+                resultados[indice] = e
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabalho, args=(i,)) for i in range(quantidade)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return resultados
+
+    return executar
@@ -0,0 +1,91 @@
+import pytest
+import datetime
+import io
+import json
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+
+from api import extrato, ledger
+from api.models import Pessoa, Conta, Transacao, TransacaoArquivada, TransacaoHistorico
+
+
+@pytest.fixture
+def conta(pessoa: Pessoa, dias_atras) -> Conta:
+    """Conta aberta com 100, com um depósito de 50 há 100 dias, um saque de
+    30 há 40 dias e um depósito de 7 hoje (saldo atual 127)"""
+    conta = Conta.objects.create(saldo=127, limiteSaqueDiario=200, pessoa=pessoa)
+    for valor, tipo, dia in ((50, "deposito", 100), (30, "saque", 40), (7, "deposito", 0)):
+        transacao = Transacao.objects.create(conta=conta, valor=valor, tipo=tipo)
+        momento = extrato.inicio_do_dia(dias_atras(dia)) + datetime.timedelta(hours=12)
+        Transacao.objects.filter(pk=transacao.pk).update(dataTransacao=momento)
+    return conta
+
+
+def arquivar(**opcoes) -> None:
+    call_command("arquivar_transacoes", stdout=io.StringIO(), **opcoes)
+
+
+def test_arquivar_move_transacoes_antigas_com_o_mesmo_id(conta: Conta, dias_atras) -> None:
+    ids = list(Transacao.objects.order_by("id").values_list("id", flat=True))
+
+    arquivar(antes_de=dias_atras(30), lote=1)
+
+    arquivadas = TransacaoArquivada.objects.order_by("id").values_list("id", flat=True)
+    assert list(arquivadas) == ids[:2]
+    assert list(Transacao.objects.values_list("id", flat=True)) == ids[2:]
+    assert list(TransacaoHistorico.objects.order_by("id").values_list("id", flat=True)) == ids
+
+
+def test_arquivar_mantem_os_meses_recentes(conta: Conta) -> None:
+    arquivar(meses=0)
+
+    assert Transacao.objects.count() == 1
+    assert TransacaoArquivada.objects.count() == 2
+
+
+def test_corte_no_futuro_recusado(conta: Conta, dias_atras) -> None:
+    with pytest.raises(CommandError):
+        arquivar(antes_de=dias_atras(-1))
+
+
+def test_listagem_e_extrato_atravessam_o_arquivo(client, conta: Conta, dias_atras) -> None:
+    arquivar(antes_de=dias_atras(30))
+    transacoes_url = reverse("transacoes", kwargs={"id": conta.id})
+
+    primeira = client.get(transacoes_url, {"limite": 2}).json()
+    segunda = client.get(primeira["next"]).json()
+
+    valores = [t["valor"] for t in primeira["results"] + segunda["results"]]
+    assert valores == ["50.00", "30.00", "7.00"]
+
+    response = client.get(
+        reverse("extrato", kwargs={"id": conta.id}),
+        {
+            "data_inicial": dias_atras(120).isoformat(),
+            "data_final": dias_atras(50).isoformat(),
+        },
+    )
+    conteudo = json.loads(response.content)
+    assert conteudo["saldoInicial"] == 100
+    assert conteudo["saldoFinal"] == 150
+    assert [m["valor"] for m in conteudo["movimentos"]] == ["50.00"]
+
+
+def test_saldos_diarios_incluem_dias_arquivados(conta: Conta, dias_atras) -> None:
+    arquivar(antes_de=dias_atras(30))
+    call_command("gerar_saldos_diarios", stdout=io.StringIO())
+
+    assert extrato.saldo_no_inicio_do_dia(conta.id, dias_atras(50)) == 150
+    assert extrato.saldo_no_inicio_do_dia(conta.id, dias_atras(39)) == 120
+
+
+def test_saque_depois_do_arquivamento(conta: Conta) -> None:
+    arquivar(meses=0)
+
+    ledger.depositar(conta.id, Decimal(500))
+    ledger.sacar(conta.id, Decimal(100))
+
+    with pytest.raises(ledger.LimiteSaqueExcedido):
+        ledger.sacar(conta.id, Decimal(101))
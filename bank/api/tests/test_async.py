@@ -0,0 +1,120 @@
+import pytest
+import asyncio
+import json
+import threading
+from decimal import Decimal
+
+from django.urls import reverse
+
+from api import async_views, ledger
+from api.models import Conta
+
+
+# As views assíncronas acessam o banco pelas threads do pool, que não
+# enxergam a transação aberta por um teste com django_db comum
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def test_views_sao_assincronas() -> None:
+    assert asyncio.iscoroutinefunction(async_views.saldo)
+    assert async_views.saque.csrf_exempt
+
+
+@pytest.mark.parametrize("nome", ["conta-detail", "saldo", "transacoes"])
+def test_leitura_igual_a_rota_sincrona(client, conta: Conta, nome: str) -> None:
+    response = client.get(reverse(f"async:{nome}", kwargs={"id": conta.id}))
+    esperado = client.get(reverse(nome, kwargs={"id": conta.id}))
+    assert response.status_code == 200
+    assert response.content == esperado.content
+
+
+def test_pessoa_detail(client, conta: Conta) -> None:
+    response = client.get(reverse("async:pessoa-detail", kwargs={"id": conta.pessoa.id}))
+    assert json.loads(response.content)["cpf"] == "12345678910"
+
+
+@pytest.mark.parametrize("limite_saque", [50])
+def test_deposito_e_saque(client, conta: Conta) -> None:
+    client.post(reverse("async:deposito", kwargs={"id": conta.id}), data={"valor": "10"})
+    response = client.post(
+        reverse("async:saque", kwargs={"id": conta.id}), data={"valor": "30"}
+    )
+    assert response.status_code == 200
+    assert Decimal(json.loads(response.content)["conta"]["saldo"]) == 80
+
+    response = client.post(
+        reverse("async:saque", kwargs={"id": conta.id}), data={"valor": "30"}
+    )
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "limiteSaqueDiario": "Essa operação excedera o limite de saque diário desta conta"
+    }
+
+
+def test_conta_inexistente(client, transactional_db) -> None:
+    response = client.get(reverse("async:saldo", kwargs={"id": 999}))
+    assert response.status_code == 404
+
+
+def test_transacoes_em_streaming(client, conta: Conta) -> None:
+    client.post(reverse("deposito", kwargs={"id": conta.id}), data={"valor": "5"})
+    response = client.get(
+        reverse("async:transacoes", kwargs={"id": conta.id}), {"stream": 1}
+    )
+    assert len(json.loads(b"".join(response.streaming_content))) == 1
+
+
+def test_streaming_pelo_handler_asgi(conta: Conta, settings) -> None:
+    settings.STREAM_CHUNK_SIZE = 1
+    for _ in range(3):
+        ledger.depositar(conta.id, Decimal("1"))
+    url = reverse("async:transacoes", kwargs={"id": conta.id})
+    escopo = {
+        "type": "http",
+        "method": "GET",
+        "path": url,
+        "query_string": b"stream=1",
+        "headers": [(b"host", b"testserver")],
+    }
+    mensagens = []
+
+    async def receber():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def enviar(mensagem):
+        mensagens.append(mensagem)
+
+    asyncio.run(async_views.ASGIHandler()(escopo, receber, enviar))
+
+    assert mensagens[0]["status"] == 200
+    corpos = [m["body"] for m in mensagens[1:] if m.get("body")]
+    # Uma mensagem por bloco de STREAM_CHUNK_SIZE linhas, não o corpo inteiro
+    assert len(corpos) > 1
+    assert len(json.loads(b"".join(corpos))) == 3
+    assert not mensagens[-1].get("more_body")
+
+
+def test_cliente_que_desiste_libera_as_threads() -> None:
+    liberar = threading.Event()
+    threads = []
+
+    def lento():
+        threads.append(threading.current_thread().name)
+        yield b"a"
+        liberar.wait(5)
+        yield b"b"
+
+    partes = async_views._Partes(lento())
+
+    async def ler():
+        assert await partes.__anext__() == b"a"
+        proxima = asyncio.ensure_future(partes.__anext__())
+        await asyncio.sleep(0.05)
+        partes.close()
+        with pytest.raises(StopAsyncIteration):
+            await asyncio.wait_for(proxima, 1)
+
+    asyncio.run(ler())
+    liberar.set()
+    # Fora do pool das views, que continua livre para as demais requisições
+    assert threads[0].startswith("api-stream")
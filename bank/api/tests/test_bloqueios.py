@@ -0,0 +1,102 @@
+import pytest
+from decimal import Decimal
+
+from django.urls import reverse
+
+from api import ledger
+from api.bloqueios import Bitset, bloqueadas
+from api.models import Conta, Evento, Transacao
+
+
+@pytest.fixture
+def bloqueada(conta: Conta) -> Conta:
+    Conta.objects.filter(pk=conta.id).update(flagAtivo=False)
+    return conta
+
+
+def test_bitset() -> None:
+    bits = Bitset()
+    for valor in (0, 7, 8, 100000):
+        bits.adicionar(valor)
+    bits.remover(7)
+    bits.remover(5000000)
+
+    assert [valor for valor in (0, 1, 7, 8, 100000, 100001) if valor in bits] == [0, 8, 100000]
+
+
+@pytest.mark.parametrize("operacao", [ledger.depositar, ledger.sacar])
+def test_conta_bloqueada_recusada_pelo_update(bloqueada: Conta, operacao) -> None:
+    with pytest.raises(ledger.ContaBloqueada):
+        operacao(bloqueada.id, Decimal(10))
+
+    bloqueada.refresh_from_db()
+    assert bloqueada.saldo == 100
+    assert not Transacao.objects.exists()
+    assert not Evento.objects.exists()
+
+
+def test_recusas_do_saque(conta: Conta) -> None:
+    with pytest.raises(ledger.SaldoInsuficiente):
+        ledger.sacar(conta.id, Decimal(500))
+    with pytest.raises(Conta.DoesNotExist):
+        ledger.sacar(conta.id + 1, Decimal(1))
+
+
+def test_lote_recusa_conta_bloqueada(client, bloqueada: Conta) -> None:
+    pessoa = bloqueada.pessoa
+    ativa = Conta.objects.create(saldo=0, limiteSaqueDiario=1000, pessoa=pessoa)
+
+    response = client.post(
+        reverse("transacoes-lote"),
+        data=[
+            {"conta": bloqueada.id, "tipo": "deposito", "valor": "10"},
+            {"conta": ativa.id, "tipo": "deposito", "valor": "10"},
+        ],
+        content_type="application/json",
+    )
+
+    conteudo = response.json()
+    assert conteudo["aceitas"] == 1
+    assert conteudo["resultados"][0]["erros"] == {"flagAtivo": "A conta está bloqueada"}
+
+
+@pytest.mark.parametrize("rota", ["deposito", "saque"])
+def test_view_recusa_conta_bloqueada(client, conta: Conta, rota: str) -> None:
+    client.post(reverse("bloqueio", kwargs={"id": conta.id}))
+
+    response = client.post(reverse(rota, kwargs={"id": conta.id}), data={"valor": "10"})
+
+    conta.refresh_from_db()
+    assert response.status_code == 400
+    assert response.json() == {"flagAtivo": "A conta está bloqueada"}
+    assert conta.saldo == 100
+
+
+def test_recusa_sem_consultar_o_banco(
+    client, transactional_db, conta: Conta, settings, django_assert_num_queries
+) -> None:
+    settings.BLOQUEADAS_INTERVALO = 60
+    saque = reverse("saque", kwargs={"id": conta.id})
+    assert client.post(saque, data={"valor": "1"}).status_code == 200
+    client.post(reverse("bloqueio", kwargs={"id": conta.id}))
+
+    with django_assert_num_queries(0):
+        response = client.post(saque, data={"valor": "1"})
+
+    assert response.status_code == 400
+    client.post(reverse("desbloqueio", kwargs={"id": conta.id}))
+    assert client.post(saque, data={"valor": "1"}).status_code == 200
+
+
+def test_bloqueios_de_outros_processos(conta: Conta, settings) -> None:
+    settings.BLOQUEADAS_INTERVALO = 0
+    assert conta.id not in bloqueadas
+
+    # Sem passar por ledger.alterar_bloqueio, como em outro processo
+    Conta.objects.filter(pk=conta.id).update(flagAtivo=False)
+    Evento.objects.create(tipo=Evento.Tipo.BLOQUEIO, conta=conta)
+    assert conta.id in bloqueadas
+
+    Conta.objects.filter(pk=conta.id).update(flagAtivo=True)
+    Evento.objects.create(tipo=Evento.Tipo.DESBLOQUEIO, conta=conta)
+    assert conta.id not in bloqueadas
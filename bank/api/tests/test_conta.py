@@ -4,7 +4,8 @@ from decimal import Decimal
 
 from django.urls import reverse
 
-from api.models import Pessoa, Conta
+from api import cache
+from api.models import Pessoa, Conta, Transacao
 
 
 contas_url = reverse("contas")
@@ -19,14 +20,6 @@ def test_zero_contas_deve_reornar_lista_vazia(client) -> None:
     assert json.loads(response.content) == []
 
 
-@pytest.mark.django_db
-@pytest.fixture
-def pessoa() -> Pessoa:
-    return Pessoa.objects.create(
-        nome="João", cpf="12345678910", dataNascimento="1999-10-10"
-    )
-
-
 @pytest.mark.django_db
 def test_uma_conta_existe(client, pessoa: Pessoa) -> None:
     test_conta = Conta.objects.create(saldo=0, limiteSaqueDiario=200.00, pessoa=pessoa)
@@ -105,12 +98,6 @@ def test_criar_conta(client, pessoa: Pessoa) -> None:
 # ------------------ Test Deposito/Saque ------------------------
 
 
-@pytest.mark.django_db
-@pytest.fixture
-def conta(pessoa: Pessoa) -> Conta:
-    return Conta.objects.create(saldo=100, limiteSaqueDiario=50.00, pessoa=pessoa)
-
-
 @pytest.mark.django_db
 def test_deposito_sem_valor(client, conta: Conta) -> None:
     response = client.post(reverse("deposito", kwargs={"id": conta.id}), data={})
@@ -131,6 +118,35 @@ def test_deposito_valor_nao_numerico(client, conta: Conta) -> None:
     }
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize("rota", ["deposito", "saque"])
+@pytest.mark.parametrize(
+    "valor, erro",
+    [
+        ("-50", "Valor tem que ser positivo"),
+        ("0", "Valor tem que ser positivo"),
+        ("0.001", "Valor tem que ser positivo"),
+        ("NaN", "Valor tem que ser positivo"),
+        ("sNaN", "Valor tem que ser positivo"),
+        ("Infinity", "Valor tem que ser positivo"),
+        ("1e20", "Valor deve ser no máximo 999999999.99"),
+        ("999999999.995", "Valor deve ser no máximo 999999999.99"),
+    ],
+)
+def test_movimentacao_valor_invalido(
+    client, conta: Conta, rota: str, valor: str, erro: str
+) -> None:
+    response = client.post(reverse(rota, kwargs={"id": conta.id}), data={"valor": valor})
+
+    conta.refresh_from_db()
+    assert response.status_code == 400
+    assert json.loads(response.content) == {"valor": erro}
+    assert conta.saldo == 100
+    assert not Transacao.objects.exists()
+    transacoes = client.get(reverse("transacoes", kwargs={"id": conta.id}))
+    assert transacoes.status_code == 200
+
+
 @pytest.mark.django_db
 def test_deposito(client, conta: Conta) -> None:
     saldo_antigo = conta.saldo
@@ -162,6 +178,7 @@ def test_saque_valor_maior_que_saldo(client, conta: Conta) -> None:
 
 
 @pytest.mark.django_db
+@pytest.mark.parametrize("limite_saque", [50])
 def test_saque_valor_excede_limite_diario(client, conta: Conta) -> None:
     response = client.post(
         reverse("saque", kwargs={"id": conta.id}), data={"valor": 20}
@@ -190,6 +207,189 @@ def test_saque(client, conta: Conta) -> None:
     assert Decimal(response_content["transacao"].get("valor")) == Decimal(10.5)
 
 
+# ------------------ Test Transacoes ------------------------
+
+
+@pytest.mark.django_db
+def test_transacoes_paginadas_por_cursor(client, conta: Conta) -> None:
+    for valor in ("1", "2", "3"):
+        client.post(reverse("deposito", kwargs={"id": conta.id}), data={"valor": valor})
+    transacoes_url = reverse("transacoes", kwargs={"id": conta.id})
+
+    response = client.get(transacoes_url, {"limite": 2})
+    pagina = json.loads(response.content)
+    assert response.status_code == 200
+    assert [Decimal(t["valor"]) for t in pagina["results"]] == [1, 2]
+
+    pagina = json.loads(client.get(pagina["next"]).content)
+    assert [Decimal(t["valor"]) for t in pagina["results"]] == [3]
+    assert pagina["next"] is None
+
+
+@pytest.mark.django_db
+def test_transacoes_em_streaming(client, conta: Conta) -> None:
+    client.post(reverse("deposito", kwargs={"id": conta.id}), data={"valor": "5"})
+    response = client.get(
+        reverse("transacoes", kwargs={"id": conta.id}), {"stream": 1}
+    )
+    conteudo = json.loads(b"".join(response.streaming_content))
+    assert len(conteudo) == 1
+    assert conteudo[0]["conta"] == conta.id
+    assert Decimal(conteudo[0]["valor"]) == 5
+
+
+# ------------------ Test Lote ------------------------
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("limite_saque", [50])
+def test_lote_de_operacoes(client, conta: Conta, pessoa: Pessoa) -> None:
+    outra = Conta.objects.create(saldo=0, limiteSaqueDiario=50.00, pessoa=pessoa)
+    operacoes = [
+        {"conta": conta.id, "tipo": "saque", "valor": "30"},
+        {"conta": outra.id, "tipo": "deposito", "valor": "10.50"},
+        {"conta": conta.id, "tipo": "saque", "valor": "30"},
+        {"conta": outra.id, "tipo": "saque", "valor": "20"},
+        {"conta": conta.id, "tipo": "deposito", "valor": 5},
+        {"conta": 999, "tipo": "deposito", "valor": "1"},
+        {"conta": conta.id, "tipo": "pix", "valor": "-1"},
+    ]
+    response = client.post(
+        reverse("transacoes-lote"), data=operacoes, content_type="application/json"
+    )
+    response_content = json.loads(response.content)
+    assert response.status_code == 200
+    assert response_content["aceitas"] == 3
+    assert response_content["recusadas"] == 4
+    assert [r["status"] for r in response_content["resultados"]] == [
+        "aceita",
+        "aceita",
+        "recusada",
+        "recusada",
+        "aceita",
+        "recusada",
+        "recusada",
+    ]
+    assert response_content["resultados"][2]["erros"] == {
+        "limiteSaqueDiario": "Essa operação excedera o limite de saque diário desta conta"
+    }
+    assert response_content["resultados"][3]["erros"] == {
+        "valor": "A conta não tem saldo suficiente"
+    }
+    assert response_content["resultados"][5]["erros"] == {"conta": "Conta não encontrada"}
+    assert set(response_content["resultados"][6]["erros"]) == {"tipo", "valor"}
+
+    conta.refresh_from_db()
+    outra.refresh_from_db()
+    assert conta.saldo == Decimal(75)
+    assert outra.saldo == Decimal("10.50")
+    assert conta.transacao_set.count() == 2
+    assert conta.saquediario_set.get().total == Decimal(30)
+
+
+@pytest.mark.django_db
+def test_lote_nao_passa_do_saldo_maximo(client, conta: Conta) -> None:
+    Conta.objects.filter(pk=conta.id).update(saldo=Decimal("0.99"))
+    operacoes = [{"conta": conta.id, "tipo": "deposito", "valor": "999999999"}] * 3 + [
+        {"conta": conta.id, "tipo": "deposito", "valor": "1e20"}
+    ]
+    response = client.post(
+        reverse("transacoes-lote"), data=operacoes, content_type="application/json"
+    )
+    response_content = json.loads(response.content)
+    assert response.status_code == 200
+    assert [r["status"] for r in response_content["resultados"]] == [
+        "aceita",
+        "recusada",
+        "recusada",
+        "recusada",
+    ]
+    assert response_content["resultados"][1]["erros"] == {
+        "valor": "O saldo da conta passaria do máximo de 999999999.99"
+    }
+    assert response_content["resultados"][3]["erros"] == {
+        "valor": "Valor deve ser no máximo 999999999.99"
+    }
+
+    conta.refresh_from_db()
+    assert conta.saldo == Decimal("999999999.99")
+    response = client.get(reverse("conta-detail", kwargs={"id": conta.id}))
+    assert response.status_code == 200
+    assert json.loads(response.content)["saldo"] == "999999999.99"
+    response = client.post(reverse("deposito", kwargs={"id": conta.id}), {"valor": "0.01"})
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_lote_precisa_ser_lista(client) -> None:
+    response = client.post(
+        reverse("transacoes-lote"), data={"conta": 1}, content_type="application/json"
+    )
+    assert response.status_code == 400
+    assert json.loads(response.content) == {"operacoes": "Envie uma lista de operações"}
+
+
+# ------------------ Test Transferencia ------------------------
+
+
+@pytest.mark.django_db
+def test_transferencia(client, conta: Conta, pessoa: Pessoa) -> None:
+    destino = Conta.objects.create(saldo=0, limiteSaqueDiario=50.00, pessoa=pessoa)
+    response = client.post(
+        reverse("transferencia", kwargs={"id": conta.id}),
+        data={"destino": destino.id, "valor": "30"},
+    )
+    response_content = json.loads(response.content)
+    assert response.status_code == 200
+    assert Decimal(response_content["conta"]["saldo"]) == Decimal(70)
+    assert response_content["destino"] == destino.id
+    assert [t["tipo"] for t in response_content["transacoes"]] == ["saque", "deposito"]
+
+    destino.refresh_from_db()
+    assert destino.saldo == Decimal(30)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("limite_saque", [50])
+def test_transferencia_excede_limite_diario(client, conta: Conta, pessoa: Pessoa) -> None:
+    destino = Conta.objects.create(saldo=0, limiteSaqueDiario=50.00, pessoa=pessoa)
+    response = client.post(
+        reverse("transferencia", kwargs={"id": conta.id}),
+        data={"destino": destino.id, "valor": "60"},
+    )
+    assert response.status_code == 400
+    assert json.loads(response.content) == {
+        "limiteSaqueDiario": "Essa operação excedera o limite de saque diário desta conta"
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "dados, erro",
+    [
+        ({"valor": "10"}, "destino"),
+        ({"destino": "abc", "valor": "10"}, "destino"),
+        ({"destino": 999, "valor": "-10"}, "valor"),
+        ({"destino": 999, "valor": "NaN"}, "valor"),
+        ({"destino": 999, "valor": "1e20"}, "valor"),
+    ],
+)
+def test_transferencia_dados_invalidos(client, conta: Conta, dados: dict, erro: str) -> None:
+    response = client.post(reverse("transferencia", kwargs={"id": conta.id}), data=dados)
+    assert response.status_code == 400
+    assert erro in json.loads(response.content)
+
+
+@pytest.mark.django_db
+def test_transferencia_para_a_propria_conta(client, conta: Conta) -> None:
+    response = client.post(
+        reverse("transferencia", kwargs={"id": conta.id}),
+        data={"destino": conta.id, "valor": "10"},
+    )
+    assert response.status_code == 400
+    assert conta.transacao_set.count() == 0
+
+
 # ------------------ Test Bloqueio/Desbloqueio ------------------------
 
 
@@ -207,3 +407,80 @@ def test_desbloqueio(client, conta: Conta) -> None:
     response_content = json.loads(response.content)
     assert response.status_code == 200
     assert response_content.get("flagAtivo") == True
+
+
+# ------------------ Test Cache ------------------------
+
+
+@pytest.mark.django_db(transaction=True)
+def test_saldo_atualizado_apos_deposito_e_saque(client, conta: Conta) -> None:
+    saldo_url = reverse("saldo", kwargs={"id": conta.id})
+    assert json.loads(client.get(saldo_url).content) == {"saldo": 100.0}
+
+    client.post(reverse("deposito", kwargs={"id": conta.id}), data={"valor": "10"})
+    assert json.loads(client.get(saldo_url).content) == {"saldo": 110.0}
+
+    client.post(reverse("saque", kwargs={"id": conta.id}), data={"valor": "30"})
+    assert json.loads(client.get(saldo_url).content) == {"saldo": 80.0}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_conta_atualizada_apos_bloqueio(client, conta: Conta) -> None:
+    conta_url = reverse("conta-detail", kwargs={"id": conta.id})
+    assert json.loads(client.get(conta_url).content)["flagAtivo"] == True
+
+    client.post(reverse("bloqueio", kwargs={"id": conta.id}))
+    assert json.loads(client.get(conta_url).content)["flagAtivo"] == False
+
+
+@pytest.mark.django_db(transaction=True)
+def test_get_condicional_com_etag(client, conta: Conta) -> None:
+    conta_url = reverse("conta-detail", kwargs={"id": conta.id})
+    etag = client.get(conta_url)["ETag"]
+
+    response = client.get(conta_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+    client.post(reverse("deposito", kwargs={"id": conta.id}), data={"valor": "1"})
+    response = client.get(conta_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_estatisticas_do_cache(client, conta: Conta) -> None:
+    estatisticas_url = reverse("cache-estatisticas")
+    antes = json.loads(client.get(estatisticas_url).content)
+    saldo_url = reverse("saldo", kwargs={"id": conta.id})
+    client.get(saldo_url)
+    client.get(saldo_url)
+    client.get(saldo_url)
+
+    depois = json.loads(client.get(estatisticas_url).content)
+    assert depois["misses"] - antes["misses"] == 1
+    assert depois["hits"] - antes["hits"] == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_invalidacao_durante_a_leitura_nao_deixa_snapshot_velho(
+    conta: Conta, monkeypatch
+) -> None:
+    snapshot = cache.snapshot
+
+    def ler_e_depositar(lida: Conta) -> dict:
+        # O depósito faz commit entre a leitura do banco e o cache.set
+        Conta.objects.filter(pk=lida.pk).update(saldo=Decimal("101"))
+        cache.invalidar(lida.pk)
+        return snapshot(lida)
+
+    monkeypatch.setattr(cache, "snapshot", ler_e_depositar)
+    assert cache.obter(conta.id)["dados"]["saldo"] == "100.00"
+    monkeypatch.setattr(cache, "snapshot", snapshot)
+    assert cache.obter(conta.id)["dados"]["saldo"] == "101.00"
+
+
+@pytest.mark.django_db
+def test_saldo_conta_inexistente(client) -> None:
+    response = client.get(reverse("saldo", kwargs={"id": 999}))
+    assert response.status_code == 404
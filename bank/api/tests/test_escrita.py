@@ -0,0 +1,111 @@
+import pytest
+import threading
+import time
+from decimal import Decimal
+
+from django.db import connection
+
+from api import escrita, ledger, sqlite
+from api.models import Conta, Transacao
+
+
+# O escritor usa outra thread, que só enxerga o que foi gravado fora da
+# transação do teste
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def fila():
+    fila = escrita.FilaDeEscrita(grupo_maximo=100)
+    yield fila
+    fila.parar()
+
+
+def enfileirar(fila: escrita.FilaDeEscrita, funcao, *args) -> dict:
+    """Chama fila.executar em outra thread e guarda o resultado ou a exceção"""
+    retorno = {}
+
+    def chamar():
+        try:
+            retorno["resultado"] = fila.executar(funcao, *args)
+        except Exception as e:
+            retorno["erro"] = e
+        finally:
+            connection.close()
+
+    retorno["thread"] = threading.Thread(target=chamar)
+    retorno["thread"].start()
+    return retorno
+
+
+def segurar(fila: escrita.FilaDeEscrita) -> threading.Event:
+    """Ocupa a thread escritora até o evento retornado ser disparado, para
+    que as próximas operações se acumulem na fila"""
+    liberar = threading.Event()
+    ocupada = threading.Event()
+
+    def esperar():
+        ocupada.set()
+        liberar.wait()
+
+    enfileirar(fila, esperar)
+    ocupada.wait()
+    return liberar
+
+
+def aguardar_fila(fila: escrita.FilaDeEscrita, tamanho: int) -> None:
+    while fila._fila.qsize() < tamanho:
+        time.sleep(0.001)
+
+
+def test_operacoes_que_chegam_juntas_tem_um_commit(conta: Conta, fila) -> None:
+    liberar = segurar(fila)
+    chamadas = [enfileirar(fila, ledger.depositar, conta.id, Decimal(1)) for _ in range(10)]
+    aguardar_fila(fila, 10)
+    liberar.set()
+    for chamada in chamadas:
+        chamada["thread"].join()
+
+    assert all(chamada["resultado"][0].id == conta.id for chamada in chamadas)
+    assert (fila.operacoes, fila.commits) == (11, 2)
+    conta.refresh_from_db()
+    assert conta.saldo == 110
+
+
+def test_excecao_desfaz_apenas_a_propria_operacao(conta: Conta, fila) -> None:
+    liberar = segurar(fila)
+    deposito = enfileirar(fila, ledger.depositar, conta.id, Decimal(5))
+    aguardar_fila(fila, 1)
+    saque = enfileirar(fila, ledger.sacar, conta.id, Decimal(1000))
+    aguardar_fila(fila, 2)
+    liberar.set()
+    deposito["thread"].join()
+    saque["thread"].join()
+
+    assert isinstance(saque["erro"], ledger.SaldoInsuficiente)
+    assert fila.commits == 2
+    conta.refresh_from_db()
+    assert conta.saldo == 105
+    assert Transacao.objects.get().tipo == Transacao.Tipo.DEP
+
+
+def test_ledger_usa_a_fila_do_processo(conta: Conta, settings) -> None:
+    settings.ESCRITA_EM_FILA = True
+    escrita.parar()
+    try:
+        conta_atualizada, _ = ledger.depositar(conta.id, Decimal(1))
+        with pytest.raises(ledger.SaldoInsuficiente):
+            ledger.sacar(conta.id, Decimal(1000))
+
+        assert conta_atualizada.saldo == 101
+        assert escrita.fila().operacoes == 2
+    finally:
+        escrita.parar()
+
+
+def test_pragmas_aplicados_em_conexoes_novas(transactional_db, settings) -> None:
+    settings.SQLITE_PRAGMAS = {"synchronous": "normal", "mmap_size": 1024 * 1024}
+    with connection.cursor() as cursor:
+        sqlite.aplicar_pragmas(sender=None, connection=connection)
+        assert cursor.execute("PRAGMA synchronous").fetchone() == (1,)
+        assert cursor.execute("PRAGMA mmap_size").fetchone() == (1024 * 1024,)
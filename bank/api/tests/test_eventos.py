@@ -0,0 +1,195 @@
+import pytest
+import io
+import json
+import socket
+import threading
+import time
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+
+from api import eventos, ledger
+from api.models import Conta, Entrega, Evento
+
+
+def resumo() -> list:
+    return list(Evento.objects.order_by("id").values_list("tipo", "conta_id", "dados"))
+
+
+def test_movimentos_gravam_eventos(client, contas: list) -> None:
+    conta = contas[0].id
+    client.post(reverse("deposito", kwargs={"id": conta}), data={"valor": "10"})
+    client.post(reverse("saque", kwargs={"id": conta}), data={"valor": "30"})
+    client.post(reverse("bloqueio", kwargs={"id": conta}))
+    client.post(reverse("desbloqueio", kwargs={"id": conta}))
+
+    assert resumo() == [
+        ("deposito", conta, {"valor": "10.00", "saldo": "110.00"}),
+        ("saque", conta, {"valor": "30.00", "saldo": "80.00"}),
+        ("bloqueio", conta, {}),
+        ("desbloqueio", conta, {}),
+    ]
+
+
+def test_movimento_recusado_nao_grava_evento(contas: list) -> None:
+    with pytest.raises(ledger.SaldoInsuficiente):
+        ledger.sacar(contas[0].id, Decimal(500))
+
+    assert not Evento.objects.exists()
+
+
+def test_transferencia_e_lote_gravam_eventos(contas: list) -> None:
+    origem, destino = contas[0].id, contas[1].id
+    ledger.transferir(origem, destino, Decimal(40))
+    ledger.aplicar_lote(
+        [
+            ledger.Operacao(origem, "saque", Decimal(100)),
+            ledger.Operacao(destino, "deposito", Decimal(5)),
+        ]
+    )
+
+    assert resumo() == [
+        ("saque", origem, {"valor": "40.00", "saldo": "60.00", "contraparte": destino}),
+        ("deposito", destino, {"valor": "40.00", "saldo": "140.00", "contraparte": origem}),
+        ("deposito", destino, {"valor": "5.00", "saldo": "145.00"}),
+    ]
+
+
+def test_feed_por_cursor(client, contas: list) -> None:
+    for _ in range(3):
+        ledger.depositar(contas[0].id, Decimal(1))
+
+    primeira = client.get(reverse("eventos"), {"limite": 2}).json()
+    segunda = client.get(reverse("eventos"), {"cursor": primeira["cursor"]}).json()
+    vazia = client.get(reverse("eventos"), {"cursor": segunda["cursor"]}).json()
+
+    assert [e["dados"]["saldo"] for e in primeira["eventos"] + segunda["eventos"]] == [
+        "101.00", "102.00", "103.00"
+    ]
+    assert vazia == {"eventos": [], "cursor": segunda["cursor"]}
+
+
+def test_feed_parametros_invalidos(client, db) -> None:
+    response = client.get(reverse("eventos"), {"cursor": "abc"})
+
+    assert response.status_code == 400
+    assert "cursor" in response.json()
+
+
+def test_feed_espera_por_evento_novo(
+    client, transactional_db, conta: Conta, settings
+) -> None:
+    # Só o commit do depósito acorda a espera antes do intervalo de leitura
+    settings.EVENTOS_INTERVALO = 10
+
+    def depositar():
+        time.sleep(0.2)
+        ledger.depositar(conta.id, Decimal(1))
+        connection.close()
+
+    thread = threading.Thread(target=depositar)
+    thread.start()
+    inicio = time.monotonic()
+    feed = client.get(reverse("eventos"), {"espera": 5}).json()
+    thread.join()
+
+    assert time.monotonic() - inicio < 2
+    assert [e["tipo"] for e in feed["eventos"]] == ["deposito"]
+
+
+def test_feed_assincrono(client, transactional_db, conta: Conta) -> None:
+    ledger.depositar(conta.id, Decimal(1))
+
+    response = client.get(reverse("async:eventos"))
+
+    assert json.loads(response.content) == client.get(reverse("eventos")).json()
+
+
+def publicar(destino: str) -> None:
+    call_command("publicar_eventos", destino, uma_vez=True, stdout=io.StringIO())
+
+
+def test_publicacao_em_arquivo(contas: list, settings, tmp_path) -> None:
+    caminho = tmp_path / "eventos.ndjson"
+    settings.EVENTOS_DESTINOS = {
+        "arquivo": {"CLASSE": "api.eventos.DestinoArquivo", "CAMINHO": str(caminho)}
+    }
+    ledger.depositar(contas[0].id, Decimal(1))
+    publicar("arquivo")
+    ledger.sacar(contas[0].id, Decimal(2))
+    publicar("arquivo")
+
+    linhas = [json.loads(linha) for linha in caminho.read_text().splitlines()]
+    assert [linha["tipo"] for linha in linhas] == ["deposito", "saque"]
+    assert Entrega.objects.get(destino="arquivo").ultimoEvento == linhas[-1]["id"]
+    assert eventos.atraso("arquivo") == {"pendentes": 0, "segundos": 0}
+
+
+class DestinoComFalha(eventos.Destino):
+    def __init__(self):
+        self.lotes = []
+        self.falhar = True
+
+    def publicar(self, lote):
+        if self.falhar:
+            self.falhar = False
+            raise OSError("destino indisponível")
+        self.lotes.append([evento["id"] for evento in lote])
+
+
+def test_falha_repete_o_lote(contas: list) -> None:
+    for _ in range(3):
+        ledger.depositar(contas[0].id, Decimal(1))
+    destino = DestinoComFalha()
+
+    with pytest.raises(OSError):
+        eventos.publicar("teste", destino, lote=2)
+    assert eventos.atraso("teste")["pendentes"] == 3
+
+    while eventos.publicar("teste", destino, lote=2):
+        pass
+    ids = list(Evento.objects.order_by("id").values_list("id", flat=True))
+    assert destino.lotes == [ids[:2], ids[2:]]
+
+
+def test_publicacao_em_socket(contas: list, settings, tmp_path) -> None:
+    caminho = str(tmp_path / "eventos.sock")
+    settings.EVENTOS_DESTINOS = {
+        "socket": {"CLASSE": "api.eventos.DestinoSocket", "CAMINHO": caminho}
+    }
+    servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    servidor.bind(caminho)
+    servidor.listen(1)
+    recebido = []
+
+    def receber():
+        conexao, _ = servidor.accept()
+        with conexao:
+            while True:
+                dados = conexao.recv(65536)
+                if not dados:
+                    return
+                recebido.append(dados)
+
+    thread = threading.Thread(target=receber)
+    thread.start()
+    ledger.depositar(contas[0].id, Decimal(1))
+    publicar("socket")
+    thread.join(timeout=5)
+    servidor.close()
+
+    linhas = b"".join(recebido).decode().splitlines()
+    assert [json.loads(linha)["tipo"] for linha in linhas] == ["deposito"]
+
+
+def test_publicacao_em_cache(client, contas: list) -> None:
+    ledger.depositar(contas[0].id, Decimal(1))
+    publicar("cache")
+
+    cache = caches["eventos"]
+    ultimo = cache.get("evento:ultimo")
+    assert cache.get(f"evento:{ultimo}")["dados"]["saldo"] == "101.00"
+    assert client.get(reverse("eventos-atraso")).json()["cache"]["pendentes"] == 0
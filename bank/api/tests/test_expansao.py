@@ -0,0 +1,118 @@
+import pytest
+import json
+import datetime
+import io
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from api.models import Pessoa, Conta, Transacao
+
+
+def criar_contas(quantidade: int, transacoes: int = 3) -> list:
+    contas = []
+    for i in range(quantidade):
+        pessoa = Pessoa.objects.create(
+            nome=f"Pessoa {i}", cpf=f"{i:011d}", dataNascimento="1999-10-10"
+        )
+        conta = Conta.objects.create(saldo=100, limiteSaqueDiario=1000, pessoa=pessoa)
+        for dia in range(transacoes):
+            transacao = Transacao.objects.create(conta=conta, valor=dia + 1, tipo="deposito")
+            Transacao.objects.filter(pk=transacao.pk).update(
+                dataTransacao=timezone.now() - datetime.timedelta(days=transacoes - dia)
+            )
+        contas.append(conta)
+    return contas
+
+
+@pytest.mark.parametrize("quantidade", [1, 5, 20])
+def test_listagem_expandida_com_consultas_constantes(
+    client, db, django_assert_num_queries, quantidade: int
+) -> None:
+    criar_contas(quantidade)
+
+    # contas com pessoa (JOIN) + transações recentes de todas as contas
+    with django_assert_num_queries(2):
+        response = client.get(
+            reverse("contas"), {"expand": "pessoa,transacoes_recentes"}
+        )
+
+    contas = response.json()
+    assert len(contas) == quantidade
+    assert contas[0]["pessoa"]["nome"] == "Pessoa 0"
+    assert [t["valor"] for t in contas[0]["transacoesRecentes"]] == ["3.00", "2.00", "1.00"]
+
+
+def test_listagem_paginada_expandida(client, db, django_assert_num_queries) -> None:
+    criar_contas(5)
+
+    with django_assert_num_queries(1):
+        response = client.get(reverse("contas"), {"expand": "pessoa", "limite": 2})
+
+    pagina = response.json()
+    assert [c["pessoa"]["cpf"] for c in pagina["results"]] == ["00000000000", "00000000001"]
+    assert pagina["next"]
+
+
+def test_transacoes_recentes_limitadas(client, db, settings) -> None:
+    settings.TRANSACOES_RECENTES = 4
+    conta = criar_contas(1, transacoes=10)[0]
+
+    response = client.get(
+        reverse("conta-detail", kwargs={"id": conta.id}), {"expand": "transacoes_recentes"}
+    )
+
+    dados = response.json()
+    assert dados["pessoa"] == conta.pessoa_id
+    assert [t["valor"] for t in dados["transacoesRecentes"]] == [
+        "10.00", "9.00", "8.00", "7.00"
+    ]
+
+
+def test_transacoes_recentes_incluem_as_arquivadas(client, db) -> None:
+    conta = criar_contas(1, transacoes=3)[0]
+    Transacao.objects.create(conta=conta, valor=4, tipo="deposito")
+    call_command("arquivar_transacoes", antes_de=timezone.localdate(), stdout=io.StringIO())
+
+    response = client.get(
+        reverse("conta-detail", kwargs={"id": conta.id}), {"expand": "transacoes_recentes"}
+    )
+
+    assert Transacao.objects.filter(conta=conta).count() == 1
+    assert [t["valor"] for t in response.json()["transacoesRecentes"]] == [
+        "4.00", "3.00", "2.00", "1.00"
+    ]
+
+
+def test_detalhe_expandido(client, db, django_assert_num_queries) -> None:
+    conta = criar_contas(1)[0]
+
+    with django_assert_num_queries(2):
+        response = client.get(
+            reverse("conta-detail", kwargs={"id": conta.id}),
+            {"expand": "pessoa,transacoes_recentes"},
+        )
+
+    dados = response.json()
+    assert dados["id"] == conta.id
+    assert dados["pessoa"]["id"] == conta.pessoa_id
+    assert len(dados["transacoesRecentes"]) == 3
+    assert not response.has_header("ETag")
+
+
+def test_stream_expandido_em_blocos(client, db, settings) -> None:
+    settings.STREAM_CHUNK_SIZE = 2
+    criar_contas(5)
+
+    response = client.get(reverse("contas"), {"expand": "pessoa", "stream": 1})
+
+    contas = json.loads(b"".join(response.streaming_content))
+    assert [c["pessoa"]["nome"] for c in contas] == [f"Pessoa {i}" for i in range(5)]
+
+
+def test_expansao_desconhecida(client, db) -> None:
+    response = client.get(reverse("contas"), {"expand": "pessoa,extrato"})
+
+    assert response.status_code == 400
+    assert "expand" in response.json()
@@ -0,0 +1,101 @@
+import pytest
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from api import extrato
+from api.models import Pessoa, Conta, SaldoDiario, Transacao
+
+
+@pytest.fixture
+def conta(pessoa: Pessoa, dias_atras) -> Conta:
+    """Conta aberta com 100, com um depósito de 50 há 10 dias, um saque de
+    30 há 5 dias e um depósito de 7 hoje (saldo atual 127)"""
+    conta = Conta.objects.create(saldo=127, limiteSaqueDiario=200, pessoa=pessoa)
+    for valor, tipo, dia in ((50, "deposito", 10), (30, "saque", 5), (7, "deposito", 0)):
+        transacao = Transacao.objects.create(conta=conta, valor=valor, tipo=tipo)
+        momento = extrato.inicio_do_dia(dias_atras(dia)) + datetime.timedelta(hours=12)
+        Transacao.objects.filter(pk=transacao.pk).update(dataTransacao=momento)
+    return conta
+
+
+SALDOS_ESPERADOS = [(11, 100), (10, 100), (9, 150), (5, 150), (4, 120), (0, 120), (-1, 127)]
+
+
+@pytest.mark.parametrize("dia, saldo", SALDOS_ESPERADOS)
+def test_saldo_sem_checkpoints(conta: Conta, dia: int, saldo: int, dias_atras) -> None:
+    assert extrato.saldo_no_inicio_do_dia(conta.id, dias_atras(dia)) == saldo
+
+
+@pytest.mark.parametrize("dia, saldo", SALDOS_ESPERADOS)
+def test_saldo_com_checkpoints(conta: Conta, dia: int, saldo: int, dias_atras) -> None:
+    call_command("gerar_saldos_diarios")
+    assert extrato.saldo_no_inicio_do_dia(conta.id, dias_atras(dia)) == saldo
+
+
+def test_checkpoints_gerados_apenas_para_dias_encerrados(conta: Conta, dias_atras) -> None:
+    call_command("gerar_saldos_diarios")
+
+    checkpoints = SaldoDiario.objects.filter(conta=conta).order_by("data")
+    assert [(c.data, c.saldo) for c in checkpoints] == [
+        (dias_atras(10), 150),
+        (dias_atras(5), 120),
+    ]
+
+
+def test_checkpoints_incrementais(conta: Conta, dias_atras) -> None:
+    call_command("gerar_saldos_diarios")
+    transacao = Transacao.objects.create(conta=conta, valor=20, tipo="saque")
+    Transacao.objects.filter(pk=transacao.pk).update(
+        dataTransacao=extrato.inicio_do_dia(dias_atras(2))
+    )
+    Conta.objects.filter(pk=conta.id).update(saldo=107)
+
+    call_command("gerar_saldos_diarios")
+
+    assert SaldoDiario.objects.filter(conta=conta).count() == 3
+    assert SaldoDiario.objects.get(conta=conta, data=dias_atras(2)).saldo == 100
+
+
+def test_endpoint_extrato(client, conta: Conta, dias_atras) -> None:
+    response = client.get(
+        reverse("extrato", kwargs={"id": conta.id}),
+        {"data_inicial": dias_atras(6).isoformat(), "data_final": dias_atras(1).isoformat()},
+    )
+    response_content = json.loads(response.content)
+    assert response.status_code == 200
+    assert Decimal(response_content["saldoInicial"]) == 150
+    assert Decimal(response_content["saldoFinal"]) == 120
+    assert [Decimal(m["valor"]) for m in response_content["movimentos"]] == [30]
+
+
+def test_endpoint_extrato_data_invalida(client, conta: Conta) -> None:
+    response = client.get(
+        reverse("extrato", kwargs={"id": conta.id}), {"data_inicial": "ontem"}
+    )
+    assert response.status_code == 400
+    assert json.loads(response.content) == {"data": "Data deve estar no formato AAAA-MM-DD"}
+
+
+def test_endpoint_extrato_conta_inexistente(client, db) -> None:
+    response = client.get(reverse("extrato", kwargs={"id": 999}))
+    assert response.status_code == 404
+
+
+DATAS_FORA_DO_INTERVALO = [
+    {"data_final": "9999-12-31"},
+    {"data_inicial": "0001-01-01"},
+    {"data_inicial": "0001-01-01", "data_final": "0001-01-02"},
+]
+
+
+@pytest.mark.parametrize("parametros", DATAS_FORA_DO_INTERVALO)
+def test_endpoint_extrato_datas_fora_do_intervalo(
+    client, conta: Conta, parametros: dict
+) -> None:
+    response = client.get(reverse("extrato", kwargs={"id": conta.id}), parametros)
+    assert response.status_code == 400
+
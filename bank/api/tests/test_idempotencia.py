@@ -0,0 +1,148 @@
+import pytest
+import json
+import time
+from decimal import Decimal
+
+from django.test import Client
+from django.urls import reverse
+from rest_framework.response import Response
+
+from api import idempotencia
+from api.models import Conta, Transacao
+
+
+def test_deposito_repetido_nao_movimenta_de_novo(client, conta: Conta) -> None:
+    url = reverse("deposito", kwargs={"id": conta.id})
+    primeira = client.post(url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc")
+    repetida = client.post(url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc")
+
+    conta.refresh_from_db()
+    assert primeira.status_code == repetida.status_code == 200
+    assert json.loads(primeira.content) == json.loads(repetida.content)
+    assert repetida["Idempotent-Replayed"] == "true"
+    assert not primeira.has_header("Idempotent-Replayed")
+    assert conta.saldo == Decimal(110)
+    assert Transacao.objects.filter(conta=conta).count() == 1
+
+
+def test_saque_recusado_tambem_e_repetido(client, conta: Conta) -> None:
+    url = reverse("saque", kwargs={"id": conta.id})
+    primeira = client.post(url, data={"valor": "500"}, HTTP_IDEMPOTENCY_KEY="abc")
+    Conta.objects.filter(pk=conta.id).update(saldo=1000)
+    repetida = client.post(url, data={"valor": "500"}, HTTP_IDEMPOTENCY_KEY="abc")
+
+    assert primeira.status_code == repetida.status_code == 400
+    assert repetida["Idempotent-Replayed"] == "true"
+    assert not Transacao.objects.filter(conta=conta).exists()
+
+
+def test_mesma_chave_com_outro_valor(client, conta: Conta) -> None:
+    url = reverse("deposito", kwargs={"id": conta.id})
+    client.post(url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc")
+    response = client.post(url, data={"valor": "20"}, HTTP_IDEMPOTENCY_KEY="abc")
+
+    assert response.status_code == 422
+    assert Transacao.objects.filter(conta=conta).count() == 1
+
+
+def test_chave_separada_por_operacao_e_conta(client, conta: Conta) -> None:
+    client.post(
+        reverse("deposito", kwargs={"id": conta.id}),
+        data={"valor": "10"},
+        HTTP_IDEMPOTENCY_KEY="abc",
+    )
+    response = client.post(
+        reverse("saque", kwargs={"id": conta.id}),
+        data={"valor": "10"},
+        HTTP_IDEMPOTENCY_KEY="abc",
+    )
+
+    assert response.status_code == 200
+    assert not response.has_header("Idempotent-Replayed")
+    assert Transacao.objects.filter(conta=conta).count() == 2
+
+
+def test_chave_separada_por_cliente(client, conta: Conta) -> None:
+    url = reverse("deposito", kwargs={"id": conta.id})
+    client.post(url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc", REMOTE_ADDR="10.0.0.1")
+    response = client.post(
+        url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc", REMOTE_ADDR="10.0.0.2"
+    )
+
+    assert response.status_code == 200
+    assert not response.has_header("Idempotent-Replayed")
+    assert Transacao.objects.filter(conta=conta).count() == 2
+
+
+def test_sem_chave_cada_requisicao_movimenta(client, conta: Conta) -> None:
+    url = reverse("deposito", kwargs={"id": conta.id})
+    client.post(url, data={"valor": "10"})
+    client.post(url, data={"valor": "10"})
+
+    assert Transacao.objects.filter(conta=conta).count() == 2
+
+
+def test_chave_liberada_quando_conta_nao_existe(client, db) -> None:
+    url = reverse("deposito", kwargs={"id": 999})
+    client.post(url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc")
+
+    assert client.post(url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc").status_code == 404
+    assert len(idempotencia.armazem) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_repeticoes_concorrentes_esperam_a_primeira(conta: Conta, executar_em_paralelo) -> None:
+    url = reverse("deposito", kwargs={"id": conta.id})
+    respostas = executar_em_paralelo(
+        lambda: Client().post(url, data={"valor": "10"}, HTTP_IDEMPOTENCY_KEY="abc"), 8
+    )
+
+    conta.refresh_from_db()
+    assert [r.status_code for r in respostas] == [200] * 8
+    assert sum(r.has_header("Idempotent-Replayed") for r in respostas) == 7
+    assert conta.saldo == Decimal(110)
+    assert Transacao.objects.filter(conta=conta).count() == 1
+
+
+# ------------------ Test Armazem ------------------------
+
+
+def reservar_e_concluir(armazem, chave: str) -> None:
+    entrada, _ = armazem.reservar(chave, b"")
+    armazem.concluir(entrada, Response({}, status=200))
+
+
+def test_chaves_expiram(settings) -> None:
+    settings.IDEMPOTENCIA_TTL = 0.01
+    armazem = idempotencia.ArmazemIdempotencia()
+    reservar_e_concluir(armazem, "a")
+    time.sleep(0.02)
+
+    _, primeira = armazem.reservar("b", b"")
+    assert primeira
+    assert len(armazem) == 1
+
+
+def test_chaves_mais_antigas_saem_ao_atingir_o_maximo(settings) -> None:
+    settings.IDEMPOTENCIA_MAXIMO = 2
+    armazem = idempotencia.ArmazemIdempotencia()
+    for chave in "abc":
+        reservar_e_concluir(armazem, chave)
+
+    assert len(armazem) == 2
+    assert armazem.reservar("a", b"")[1]
+
+
+def test_chaves_em_andamento_nao_saem(settings) -> None:
+    settings.IDEMPOTENCIA_TTL = 0.01
+    settings.IDEMPOTENCIA_MAXIMO = 2
+    armazem = idempotencia.ArmazemIdempotencia()
+    em_andamento, _ = armazem.reservar("a", b"")
+    time.sleep(0.02)
+    for chave in "bcd":
+        reservar_e_concluir(armazem, chave)
+
+    # A repetição encontra a execução original, vencida e a mais antiga
+    entrada, primeira = armazem.reservar("a", b"")
+    assert not primeira and entrada is em_andamento
+    assert armazem.reservar("b", b"")[1]
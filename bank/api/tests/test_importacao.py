@@ -0,0 +1,189 @@
+import pytest
+import io
+import json
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from api import ledger, razao
+from api.models import Pessoa, Conta, Lancamento
+
+
+def ndjson(*registros) -> bytes:
+    return "".join(json.dumps(registro) + "\n" for registro in registros).encode()
+
+
+# ------------------ Importação de pessoas ------------------------
+
+
+def test_importar_pessoas_csv(client, pessoa: Pessoa) -> None:
+    corpo = (
+        "nome,cpf,dataNascimento\n"
+        "Maria,10987654321,1990-01-31\n"
+        "Ana,123,1990-01-31\n"
+        "Pedro,12345678910,1980-05-05\n"
+        "José,11111111111,31/01/1990\n"
+        "Clara,22222222222,2000-02-02\n"
+        "Clara,22222222222,2000-02-02\n"
+    )
+    response = client.post(
+        reverse("pessoas-importar"), data=corpo.encode(), content_type="text/csv"
+    )
+
+    assert response.status_code == 201
+    assert response.json() == {
+        "importadas": 2,
+        "rejeitadas": 4,
+        "erros": [
+            {"linha": 2, "erros": {"cpf": "CPF deve conter 11 e não 3 dígitos"}},
+            {"linha": 3, "erros": {"cpf": "Já existe uma pessoa com este CPF"}},
+            {"linha": 4, "erros": {"dataNascimento": "Data deve estar no formato AAAA-MM-DD"}},
+            {"linha": 6, "erros": {"cpf": "Já existe uma pessoa com este CPF"}},
+        ],
+    }
+    assert sorted(Pessoa.objects.values_list("nome", flat=True)) == ["Clara", "João", "Maria"]
+
+
+def test_importar_pessoas_ndjson_em_lotes(client, db, settings) -> None:
+    settings.IMPORTACAO_LOTE = 2
+    settings.IMPORTACAO_ERROS_MAXIMO = 1
+    corpo = ndjson(
+        *[
+            {"nome": f"Pessoa {i}", "cpf": f"{i:011d}", "dataNascimento": "2000-01-01"}
+            for i in range(5)
+        ],
+        {"nome": "", "cpf": "abc", "dataNascimento": "2000-01-01"},
+    ) + b"{nao e json\n"
+
+    response = client.post(
+        reverse("pessoas-importar"), data=corpo, content_type="application/x-ndjson"
+    )
+
+    assert response.json() == {
+        "importadas": 5,
+        "rejeitadas": 2,
+        "erros": [
+            {
+                "linha": 6,
+                "erros": {
+                    "nome": "Este campo é obrigatório.",
+                    "cpf": "CPF deve conter apenas números",
+                },
+            }
+        ],
+    }
+    assert Pessoa.objects.count() == 5
+
+
+def test_importar_sem_formato(client, db) -> None:
+    response = client.post(reverse("pessoas-importar"), data=b"", content_type="text/plain")
+    assert response.status_code == 415
+
+
+# ------------------ Importação de contas ------------------------
+
+
+def test_importar_contas_lanca_saldo_de_abertura(client, pessoa: Pessoa) -> None:
+    corpo = (
+        "cpf,pessoa,saldo,limiteSaqueDiario,tipoConta\n"
+        "12345678910,,150.50,1000,\n"
+        f",{pessoa.id},0,500,2\n"
+        "99999999999,,10,10,\n"
+        f",{pessoa.id},abc,10,\n"
+    )
+    response = client.post(
+        reverse("contas-importar") + "?formato=csv",
+        data=corpo.encode(),
+        content_type="application/octet-stream",
+    )
+
+    assert response.json() == {
+        "importadas": 2,
+        "rejeitadas": 2,
+        "erros": [
+            {"linha": 3, "erros": {"cpf": "Nenhuma pessoa com este CPF"}},
+            {"linha": 4, "erros": {"saldo": "Saldo tem que existir e ser numérico"}},
+        ],
+    }
+    contas = list(Conta.objects.order_by("id"))
+    assert [(c.saldo, c.tipoConta) for c in contas] == [(Decimal("150.50"), 1), (0, 2)]
+    for conta in contas:
+        assert razao.saldo_derivado(conta.id) == conta.saldo
+    assert Lancamento.objects.count() == 2
+
+
+# ------------------ Comandos ------------------------
+
+
+def test_comando_importar(pessoa: Pessoa, tmp_path, capsys) -> None:
+    arquivo = tmp_path / "contas.ndjson"
+    arquivo.write_bytes(
+        ndjson(
+            {"pessoa": pessoa.id, "saldo": "10", "limiteSaqueDiario": "100"},
+            {"pessoa": 0, "saldo": "10", "limiteSaqueDiario": "100"},
+        )
+    )
+    rejeitadas = tmp_path / "rejeitadas.ndjson"
+
+    call_command("importar", "contas", str(arquivo), lote=1, rejeitadas=str(rejeitadas))
+
+    assert "1 contas importadas, 1 rejeitadas" in capsys.readouterr().out
+    assert json.loads(rejeitadas.read_text()) == {
+        "linha": 2,
+        "erros": {"pessoa": "Pessoa não encontrada"},
+    }
+    assert Conta.objects.get().saldo == 10
+
+
+# ------------------ Exportação ------------------------
+
+
+@pytest.fixture
+def transacoes(pessoa: Pessoa) -> list:
+    conta = Conta.objects.create(saldo=100, limiteSaqueDiario=1000, pessoa=pessoa)
+    return [
+        ledger.depositar(conta.id, Decimal(valor))[1] for valor in ("1.50", "2", "3")
+    ]
+
+
+def test_exportar_transacoes_csv(client, transacoes: list) -> None:
+    response = client.get(reverse("transacoes-exportar"), {"conta": transacoes[0].conta_id})
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "text/csv"
+    assert response["Content-Disposition"] == 'attachment; filename="transacoes.csv"'
+    linhas = b"".join(response.streaming_content).decode().splitlines()
+    assert linhas[0] == "id,conta,valor,tipo,dataTransacao"
+    assert [linha.split(",")[2] for linha in linhas[1:]] == ["1.50", "2.00", "3.00"]
+
+
+def test_exportar_transacoes_ndjson_por_periodo(client, transacoes: list) -> None:
+    hoje = timezone.localtime(transacoes[0].dataTransacao).date()
+
+    response = client.get(
+        reverse("transacoes-exportar"),
+        {"formato": "ndjson", "data_inicial": hoje.isoformat(), "data_final": hoje.isoformat()},
+    )
+    linhas = b"".join(response.streaming_content).decode().splitlines()
+    assert [json.loads(linha)["id"] for linha in linhas] == [t.id for t in transacoes]
+
+    response = client.get(
+        reverse("transacoes-exportar"),
+        {"data_inicial": "1999-01-01", "data_final": "1999-12-31"},
+    )
+    assert b"".join(response.streaming_content).decode().splitlines() == [
+        "id,conta,valor,tipo,dataTransacao"
+    ]
+
+
+def test_exportar_transacoes_data_invalida(client, db) -> None:
+    response = client.get(reverse("transacoes-exportar"), {"data_inicial": "ontem"})
+    assert response.status_code == 400
+
+
+def test_comando_exportar_transacoes(transacoes: list) -> None:
+    saida = io.StringIO()
+    call_command("exportar_transacoes", formato="ndjson", lote=2, stdout=saida)
+    assert len(saida.getvalue().splitlines()) == 3
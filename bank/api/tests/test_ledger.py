@@ -0,0 +1,205 @@
+import pytest
+import datetime
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from api import ledger
+from api.models import Conta, SaqueDiario, Transacao
+
+
+# As operações concorrentes usam outras threads, que só enxergam o que foi
+# gravado fora da transação do teste
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+# ------------------ Test Saques concorrentes ------------------------
+
+
+def test_saques_paralelos_nunca_deixam_saldo_negativo(conta: Conta, executar_em_paralelo) -> None:
+    resultados = executar_em_paralelo(lambda: ledger.sacar(conta.id, Decimal(30)), 16)
+
+    sucessos = [r for r in resultados if isinstance(r, tuple)]
+    recusados = [r for r in resultados if isinstance(r, ledger.SaldoInsuficiente)]
+    conta.refresh_from_db()
+    assert len(sucessos) == 3
+    assert len(recusados) == 13
+    assert conta.saldo == Decimal(10)
+    assert Transacao.objects.filter(conta=conta, tipo="saque").count() == 3
+
+
+def test_saques_paralelos_respeitam_limite_diario(conta: Conta, executar_em_paralelo) -> None:
+    Conta.objects.filter(pk=conta.id).update(limiteSaqueDiario=50)
+    resultados = executar_em_paralelo(lambda: ledger.sacar(conta.id, Decimal(20)), 8)
+
+    sucessos = [r for r in resultados if isinstance(r, tuple)]
+    conta.refresh_from_db()
+    assert len(sucessos) == 2
+    assert conta.saldo == Decimal(60)
+    assert ledger.gasto_diario(conta.id) == Decimal(40)
+    assert SaqueDiario.objects.get(conta=conta).total == Decimal(40)
+
+
+def test_depositos_paralelos_nao_perdem_atualizacao(conta: Conta, executar_em_paralelo) -> None:
+    executar_em_paralelo(lambda: ledger.depositar(conta.id, Decimal(5)), 16)
+
+    conta.refresh_from_db()
+    assert conta.saldo == Decimal(180)
+    assert Transacao.objects.filter(conta=conta, tipo="deposito").count() == 16
+
+
+def test_saque_recusado_nao_registra_transacao(conta: Conta) -> None:
+    with pytest.raises(ledger.SaldoInsuficiente):
+        ledger.sacar(conta.id, Decimal(101))
+
+    conta.refresh_from_db()
+    assert conta.saldo == Decimal(100)
+    assert not Transacao.objects.filter(conta=conta).exists()
+
+
+def test_conta_inexistente(transactional_db) -> None:
+    with pytest.raises(Conta.DoesNotExist):
+        ledger.sacar(999, Decimal(1))
+    with pytest.raises(Conta.DoesNotExist):
+        ledger.depositar(999, Decimal(1))
+
+
+def test_gasto_diario_usa_o_dia_local(conta: Conta) -> None:
+    hoje = timezone.localdate()
+    meia_noite = timezone.make_aware(datetime.datetime.combine(hoje, datetime.time.min))
+    for valor, momento in (
+        (1, meia_noite - datetime.timedelta(microseconds=1)),
+        (2, meia_noite),
+        (4, meia_noite + datetime.timedelta(days=1, microseconds=-1)),
+        (8, meia_noite + datetime.timedelta(days=1)),
+    ):
+        transacao = Transacao.objects.create(conta=conta, valor=valor, tipo="saque")
+        Transacao.objects.filter(pk=transacao.pk).update(dataTransacao=momento)
+
+    assert ledger.gasto_diario(conta.id, hoje) == Decimal(6)
+
+
+# ------------------ Test Transferencias ------------------------
+
+
+@pytest.fixture
+def outra(conta: Conta) -> Conta:
+    return Conta.objects.create(saldo=100, limiteSaqueDiario=1000, pessoa=conta.pessoa)
+
+
+def test_transferencias_cruzadas_nao_travam_nem_perdem_saldo(
+    conta: Conta, outra: Conta, executar_em_paralelo
+) -> None:
+    contador = iter(range(32))
+
+    def transferir():
+        if next(contador) % 2:
+            return ledger.transferir(conta.id, outra.id, Decimal(10))
+        return ledger.transferir(outra.id, conta.id, Decimal(10))
+
+    resultados = executar_em_paralelo(transferir, 32)
+
+    conta.refresh_from_db()
+    outra.refresh_from_db()
+    sucessos = [r for r in resultados if isinstance(r, tuple)]
+    assert all(isinstance(r, (tuple, ledger.SaldoInsuficiente)) for r in resultados)
+    assert conta.saldo + outra.saldo == Decimal(200)
+    assert conta.saldo >= 0 and outra.saldo >= 0
+    assert Transacao.objects.count() == 2 * len(sucessos)
+
+
+def test_transferencia_registra_saque_e_deposito(conta: Conta, outra: Conta) -> None:
+    origem, destino, saque, deposito = ledger.transferir(conta.id, outra.id, Decimal("12.345"))
+
+    assert origem.saldo == Decimal("87.66")
+    assert destino.saldo == Decimal("112.34")
+    assert (saque.conta_id, saque.tipo, saque.valor) == (conta.id, "saque", Decimal("12.34"))
+    assert (deposito.conta_id, deposito.tipo) == (outra.id, "deposito")
+    assert SaqueDiario.objects.get(conta=conta).total == Decimal("12.34")
+
+
+@pytest.mark.parametrize(
+    "ajuste, erro",
+    [
+        ({"limiteSaqueDiario": 5}, ledger.LimiteSaqueExcedido),
+        ({"saldo": 5}, ledger.SaldoInsuficiente),
+        ({"flagAtivo": False}, ledger.ContaBloqueada),
+    ],
+)
+def test_transferencia_recusada_nao_altera_contas(
+    conta: Conta, outra: Conta, ajuste: dict, erro
+) -> None:
+    Conta.objects.filter(pk=conta.id).update(**ajuste)
+
+    with pytest.raises(erro):
+        ledger.transferir(conta.id, outra.id, Decimal(10))
+
+    outra.refresh_from_db()
+    assert outra.saldo == Decimal(100)
+    assert not Transacao.objects.exists()
+    assert not SaqueDiario.objects.exists()
+
+
+def test_transferencia_para_conta_bloqueada(conta: Conta, outra: Conta) -> None:
+    Conta.objects.filter(pk=outra.id).update(flagAtivo=False)
+
+    with pytest.raises(ledger.ContaBloqueada):
+        ledger.transferir(conta.id, outra.id, Decimal(10))
+
+
+def test_transferencia_para_conta_inexistente(conta: Conta) -> None:
+    with pytest.raises(Conta.DoesNotExist):
+        ledger.transferir(conta.id, 999, Decimal(10))
+
+    conta.refresh_from_db()
+    assert conta.saldo == Decimal(100)
+
+
+# ------------------ Test SaqueDiario ------------------------
+
+
+def test_saque_soma_no_contador_do_dia(conta: Conta) -> None:
+    ledger.sacar(conta.id, Decimal(10))
+    ledger.sacar(conta.id, Decimal("2.5"))
+
+    contador = SaqueDiario.objects.get(conta=conta)
+    assert contador.data == timezone.localdate()
+    assert contador.total == Decimal("12.5")
+
+
+def test_contador_parte_das_transacoes_existentes(conta: Conta) -> None:
+    Conta.objects.filter(pk=conta.id).update(limiteSaqueDiario=50)
+    Transacao.objects.create(conta=conta, valor=45, tipo="saque")
+
+    with pytest.raises(ledger.LimiteSaqueExcedido):
+        ledger.sacar(conta.id, Decimal(10))
+    ledger.sacar(conta.id, Decimal(5))
+
+    assert SaqueDiario.objects.get(conta=conta).total == Decimal(50)
+
+
+def test_recalcular_saques_diarios(conta: Conta) -> None:
+    Transacao.objects.create(conta=conta, valor=10, tipo="saque")
+    Transacao.objects.create(conta=conta, valor=15, tipo="saque")
+    Transacao.objects.create(conta=conta, valor=99, tipo="deposito")
+    SaqueDiario.objects.create(conta=conta, data=timezone.localdate(), total=1)
+
+    call_command("recalcular_saques_diarios")
+
+    contador = SaqueDiario.objects.get(conta=conta)
+    assert contador.data == timezone.localdate()
+    assert contador.total == Decimal(25)
+
+
+@pytest.mark.parametrize("valor", [Decimal(-10), Decimal(0), Decimal("NaN"), Decimal("1e20")])
+def test_valor_invalido_nao_altera_a_conta(conta: Conta, valor: Decimal) -> None:
+    for operacao in (ledger.depositar, ledger.sacar):
+        with pytest.raises(ledger.ValorInvalido):
+            operacao(conta.id, valor)
+    with pytest.raises(ledger.ValorInvalido):
+        ledger.transferir(conta.id, conta.id + 1, valor)
+
+    conta.refresh_from_db()
+    assert conta.saldo == 100
+    assert not Transacao.objects.exists()
@@ -0,0 +1,139 @@
+import pytest
+
+from django.urls import reverse
+
+from api import limites
+
+
+def test_balde_enche_com_o_tempo() -> None:
+    baldes = limites.Baldes()
+
+    assert baldes.consumir("a", 2, 2, agora=0) == 0
+    assert baldes.consumir("a", 2, 2, agora=0) == 0
+    assert baldes.consumir("a", 2, 2, agora=0) == pytest.approx(0.5)
+    assert baldes.consumir("a", 2, 2, agora=0.25) == pytest.approx(0.25)
+    assert baldes.consumir("a", 2, 2, agora=0.5) == 0
+    assert baldes.consumir("b", 2, 2, agora=0.5) == 0
+
+
+def test_balde_nao_passa_da_capacidade() -> None:
+    baldes = limites.Baldes()
+    baldes.consumir("a", 1, 2, agora=0)
+
+    for _ in range(2):
+        assert baldes.consumir("a", 1, 2, agora=1000) == 0
+    assert baldes.consumir("a", 1, 2, agora=1000) > 0
+
+
+def test_baldes_menos_usados_descartados(settings) -> None:
+    settings.LIMITES_MAXIMO = 2
+    baldes = limites.Baldes()
+    for chave in ("a", "b", "a", "c"):
+        baldes.consumir(chave, 1, 1, agora=0)
+
+    assert len(baldes) == 2
+    # "b" foi descartado e volta cheio; "a" e "c" continuam vazios
+    assert baldes.consumir("c", 1, 1, agora=0) > 0
+    assert baldes.consumir("a", 1, 1, agora=0) > 0
+    assert baldes.consumir("b", 1, 1, agora=0) == 0
+
+
+def test_limite_por_conta_recusa_antes_do_banco(
+    client, settings, contas: list, django_assert_num_queries
+) -> None:
+    settings.LIMITE_CONTA = (1, 2)
+    url = reverse("saque", kwargs={"id": contas[0].id})
+    for _ in range(2):
+        assert client.post(url, data={"valor": "1"}).status_code == 200
+
+    with django_assert_num_queries(0):
+        response = client.post(url, data={"valor": "1"})
+
+    assert response.status_code == 429
+    assert response["Retry-After"] == "1"
+    outra = reverse("saque", kwargs={"id": contas[1].id})
+    assert client.post(outra, data={"valor": "1"}).status_code == 200
+
+
+def test_limite_por_cliente(client, settings, contas: list) -> None:
+    settings.LIMITE_CLIENTE = (1, 1)
+    primeira = reverse("deposito", kwargs={"id": contas[0].id})
+    segunda = reverse("deposito", kwargs={"id": contas[1].id})
+
+    assert client.post(primeira, data={"valor": "1"}).status_code == 200
+    assert client.post(segunda, data={"valor": "1"}).status_code == 429
+    assert client.post(segunda, data={"valor": "1"}, REMOTE_ADDR="10.0.0.2").status_code == 200
+
+
+def test_recusa_nao_gasta_ficha_dos_outros_limites(client, settings, contas: list) -> None:
+    settings.LIMITE_CLIENTE = (0.001, 2)
+    settings.LIMITE_CONTA = (0.001, 1)
+    primeira = reverse("deposito", kwargs={"id": contas[0].id})
+    segunda = reverse("deposito", kwargs={"id": contas[1].id})
+    assert client.post(primeira, data={"valor": "1"}).status_code == 200
+
+    # Recusada pela conta: a ficha do cliente é devolvida
+    assert client.post(primeira, data={"valor": "1"}).status_code == 429
+    assert client.post(segunda, data={"valor": "1"}).status_code == 200
+
+
+def test_recusa_pelo_cliente_nao_gasta_ficha_da_conta(client, settings, contas: list) -> None:
+    settings.LIMITE_CLIENTE = (0.001, 1)
+    settings.LIMITE_CONTA = (0.001, 1)
+    segunda = reverse("deposito", kwargs={"id": contas[1].id})
+    client.post(reverse("deposito", kwargs={"id": contas[0].id}), data={"valor": "1"})
+
+    assert client.post(segunda, data={"valor": "1"}).status_code == 429
+    outro = client.post(segunda, data={"valor": "1"}, REMOTE_ADDR="10.0.0.2")
+    assert outro.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "criar", [limites.Baldes, lambda: limites.BaldesEmCache("default")], ids=["memoria", "cache"]
+)
+def test_devolver_ficha(criar) -> None:
+    baldes = criar()
+    baldes.consumir("a", 1, 1, agora=0)
+    baldes.devolver("a", 1, 1)
+
+    assert baldes.consumir("a", 1, 1, agora=0) == 0
+    assert baldes.consumir("a", 1, 1, agora=0, gastar=False) > 0
+
+
+def test_contrapressao_recusa_com_a_fila_cheia(client, settings, contas: list) -> None:
+    settings.MOVIMENTACAO_FILA_MAXIMA = 0
+    response = client.post(
+        reverse("deposito", kwargs={"id": contas[0].id}), data={"valor": "1"}
+    )
+
+    contas[0].refresh_from_db()
+    assert response.status_code == 429
+    assert response["Retry-After"] == "1"
+    assert contas[0].saldo == 100
+
+
+def test_fila_informada_na_resposta(client, contas: list) -> None:
+    response = client.post(
+        reverse("deposito", kwargs={"id": contas[0].id}), data={"valor": "1"}
+    )
+
+    assert response.status_code == 200
+    assert response[limites.HEADER_FILA] == "0"
+    assert limites.em_andamento() == 0
+
+
+def test_metricas_dos_limites(client, contas: list) -> None:
+    client.post(reverse("deposito", kwargs={"id": contas[0].id}), data={"valor": "1"})
+    conteudo = client.get(reverse("metricas")).content.decode()
+
+    assert "bank_limites_baldes 2" in conteudo
+    assert "bank_movimentacao_em_andamento 0" in conteudo
+
+
+def test_metricas_sem_baldes_no_cache(client, contas: list, settings) -> None:
+    settings.LIMITES_CACHE = "default"
+    client.post(reverse("deposito", kwargs={"id": contas[0].id}), data={"valor": "1"})
+    conteudo = client.get(reverse("metricas")).content.decode()
+
+    assert "bank_limites_baldes" not in conteudo
+    assert "bank_movimentacao_em_andamento 0" in conteudo
@@ -0,0 +1,67 @@
+import pytest
+
+from django.urls import reverse
+
+from api.models import Conta
+
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def metricas(client) -> dict:
+    response = client.get(reverse("metricas"))
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    linhas = response.content.decode().splitlines()
+    return dict(linha.rsplit(" ", 1) for linha in linhas if not linha.startswith("#"))
+
+
+def test_metricas_por_rota(client, conta: Conta) -> None:
+    client.get(reverse("saldo", kwargs={"id": conta.id}))
+    client.post(reverse("deposito", kwargs={"id": conta.id}), data={"valor": "10"})
+    client.post(reverse("deposito", kwargs={"id": conta.id}), data={})
+
+    valores = metricas(client)
+    assert valores['bank_http_requisicoes_total{rota="saldo",metodo="GET",status="2xx"}'] == "1"
+    assert valores['bank_http_requisicoes_total{rota="deposito",metodo="POST",status="2xx"}'] == "1"
+    assert valores['bank_http_requisicoes_total{rota="deposito",metodo="POST",status="4xx"}'] == "1"
+    assert valores['bank_http_duracao_segundos_count{rota="deposito",metodo="POST"}'] == "2"
+    assert valores['bank_db_consultas_count{rota="saldo"}'] == "1"
+    assert valores['bank_db_consultas_bucket{rota="saldo",le="0"}'] == "0"
+    assert int(valores['bank_db_consultas_sum{rota="saldo"}']) >= 1
+    assert float(valores['bank_db_duracao_segundos_sum{rota="saldo"}']) > 0
+    assert float(valores['bank_serializacao_duracao_segundos_sum{rota="saldo"}']) > 0
+    assert int(valores['bank_cache_contas_total{resultado="miss"}']) >= 1
+
+
+def test_buckets_acumulados(client, conta: Conta) -> None:
+    for _ in range(3):
+        client.get(reverse("conta-detail", kwargs={"id": conta.id}))
+
+    valores = metricas(client)
+    buckets = [
+        int(valor)
+        for chave, valor in valores.items()
+        if chave.startswith('bank_http_duracao_segundos_bucket{rota="conta-detail"')
+    ]
+    assert buckets == sorted(buckets)
+    assert buckets[-1] == 3
+    assert 'bank_http_duracao_segundos_bucket{rota="conta-detail",metodo="GET",le="+Inf"}' in valores
+
+
+def test_amostragem_zero_so_conta_requisicoes(client, conta: Conta, settings) -> None:
+    settings.METRICAS_AMOSTRAGEM = 0
+    client.get(reverse("saldo", kwargs={"id": conta.id}))
+
+    valores = metricas(client)
+    assert valores['bank_http_requisicoes_total{rota="saldo",metodo="GET",status="2xx"}'] == "1"
+    assert not any(chave.startswith("bank_db_consultas") for chave in valores)
+    assert valores["bank_metricas_amostragem"] == "0"
+
+
+def test_consultas_medidas_nas_views_assincronas(client, conta: Conta) -> None:
+    client.post(reverse("async:deposito", kwargs={"id": conta.id}), data={"valor": "10"})
+
+    valores = metricas(client)
+    assert int(valores['bank_db_consultas_sum{rota="async:deposito"}']) >= 3
+    assert float(valores['bank_serializacao_duracao_segundos_sum{rota="async:deposito"}']) > 0
@@ -18,30 +18,24 @@ def test_zero_pessoas_deve_retornar_lista_vazia(client) -> None:
 
 
 @pytest.mark.django_db
-def test_uma_pessoa_existe(client) -> None:
-    test_pessoa = Pessoa.objects.create(
-        nome="João", cpf="12345678910", dataNascimento="1999-10-10"
-    )
+def test_uma_pessoa_existe(client, pessoa: Pessoa) -> None:
     response = client.get(pessoas_url)
     response_content = json.loads(response.content)[0]
     assert response.status_code == 200
-    assert response_content.get("nome") == test_pessoa.nome
-    assert response_content.get("cpf") == test_pessoa.cpf
-    assert response_content.get("dataNascimento") == test_pessoa.dataNascimento
+    assert response_content.get("nome") == pessoa.nome
+    assert response_content.get("cpf") == pessoa.cpf
+    assert response_content.get("dataNascimento") == pessoa.dataNascimento
 
 
 @pytest.mark.django_db
-def test_get_uma_pessoa_por_id(client) -> None:
-    test_pessoa = Pessoa.objects.create(
-        nome="João", cpf="12345678910", dataNascimento="1999-10-10"
-    )
-    pessoa_detail_url = reverse("pessoa-detail", kwargs={"id": test_pessoa.id})
+def test_get_uma_pessoa_por_id(client, pessoa: Pessoa) -> None:
+    pessoa_detail_url = reverse("pessoa-detail", kwargs={"id": pessoa.id})
     response = client.get(pessoa_detail_url)
     response_content = json.loads(response.content)
     assert response.status_code == 200
-    assert response_content.get("nome") == test_pessoa.nome
-    assert response_content.get("cpf") == test_pessoa.cpf
-    assert response_content.get("dataNascimento") == test_pessoa.dataNascimento
+    assert response_content.get("nome") == pessoa.nome
+    assert response_content.get("cpf") == pessoa.cpf
+    assert response_content.get("dataNascimento") == pessoa.dataNascimento
 
 
 # ------------------ Test POST Pessoas ------------------------
@@ -107,3 +101,98 @@ def test_criar_pessoa(client) -> None:
     assert response_content.get("nome") == "João"
     assert response_content.get("cpf") == "12345678910"
     assert response_content.get("dataNascimento") == "1999-10-10"
+
+
+# ------------------ Test Paginação/Streaming ------------------------
+
+
+@pytest.fixture
+def varias_pessoas(db) -> list:
+    return Pessoa.objects.bulk_create(
+        Pessoa(nome=f"Pessoa {i}", cpf=f"{i:011d}", dataNascimento="1999-10-10")
+        for i in range(5)
+    )
+
+
+def test_pessoas_paginadas_por_cursor(client, varias_pessoas: list) -> None:
+    response = client.get(pessoas_url, {"limite": 3})
+    pagina = json.loads(response.content)
+    assert response.status_code == 200
+    assert [p["cpf"] for p in pagina["results"]] == [f"{i:011d}" for i in range(3)]
+    assert pagina["previous"] is None
+
+    response = client.get(pagina["next"])
+    pagina = json.loads(response.content)
+    assert [p["cpf"] for p in pagina["results"]] == [f"{i:011d}" for i in range(3, 5)]
+    assert pagina["next"] is None
+
+
+def test_pessoas_em_streaming(client, varias_pessoas: list, settings) -> None:
+    settings.STREAM_CHUNK_SIZE = 2
+    response = client.get(pessoas_url, {"stream": 1})
+    assert response.status_code == 200
+    assert response.streaming
+    conteudo = json.loads(b"".join(response.streaming_content))
+    assert conteudo == json.loads(client.get(pessoas_url).content)
+
+
+def test_streaming_sem_pessoas(client, db) -> None:
+    response = client.get(pessoas_url, {"stream": 1})
+    assert json.loads(b"".join(response.streaming_content)) == []
+
+
+# ------------------ Busca de Pessoas ------------------------
+
+
+@pytest.fixture
+def homonimos(db) -> list:
+    return Pessoa.objects.bulk_create(
+        Pessoa(nome=nome, cpf=f"{i:011d}", dataNascimento="1999-10-10")
+        for i, nome in enumerate(["José  Silva", "JOSEFA Souza", "João", "Josué", "Maria José"])
+    )
+
+
+def nomes(response) -> list:
+    return [p["nome"] for p in json.loads(response.content)["results"]]
+
+
+def test_busca_por_cpf(client, homonimos: list) -> None:
+    response = client.get(pessoas_url, {"cpf": "00000000002"})
+    assert response.status_code == 200
+    assert nomes(response) == ["João"]
+    assert nomes(client.get(pessoas_url, {"cpf": "99999999999"})) == []
+
+
+def test_busca_pelo_comeco_do_nome(client, homonimos: list) -> None:
+    assert nomes(client.get(pessoas_url, {"nome": "jose"})) == ["José  Silva", "JOSEFA Souza"]
+    assert nomes(client.get(pessoas_url, {"nome": "JOSÉ S"})) == ["José  Silva"]
+    assert nomes(client.get(pessoas_url, {"nome": "jo"})) == [
+        "João", "José  Silva", "JOSEFA Souza", "Josué"
+    ]
+    assert nomes(client.get(pessoas_url, {"nome": "jose", "cpf": "00000000001"})) == [
+        "JOSEFA Souza"
+    ]
+
+
+def test_busca_por_nome_paginada(client, homonimos: list) -> None:
+    pagina = json.loads(client.get(pessoas_url, {"nome": "jo", "limite": 3}).content)
+    seguinte = json.loads(client.get(pagina["next"]).content)
+
+    assert [p["nome"] for p in pagina["results"] + seguinte["results"]] == [
+        "João", "José  Silva", "JOSEFA Souza", "Josué"
+    ]
+    assert seguinte["next"] is None
+
+
+def test_busca_sem_nome(client, homonimos: list) -> None:
+    response = client.get(pessoas_url, {"nome": "  "})
+    assert response.status_code == 400
+    assert "nome" in json.loads(response.content)
+
+
+def test_busca_por_nome_usa_o_indice(homonimos: list) -> None:
+    plano = Pessoa.objects.filter(
+        nomeBusca__gte="jo", nomeBusca__lt="jo\U0010ffff"
+    ).order_by("nomeBusca", "id").explain()
+    assert "pessoa_nome_busca" in plano
+    assert "TEMP B-TREE" not in plano
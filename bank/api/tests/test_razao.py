@@ -0,0 +1,104 @@
+import pytest
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+
+from api import ledger, razao
+from api.models import Pessoa, Conta, Lancamento, LancamentoImutavel, SaldoConsolidado
+
+
+@pytest.fixture
+def outra(pessoa: Pessoa) -> Conta:
+    return Conta.objects.create(saldo=0, limiteSaqueDiario=1000, pessoa=pessoa)
+
+
+def movimentar(conta: Conta, outra: Conta) -> None:
+    ledger.depositar(conta.id, Decimal("10.50"))
+    ledger.sacar(conta.id, Decimal(20))
+    ledger.transferir(conta.id, outra.id, Decimal(30))
+    ledger.aplicar_lote(
+        [
+            ledger.Operacao(outra.id, "saque", Decimal(5)),
+            ledger.Operacao(conta.id, "deposito", Decimal(1)),
+            ledger.Operacao(outra.id, "saque", Decimal(500)),
+        ]
+    )
+
+
+def test_conta_nova_lanca_saldo_de_abertura(conta: Conta, outra: Conta) -> None:
+    partidas = Lancamento.objects.order_by("id")
+    assert [(p.conta_id, p.natureza, p.valor) for p in partidas] == [
+        (None, "D", Decimal(100)),
+        (conta.id, "C", Decimal(100)),
+    ]
+
+
+def test_movimentos_lancam_debito_e_credito(conta: Conta, outra: Conta) -> None:
+    movimentar(conta, outra)
+
+    conta.refresh_from_db()
+    outra.refresh_from_db()
+    assert razao.saldo_derivado(conta.id) == conta.saldo == Decimal("61.50")
+    assert razao.saldo_derivado(outra.id) == outra.saldo == Decimal(25)
+    assert Lancamento.objects.count() == 2 * 6
+    assert list(razao.movimentos_desbalanceados()) == []
+
+    transferencia = Lancamento.objects.filter(conta=outra, natureza="C").get()
+    contrapartida = Lancamento.objects.filter(movimento=transferencia.movimento).exclude(
+        pk=transferencia.pk
+    )
+    assert [(p.conta_id, p.natureza) for p in contrapartida] == [(conta.id, "D")]
+
+
+def test_movimento_recusado_nao_lanca(conta: Conta, outra: Conta) -> None:
+    with pytest.raises(ledger.SaldoInsuficiente):
+        ledger.transferir(conta.id, outra.id, Decimal(1000))
+
+    assert Lancamento.objects.count() == 2
+
+
+def test_lancamentos_sao_imutaveis(conta: Conta) -> None:
+    partida = Lancamento.objects.first()
+
+    with pytest.raises(LancamentoImutavel):
+        Lancamento.objects.update(valor=0)
+    with pytest.raises(LancamentoImutavel):
+        Lancamento.objects.filter(pk=partida.pk).delete()
+    with pytest.raises(LancamentoImutavel):
+        partida.save()
+    with pytest.raises(LancamentoImutavel):
+        partida.delete()
+
+
+def test_verificar_razao(conta: Conta, outra: Conta, capsys) -> None:
+    movimentar(conta, outra)
+
+    call_command("verificar_razao")
+
+    assert "2 contas conferidas, 0 divergentes" in capsys.readouterr().out
+
+
+def test_verificar_razao_detecta_saldo_alterado_fora_do_ledger(
+    conta: Conta, outra: Conta, capsys
+) -> None:
+    Conta.objects.filter(pk=conta.id).update(saldo=1000)
+
+    with pytest.raises(CommandError):
+        call_command("verificar_razao", lote=1)
+
+    assert f"conta {conta.id}: saldo 1000.00, razão 100.00" in capsys.readouterr().err
+
+
+def test_saldo_derivado_parte_do_consolidado(conta: Conta, outra: Conta) -> None:
+    movimentar(conta, outra)
+    call_command("verificar_razao", consolidar=True)
+    ledger.depositar(conta.id, Decimal(7))
+
+    consolidado = SaldoConsolidado.objects.get(conta=conta)
+    assert consolidado.saldo == Decimal("61.50")
+    assert razao.saldo_derivado(conta.id) == Decimal("68.50")
+
+    call_command("verificar_razao", consolidar=True)
+    call_command("verificar_razao", completo=True, consolidar=True)
+    assert SaldoConsolidado.objects.filter(conta=conta).count() == 2
+    assert SaldoConsolidado.objects.filter(conta=outra).count() == 1
@@ -0,0 +1,180 @@
+import pytest
+import datetime
+
+from django.urls import reverse
+
+from api import extrato, relatorios
+from api.models import Pessoa, Conta, Transacao
+
+
+@pytest.fixture(params=["numpy", "python"])
+def com_e_sem_numpy(request, monkeypatch) -> None:
+    """Executa o teste com as estatísticas em NumPy, se instalado
+    (requirements-opcionais.txt), e em Python puro"""
+    if request.param == "numpy":
+        monkeypatch.setattr(relatorios, "numpy", pytest.importorskip("numpy"))
+    else:
+        monkeypatch.setattr(relatorios, "numpy", None)
+
+
+@pytest.fixture
+def contas(pessoa: Pessoa, dias_atras) -> list:
+    """Conta com saldo 140 antes de um depósito de 100 há 10 dias e saques
+    de 20 e 10 há 9 dias e de 40 há 8 dias (saldo atual 170), e outra com
+    um depósito de 5 há 9 dias"""
+    primeira = Conta.objects.create(saldo=170, limiteSaqueDiario=1000, pessoa=pessoa)
+    segunda = Conta.objects.create(saldo=5, limiteSaqueDiario=1000, pessoa=pessoa)
+    for conta, valor, tipo, dia in (
+        (primeira, 100, "deposito", 10),
+        (primeira, 20, "saque", 9),
+        (primeira, 10, "saque", 9),
+        (primeira, 40, "saque", 8),
+        (segunda, 5, "deposito", 9),
+    ):
+        transacao = Transacao.objects.create(conta=conta, valor=valor, tipo=tipo)
+        momento = extrato.inicio_do_dia(dias_atras(dia)) + datetime.timedelta(hours=12)
+        Transacao.objects.filter(pk=transacao.pk).update(dataTransacao=momento)
+    return [primeira, segunda]
+
+
+@pytest.fixture
+def periodo(dias_atras):
+    """Função que monta os parâmetros data_inicial e data_final"""
+
+    def parametros(inicio: int = 10, fim: int = 7) -> dict:
+        return {
+            "data_inicial": dias_atras(inicio).isoformat(),
+            "data_final": dias_atras(fim).isoformat(),
+        }
+
+    return parametros
+
+
+def test_agregados_por_conta_e_tipo(client, contas: list, periodo) -> None:
+    response = client.get(reverse("relatorios-agregados"), periodo())
+
+    assert response.status_code == 200
+    assert response.json()["grupos"] == [
+        {"conta": contas[0].id, "tipo": "deposito", "total": "100.00", "quantidade": 1, "minimo": "100.00", "maximo": "100.00"},
+        {"conta": contas[0].id, "tipo": "saque", "total": "70.00", "quantidade": 3, "minimo": "10.00", "maximo": "40.00"},
+        {"conta": contas[1].id, "tipo": "deposito", "total": "5.00", "quantidade": 1, "minimo": "5.00", "maximo": "5.00"},
+    ]
+
+
+def test_agregados_por_dia_e_mes(client, contas: list, dias_atras, periodo) -> None:
+    url = reverse("relatorios-agregados")
+
+    por_dia = client.get(url, {**periodo(), "agrupar": "dia,tipo", "conta": contas[0].id})
+    por_mes = client.get(url, {**periodo(), "agrupar": "mes"})
+
+    assert [(g["dia"], g["tipo"], g["total"]) for g in por_dia.json()["grupos"]] == [
+        (dias_atras(10).isoformat(), "deposito", "100.00"),
+        (dias_atras(9).isoformat(), "saque", "30.00"),
+        (dias_atras(8).isoformat(), "saque", "40.00"),
+    ]
+    meses = por_mes.json()["grupos"]
+    assert sum(g["quantidade"] for g in meses) == 5
+    assert all(g["mes"].endswith("-01") for g in meses)
+
+
+@pytest.mark.parametrize("agrupar", ["pessoa", "dia,mes", "tipo,tipo"])
+def test_agrupamento_invalido(client, db, agrupar: str) -> None:
+    response = client.get(reverse("relatorios-agregados"), {"agrupar": agrupar})
+
+    assert response.status_code == 400
+
+
+def test_estatisticas_da_conta(client, contas: list, com_e_sem_numpy, periodo) -> None:
+    response = client.get(
+        reverse("relatorios-estatisticas"), {**periodo(), "conta": contas[0].id, "janela": 2}
+    )
+
+    relatorio = response.json()
+    assert [(d["liquido"], d["saldo"], d["mediaMovel"]) for d in relatorio["dias"]] == [
+        ("100.00", "240.00", None),
+        ("-30.00", "210.00", 35.0),
+        ("-40.00", "170.00", -35.0),
+        ("0.00", "170.00", -20.0),
+    ]
+    assert relatorio["saldoMedio"] == "197.50"
+    assert relatorio["saques"] == {
+        "quantidade": 3, "media": "23.33", "p50": 20.0, "p90": 36.0, "p99": 39.6
+    }
+
+
+def test_estatisticas_da_carteira(client, contas: list, periodo) -> None:
+    relatorio = client.get(reverse("relatorios-estatisticas"), periodo()).json()
+
+    assert [d["entradas"] for d in relatorio["dias"]] == ["100.00", "5.00", "0.00", "0.00"]
+    assert "saldoMedio" not in relatorio
+    assert "saldo" not in relatorio["dias"][0]
+
+
+def test_estatisticas_de_conta_inexistente(client, db) -> None:
+    response = client.get(reverse("relatorios-estatisticas"), {"conta": 999})
+
+    assert response.status_code == 404
+
+
+def test_periodo_encerrado_em_cache(
+    client, contas: list, django_assert_num_queries, periodo
+) -> None:
+    url = reverse("relatorios-agregados")
+    primeira = client.get(url, periodo())
+    Transacao.objects.filter(conta=contas[1]).delete()
+
+    with django_assert_num_queries(0):
+        repetida = client.get(url, periodo())
+
+    assert repetida.json() == primeira.json()
+
+
+def test_periodo_aberto_fora_do_cache(client, contas: list, periodo) -> None:
+    url = reverse("relatorios-agregados")
+    client.get(url, periodo(fim=0))
+    Transacao.objects.filter(conta=contas[1]).delete()
+
+    grupos = client.get(url, periodo(fim=0)).json()["grupos"]
+
+    assert {g["conta"] for g in grupos} == {contas[0].id}
+
+
+def test_percentis_e_media_movel(com_e_sem_numpy) -> None:
+    assert relatorios.percentis([[1.0, 4.0], [2.0], [3.0]], [0, 25, 50, 100]) == [
+        1.0, 1.75, 2.5, 4.0
+    ]
+    assert relatorios.percentis([], [50]) == [None]
+    assert relatorios.media_movel([1, 2, 3, 4], 3) == [None, None, 2.0, 3.0]
+    assert relatorios.media_movel([1, 2], 3) == [None, None]
+
+
+DATAS_FORA_DO_INTERVALO = [
+    {"data_final": "9999-12-31"},
+    {"data_inicial": "0001-01-01"},
+    {"data_inicial": "0001-01-01", "data_final": "0001-01-02"},
+]
+
+
+@pytest.mark.parametrize("parametros", DATAS_FORA_DO_INTERVALO)
+@pytest.mark.parametrize(
+    "rota", ["relatorios-agregados", "relatorios-estatisticas", "transacoes-exportar"]
+)
+def test_datas_fora_do_intervalo(client, db, rota: str, parametros: dict) -> None:
+    response = client.get(reverse(rota), parametros)
+    assert response.status_code == 400
+    assert response.json() == {
+        "data": "Data deve estar entre 1900-01-01 e 9999-12-30"
+    }
+
+
+@pytest.mark.parametrize("rota", ["relatorios-agregados", "relatorios-estatisticas"])
+def test_periodo_longo(client, db, rota: str) -> None:
+    response = client.get(
+        reverse(rota), {"data_inicial": "2020-01-01", "data_final": "2020-12-31"}
+    )
+    assert response.status_code == 200
+    response = client.get(
+        reverse(rota), {"data_inicial": "2020-01-01", "data_final": "2021-01-01"}
+    )
+    assert response.status_code == 400
+    assert response.json() == {"data": "O período deve ter no máximo 366 dias"}
@@ -0,0 +1,90 @@
+import pytest
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from api import replicas
+from api.models import Pessoa, Conta
+
+
+@pytest.fixture
+def replica(transactional_db, settings, tmp_path) -> str:
+    """Um segundo arquivo SQLite como réplica do banco de testes, atualizado
+    apenas por atualizar()"""
+    connections.databases["replica"] = {
+        **connections.databases["default"],
+        "NAME": str(tmp_path / "replica.sqlite3"),
+    }
+    settings.REPLICAS = ["replica"]
+    yield "replica"
+    connections["replica"].close()
+    del connections["replica"]
+    del connections.databases["replica"]
+
+
+def atualizar() -> None:
+    call_command("copiar_replicas", stdout=io.StringIO())
+
+
+@pytest.fixture
+def conta(replica: str, pessoa: Pessoa) -> Conta:
+    conta = Conta.objects.create(saldo=100, limiteSaqueDiario=1000, pessoa=pessoa)
+    atualizar()
+    return conta
+
+
+def test_leituras_vao_para_a_replica(client, conta: Conta) -> None:
+    Pessoa.objects.create(nome="Maria", cpf="10987654321", dataNascimento="1990-01-01")
+
+    response = client.get(reverse("pessoas"))
+
+    assert [pessoa["nome"] for pessoa in response.json()] == ["João"]
+    response = client.get(reverse("pessoas"), {"stream": 1})
+    assert b"Maria" not in b"".join(response.streaming_content)
+
+
+def test_rotas_fora_da_lista_leem_do_default(client, conta: Conta) -> None:
+    maria = Pessoa.objects.create(
+        nome="Maria", cpf="10987654321", dataNascimento="1990-01-01"
+    )
+
+    response = client.get(reverse("pessoa-detail", kwargs={"id": maria.id}))
+
+    assert response.status_code == 200
+
+
+def test_cliente_le_as_proprias_escritas(client, conta: Conta) -> None:
+    saldo_url = reverse("saldo", kwargs={"id": conta.id})
+
+    response = client.post(reverse("deposito", kwargs={"id": conta.id}), {"valor": 10})
+
+    assert response.json()["conta"]["saldo"] == "110.00"
+    # Outro cliente lê da réplica, que ainda não recebeu o depósito, e o
+    # snapshot lido da réplica não vai para o cache
+    assert Client().get(saldo_url).json() == {"saldo": 100}
+    assert client.get(saldo_url).json() == {"saldo": 110}
+    # O snapshot lido do default pelo cliente que escreveu vai
+    assert Client().get(saldo_url).json() == {"saldo": 110}
+
+
+def test_escrita_marca_o_cliente_pela_janela(client, conta: Conta, settings) -> None:
+    settings.REPLICA_JANELA = 7
+
+    response = client.post(reverse("deposito", kwargs={"id": conta.id}), {"valor": 10})
+
+    assert response.cookies[replicas.COOKIE]["max-age"] == 7
+    del client.cookies[replicas.COOKIE]
+    assert client.get(reverse("saldo", kwargs={"id": conta.id})).json() == {"saldo": 100}
+
+
+def test_movimentacao_usa_sempre_o_default(conta: Conta) -> None:
+    Conta.objects.filter(pk=conta.id).update(saldo=Decimal(5))
+
+    response = Client().post(reverse("saque", kwargs={"id": conta.id}), {"valor": 50})
+
+    assert response.status_code == 400
+    assert response.json() == {"valor": "A conta não tem saldo suficiente"}
@@ -0,0 +1,47 @@
+import pytest
+from decimal import Decimal
+
+from api.models import Pessoa, Conta, Transacao
+from api.serializers import (
+    PessoaSerializer,
+    ContaSerializer,
+    TransacaoSerializer,
+    conta_leitura,
+    pessoa_leitura,
+    transacao_leitura,
+)
+
+
+@pytest.fixture
+def transacao(pessoa: Pessoa) -> Transacao:
+    conta = Conta.objects.create(saldo=0, limiteSaqueDiario=200.5, pessoa=pessoa)
+    return Transacao.objects.create(conta=conta, valor=Decimal("10.5"), tipo="saque")
+
+
+CASOS = [
+    (Pessoa, PessoaSerializer, pessoa_leitura),
+    (Conta, ContaSerializer, conta_leitura),
+    (Transacao, TransacaoSerializer, transacao_leitura),
+]
+
+
+@pytest.mark.parametrize("modelo, serializer_class, projecao", CASOS)
+def test_projecao_igual_ao_serializer(transacao, modelo, serializer_class, projecao) -> None:
+    objeto = modelo.objects.get()
+    assert projecao.serializar(objeto) == serializer_class(objeto).data
+
+
+@pytest.mark.parametrize("modelo, serializer_class, projecao", CASOS)
+def test_projecao_de_valores_igual_ao_serializer(
+    transacao, modelo, serializer_class, projecao
+) -> None:
+    esperado = serializer_class(modelo.objects.all(), many=True).data
+    assert list(projecao.serializar_valores(modelo.objects.all())) == esperado
+    assert list(projecao.serializar_valores(modelo.objects.all(), chunk_size=1)) == esperado
+
+
+def test_projecao_de_objetos_nao_recarregados(transacao: Transacao) -> None:
+    conta = transacao.conta
+    assert conta_leitura.serializar(conta) == ContaSerializer(conta).data
+    assert pessoa_leitura.serializar(conta.pessoa) == PessoaSerializer(conta.pessoa).data
+    assert transacao_leitura.serializar(transacao) == TransacaoSerializer(transacao).data
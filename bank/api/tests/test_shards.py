@@ -0,0 +1,538 @@
+import contextlib
+import datetime
+import pytest
+import io
+import json
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.db import connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from api import escrita, ledger, razao, shards
+from api.bloqueios import bloqueadas
+from api.models import (
+    Pessoa,
+    Conta,
+    Evento,
+    Lancamento,
+    SaldoDiario,
+    SaqueDiario,
+    Transacao,
+    TransacaoArquivada,
+    TransferenciaPendente,
+)
+
+
+@pytest.fixture
+def acrescentar_shard(transactional_db, settings, tmp_path):
+    """Acrescenta a settings.SHARDS um shard em um arquivo SQLite
+    temporário, já migrado"""
+    novos = []
+
+    def acrescentar() -> str:
+        alias = f"shard{len(settings.SHARDS)}"
+        connections.databases[alias] = {
+            **connections.databases["default"],
+            "NAME": str(tmp_path / f"{alias}.sqlite3"),
+        }
+        novos.append(alias)
+        settings.SHARDS = [*settings.SHARDS, alias]
+        call_command("migrate", database=alias, verbosity=0)
+        return alias
+
+    yield acrescentar
+    # A thread escritora (BANK_SQLITE_PRODUCAO) tem as próprias conexões com
+    # os shards, que precisam ser fechadas antes de remover os aliases
+    escrita.parar()
+    for alias in novos:
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
+
+
+@pytest.fixture
+def pessoa(client, acrescentar_shard) -> int:
+    """Uma pessoa, com default, shard1 e shard2 como shards"""
+    acrescentar_shard()
+    acrescentar_shard()
+    response = client.post(
+        reverse("pessoas"),
+        {"nome": "João", "cpf": "12345678910", "dataNascimento": "1999-10-10"},
+    )
+    return response.json()["id"]
+
+
+def criar_conta(client, pessoa: int, saldo: int = 100) -> int:
+    response = client.post(
+        reverse("contas"), {"pessoa": pessoa, "saldo": saldo, "limiteSaqueDiario": 1000}
+    )
+    assert response.status_code == 201, response.content
+    return response.json()["id"]
+
+
+def criar_contas(client, pessoa: int, quantidade: int) -> list:
+    return [criar_conta(client, pessoa) for _ in range(quantidade)]
+
+
+def saldo(conta_id: int) -> Decimal:
+    return Conta.objects.using(shards.banco(conta_id)).get(pk=conta_id).saldo
+
+
+def conferir_razao(*contas: int) -> None:
+    for conta_id in contas:
+        with shards.da_conta(conta_id):
+            assert razao.saldo_derivado(conta_id) == saldo(conta_id)
+
+
+def test_anel_move_poucas_contas() -> None:
+    antes = shards.Anel(["default", "shard1"], 128)
+    depois = shards.Anel(["default", "shard1", "shard2"], 128)
+    donos = [depois.dono(conta_id) for conta_id in range(1, 3001)]
+
+    movidas = [
+        conta_id
+        for conta_id, dono in zip(range(1, 3001), donos)
+        if dono != antes.dono(conta_id)
+    ]
+    # Só as contas que passam para o shard novo mudam de lugar
+    assert {donos[conta_id - 1] for conta_id in movidas} == {"shard2"}
+    assert 700 < len(movidas) < 1300
+    assert all(donos.count(shard) > 700 for shard in ("default", "shard1", "shard2"))
+
+
+def test_contas_criadas_no_shard_do_id(client, pessoa: int) -> None:
+    contas = criar_contas(client, pessoa, 12)
+
+    assert contas == list(range(contas[0], contas[0] + 12))
+    assert len({shards.dono(conta_id) for conta_id in contas}) == 3
+    for conta_id in contas:
+        alias = shards.dono(conta_id)
+        assert Conta.objects.using(alias).filter(pk=conta_id).exists()
+        assert Pessoa.objects.using(alias).filter(pk=pessoa).exists()
+        assert Lancamento.objects.using(alias).filter(conta_id=conta_id).exists()
+
+
+def test_rotas_da_conta_usam_o_shard(client, pessoa: int) -> None:
+    conta = next(c for c in criar_contas(client, pessoa, 6) if shards.dono(c) != "default")
+
+    client.post(reverse("deposito", kwargs={"id": conta}), {"valor": "10"})
+    client.post(reverse("saque", kwargs={"id": conta}), {"valor": "30"})
+    detalhe = client.get(reverse("conta-detail", kwargs={"id": conta}), {"expand": "pessoa"})
+    transacoes = client.get(reverse("transacoes", kwargs={"id": conta}))
+
+    assert detalhe.json()["saldo"] == "80.00"
+    assert detalhe.json()["pessoa"]["id"] == pessoa
+    assert [t["tipo"] for t in transacoes.json()] == ["deposito", "saque"]
+    assert Transacao.objects.using(shards.dono(conta)).filter(conta_id=conta).count() == 2
+    assert not Transacao.objects.using("default").exists()
+
+
+def test_ids_em_faixas_por_shard(client, pessoa: int, settings) -> None:
+    for conta in criar_contas(client, pessoa, 6):
+        ledger.depositar(conta, Decimal(1))
+
+    for indice, alias in enumerate(settings.SHARDS):
+        ids = Transacao.objects.using(alias).values_list("id", flat=True)
+        faixa = range(indice * shards.IDS_POR_SHARD + 1, (indice + 1) * shards.IDS_POR_SHARD)
+        assert all(i in faixa for i in ids)
+
+
+def em_shards_diferentes(client, pessoa: int) -> tuple:
+    contas = criar_contas(client, pessoa, 6)
+    primeira = contas[0]
+    outra = next(c for c in contas if shards.dono(c) != shards.dono(primeira))
+    return primeira, outra
+
+
+def test_transferencia_entre_shards(client, pessoa: int, settings) -> None:
+    origem, destino = em_shards_diferentes(client, pessoa)
+
+    response = client.post(
+        reverse("transferencia", kwargs={"id": origem}),
+        {"destino": destino, "valor": "40"},
+    )
+
+    assert response.status_code == 200, response.content
+    assert (saldo(origem), saldo(destino)) == (60, 140)
+    for conta_id, tipo in ((origem, "saque"), (destino, "deposito")):
+        alias = shards.dono(conta_id)
+        assert Evento.objects.using(alias).get(conta_id=conta_id).tipo == tipo
+        # As partidas de cada lado ficam no shard da conta
+        assert Lancamento.objects.using(alias).filter(conta_id=conta_id).count() == 2
+    conferir_razao(origem, destino)
+    assert not any(
+        TransferenciaPendente.objects.using(alias).exists() for alias in settings.SHARDS
+    )
+
+
+def test_transferencia_entre_shards_recusada(client, pessoa: int, settings) -> None:
+    origem, destino = em_shards_diferentes(client, pessoa)
+
+    with pytest.raises(ledger.SaldoInsuficiente):
+        ledger.transferir(origem, destino, Decimal(500))
+
+    assert (saldo(origem), saldo(destino)) == (100, 100)
+    assert not any(Transacao.objects.using(alias).exists() for alias in settings.SHARDS)
+
+
+@contextlib.contextmanager
+def falha_no_ultimo_commit(*bancos: str):
+    """shards.transacao em que o commit do primeiro banco falha depois do
+    commit do segundo, como uma queda entre os dois"""
+    primeiro, segundo = shards.ordenar(bancos)
+    with transaction.atomic(using=primeiro):
+        with transaction.atomic(using=segundo):
+            yield
+        raise OSError("falha no commit")
+
+
+def test_transferencia_com_um_lado_so_e_estornada(
+    client, pessoa: int, settings, monkeypatch
+) -> None:
+    origem, destino = em_shards_diferentes(client, pessoa)
+    monkeypatch.setattr(shards, "transacao", falha_no_ultimo_commit)
+    with pytest.raises(OSError):
+        ledger.transferir(origem, destino, Decimal(40))
+    monkeypatch.undo()
+
+    gravado = shards.ordenar([shards.dono(origem), shards.dono(destino)])[1]
+    conta_gravada = origem if shards.dono(origem) == gravado else destino
+    pendente = TransferenciaPendente.objects.using(gravado).get()
+    assert pendente.conta_id == conta_gravada
+    assert saldo(conta_gravada) == (60 if conta_gravada == origem else 140)
+    with pytest.raises(CommandError):
+        call_command("verificar_razao", stdout=io.StringIO(), stderr=io.StringIO())
+
+    # Ainda pode ser uma transferência em andamento
+    call_command("reconciliar_transferencias", stdout=io.StringIO())
+    assert TransferenciaPendente.objects.using(gravado).exists()
+    saida = io.StringIO()
+    call_command("reconciliar_transferencias", idade=0, stdout=saida)
+
+    assert "0 transferências concluídas, 1 lados estornados" in saida.getvalue()
+    assert (saldo(origem), saldo(destino)) == (100, 100)
+    assert not TransferenciaPendente.objects.using(gravado).exists()
+    call_command("verificar_razao", stdout=io.StringIO())
+    conferir_razao(origem, destino)
+
+
+def test_reconciliacao_de_transferencia_concluida(client, pessoa: int, settings) -> None:
+    origem, destino = em_shards_diferentes(client, pessoa)
+    ledger.transferir(origem, destino, Decimal(40))
+    # Os dois commits foram feitos, mas os registros não foram apagados
+    for conta_id, contraparte, partida in (
+        (origem, destino, Lancamento.Natureza.DEB),
+        (destino, origem, Lancamento.Natureza.CRED),
+    ):
+        alias = shards.dono(conta_id)
+        lancamento = Lancamento.objects.using(alias).get(
+            conta_id=conta_id, natureza=partida, valor=40
+        )
+        TransferenciaPendente.objects.using(alias).create(
+            movimento=lancamento.movimento,
+            conta_id=conta_id,
+            contraparte=contraparte,
+            natureza=partida,
+            valor=40,
+        )
+
+    saida = io.StringIO()
+    call_command("reconciliar_transferencias", idade=0, stdout=saida)
+
+    assert "2 transferências concluídas, 0 lados estornados" in saida.getvalue()
+    assert (saldo(origem), saldo(destino)) == (60, 140)
+    assert not any(
+        TransferenciaPendente.objects.using(alias).exists() for alias in settings.SHARDS
+    )
+
+
+def test_lote_em_varios_shards(client, pessoa: int) -> None:
+    contas = criar_contas(client, pessoa, 6)
+
+    resultados = ledger.aplicar_lote(
+        [
+            ledger.Operacao(conta_id, "deposito", Decimal(indice + 1))
+            for indice, conta_id in enumerate(contas)
+        ]
+        + [ledger.Operacao(contas[0], "saque", Decimal(1000))]
+    )
+
+    assert [r is None for r in resultados] == [True] * 6 + [False]
+    assert isinstance(resultados[-1], ledger.SaldoInsuficiente)
+    assert [saldo(conta_id) for conta_id in contas] == [101, 102, 103, 104, 105, 106]
+
+
+def test_importacao_distribui_as_contas(client, pessoa: int, settings) -> None:
+    pessoas = "nome,cpf,dataNascimento\nMaria,10987654321,1990-01-01\n"
+    client.post(
+        reverse("pessoas-importar") + "?formato=csv",
+        data=pessoas.encode(),
+        content_type="application/octet-stream",
+    )
+    contas = "cpf,saldo,limiteSaqueDiario\n" + "10987654321,10,100\n" * 9
+    response = client.post(
+        reverse("contas-importar") + "?formato=csv",
+        data=contas.encode(),
+        content_type="application/octet-stream",
+    )
+
+    assert response.json()["importadas"] == 9
+    maria = Pessoa.objects.get(cpf="10987654321").id
+    importadas = []
+    for alias in settings.SHARDS:
+        assert Pessoa.objects.using(alias).filter(pk=maria, nome="Maria").exists()
+        ids = list(Conta.objects.using(alias).filter(pessoa=maria).values_list("id", flat=True))
+        assert all(shards.dono(conta_id) == alias for conta_id in ids)
+        importadas += ids
+    assert len(importadas) == 9
+    conferir_razao(*importadas)
+
+
+def test_listagem_intercala_os_shards(client, pessoa: int) -> None:
+    contas = criar_contas(client, pessoa, 7)
+    url = reverse("contas")
+
+    completa = client.get(url).json()
+    primeira = client.get(url, {"limite": 3}).json()
+    segunda = client.get(primeira["next"]).json()
+    terceira = client.get(segunda["next"]).json()
+    volta = client.get(terceira["previous"]).json()
+    stream = json.loads(b"".join(client.get(url, {"stream": 1}).streaming_content))
+
+    assert [c["id"] for c in completa] == contas
+    assert [c["id"] for c in stream] == contas
+    paginas = [primeira, segunda, terceira]
+    assert [[c["id"] for c in p["results"]] for p in paginas] == [
+        contas[:3], contas[3:6], contas[6:]
+    ]
+    assert primeira["previous"] is None and terceira["next"] is None
+    assert [c["id"] for c in volta["results"]] == contas[3:6]
+
+
+def test_rebalanceamento(client, pessoa: int, settings, acrescentar_shard) -> None:
+    contas = criar_contas(client, pessoa, 20)
+    for conta_id in contas:
+        ledger.depositar(conta_id, Decimal(5))
+    anteriores = list(settings.SHARDS)
+    acrescentar_shard()
+    settings.SHARDS_ANTERIORES = anteriores
+    movidas = [c for c in contas if shards.dono(c) == "shard3"]
+    assert movidas
+
+    # Antes de mover, a conta é lida no shard anterior
+    response = client.get(reverse("saldo", kwargs={"id": movidas[0]}))
+    assert response.status_code == 200
+    call_command("rebalancear_shards", lote=3, stdout=io.StringIO())
+    ledger.depositar(movidas[0], Decimal(1))
+
+    assert set(Conta.objects.using("shard3").values_list("id", flat=True)) == set(movidas)
+    assert Pessoa.objects.using("shard3").filter(pk=pessoa).exists()
+    assert [saldo(conta_id) for conta_id in contas] == [
+        106 if conta_id == movidas[0] else 105 for conta_id in contas
+    ]
+    novas = Transacao.objects.using("shard3").values_list("id", flat=True)
+    assert all(3 * shards.IDS_POR_SHARD < i < 4 * shards.IDS_POR_SHARD for i in novas)
+    assert Transacao.objects.using("shard3").count() == len(movidas) + 1
+    conferir_razao(*contas)
+
+
+def test_rebalanceamento_interrompido(
+    client, pessoa: int, settings, acrescentar_shard, monkeypatch
+) -> None:
+    contas = criar_contas(client, pessoa, 20)
+    anteriores = list(settings.SHARDS)
+    acrescentar_shard()
+    settings.SHARDS_ANTERIORES = anteriores
+    movidas = [c for c in contas if shards.dono(c) == "shard3"]
+
+    # Falha depois do commit em shard3, antes do commit no shard de origem
+    def falhar(queryset):
+        raise OSError("falha no commit")
+
+    monkeypatch.setattr(shards.models.QuerySet, "delete", falhar)
+    with pytest.raises(OSError):
+        call_command("rebalancear_shards", stdout=io.StringIO())
+    monkeypatch.undo()
+    # As contas copiadas são usadas no shard novo
+    ledger.depositar(movidas[0], Decimal(1))
+    call_command("rebalancear_shards", stdout=io.StringIO())
+
+    assert set(Conta.objects.using("shard3").values_list("id", flat=True)) == set(movidas)
+    for alias in anteriores:
+        assert not Conta.objects.using(alias).filter(pk__in=movidas).exists()
+    assert saldo(movidas[0]) == 101
+    conferir_razao(*contas)
+
+
+def test_requisicao_repetida_se_a_conta_foi_movida(
+    client, pessoa: int, settings, monkeypatch
+) -> None:
+    conta = criar_conta(client, pessoa)
+    errado = next(alias for alias in settings.SHARDS if alias != shards.dono(conta))
+    settings.SHARDS_ANTERIORES = ["default"]
+    localizar = shards.banco
+    respostas = iter([errado])
+    monkeypatch.setattr(shards, "banco", lambda conta_id: next(respostas, localizar(conta_id)))
+
+    response = client.get(reverse("saldo", kwargs={"id": conta}))
+
+    assert response.status_code == 200
+
+
+def test_movimentacao_repetida_se_a_conta_foi_movida(
+    client, pessoa: int, settings, monkeypatch
+) -> None:
+    # Um balde de uma ficha por conta: a repetição não pode gastar outra
+    settings.LIMITE_CONTA = (0.001, 1)
+    conta = criar_conta(client, pessoa)
+    errado = next(alias for alias in settings.SHARDS if alias != shards.dono(conta))
+    settings.SHARDS_ANTERIORES = ["default"]
+    localizar = shards.banco
+    # Localizada no shard errado pela rota e pelo ledger
+    respostas = iter([errado, errado])
+    monkeypatch.setattr(shards, "banco", lambda conta_id: next(respostas, localizar(conta_id)))
+
+    response = client.post(
+        reverse("deposito", kwargs={"id": conta}),
+        {"valor": "10"},
+        HTTP_IDEMPOTENCY_KEY="movida",
+    )
+
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response
+    assert saldo(conta) == 110
+
+
+def test_bloqueadas_em_todos_os_shards(client, pessoa: int, settings) -> None:
+    settings.BLOQUEADAS_INTERVALO = 0
+    primeira, outra = em_shards_diferentes(client, pessoa)
+    Conta.objects.using(shards.dono(outra)).filter(pk=outra).update(flagAtivo=False)
+    assert outra in bloqueadas and primeira not in bloqueadas
+
+    # Bloqueio gravado por outro processo, lido do evento no shard da conta
+    alias = shards.dono(primeira)
+    Conta.objects.using(alias).filter(pk=primeira).update(flagAtivo=False)
+    Evento.objects.using(alias).create(tipo=Evento.Tipo.BLOQUEIO, conta_id=primeira)
+
+    assert primeira in bloqueadas
+    response = client.post(reverse("deposito", kwargs={"id": primeira}), {"valor": "10"})
+    assert response.status_code == 400
+
+
+def test_feed_e_publicacao_leem_todos_os_shards(
+    client, pessoa: int, settings, tmp_path
+) -> None:
+    contas = criar_contas(client, pessoa, 6)
+    for conta_id in contas:
+        ledger.depositar(conta_id, Decimal(1))
+    assert len({shards.dono(conta_id) for conta_id in contas}) > 1
+
+    recebidos = []
+    cursor = None
+    while True:
+        parametros = {"limite": 4} if cursor is None else {"limite": 4, "cursor": cursor}
+        pagina = client.get(reverse("eventos"), parametros).json()
+        if not pagina["eventos"]:
+            break
+        recebidos += [e["conta"] for e in pagina["eventos"]]
+        cursor = pagina["cursor"]
+    assert sorted(recebidos) == contas
+    assert len(cursor.split(",")) == len(settings.SHARDS)
+
+    caminho = tmp_path / "eventos.ndjson"
+    settings.EVENTOS_DESTINOS = {
+        "arquivo": {"CLASSE": "api.eventos.DestinoArquivo", "CAMINHO": str(caminho)}
+    }
+    call_command("publicar_eventos", "arquivo", uma_vez=True, stdout=io.StringIO())
+    publicados = [json.loads(linha)["conta"] for linha in caminho.read_text().splitlines()]
+    assert sorted(publicados) == contas
+    assert client.get(reverse("eventos-atraso")).json()["arquivo"]["pendentes"] == 0
+
+
+def test_relatorios_e_exportacao_leem_todos_os_shards(client, pessoa: int) -> None:
+    contas = criar_contas(client, pessoa, 6)
+    for conta_id in contas:
+        ledger.sacar(conta_id, Decimal(10))
+
+    agregados = client.get(reverse("relatorios-agregados"), {"agrupar": "tipo"}).json()
+    estatisticas = client.get(reverse("relatorios-estatisticas")).json()
+    da_conta = client.get(reverse("relatorios-estatisticas"), {"conta": contas[-1]}).json()
+    exportadas = client.get(reverse("transacoes-exportar"), {"formato": "ndjson"})
+    linhas = [json.loads(linha) for linha in b"".join(exportadas.streaming_content).splitlines()]
+
+    assert [(g["tipo"], g["quantidade"]) for g in agregados["grupos"]] == [("saque", 6)]
+    assert estatisticas["saques"]["quantidade"] == 6
+    assert da_conta["saques"]["quantidade"] == 1
+    assert Decimal(str(da_conta["dias"][-1]["saldo"])) == 90
+    assert sorted(linha["conta"] for linha in linhas) == contas
+
+
+def test_verificar_razao_em_varios_shards(client, pessoa: int) -> None:
+    origem, destino = em_shards_diferentes(client, pessoa)
+    ledger.transferir(origem, destino, Decimal(40))
+
+    saida = io.StringIO()
+    call_command("verificar_razao", stdout=saida)
+    assert "0 divergentes, 0 movimentos desbalanceados" in saida.getvalue()
+
+    # Só um lado de um movimento não se anula em nenhum shard
+    lado = razao.partidas(origem, destino, Decimal(1))[0]
+    Lancamento.objects.using(shards.dono(origem)).bulk_create([lado])
+    erros = io.StringIO()
+    with pytest.raises(CommandError):
+        call_command("verificar_razao", stdout=io.StringIO(), stderr=erros)
+    assert f"movimento {lado.movimento} desbalanceado em -1.00" in erros.getvalue()
+
+
+def movimentar_ha_dias(client, pessoa: int, dias: int) -> list:
+    """Contas em todos os shards, cada uma com um saque de 10 feito há dias"""
+    contas = criar_contas(client, pessoa, 6)
+    for conta_id in contas:
+        ledger.sacar(conta_id, Decimal(10))
+        Transacao.objects.using(shards.dono(conta_id)).filter(conta_id=conta_id).update(
+            dataTransacao=timezone.now() - datetime.timedelta(days=dias)
+        )
+    return contas
+
+
+def test_arquivar_transacoes_em_todos_os_shards(client, pessoa: int, settings) -> None:
+    contas = movimentar_ha_dias(client, pessoa, 3)
+
+    call_command(
+        "arquivar_transacoes", antes_de=timezone.localdate(), stdout=io.StringIO()
+    )
+
+    for conta_id in contas:
+        alias = shards.dono(conta_id)
+        assert not Transacao.objects.using(alias).filter(conta_id=conta_id).exists()
+        assert TransacaoArquivada.objects.using(alias).filter(conta_id=conta_id).count() == 1
+    resposta = client.get(reverse("transacoes", kwargs={"id": contas[-1]}))
+    assert [t["tipo"] for t in resposta.json()] == ["saque"]
+
+
+def test_gerar_saldos_diarios_em_todos_os_shards(client, pessoa: int) -> None:
+    contas = movimentar_ha_dias(client, pessoa, 3)
+
+    saida = io.StringIO()
+    call_command("gerar_saldos_diarios", stdout=saida)
+
+    assert f"{len(contas)} saldos diários gravados" in saida.getvalue()
+    for conta_id in contas:
+        checkpoint = SaldoDiario.objects.using(shards.dono(conta_id)).get(conta_id=conta_id)
+        assert checkpoint.saldo == 90
+
+
+def test_recalcular_saques_diarios_em_todos_os_shards(
+    client, pessoa: int, settings
+) -> None:
+    contas = movimentar_ha_dias(client, pessoa, 0)
+    for alias in settings.SHARDS:
+        SaqueDiario.objects.using(alias).all().delete()
+
+    call_command("recalcular_saques_diarios", stdout=io.StringIO())
+
+    for conta_id in contas:
+        contador = SaqueDiario.objects.using(shards.dono(conta_id)).get(conta_id=conta_id)
+        assert contador.total == 10
@@ -4,12 +4,28 @@ from api import views
 urlpatterns = [
     path("pessoas/", views.pessoas, name="pessoas"),
     path("pessoa/<int:id>/", views.pessoas_detail, name="pessoa-detail"),
+    path("pessoas/importar/", views.pessoas_importar, name="pessoas-importar"),
     path("contas/", views.contas, name="contas"),
+    path("contas/importar/", views.contas_importar, name="contas-importar"),
     path("conta/<int:id>/", views.contas_detail, name="conta-detail"),
     path("conta/<int:id>/deposito/", views.deposito, name="deposito"),
     path("conta/<int:id>/saldo/", views.saldo, name="saldo"),
     path("conta/<int:id>/saque/", views.saque, name="saque"),
+    path("conta/<int:id>/transferencia/", views.transferencia, name="transferencia"),
     path("conta/<int:id>/bloqueio/", views.bloqueio, name="bloqueio"),
     path("conta/<int:id>/desbloqueio/", views.desbloqueio, name="desbloqueio"),
     path("conta/<int:id>/transacoes/", views.transacoes, name="transacoes"),
+    path("conta/<int:id>/extrato/", views.extrato, name="extrato"),
+    path("transacoes/exportar/", views.transacoes_exportar, name="transacoes-exportar"),
+    path("transacoes/lote/", views.transacoes_lote, name="transacoes-lote"),
+    path("relatorios/agregados/", views.relatorios_agregados, name="relatorios-agregados"),
+    path(
+        "relatorios/estatisticas/",
+        views.relatorios_estatisticas,
+        name="relatorios-estatisticas",
+    ),
+    path("eventos/", views.eventos, name="eventos"),
+    path("_cache/contas/", views.cache_estatisticas, name="cache-estatisticas"),
+    path("_eventos/atraso/", views.eventos_atraso, name="eventos-atraso"),
+    path("_metrics", views.metricas, name="metricas"),
 ]
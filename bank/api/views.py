@@ -1,21 +1,56 @@
 import decimal
 import datetime
+from typing import Optional
 
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-
-from .models import Pessoa, Conta, Transacao
-from .serializers import PessoaSerializer, ContaSerializer, TransacaoSerializer
-from .functions import is_decimal
+from django.utils import timezone
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+
+from . import cache as cache_contas
+from . import eventos as eventos_api
+from . import extrato as extrato_contas
+from . import importacao
+from . import ledger
+from . import metricas as metricas_api
+from . import relatorios
+from . import shards
+from .models import Pessoa, Conta, TransacaoHistorico
+from .serializers import (
+    PessoaSerializer,
+    ContaSerializer,
+    ContaExpandida,
+    conta_leitura,
+    pessoa_leitura,
+    transacao_leitura,
+    validar_operacoes,
+)
+from .functions import intervalo_do_prefixo, normalizar_nome
+from .bloqueios import bloqueadas
+from .idempotencia import idempotente
+from .limites import LIMITES_MOVIMENTACAO, contrapressao
+from .pagination import (
+    IdCursorPagination,
+    PessoaNomeCursorPagination,
+    TransacaoCursorPagination,
+    listar,
+    listar_em_shards,
+)
 
 from rest_framework.decorators import api_view
 
 
 @api_view(["GET", "POST"])
 def pessoas(request):
-    """GET: retorna uma lista com todas as pessoas registradas
+    """GET: retorna uma lista com todas as pessoas registradas,
+       paginada por cursor com ?cursor=/?limite= ou em streaming com ?stream=1.
+       Com ?cpf= busca pelo CPF e com ?nome= pelo começo do nome, sem
+       diferenciar maiúsculas e acentos, sempre paginadas
        POST: recebe um nome,cpf e dataNascimento, cria uma nova pessoa
        e retorna esse objeto"""
     if request.method == "POST":
@@ -27,21 +62,54 @@ def pessoas(request):
             return Response(serializer_pessoa.errors, status=status.HTTP_400_BAD_REQUEST)
 
     pessoas = Pessoa.objects.all()
-    pessoas_serialized = PessoaSerializer(pessoas, many=True)
-    return Response(pessoas_serialized.data)
+    cpf = request.query_params.get("cpf")
+    nome = request.query_params.get("nome")
+    if cpf is None and nome is None:
+        return listar(request, pessoas, pessoa_leitura)
+
+    paginacao = IdCursorPagination
+    if cpf is not None:
+        # Usa o índice único de cpf
+        pessoas = pessoas.filter(cpf=cpf.strip())
+    if nome is not None:
+        prefixo = normalizar_nome(nome)
+        if not prefixo:
+            return Response(
+                {"nome": "Informe o começo do nome"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        inicio, fim = intervalo_do_prefixo(prefixo)
+        pessoas = pessoas.filter(nomeBusca__gte=inicio, nomeBusca__lt=fim)
+        paginacao = PessoaNomeCursorPagination
+    return listar(request, pessoas, pessoa_leitura, paginacao, paginar=True)
 
 
 @api_view(["GET"])
 def pessoas_detail(request, id):
     """Recebe um parametro id e retorna um objeto Pessoa especifico"""
     pessoa = get_object_or_404(Pessoa, pk=id)
-    pessoa_serialized = PessoaSerializer(pessoa)
-    return Response(pessoa_serialized.data)
+    return Response(pessoa_leitura.serializar(pessoa))
+
+
+def _expansao(request) -> Optional[ContaExpandida]:
+    """Lê ?expand=pessoa,transacoes_recentes. Retorna None sem o parâmetro
+    e levanta ValueError com uma expansão desconhecida"""
+    expansoes = [e for e in request.query_params.get("expand", "").split(",") if e]
+    if not expansoes:
+        return None
+    desconhecidas = set(expansoes) - set(ContaExpandida.EXPANSOES)
+    if desconhecidas:
+        raise ValueError(
+            f"Expansões disponíveis: {', '.join(ContaExpandida.EXPANSOES)}"
+        )
+    return ContaExpandida(expansoes)
 
 
 @api_view(["GET", "POST"])
 def contas(request):
-    """GET: retorna uma lista com todas as contas criadas
+    """GET: retorna uma lista com todas as contas criadas,
+       paginada por cursor com ?cursor=/?limite= ou em streaming com ?stream=1.
+       Com ?expand=pessoa,transacoes_recentes embute a pessoa e as últimas
+       transações de cada conta
        POST: recebe obrigatoriamente um saldo,limiteSaqueDiario e uma pessoa_id, cria uma nova conta
        e retorna esse objeto"""
     if request.method == "POST":
@@ -52,72 +120,180 @@ def contas(request):
         else:
             return Response(serializer_conta.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    try:
+        expansao = _expansao(request)
+    except ValueError as e:
+        return Response({"expand": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     contas = Conta.objects.all()
-    contas_serialized = ContaSerializer(contas, many=True)
-    return Response(contas_serialized.data)
+    listagem = listar_em_shards if shards.distribuido() else listar
+    if expansao is not None:
+        return listagem(request, expansao.preparar(contas), expansao)
+    return listagem(request, contas, conta_leitura)
+
+
+def _snapshot_conta(id) -> dict:
+    try:
+        return cache_contas.obter(id)
+    except Conta.DoesNotExist:
+        raise Http404
+
+
+def _resposta_condicional(request, snapshot: dict, dados) -> Response:
+    """Responde 304 se o cliente já tem a versão atual (If-None-Match)"""
+    etag = snapshot["etag"]
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(dados, headers={"ETag": etag})
 
 
 @api_view(["GET"])
 def contas_detail(request, id):
-    """Recebe um parametro id e retorna um objeto Conta especifico"""
-    conta = get_object_or_404(Conta, pk=id)
-    conta_serialized = ContaSerializer(conta)
-    return Response(conta_serialized.data)
+    """Recebe um parametro id e retorna um objeto Conta especifico,
+    com ETag para GETs condicionais. Com ?expand= embute a pessoa e as
+    últimas transações, lidas do banco e sem ETag"""
+    try:
+        expansao = _expansao(request)
+    except ValueError as e:
+        return Response({"expand": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if expansao is not None:
+        conta = get_object_or_404(expansao.preparar(Conta.objects.all()), pk=id)
+        return Response(expansao.serializar(conta))
+
+    snapshot = _snapshot_conta(id)
+    return _resposta_condicional(request, snapshot, snapshot["dados"])
 
 
 @api_view(["POST"])
+@throttle_classes(LIMITES_MOVIMENTACAO)
+@contrapressao
+@idempotente
 def deposito(request, id):
     """Recebe um parametro id e um valor e faz um deposito
-       na conta especificada"""
-    valor = request.POST.get("valor")
-    if not is_decimal(valor):
+       na conta especificada. Aceita o header Idempotency-Key.
+       Limitada por cliente e por conta (429 com Retry-After)"""
+    try:
+        valor = ledger.valor_da_operacao(request.POST.get("valor"))
+    except ledger.ValorInvalido as e:
+        return Response({"valor": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if id in bloqueadas:
+            raise ledger.ContaBloqueada
+        conta, transacao = ledger.depositar(id, valor)
+    except Conta.DoesNotExist:
+        raise Http404
+    except ledger.ContaBloqueada:
         return Response(
-            {"valor": "Valor tem que existir e ser numérico"},
+            {"flagAtivo": "A conta está bloqueada"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    except ledger.SaldoExcedido:
+        return Response(
+            {"valor": f"O saldo da conta passaria do máximo de {ledger.VALOR_MAXIMO}"},
             status=status.HTTP_400_BAD_REQUEST,
         )
-
-    conta = get_object_or_404(Conta, pk=id)
-    valor = decimal.Decimal(valor)
-    conta.saldo += valor
-    transacao = Transacao(conta=conta, valor=valor,tipo="deposito")
-    conta.save()
-    transacao.save()
-    conta_serialized = ContaSerializer(conta)
-    transacao_serialized = TransacaoSerializer(transacao)
     return Response(
-        {"conta": conta_serialized.data, "transacao": transacao_serialized.data}
+        {
+            "conta": conta_leitura.serializar(conta),
+            "transacao": transacao_leitura.serializar(transacao),
+        }
     )
 
 
 @api_view(["POST"])
+@throttle_classes(LIMITES_MOVIMENTACAO)
+@contrapressao
+@idempotente
 def saque(request, id):
     """Recebe um parametro id e um valor e faz um saque
        na conta especificada, caso o limiteSaqueDiario não
-       seja excedido e haja saldo o suficiente"""
-    valor = request.POST.get("valor")
-    if not is_decimal(valor):
+       seja excedido e haja saldo o suficiente. Aceita o header Idempotency-Key.
+       Limitada por cliente e por conta (429 com Retry-After)"""
+    try:
+        valor = ledger.valor_da_operacao(request.POST.get("valor"))
+    except ledger.ValorInvalido as e:
+        return Response({"valor": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if id in bloqueadas:
+            raise ledger.ContaBloqueada
+        conta, transacao = ledger.sacar(id, valor)
+    except Conta.DoesNotExist:
+        raise Http404
+    except ledger.ContaBloqueada:
         return Response(
-            {"valor": "Valor tem que existir e ser numérico"},
+            {"flagAtivo": "A conta está bloqueada"},
             status=status.HTTP_400_BAD_REQUEST,
         )
-
-    conta = get_object_or_404(Conta, pk=id)
-    if float(valor) > conta.saldo:
+    except ledger.SaldoInsuficiente:
         return Response(
             {"valor": "A conta não tem saldo suficiente"},
             status=status.HTTP_400_BAD_REQUEST,
         )
+    except ledger.LimiteSaqueExcedido:
+        return Response(
+            {
+                "limiteSaqueDiario": "Essa operação excedera o limite de saque diário desta conta"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
-    transacoes = Transacao.objects.filter(
-        conta_id=id, dataTransacao__date=datetime.datetime.today().strftime("%Y-%m-%d"),tipo="saque"
-    ).values_list()
-    gasto_diario = 0
-    for transacao in transacoes:
-        gasto_diario += transacao[1]
+    return Response(
+        {
+            "conta": conta_leitura.serializar(conta),
+            "transacao": transacao_leitura.serializar(transacao),
+        }
+    )
 
-    valor = decimal.Decimal(valor)
 
-    if (gasto_diario + valor) > conta.limiteSaqueDiario:
+@api_view(["POST"])
+@throttle_classes(LIMITES_MOVIMENTACAO)
+@contrapressao
+@idempotente
+def transferencia(request, id):
+    """Recebe um parametro id, uma conta destino e um valor e transfere
+       o valor da conta especificada para a conta destino, caso as duas
+       estejam ativas, haja saldo e o limiteSaqueDiario não seja excedido.
+       Aceita o header Idempotency-Key. Limitada por cliente e pela conta
+       de origem (429 com Retry-After)"""
+    try:
+        valor = ledger.valor_da_operacao(request.data.get("valor"))
+    except ledger.ValorInvalido as e:
+        return Response({"valor": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    destino = request.data.get("destino")
+    if not str(destino).isdigit():
+        return Response(
+            {"destino": "Conta destino tem que existir e ser um id"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if int(destino) == id:
+        return Response(
+            {"destino": "Conta destino deve ser diferente da conta de origem"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        if id in bloqueadas or int(destino) in bloqueadas:
+            raise ledger.ContaBloqueada
+        origem, destino, saque, deposito = ledger.transferir(id, int(destino), valor)
+    except Conta.DoesNotExist:
+        raise Http404
+    except ledger.ContaBloqueada:
+        return Response(
+            {"flagAtivo": "A conta de origem ou de destino está bloqueada"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    except ledger.SaldoInsuficiente:
+        return Response(
+            {"valor": "A conta não tem saldo suficiente"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    except ledger.SaldoExcedido:
+        return Response(
+            {"valor": f"O saldo da conta destino passaria do máximo de {ledger.VALOR_MAXIMO}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    except ledger.LimiteSaqueExcedido:
         return Response(
             {
                 "limiteSaqueDiario": "Essa operação excedera o limite de saque diário desta conta"
@@ -125,64 +301,400 @@ def saque(request, id):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    conta.saldo -= valor
-    transacao = Transacao(conta=conta, valor=valor,tipo="saque")
-    conta.save()
-    transacao.save()
-    conta_serialized = ContaSerializer(conta)
-    transacao_serialized = TransacaoSerializer(transacao)
     return Response(
-        {"conta": conta_serialized.data, "transacao": transacao_serialized.data}
+        {
+            "conta": conta_leitura.serializar(origem),
+            "destino": destino.id,
+            "transacoes": transacao_leitura.serializar_lista([saque, deposito]),
+        }
     )
 
 
 @api_view(["POST"])
 def bloqueio(request, id):
     """Recebe um parametro id e bloqueia uma conta especifica"""
-    conta = get_object_or_404(Conta, pk=id)
-    conta.flagAtivo = False
-    conta.save()
-    conta_serialized = ContaSerializer(conta)
-    return Response(conta_serialized.data)
+    try:
+        conta = ledger.alterar_bloqueio(id, False)
+    except Conta.DoesNotExist:
+        raise Http404
+    return Response(conta_leitura.serializar(conta))
 
 
 @api_view(["POST"])
 def desbloqueio(request, id):
     """Recebe um parametro id e desbloqueia uma conta especifica"""
-    conta = get_object_or_404(Conta, pk=id)
-    conta.flagAtivo = True
-    conta.save()
-    conta_serialized = ContaSerializer(conta)
-    return Response(conta_serialized.data)
+    try:
+        conta = ledger.alterar_bloqueio(id, True)
+    except Conta.DoesNotExist:
+        raise Http404
+    return Response(conta_leitura.serializar(conta))
 
 
 @api_view(["GET"])
 def saldo(request, id):
-    """Recebe um parametro id e retorna o saldo de uma conta especifica"""
-    conta = get_object_or_404(Conta, pk=id)
-    saldo = conta.saldo
-    return Response({"saldo": saldo})
+    """Recebe um parametro id e retorna o saldo de uma conta especifica,
+    com ETag para GETs condicionais"""
+    snapshot = _snapshot_conta(id)
+    saldo = decimal.Decimal(snapshot["dados"]["saldo"])
+    return _resposta_condicional(request, snapshot, {"saldo": saldo})
+
+
+@api_view(["GET"])
+def cache_estatisticas(request):
+    """Retorna os contadores de hits e misses do cache de contas"""
+    return Response(cache_contas.estatisticas())
+
+
+@require_GET
+def metricas(request):
+    """Retorna as métricas de requisições, banco e serialização no
+    formato texto do Prometheus"""
+    return HttpResponse(metricas_api.exportar(), content_type=metricas_api.CONTENT_TYPE)
 
 
 @api_view(["GET"])
 def transacoes(request, id):
     """Recebe um parametro id, e opcionalmente uma data inicial/final e 
-    retorna as transações no periodo ou no geral da conta especificada"""
+    retorna as transações no periodo ou no geral da conta especificada,
+    paginadas por cursor com ?cursor=/?limite= ou em streaming com ?stream=1"""
     data_inicial = request.POST.get("data_inicial")
     data_final = request.POST.get("data_final")
     if data_inicial:
         if not data_final:
             data_final = datetime.datetime.now()
         try:
-            transacao = Transacao.objects.filter(
+            transacao = TransacaoHistorico.objects.filter(
                 conta_id=id,
                 dataTransacao__range=[data_inicial, data_final]
             )
         except Exception as e:
             return Response({"data": e}, status=status.HTTP_400_BAD_REQUEST)
-        serializer = TransacaoSerializer(transacao, many=True)
-        return Response(serializer.data)
+        return listar(request, transacao, transacao_leitura, TransacaoCursorPagination)
+
+    transacao = TransacaoHistorico.objects.filter(conta=id)
+    return listar(request, transacao, transacao_leitura, TransacaoCursorPagination)
+
+
+def _data(texto: str) -> datetime.date:
+    """Lê uma data AAAA-MM-DD entre DATA_MINIMA e DATA_MAXIMA. Levanta
+    ValueError com a mensagem de erro"""
+    try:
+        data = datetime.date.fromisoformat(texto)
+    except ValueError:
+        raise ValueError("Data deve estar no formato AAAA-MM-DD")
+    if not extrato_contas.DATA_MINIMA <= data <= extrato_contas.DATA_MAXIMA:
+        raise ValueError(
+            f"Data deve estar entre {extrato_contas.DATA_MINIMA} e {extrato_contas.DATA_MAXIMA}"
+        )
+    return data
+
+
+def _periodo(request):
+    """Lê ?data_inicial= e ?data_final= (AAAA-MM-DD, padrão: últimos 30
+    dias), de até settings.PERIODO_MAXIMO_DIAS dias. Levanta ValueError com
+    a mensagem de erro"""
+    data_final = _data(
+        request.query_params.get("data_final") or timezone.localdate().isoformat()
+    )
+    if request.query_params.get("data_inicial"):
+        data_inicial = _data(request.query_params["data_inicial"])
+    else:
+        data_inicial = max(data_final - datetime.timedelta(days=30), extrato_contas.DATA_MINIMA)
+    if data_inicial > data_final:
+        raise ValueError("data_inicial deve ser anterior a data_final")
+    if (data_final - data_inicial).days >= settings.PERIODO_MAXIMO_DIAS:
+        raise ValueError(f"O período deve ter no máximo {settings.PERIODO_MAXIMO_DIAS} dias")
+    return data_inicial, data_final
+
+
+@api_view(["GET"])
+def extrato(request, id):
+    """Recebe um parametro id e opcionalmente ?data_inicial= e ?data_final=
+    (AAAA-MM-DD, padrão: últimos 30 dias) e retorna o saldo inicial, as
+    transações do periodo paginadas por cursor e o saldo final"""
+    try:
+        data_inicial, data_final = _periodo(request)
+    except ValueError as e:
+        return Response({"data": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not Conta.objects.filter(pk=id).exists():
+        raise Http404
+
+    saldo_inicial, saldo_final = extrato_contas.saldos_do_periodo(
+        id, data_inicial, data_final
+    )
+    movimentos = TransacaoHistorico.objects.filter(
+        conta_id=id,
+        dataTransacao__gte=extrato_contas.inicio_do_dia(data_inicial),
+        dataTransacao__lt=extrato_contas.inicio_do_dia(
+            data_final + extrato_contas.UM_DIA
+        ),
+    )
+    paginacao = TransacaoCursorPagination()
+    pagina = paginacao.paginate_queryset(movimentos, request)
+    return Response(
+        {
+            "conta": id,
+            "data_inicial": data_inicial,
+            "data_final": data_final,
+            "saldoInicial": saldo_inicial,
+            "saldoFinal": saldo_final,
+            "next": paginacao.get_next_link(),
+            "previous": paginacao.get_previous_link(),
+            "movimentos": transacao_leitura.serializar_lista(pagina),
+        }
+    )
+
+
+ERROS_LOTE = {
+    Conta.DoesNotExist: {"conta": "Conta não encontrada"},
+    ledger.ContaBloqueada: {"flagAtivo": "A conta está bloqueada"},
+    ledger.SaldoInsuficiente: {"valor": "A conta não tem saldo suficiente"},
+    ledger.SaldoExcedido: {
+        "valor": f"O saldo da conta passaria do máximo de {ledger.VALOR_MAXIMO}"
+    },
+    ledger.LimiteSaqueExcedido: {
+        "limiteSaqueDiario": "Essa operação excedera o limite de saque diário desta conta"
+    },
+}
+
+
+@api_view(["POST"])
+@throttle_classes(LIMITES_MOVIMENTACAO)
+@contrapressao
+def transacoes_lote(request):
+    """Recebe uma lista de operações {conta, tipo, valor} de várias contas,
+    aplica todas em uma única transação e retorna o resultado de cada uma"""
+    if not isinstance(request.data, list):
+        return Response(
+            {"operacoes": "Envie uma lista de operações"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(request.data) > settings.TRANSACOES_LOTE_MAXIMO:
+        return Response(
+            {
+                "operacoes": f"O lote pode ter no máximo {settings.TRANSACOES_LOTE_MAXIMO} operações"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    validadas = validar_operacoes(request.data)
+    operacoes = [op for op in validadas if isinstance(op, ledger.Operacao)]
+    aplicadas = iter(ledger.aplicar_lote(operacoes) if operacoes else [])
+
+    resultados = []
+    aceitas = 0
+    for indice, op in enumerate(validadas):
+        erro = next(aplicadas) if isinstance(op, ledger.Operacao) else op
+        if erro is None:
+            aceitas += 1
+            resultados.append({"indice": indice, "status": "aceita"})
+        else:
+            resultados.append(
+                {
+                    "indice": indice,
+                    "status": "recusada",
+                    "erros": ERROS_LOTE.get(type(erro), erro),
+                }
+            )
+    return Response(
+        {
+            "aceitas": aceitas,
+            "recusadas": len(resultados) - aceitas,
+            "resultados": resultados,
+        }
+    )
+
+
+def _linhas(request):
+    """Linhas do corpo da requisição, lidas sob demanda"""
+    for linha in request.stream or ():
+        yield linha.decode("utf-8", errors="replace")
+
+
+def _importar(request, importador) -> Response:
+    formato = request.query_params.get("formato") or importacao.formato_do_conteudo(
+        request.content_type
+    )
+    if formato not in importacao.FORMATOS:
+        return Response(
+            {"formato": "Envie text/csv ou application/x-ndjson, ou use ?formato=csv|ndjson"},
+            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+
+    erros = []
+
+    def rejeitar(linha, erro):
+        if len(erros) < settings.IMPORTACAO_ERROS_MAXIMO:
+            erros.append({"linha": linha, "erros": erro})
+
+    importadas, rejeitadas = importador(
+        importacao.ler_registros(_linhas(request), formato),
+        settings.IMPORTACAO_LOTE,
+        rejeitar,
+    )
+    return Response(
+        {"importadas": importadas, "rejeitadas": rejeitadas, "erros": erros},
+        status=status.HTTP_201_CREATED if importadas else status.HTTP_200_OK,
+    )
+
+
+@api_view(["POST"])
+def pessoas_importar(request):
+    """Recebe pessoas {nome, cpf, dataNascimento} em CSV ou NDJSON, uma por
+    linha, grava as válidas em lotes e retorna as linhas rejeitadas"""
+    return _importar(request, importacao.importar_pessoas)
+
+
+@api_view(["POST"])
+def contas_importar(request):
+    """Recebe contas {pessoa ou cpf, saldo, limiteSaqueDiario, tipoConta} em
+    CSV ou NDJSON, uma por linha, grava as válidas em lotes e retorna as
+    linhas rejeitadas"""
+    return _importar(request, importacao.importar_contas)
+
+
+@api_view(["GET"])
+def transacoes_exportar(request):
+    """Exporta em streaming, em CSV (padrão) ou NDJSON (?formato=), as
+    transações de ?data_inicial= a ?data_final= (AAAA-MM-DD, opcionais),
+    opcionalmente de uma ?conta="""
+    formato = request.query_params.get("formato", "csv")
+    if formato not in importacao.FORMATOS:
+        return Response(
+            {"formato": "Formato deve ser csv ou ndjson"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        periodo = {
+            campo: _data(request.query_params[campo])
+            for campo in ("data_inicial", "data_final")
+            if request.query_params.get(campo)
+        }
+    except ValueError as e:
+        return Response({"data": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    conta = request.query_params.get("conta")
+    if conta is not None:
+        if not conta.isdigit():
+            return Response(
+                {"conta": "Conta deve ser um id"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        periodo["conta_id"] = int(conta)
+
+    response = StreamingHttpResponse(
+        importacao.exportar_transacoes(formato, settings.STREAM_CHUNK_SIZE, **periodo),
+        content_type=importacao.TIPOS_DE_CONTEUDO[formato],
+    )
+    response["Content-Disposition"] = f'attachment; filename="transacoes.{formato}"'
+    return response
+
+
+def _parametros_relatorio(request):
+    """Período e ?conta= dos relatórios. Levanta ValueError com o dict de
+    erros"""
+    try:
+        data_inicial, data_final = _periodo(request)
+    except ValueError as e:
+        raise ValueError({"data": str(e)})
+    conta = request.query_params.get("conta")
+    if conta is not None and not conta.isdigit():
+        raise ValueError({"conta": "Conta deve ser um id"})
+    return data_inicial, data_final, None if conta is None else int(conta)
 
-    transacao = Transacao.objects.filter(conta=id)
-    serializer = TransacaoSerializer(transacao, many=True)
-    return Response(serializer.data)
+
+@api_view(["GET"])
+def relatorios_agregados(request):
+    """Opcionalmente ?data_inicial=/?data_final= (padrão: últimos 30 dias),
+    ?conta= e ?agrupar= (conta, tipo e dia ou mes, padrão: conta,tipo) e
+    retorna total, quantidade, mínimo e máximo das transações de cada grupo"""
+    try:
+        data_inicial, data_final, conta = _parametros_relatorio(request)
+    except ValueError as e:
+        return Response(e.args[0], status=status.HTTP_400_BAD_REQUEST)
+    agrupar = request.query_params.get("agrupar", "conta,tipo").split(",")
+    if (
+        not set(agrupar) <= set(relatorios.AGRUPAMENTOS)
+        or len(set(agrupar)) != len(agrupar)
+        or {"dia", "mes"} <= set(agrupar)
+    ):
+        return Response(
+            {"agrupar": "Agrupe por conta, tipo e dia ou mes, separados por vírgula"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    grupos = relatorios.em_cache(
+        data_final,
+        ("agregados", data_inicial, data_final, agrupar, conta),
+        lambda: relatorios.agregados(data_inicial, data_final, agrupar, conta),
+    )
+    return Response(
+        {
+            "data_inicial": data_inicial,
+            "data_final": data_final,
+            "agrupar": agrupar,
+            "grupos": grupos,
+        }
+    )
+
+
+@api_view(["GET"])
+def relatorios_estatisticas(request):
+    """Opcionalmente ?data_inicial=/?data_final= (padrão: últimos 30 dias),
+    ?conta= e ?janela= (dias da média móvel, padrão 7) e retorna entradas,
+    saídas, líquido e média móvel de cada dia e os percentis dos saques.
+    Com ?conta= também o saldo de cada dia e o saldo médio"""
+    try:
+        data_inicial, data_final, conta = _parametros_relatorio(request)
+    except ValueError as e:
+        return Response(e.args[0], status=status.HTTP_400_BAD_REQUEST)
+    janela = request.query_params.get("janela", "7")
+    if not janela.isdigit() or not 1 <= int(janela) <= 366:
+        return Response(
+            {"janela": "Janela deve ser um número de dias entre 1 e 366"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    janela = int(janela)
+    if conta is not None:
+        with shards.da_conta(conta):
+            if not Conta.objects.filter(pk=conta).exists():
+                raise Http404
+
+    relatorio = relatorios.em_cache(
+        data_final,
+        ("estatisticas", data_inicial, data_final, janela, conta),
+        lambda: relatorios.estatisticas(data_inicial, data_final, janela, conta),
+    )
+    return Response(
+        {
+            "data_inicial": data_inicial,
+            "data_final": data_final,
+            "conta": conta,
+            "janela": janela,
+            **relatorio,
+        }
+    )
+
+
+@api_view(["GET"])
+def eventos(request):
+    """Feed dos eventos de depósito, saque, bloqueio e desbloqueio depois de
+    ?cursor= (o cursor retornado pela chamada anterior; sem shards, o id
+    do último evento recebido), até ?limite= eventos. Com
+    ?espera= segundos e nenhum evento novo, espera por um antes de
+    responder. Retorna os eventos e o cursor da próxima chamada"""
+    try:
+        cursor, limite, espera = eventos_api.parametros(request.query_params)
+    except ValueError as e:
+        return Response(e.args[0], status=status.HTTP_400_BAD_REQUEST)
+    return Response(
+        eventos_api.feed(eventos_api.aguardar(cursor, limite, espera), cursor)
+    )
+
+
+@api_view(["GET"])
+def eventos_atraso(request):
+    """Retorna, para cada destino de publicação, os eventos ainda não
+    entregues e a idade do mais antigo deles em segundos"""
+    return Response(
+        {nome: eventos_api.atraso(nome) for nome in settings.EVENTOS_DESTINOS}
+    )
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bank.settings')
 
-application = get_asgi_application()
+# Como get_asgi_application(), mas com o handler de api.async_views, que
+# envia as respostas em streaming sem bloquear o event loop
+django.setup(set_prefix=False)
+
+from api.async_views import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metricas.MetricasMiddleware',
+    'api.replicas.ReplicasMiddleware',
+    'api.shards.ShardsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,14 +78,151 @@ WSGI_APPLICATION = 'bank.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
+#
+# Com BANK_SQLITE_PRODUCAO=1 o SQLite roda em modo de produção: WAL com
+# synchronous=NORMAL e mmap (SQLITE_PRAGMAS, aplicados por api.sqlite a
+# cada conexão nova), busy timeout maior, conexões reaproveitadas entre
+# requisições e as escritas do ledger feitas por uma única thread, com
+# commits em grupo (ESCRITA_EM_FILA, api.escrita).
+
+SQLITE_PRODUCAO = os.environ.get('BANK_SQLITE_PRODUCAO') == '1'
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('BANK_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': 600 if SQLITE_PRODUCAO else 0,
+        # Segundos que uma conexão espera pelo lock do banco antes de
+        # falhar com "database is locked" (o busy timeout do SQLite)
+        'OPTIONS': {'timeout': 30 if SQLITE_PRODUCAO else 5},
+        # Banco de testes em arquivo: o SQLite em memória compartilhada não
+        # espera pelo lock, e os testes de concorrência usam várias conexões.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Réplicas de leitura: BANK_DB_REPLICAS lista os arquivos SQLite, separados
+# por vírgula, mantidos como cópias do default (ex.: pelo comando
+# copiar_replicas). As rotas de REPLICA_ROTAS leem de uma réplica sorteada,
+# exceto nos REPLICA_JANELA segundos seguintes a uma escrita do mesmo
+# cliente, que lê do default (api.replicas).
+
+REPLICAS = []
+for _indice, _nome in enumerate(
+    filter(None, os.environ.get('BANK_DB_REPLICAS', '').split(',')), 1
+):
+    DATABASES[f'replica{_indice}'] = {
+        **DATABASES['default'],
+        'NAME': _nome,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICAS.append(f'replica{_indice}')
+
+DATABASE_ROUTERS = ['api.shards.Roteador', 'api.replicas.Roteador']
+
+REPLICA_ROTAS = ('pessoas', 'contas', 'transacoes', 'saldo')
+REPLICA_JANELA = 5
+
+
+# Shards: BANK_DB_SHARDS lista arquivos SQLite, separados por vírgula, que
+# se somam ao default como shards. Cada conta, com suas transações, fica no
+# shard indicado pelo hash consistente do id, com SHARDS_VIRTUAIS pontos de
+# cada shard no anel; as pessoas são copiadas em todos (api.shards). As
+# rotas de SHARD_ROTAS leem e escrevem no shard da conta da URL.
+#
+# Novos arquivos só podem ser acrescentados ao fim da lista, já que a
+# posição define a faixa de ids de cada shard. Ao acrescentar, informe em
+# BANK_DB_SHARDS_ANTERIORES quantos arquivos havia antes, até o comando
+# rebalancear_shards terminar de mover as contas.
+
+SHARDS = ['default']
+for _indice, _nome in enumerate(
+    filter(None, os.environ.get('BANK_DB_SHARDS', '').split(',')), 1
+):
+    DATABASES[f'shard{_indice}'] = {
+        **DATABASES['default'],
+        'NAME': _nome,
+        'TEST': {'NAME': BASE_DIR / f'test_shard{_indice}.sqlite3'},
+    }
+    SHARDS.append(f'shard{_indice}')
+
+SHARDS_ANTERIORES = (
+    SHARDS[: int(os.environ['BANK_DB_SHARDS_ANTERIORES']) + 1]
+    if os.environ.get('BANK_DB_SHARDS_ANTERIORES')
+    else []
+)
+SHARDS_VIRTUAIS = 128
+SHARD_ROTAS = (
+    'conta-detail',
+    'deposito',
+    'saldo',
+    'saque',
+    'transferencia',
+    'bloqueio',
+    'desbloqueio',
+    'transacoes',
+    'extrato',
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+#
+# O alias "contas" guarda os snapshots de api.cache. O LocMemCache descarta
+# as entradas menos usadas ao passar de MAX_ENTRIES. Para compartilhar o
+# cache entre processos, aponte CONTAS_CACHE_REDIS para um servidor
+# compatível com Redis (requer o pacote django-redis).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'contas': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'contas',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Eventos publicados pelo destino "cache" de EVENTOS_DESTINOS
+    'eventos': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'eventos',
+        'TIMEOUT': 24 * 60 * 60,
+    },
+    # Relatórios de períodos encerrados não mudam, então não expiram
+    'relatorios': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'relatorios',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+if os.environ.get('CONTAS_CACHE_REDIS'):
+    CACHES['contas'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['CONTAS_CACHE_REDIS'],
+        'TIMEOUT': 60,
+    }
+
+if os.environ.get('EVENTOS_REDIS'):
+    CACHES['eventos'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['EVENTOS_REDIS'],
+        'TIMEOUT': 24 * 60 * 60,
+    }
+
+CONTAS_CACHE = 'contas'
+
+RELATORIOS_CACHE = 'relatorios'
+
+# Maior período, em dias, do extrato e dos relatórios (?data_inicial= a
+# ?data_final=). As estatísticas calculam um registro por dia do período
+
+PERIODO_MAXIMO_DIAS = 366
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -125,3 +266,121 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Listagens em streaming (?stream=1): linhas lidas do banco por vez
+
+STREAM_CHUNK_SIZE = 2000
+
+
+# Máximo de operações aceitas em um POST em transacoes/lote/
+
+TRANSACOES_LOTE_MAXIMO = 50000
+
+
+# Threads que as views de api.async_views usam para acessar o banco
+
+ASYNC_DB_THREADS = 16
+
+# Threads que geram o conteúdo das respostas em streaming dessas views,
+# separadas das anteriores para que downloads lentos não as ocupem
+
+ASYNC_STREAM_THREADS = 8
+
+
+# Idempotency-Key em deposito/saque: validade das chaves (segundos), máximo
+# de chaves guardadas e espera máxima de uma repetição pela original. As
+# chaves ficam na memória de cada processo: só protegem as repetições que
+# chegam ao mesmo processo (ex.: um único worker, ou afinidade por cliente
+# no balanceador)
+
+IDEMPOTENCIA_TTL = 24 * 60 * 60
+IDEMPOTENCIA_MAXIMO = 100000
+IDEMPOTENCIA_ESPERA = 30
+
+
+# Fração das requisições com latência, consultas ao banco e serialização
+# medidas por api.metricas (0 desliga; a contagem por rota é sempre feita)
+
+METRICAS_AMOSTRAGEM = 1.0
+
+
+# Importação em lote (comando importar e pessoas/importar/, contas/importar/):
+# linhas validadas e gravadas por transação e máximo de linhas rejeitadas
+# detalhadas na resposta
+
+IMPORTACAO_LOTE = 5000
+IMPORTACAO_ERROS_MAXIMO = 1000
+
+
+# PRAGMAs executados em toda conexão SQLite nova (ver SQLITE_PRODUCAO)
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+} if SQLITE_PRODUCAO else {}
+
+
+# Escritas do ledger por uma única thread, com um commit para cada grupo de
+# até ESCRITA_GRUPO_MAXIMO operações que chegaram juntas (ver SQLITE_PRODUCAO)
+
+ESCRITA_EM_FILA = SQLITE_PRODUCAO
+ESCRITA_GRUPO_MAXIMO = 100
+
+
+# Meses, além do atual, que o comando arquivar_transacoes mantém em
+# Transacao; as transações anteriores vão para TransacaoArquivada
+
+TRANSACOES_MESES_QUENTES = 3
+
+
+# Limites das views de movimentação (api.limites): (fichas por segundo,
+# capacidade do balde) por cliente e por conta, ou None para desligar;
+# máximo de baldes em memória e, para compartilhar os baldes entre
+# processos, um alias de CACHES
+
+LIMITE_CLIENTE = (50, 100)
+LIMITE_CONTA = (10, 20)
+LIMITES_MAXIMO = 100000
+LIMITES_CACHE = None
+
+
+# Movimentações em execução no processo a partir das quais as novas são
+# recusadas com 429
+
+MOVIMENTACAO_FILA_MAXIMA = 64
+
+
+# Transações embutidas em cada conta com ?expand=transacoes_recentes
+
+TRANSACOES_RECENTES = 10
+
+
+# Outbox de eventos (api.eventos): destinos do comando publicar_eventos,
+# eventos por lote e por página do feed, espera máxima do feed (segundos)
+# e intervalo entre as leituras enquanto ele espera
+
+EVENTOS_DESTINOS = {
+    'arquivo': {
+        'CLASSE': 'api.eventos.DestinoArquivo',
+        'CAMINHO': os.environ.get('BANK_EVENTOS_ARQUIVO', str(BASE_DIR / 'eventos.ndjson')),
+    },
+    'socket': {
+        'CLASSE': 'api.eventos.DestinoSocket',
+        'CAMINHO': os.environ.get('BANK_EVENTOS_SOCKET', '/tmp/bank-eventos.sock'),
+    },
+    'cache': {
+        'CLASSE': 'api.eventos.DestinoCache',
+        'ALIAS': 'eventos',
+    },
+}
+EVENTOS_LOTE = 500
+EVENTOS_ESPERA = 30
+EVENTOS_INTERVALO = 0.5
+
+
+# Segundos entre as leituras dos bloqueios e desbloqueios feitos por outros
+# processos no bitset de contas bloqueadas (api.bloqueios)
+
+BLOQUEADAS_INTERVALO = 1
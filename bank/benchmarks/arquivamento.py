@@ -0,0 +1,99 @@
+"""Mede as consultas do caminho quente (saque com verificação do limite
+diário, primeira página de transações dos últimos 30 dias e extrato) com
+todo o histórico em Transacao e depois de arquivar o que é anterior a
+--meses meses, além do tempo do próprio arquivamento e do tamanho do
+arquivo do banco.
+
+    python -m benchmarks.arquivamento --contas 1000 --transacoes 5000000 --dias 730
+
+100 milhões de transações pedem --transacoes 100000000 e dezenas de GB
+livres; o tempo de geração domina a execução.
+"""
+import argparse
+import datetime
+import decimal
+import io
+import os
+import random
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import criar_contas, criar_transacoes
+
+
+def medir(nome: str, funcao, contas: list, repeticoes: int) -> None:
+    aleatorio = random.Random(7)
+    tempos = []
+    for _ in range(repeticoes):
+        conta = aleatorio.choice(contas)
+        inicio = time.perf_counter()
+        funcao(conta)
+        tempos.append(time.perf_counter() - inicio)
+    medidas = percentis(tempos)
+    print(f"  {nome:<28} p50 {medidas['p50']:>8.3f} ms  p99 {medidas['p99']:>8.3f} ms")
+
+
+def caminho_quente(contas: list, repeticoes: int) -> None:
+    from django.test import Client
+    from django.utils import timezone
+
+    from api import ledger
+
+    cliente = Client()
+    hoje = timezone.localdate()
+    mes = (hoje - datetime.timedelta(days=30)).isoformat()
+
+    medir("saque", lambda conta: ledger.sacar(conta, decimal.Decimal(1)), contas, repeticoes)
+    medir("gasto diário", ledger.gasto_diario, contas, repeticoes)
+    medir(
+        "transações (30 dias)",
+        lambda conta: cliente.get(
+            f"/api/conta/{conta}/transacoes/", {"data_inicial": mes, "limite": 50}
+        ),
+        contas,
+        repeticoes,
+    )
+    medir(
+        "extrato (30 dias)",
+        lambda conta: cliente.get(f"/api/conta/{conta}/extrato/", {"data_inicial": mes}),
+        contas,
+        repeticoes,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=1000)
+    parser.add_argument("--transacoes", type=int, default=2_000_000)
+    parser.add_argument("--dias", type=int, default=730, help="período coberto pelo histórico")
+    parser.add_argument("--meses", type=int, default=3, help="meses mantidos em Transacao")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    configurar()
+    from django.core.management import call_command
+    from django.db import connection
+
+    from api.models import Transacao, TransacaoArquivada
+
+    with banco_temporario():
+        contas = criar_contas(args.contas)
+        criar_transacoes(contas, args.transacoes, dias=args.dias)
+        arquivo = connection.settings_dict["NAME"]
+
+        print(f"sem arquivamento: {Transacao.objects.count()} transações em Transacao")
+        caminho_quente(contas, args.repeticoes)
+
+        inicio = time.perf_counter()
+        call_command("arquivar_transacoes", meses=args.meses, stdout=io.StringIO())
+        duracao = time.perf_counter() - inicio
+        print(
+            f"\narquivamento: {TransacaoArquivada.objects.count()} transações em "
+            f"{duracao:.1f} s; {Transacao.objects.count()} ficaram em Transacao; "
+            f"banco com {os.path.getsize(arquivo) / 2 ** 20:.0f} MiB"
+        )
+        caminho_quente(contas, args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Utilitários comuns aos benchmarks.
+
+Os benchmarks rodam a partir da pasta bank/, por exemplo:
+    python -m benchmarks.ledger
+"""
+import contextlib
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def configurar() -> None:
+    """Inicializa o Django com as settings do projeto, como nos testes
+    (DEBUG desligado e o host do test client liberado). Os limites por
+    cliente e por conta ficam desligados, já que os benchmarks repetem
+    movimentações na mesma conta bem acima deles; benchmarks.limites os
+    liga explicitamente"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bank.settings")
+    import django
+    from django.conf import settings
+    from django.test.utils import setup_test_environment
+
+    django.setup()
+    setup_test_environment()
+    settings.LIMITE_CLIENTE = settings.LIMITE_CONTA = None
+
+
+@contextlib.contextmanager
+def banco_temporario():
+    """Aponta o banco default para um arquivo SQLite temporário já migrado,
+    removido ao final do benchmark"""
+    from django.core.management import call_command
+    from django.db import connections
+
+    with tempfile.TemporaryDirectory() as pasta:
+        connections.close_all()
+        nome_original = connections.databases["default"]["NAME"]
+        connections.databases["default"]["NAME"] = os.path.join(pasta, "bench.sqlite3")
+        try:
+            call_command("migrate", verbosity=0)
+            yield
+        finally:
+            connections.close_all()
+            connections.databases["default"]["NAME"] = nome_original
+
+
+def executar_threads(funcao, threads: int, repeticoes: int) -> dict:
+    """Chama funcao repeticoes vezes em cada uma das threads e retorna
+    vazão, latências e a quantidade de erros"""
+    from django.db import connection
+
+    latencias = []
+    erros = []
+    trava = threading.Lock()
+    barreira = threading.Barrier(threads)
+
+    def trabalho():
+        locais = []
+        falhas = 0
+        barreira.wait()
+        try:
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                try:
+                    funcao()
+                except Exception:
+                    falhas += 1
+                locais.append(time.perf_counter() - inicio)
+        finally:
+            connection.close()
+        with trava:
+            latencias.extend(locais)
+            erros.append(falhas)
+
+    inicio = time.perf_counter()
+    trabalhadores = [threading.Thread(target=trabalho) for _ in range(threads)]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    for trabalhador in trabalhadores:
+        trabalhador.join()
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "operacoes": len(latencias),
+        "erros": sum(erros),
+        "duracao": duracao,
+        "vazao": len(latencias) / duracao,
+        **percentis(latencias),
+    }
+
+
+def percentis(latencias: list) -> dict:
+    """Retorna p50/p95/p99 em milissegundos"""
+    if len(latencias) < 2:
+        valor = latencias[0] * 1000 if latencias else 0.0
+        return {"p50": valor, "p95": valor, "p99": valor}
+    cortes = statistics.quantiles(latencias, n=100)
+    return {
+        "p50": cortes[49] * 1000,
+        "p95": cortes[94] * 1000,
+        "p99": cortes[98] * 1000,
+    }
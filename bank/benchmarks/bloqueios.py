@@ -0,0 +1,59 @@
+"""Mede a latência de recusar um saque em conta bloqueada: pelo bitset de
+api.bloqueios, sem ir ao banco, e pelo UPDATE condicional de api.ledger
+(conta bloqueada ainda não marcada no bitset), comparando com o saque
+aceito em uma conta ativa.
+
+    python -m benchmarks.bloqueios --repeticoes 2000
+"""
+import argparse
+import logging
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import criar_contas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    args = parser.parse_args()
+
+    configurar()
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+
+    from api.bloqueios import bloqueadas
+
+    settings.BLOQUEADAS_INTERVALO = 3600
+    # Cada recusa registraria um aviso "Bad Request"
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+    with banco_temporario():
+        ativa, bloqueada = criar_contas(2)
+        client = Client()
+        client.post(reverse("bloqueio", kwargs={"id": bloqueada}))
+
+        def medir(nome: str, conta: int, status: int) -> None:
+            url = reverse("saque", kwargs={"id": conta})
+            latencias = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                response = client.post(url, data={"valor": "1"})
+                latencias.append(time.perf_counter() - inicio)
+                assert response.status_code == status, response.content
+            resultado = percentis(latencias)
+            print(
+                f"{nome:<22} p50 {resultado['p50']:>7.3f} ms  "
+                f"p99 {resultado['p99']:>7.3f} ms"
+            )
+
+        medir("saque aceito", ativa, 200)
+        medir("recusa pelo bitset", bloqueada, 400)
+        # Desmarca só o bitset: a recusa passa a vir do UPDATE condicional
+        bloqueadas.marcar(bloqueada, False)
+        medir("recusa pelo banco", bloqueada, 400)
+        bloqueadas.limpar()
+
+
+if __name__ == "__main__":
+    main()
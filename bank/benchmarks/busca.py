@@ -0,0 +1,108 @@
+"""Mede a latência das buscas de pessoas pelo test client: pelo CPF (índice
+único), pelo começo do nome normalizado (índice pessoa_nome_busca) e a
+página seguinte pelo cursor, comparando com o filtro nome__istartswith,
+que percorre a tabela inteira.
+
+    python -m benchmarks.busca --pessoas 10000000
+"""
+import argparse
+import random
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import LOTE
+
+PRIMEIROS = [
+    "Ana", "Antônio", "Beatriz", "Bruno", "Caio", "Cecília", "Daniel", "Débora",
+    "Eduardo", "Fábio", "Gabriela", "Helena", "Igor", "Inês", "João", "Joana",
+    "José", "Josefa", "Júlia", "Lucas", "Luís", "Márcia", "Maria", "Otávio",
+    "Paula", "Renê", "Sérgio", "Simão", "Tânia", "Vitória",
+]
+SOBRENOMES = [
+    "Almeida", "Araújo", "Barbosa", "Brandão", "Cardoso", "Conceição", "Costa",
+    "Falcão", "Gonçalves", "Lima", "Magalhães", "Melo", "Oliveira", "Pereira",
+    "Ribeiro", "Rodrigues", "Santos", "Silva", "Sousa", "Simões",
+]
+
+
+def criar_pessoas(quantidade: int, semente: int = 42) -> None:
+    from api.models import Pessoa
+
+    aleatorio = random.Random(semente)
+    for inicio in range(0, quantidade, LOTE):
+        Pessoa.objects.bulk_create(
+            Pessoa(
+                nome=" ".join(
+                    [aleatorio.choice(PRIMEIROS)] + aleatorio.sample(SOBRENOMES, 2)
+                ),
+                cpf=f"{i:011d}",
+                dataNascimento="2000-01-01",
+            )
+            for i in range(inicio, min(inicio + LOTE, quantidade))
+        )
+
+
+def medir(nome: str, requisicao, repeticoes: int) -> None:
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        requisicao()
+        latencias.append(time.perf_counter() - inicio)
+    resultado = percentis(latencias)
+    print(f"{nome:<34} p50 {resultado['p50']:>9.3f} ms  p99 {resultado['p99']:>9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pessoas", type=int, default=10_000_000)
+    parser.add_argument("--repeticoes", type=int, default=500)
+    parser.add_argument("--varreduras", type=int, default=5, help="repetições sem índice")
+    args = parser.parse_args()
+
+    configurar()
+    from django.test import Client
+
+    from api.models import Pessoa
+
+    with banco_temporario():
+        inicio = time.perf_counter()
+        criar_pessoas(args.pessoas)
+        print(f"{args.pessoas} pessoas criadas em {time.perf_counter() - inicio:.1f} s")
+        client = Client()
+        aleatorio = random.Random(7)
+
+        def get(parametros: dict) -> dict:
+            response = client.get("/api/pessoas/", parametros)
+            assert response.status_code == 200, response.content
+            return response.json()
+
+        def por_cpf():
+            get({"cpf": f"{aleatorio.randrange(args.pessoas):011d}"})
+
+        def nome_completo() -> str:
+            return " ".join([aleatorio.choice(PRIMEIROS)] + aleatorio.sample(SOBRENOMES, 2))
+
+        def por_prefixo(tamanho: int):
+            def buscar():
+                get({"nome": nome_completo()[:tamanho].lower(), "limite": 20})
+
+            return buscar
+
+        def pagina_seguinte():
+            primeira = get({"nome": aleatorio.choice(PRIMEIROS)[:3], "limite": 20})
+            if primeira["next"]:
+                client.get(primeira["next"])
+
+        def sem_indice():
+            prefixo = nome_completo()
+            list(Pessoa.objects.filter(nome__istartswith=prefixo).order_by("id")[:20])
+
+        medir("cpf", por_cpf, args.repeticoes)
+        medir("nome, 3 letras", por_prefixo(3), args.repeticoes)
+        medir("nome completo", por_prefixo(100), args.repeticoes)
+        medir("nome, 3 letras + página seguinte", pagina_seguinte, args.repeticoes)
+        medir("nome__istartswith (sem índice)", sem_indice, args.varreduras)
+
+
+if __name__ == "__main__":
+    main()
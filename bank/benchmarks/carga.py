@@ -0,0 +1,161 @@
+"""Teste de carga HTTP contra um servidor real, comparando o caminho
+síncrono sob WSGI com o caminho assíncrono (/api/async/) sob ASGI.
+
+Cada servidor é iniciado como um processo separado sobre o mesmo banco
+SQLite temporário. Os comandos padrão usam gunicorn (WSGI) e uvicorn
+(ASGI), que não fazem parte do requirements.txt; instale-os ou passe
+outros comandos com --wsgi/--asgi ({porta} é substituído pela porta).
+
+    python -m benchmarks.carga --concorrencia 200 --requisicoes 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import criar_contas
+
+WSGI = "gunicorn bank.wsgi:application --bind 127.0.0.1:{porta} --workers 1 --threads 32"
+ASGI = "uvicorn bank.asgi:application --port {porta} --no-access-log"
+
+
+def porta_livre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def servidor(comando: str, banco: str, espera: float = 20.0):
+    """Inicia o servidor com BANK_DB_NAME apontando para banco e retorna
+    a porta quando ela estiver aceitando conexões"""
+    porta = porta_livre()
+    ambiente = dict(os.environ, BANK_DB_NAME=banco)
+    processo = subprocess.Popen(
+        shlex.split(comando.format(porta=porta)),
+        env=ambiente,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        limite = time.monotonic() + espera
+        while True:
+            if processo.poll() is not None:
+                raise RuntimeError(f"o servidor terminou ao iniciar: {comando}")
+            with contextlib.suppress(OSError):
+                socket.create_connection(("127.0.0.1", porta), timeout=0.2).close()
+                break
+            if time.monotonic() > limite:
+                raise RuntimeError(f"o servidor não respondeu em {espera}s: {comando}")
+            time.sleep(0.1)
+        yield porta
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
+
+
+async def _requisicao(porta: int, metodo: str, caminho: str, corpo: bytes) -> int:
+    leitor, escritor = await asyncio.open_connection("127.0.0.1", porta)
+    cabecalho = (
+        f"{metodo} {caminho} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+        f"Content-Type: application/x-www-form-urlencoded\r\n"
+        f"Content-Length: {len(corpo)}\r\n\r\n"
+    )
+    escritor.write(cabecalho.encode() + corpo)
+    await escritor.drain()
+    resposta = await leitor.read()
+    escritor.close()
+    return int(resposta.split(b" ", 2)[1])
+
+
+async def disparar(porta: int, gerar_requisicao, concorrencia: int, total: int) -> dict:
+    """Mantém concorrencia requisições em paralelo até completar total.
+    gerar_requisicao() retorna (metodo, caminho, corpo)"""
+    latencias = []
+    falhas = 0
+    restantes = iter(range(total))
+
+    async def trabalhador():
+        nonlocal falhas
+        for _ in restantes:
+            metodo, caminho, corpo = gerar_requisicao()
+            inicio = time.perf_counter()
+            try:
+                codigo = await _requisicao(porta, metodo, caminho, corpo)
+            except OSError:
+                codigo = 0
+            latencias.append(time.perf_counter() - inicio)
+            if codigo >= 500 or codigo == 0:
+                falhas += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "requisicoes": len(latencias),
+        "falhas": falhas,
+        "vazao": len(latencias) / duracao,
+        **percentis(latencias),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wsgi", default=WSGI, help="comando do servidor WSGI")
+    parser.add_argument("--asgi", default=ASGI, help="comando do servidor ASGI")
+    parser.add_argument("--concorrencia", type=int, default=200)
+    parser.add_argument("--requisicoes", type=int, default=5000)
+    parser.add_argument("--contas", type=int, default=100)
+    parser.add_argument(
+        "--mistura",
+        type=float,
+        default=0.1,
+        help="fração das requisições que são depósitos (o resto lê o saldo)",
+    )
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection
+
+    with banco_temporario():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        contas = criar_contas(args.contas)
+        banco = str(connection.settings_dict["NAME"])
+        connection.close()
+
+        for nome, comando, prefixo in (
+            ("WSGI", args.wsgi, "/api"),
+            ("ASGI", args.asgi, "/api/async"),
+        ):
+            aleatorio = random.Random(42)
+
+            def gerar_requisicao():
+                conta = aleatorio.choice(contas)
+                if aleatorio.random() < args.mistura:
+                    return "POST", f"{prefixo}/conta/{conta}/deposito/", b"valor=1"
+                return "GET", f"{prefixo}/conta/{conta}/saldo/", b""
+
+            try:
+                with servidor(comando, banco) as porta:
+                    resultado = asyncio.run(
+                        disparar(porta, gerar_requisicao, args.concorrencia, args.requisicoes)
+                    )
+            except (OSError, RuntimeError) as erro:
+                print(f"{nome}: {erro}", file=sys.stderr)
+                continue
+            print(
+                f"{nome}  {resultado['vazao']:>8.1f} req/s  p50 {resultado['p50']:>8.1f} ms  "
+                f"p99 {resultado['p99']:>8.1f} ms  falhas {resultado['falhas']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
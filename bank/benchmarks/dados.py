@@ -0,0 +1,88 @@
+"""Geração de dados sintéticos para os benchmarks, sempre com bulk_create"""
+import contextlib
+import datetime
+import decimal
+import random
+
+LOTE = 5000
+
+
+@contextlib.contextmanager
+def datas_manuais(modelo, campo: str):
+    """Desliga o auto_now_add de campo para permitir gravar datas no passado"""
+    field = modelo._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def criar_pessoas(quantidade: int, inicio: int = 0) -> list:
+    from api.models import Pessoa
+
+    Pessoa.objects.bulk_create(
+        (
+            Pessoa(nome=f"Pessoa {i}", cpf=f"{i:011d}", dataNascimento="2000-01-01")
+            for i in range(inicio, inicio + quantidade)
+        ),
+        batch_size=LOTE,
+    )
+    return list(Pessoa.objects.order_by("id").values_list("id", flat=True))[-quantidade:]
+
+
+def criar_contas(quantidade: int, saldo: int = 10 ** 6, limite: int = 10 ** 6) -> list:
+    """Cria quantidade contas, cada uma com sua pessoa e com o saldo de
+    abertura lançado no livro razão, e retorna os ids delas"""
+    from api import razao
+    from api.models import Conta, Lancamento
+
+    pessoas = criar_pessoas(quantidade, inicio=_proximo_cpf())
+    Conta.objects.bulk_create(
+        (
+            Conta(saldo=saldo, limiteSaqueDiario=limite, pessoa_id=pessoa)
+            for pessoa in pessoas
+        ),
+        batch_size=LOTE,
+    )
+    contas = list(Conta.objects.order_by("id").values_list("id", flat=True))[-quantidade:]
+    Lancamento.objects.bulk_create(
+        (
+            partida
+            for conta in contas
+            for partida in razao.partidas_de_abertura(conta, decimal.Decimal(saldo))
+        ),
+        batch_size=LOTE,
+    )
+    return contas
+
+
+def criar_transacoes(contas: list, quantidade: int, dias: int = 365, semente: int = 42) -> None:
+    """Cria quantidade transações espalhadas entre as contas e pelos
+    últimos dias, sem alterar os saldos"""
+    from django.utils import timezone
+
+    from api.models import Transacao
+
+    aleatorio = random.Random(semente)
+    agora = timezone.now()
+    segundos = dias * 24 * 60 * 60
+
+    def gerar():
+        for _ in range(quantidade):
+            yield Transacao(
+                conta_id=aleatorio.choice(contas),
+                valor=decimal.Decimal(aleatorio.randint(1, 50000)) / 100,
+                tipo=aleatorio.choice(("saque", "deposito")),
+                dataTransacao=agora
+                - datetime.timedelta(seconds=aleatorio.randrange(segundos)),
+            )
+
+    with datas_manuais(Transacao, "dataTransacao"):
+        Transacao.objects.bulk_create(gerar(), batch_size=LOTE)
+
+
+def _proximo_cpf() -> int:
+    from api.models import Pessoa
+
+    return Pessoa.objects.count()
@@ -0,0 +1,84 @@
+"""Compara a vazão de escritas concorrentes (depósitos, saques e
+transferências em contas sorteadas) no SQLite padrão, só com os PRAGMAs do
+modo de produção e com o modo de produção completo (PRAGMAs e fila única de
+escrita com commits em grupo).
+
+    python -m benchmarks.escrita --threads 16 --operacoes 300
+"""
+import argparse
+import decimal
+import random
+import threading
+
+from .base import banco_temporario, configurar, executar_threads
+from .dados import criar_contas
+
+PRAGMAS = {"journal_mode": "wal", "synchronous": "normal", "mmap_size": 256 * 1024 * 1024}
+
+MODOS = {
+    "padrão": ({}, False),
+    "pragmas": (PRAGMAS, False),
+    "produção": (PRAGMAS, True),
+}
+
+
+def operar(contas: list, semente: int):
+    from api import ledger
+
+    locais = threading.local()
+    sementes = iter(range(semente, semente + 10 ** 6))
+    trava = threading.Lock()
+    valor = decimal.Decimal(1)
+
+    def operacao():
+        if not hasattr(locais, "aleatorio"):
+            with trava:
+                locais.aleatorio = random.Random(next(sementes))
+        conta, outra = locais.aleatorio.sample(contas, 2)
+        sorteio = locais.aleatorio.random()
+        if sorteio < 0.4:
+            ledger.depositar(conta, valor)
+        elif sorteio < 0.8:
+            ledger.sacar(conta, valor)
+        else:
+            ledger.transferir(conta, outra, valor)
+
+    return operacao
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=100)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--operacoes", type=int, default=300, help="por thread")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    configurar()
+    from django.conf import settings
+
+    from api import escrita
+
+    for modo, (pragmas, em_fila) in MODOS.items():
+        settings.SQLITE_PRAGMAS = pragmas
+        settings.ESCRITA_EM_FILA = em_fila
+        with banco_temporario():
+            contas = criar_contas(args.contas)
+            for threads in args.threads:
+                resultado = executar_threads(
+                    operar(contas, args.semente), threads, args.operacoes
+                )
+                fila = escrita.fila()
+                grupo = ""
+                if fila is not None:
+                    grupo = f"  {fila.operacoes / max(fila.commits, 1):>5.1f} ops/commit"
+                print(
+                    f"{modo:<9} {threads:>3} threads {resultado['vazao']:>8.1f} ops/s  "
+                    f"p50 {resultado['p50']:>7.2f} ms  p99 {resultado['p99']:>8.2f} ms  "
+                    f"erros {resultado['erros']}{grupo}"
+                )
+                escrita.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Mede o outbox de eventos: a vazão do comando publicar_eventos para um
+arquivo e o atraso entre um depósito e a chegada do evento a
+um consumidor esperando no feed (eventos.aguardar), comparado com um
+consumidor que consulta as transações de cada conta a cada intervalo.
+
+    python -m benchmarks.eventos --eventos 20000 --depositos 300
+"""
+import argparse
+import decimal
+import os
+import tempfile
+import threading
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import criar_contas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eventos", type=int, default=20000)
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--depositos", type=int, default=300)
+    parser.add_argument("--contas", type=int, default=100)
+    parser.add_argument(
+        "--intervalo", type=float, default=1.0, help="segundos entre as consultas do polling"
+    )
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection
+
+    from api import eventos, ledger
+    from api.models import Evento
+
+    with banco_temporario():
+        contas = criar_contas(args.contas)
+        Evento.objects.bulk_create(
+            eventos.evento(Evento.Tipo.DEPOSITO, contas[i % len(contas)], valor=decimal.Decimal(1))
+            for i in range(args.eventos)
+        )
+        with tempfile.TemporaryDirectory() as pasta:
+            destino = eventos.DestinoArquivo(os.path.join(pasta, "eventos.ndjson"))
+            inicio = time.perf_counter()
+            while eventos.publicar("benchmark", destino, args.lote):
+                pass
+            duracao = time.perf_counter() - inicio
+            destino.fechar()
+        print(
+            f"publicar_eventos em arquivo: {args.eventos / duracao:,.0f} eventos/s "
+            f"(lotes de {args.lote})"
+        )
+
+        # Atraso do feed: o consumidor espera em eventos.aguardar enquanto
+        # outra thread deposita em intervalos irregulares
+        cursor = Evento.objects.order_by("-id").values_list("id", flat=True).first()
+        commits = {}
+        atrasos = []
+
+        def consumir():
+            proximo = cursor
+            while len(atrasos) < args.depositos:
+                for evento in eventos.aguardar(proximo, args.lote, 5):
+                    atrasos.append(time.perf_counter() - commits[evento.pk])
+                    proximo = evento.pk
+            connection.close()
+
+        consumidor = threading.Thread(target=consumir)
+        consumidor.start()
+        for i in range(args.depositos):
+            # Medido do início do depósito, então inclui o próprio commit
+            commits[cursor + i + 1] = time.perf_counter()
+            ledger.depositar(contas[i % len(contas)], decimal.Decimal(1))
+            time.sleep(0.002 * (i % 5))
+        consumidor.join()
+        resultado = percentis(atrasos)
+        print(
+            f"feed, atraso do depósito ao consumidor: p50 {resultado['p50']:.2f} ms  "
+            f"p99 {resultado['p99']:.2f} ms"
+        )
+        print(
+            f"polling de {args.contas} contas a cada {args.intervalo:g} s: "
+            f"{args.contas / args.intervalo:,.0f} consultas/s, atraso médio "
+            f"{args.intervalo / 2 * 1000:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compara a tela de contas montada com uma requisição por conta (a
+listagem, depois pessoa/<id>/ e conta/<id>/transacoes/ de cada uma) com a
+listagem única com ?expand=pessoa,transacoes_recentes, contando as
+consultas ao banco de cada uma.
+
+    python -m benchmarks.expansao --contas 100 --transacoes 20000
+"""
+import argparse
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import criar_contas, criar_transacoes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=100)
+    parser.add_argument("--transacoes", type=int, default=20000)
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    with banco_temporario():
+        contas = criar_contas(args.contas)
+        criar_transacoes(contas, args.transacoes, dias=args.dias)
+        client = Client()
+        limite = {"limite": args.contas}
+
+        def uma_por_conta():
+            pagina = client.get(reverse("contas"), limite).json()
+            for conta in pagina["results"]:
+                client.get(reverse("pessoa-detail", kwargs={"id": conta["pessoa"]}))
+                client.get(
+                    reverse("transacoes", kwargs={"id": conta["id"]}), {"limite": 10}
+                )
+
+        def expandida():
+            client.get(
+                reverse("contas"), {**limite, "expand": "pessoa,transacoes_recentes"}
+            )
+
+        for nome, tela in (("uma por conta", uma_por_conta), ("expand", expandida)):
+            # O test client zera connection.queries a cada requisição, então
+            # as consultas são contadas por um execute_wrapper
+            consultas = []
+            with connection.execute_wrapper(
+                lambda executar, sql, *resto: consultas.append(sql) or executar(sql, *resto)
+            ):
+                tela()
+            latencias = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                tela()
+                latencias.append(time.perf_counter() - inicio)
+            resultado = percentis(latencias)
+            print(
+                f"{args.contas} contas, {nome:<13} {len(consultas):>5} consultas  "
+                f"p50 {resultado['p50']:>8.2f} ms  p99 {resultado['p99']:>8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
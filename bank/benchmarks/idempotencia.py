@@ -0,0 +1,72 @@
+"""Mede o custo do Idempotency-Key no caminho de deposito: a operação do
+armazém de chaves isolada (reservar + concluir) e a requisição completa
+com e sem o header.
+
+    python -m benchmarks.idempotencia --repeticoes 5000
+"""
+import argparse
+import itertools
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import criar_contas
+
+
+class _Resposta:
+    status_code = 200
+    data = {}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=5000)
+    parser.add_argument(
+        "--chaves", type=int, default=100000, help="chaves já guardadas no armazém"
+    )
+    args = parser.parse_args()
+
+    configurar()
+    from django.test import Client
+    from django.urls import reverse
+
+    from api.idempotencia import ArmazemIdempotencia, armazem
+
+    armazem_teste = ArmazemIdempotencia()
+    for i in range(args.chaves):
+        armazem_teste.reservar(f"existente:{i}", b"")
+    inicio = time.perf_counter()
+    for i in range(args.repeticoes):
+        entrada, _ = armazem_teste.reservar(f"nova:{i}", b"")
+        armazem_teste.concluir(entrada, _Resposta)
+    duracao = time.perf_counter() - inicio
+    print(
+        f"armazém com {len(armazem_teste)} chaves: "
+        f"{duracao / args.repeticoes * 1e6:.2f} µs por reservar + concluir"
+    )
+
+    with banco_temporario():
+        conta = criar_contas(1)[0]
+        url = reverse("deposito", kwargs={"id": conta})
+        client = Client()
+        contador = itertools.count()
+        for nome, cabecalhos in (
+            ("sem header", lambda: {}),
+            ("com header", lambda: {"HTTP_IDEMPOTENCY_KEY": f"k{next(contador)}"}),
+            ("repetição", lambda: {"HTTP_IDEMPOTENCY_KEY": "k0"}),
+        ):
+            latencias = []
+            for _ in range(args.repeticoes):
+                extra = cabecalhos()
+                inicio = time.perf_counter()
+                client.post(url, data={"valor": "1"}, **extra)
+                latencias.append(time.perf_counter() - inicio)
+            resultado = percentis(latencias)
+            print(
+                f"deposito {nome:<11} p50 {resultado['p50']:>7.3f} ms  "
+                f"p99 {resultado['p99']:>7.3f} ms"
+            )
+        armazem.limpar()
+
+
+if __name__ == "__main__":
+    main()
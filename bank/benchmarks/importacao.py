@@ -0,0 +1,101 @@
+"""Mede a importação em lote de pessoas e contas (linhas por segundo, por
+tamanho de lote) e o tempo e o pico de memória da exportação de transações
+em streaming, que não deve crescer com o número de transações.
+
+    python -m benchmarks.importacao --linhas 100000 --transacoes 500000
+"""
+import argparse
+import csv
+import io
+import time
+import tracemalloc
+
+from .base import banco_temporario, configurar
+from .dados import criar_contas, criar_transacoes
+
+
+def gerar_csv(linhas: int, inicio: int, com_contas: bool) -> list:
+    """Linhas CSV de pessoas e, com com_contas, de uma conta por pessoa;
+    uma a cada cem é inválida"""
+    saida = io.StringIO()
+    escritor = csv.writer(saida)
+    if com_contas:
+        escritor.writerow(["cpf", "saldo", "limiteSaqueDiario"])
+        for i in range(linhas):
+            escritor.writerow([f"{inicio + i:011d}", "abc" if i % 100 == 99 else 100, 1000])
+    else:
+        escritor.writerow(["nome", "cpf", "dataNascimento"])
+        for i in range(linhas):
+            cpf = "123" if i % 100 == 99 else f"{inicio + i:011d}"
+            escritor.writerow([f"Pessoa {i}", cpf, "1990-01-01"])
+    return saida.getvalue().splitlines(keepends=True)
+
+
+def importar(nome: str, importador, linhas: list, lote: int) -> None:
+    from api import importacao
+
+    inicio = time.perf_counter()
+    importadas, rejeitadas = importador(
+        importacao.ler_registros(linhas, "csv"), lote, lambda linha, erros: None
+    )
+    duracao = time.perf_counter() - inicio
+    print(
+        f"importar {nome:<8} lote {lote:>6}  {importadas:>7} ok {rejeitadas:>5} rejeitadas  "
+        f"{(importadas + rejeitadas) / duracao:>9.0f} linhas/s"
+    )
+
+
+def exportar(formato: str, chunk_size: int) -> None:
+    from api import importacao
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    tamanho = sum(len(pedaco) for pedaco in importacao.exportar_transacoes(formato, chunk_size))
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"exportar {formato:<6} chunk {chunk_size:>6}  {tamanho / 2 ** 20:>7.1f} MiB em "
+        f"{duracao:>6.2f} s  pico {pico / 2 ** 20:>6.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=100000, help="linhas por importação")
+    parser.add_argument("--lotes", type=int, nargs="+", default=[500, 5000, 20000])
+    parser.add_argument("--transacoes", type=int, default=500000)
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection
+
+    from api import importacao
+
+    with banco_temporario():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        for indice, lote in enumerate(args.lotes):
+            inicio = 10 ** 9 + indice * args.linhas
+            importar(
+                "pessoas",
+                importacao.importar_pessoas,
+                gerar_csv(args.linhas, inicio, False),
+                lote,
+            )
+            importar(
+                "contas",
+                importacao.importar_contas,
+                gerar_csv(args.linhas, inicio, True),
+                lote,
+            )
+
+        criar_transacoes(criar_contas(100), args.transacoes)
+        for formato in importacao.FORMATOS:
+            exportar(formato, 2000)
+        criar_transacoes(criar_contas(100), args.transacoes)
+        exportar("csv", 2000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Mostra os planos de consulta e a latência das buscas de extrato e de
+limite diário em Transacao, com e sem os índices compostos
+(conta, dataTransacao) e (conta, tipo, dataTransacao).
+
+    python -m benchmarks.indices --contas 1000 --transacoes 2000000
+"""
+import argparse
+import datetime
+import random
+import time
+
+from .base import banco_temporario, configurar
+from .dados import criar_contas, criar_transacoes
+
+
+def consultas(conta_id: int) -> dict:
+    """Retorna as consultas medidas, ainda não executadas"""
+    from django.db.models import Sum
+    from django.utils import timezone
+
+    from api.functions import intervalo_do_dia
+    from api.models import Transacao
+
+    hoje = timezone.localdate()
+    inicio, fim = intervalo_do_dia(hoje)
+    agora = timezone.now()
+    return {
+        "limite diário com __date": Transacao.objects.filter(
+            conta_id=conta_id, dataTransacao__date=hoje, tipo="saque"
+        )
+        .values("conta_id")
+        .annotate(total=Sum("valor")),
+        "limite diário com intervalo": Transacao.objects.filter(
+            conta_id=conta_id,
+            tipo="saque",
+            dataTransacao__gte=inicio,
+            dataTransacao__lt=fim,
+        )
+        .values("conta_id")
+        .annotate(total=Sum("valor")),
+        "extrato de 30 dias": Transacao.objects.filter(
+            conta_id=conta_id,
+            dataTransacao__range=[agora - datetime.timedelta(days=30), agora],
+        ),
+    }
+
+
+def medir(titulo: str, contas: list, repeticoes: int) -> None:
+    print(f"\n== {titulo} ==")
+    aleatorio = random.Random(7)
+    for nome, consulta in consultas(contas[0]).items():
+        tempos = []
+        for _ in range(repeticoes):
+            consulta = consultas(aleatorio.choice(contas))[nome]
+            inicio = time.perf_counter()
+            list(consulta)
+            tempos.append(time.perf_counter() - inicio)
+        print(f"{nome:<30} {sum(tempos) / len(tempos) * 1000:>9.3f} ms")
+        for linha in consulta.explain().splitlines():
+            print(f"    {linha}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=1000)
+    parser.add_argument("--transacoes", type=int, default=2_000_000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection, models
+
+    from api.models import Transacao
+
+    with banco_temporario():
+        contas = criar_contas(args.contas)
+        criar_transacoes(contas, args.transacoes)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        medir("com índices compostos", contas, args.repeticoes)
+
+        indice_fk = models.Index(fields=["conta"], name="bench_transacao_conta")
+        with connection.schema_editor() as editor:
+            for indice in Transacao._meta.indexes:
+                editor.remove_index(Transacao, indice)
+            editor.add_index(Transacao, indice_fk)
+        medir("apenas o índice da FK (antes da migração 0003)", contas, args.repeticoes)
+
+
+if __name__ == "__main__":
+    main()
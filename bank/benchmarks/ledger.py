@@ -0,0 +1,80 @@
+"""Compara o caminho antigo de saque (ler saldo, subtrair em Python e
+chamar conta.save()) com o UPDATE condicional de api.ledger, com várias
+threads sacando da mesma conta.
+
+    python -m benchmarks.ledger --threads 8 --saques 200
+"""
+import argparse
+import decimal
+
+from .base import banco_temporario, configurar, executar_threads
+
+
+def saque_antigo(conta_id: int, valor: decimal.Decimal) -> None:
+    """Reproduz o saque como era feito antes de api.ledger"""
+    from django.utils import timezone
+
+    from api.models import Conta, Transacao
+
+    conta = Conta.objects.get(pk=conta_id)
+    if valor > conta.saldo:
+        raise ValueError("saldo insuficiente")
+    transacoes = Transacao.objects.filter(
+        conta_id=conta_id, dataTransacao__date=timezone.localdate(), tipo="saque"
+    ).values_list()
+    gasto_diario = 0
+    for transacao in transacoes:
+        gasto_diario += transacao[1]
+    if gasto_diario + valor > conta.limiteSaqueDiario:
+        raise ValueError("limite excedido")
+    conta.saldo -= valor
+    transacao = Transacao(conta=conta, valor=valor, tipo="saque")
+    conta.save()
+    transacao.save()
+
+
+def medir(nome: str, funcao, threads: int, saques: int, saldo: int) -> None:
+    from api.models import Conta, Pessoa
+
+    pessoa, _ = Pessoa.objects.get_or_create(
+        cpf="00000000000", defaults={"nome": "Bench", "dataNascimento": "2000-01-01"}
+    )
+    conta = Conta.objects.create(saldo=saldo, limiteSaqueDiario=10 ** 8, pessoa=pessoa)
+    valor = decimal.Decimal(1)
+
+    resultado = executar_threads(lambda: funcao(conta.id, valor), threads, saques)
+
+    conta.refresh_from_db()
+    sacado = saldo - conta.saldo
+    registrado = conta.transacao_set.count()
+    print(
+        f"{nome:<10} {resultado['vazao']:>10.1f} ops/s  "
+        f"p99 {resultado['p99']:>8.2f} ms  erros {resultado['erros']:>5}  "
+        f"saldo final {conta.saldo:>10}  "
+        f"atualizações perdidas {int(registrado - sacado):>5}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--saques", type=int, default=200, help="saques por thread")
+    parser.add_argument(
+        "--saldo",
+        type=int,
+        default=None,
+        help="saldo inicial; abaixo de threads*saques testa o saque a descoberto",
+    )
+    args = parser.parse_args()
+    saldo = args.saldo if args.saldo is not None else args.threads * args.saques
+
+    configurar()
+    from api import ledger
+
+    with banco_temporario():
+        medir("antigo", saque_antigo, args.threads, args.saques, saldo)
+        medir("ledger", ledger.sacar, args.threads, args.saques, saldo)
+
+
+if __name__ == "__main__":
+    main()
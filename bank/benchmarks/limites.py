@@ -0,0 +1,66 @@
+"""Mede o custo dos limites de movimentação: Baldes.consumir isolado, com
+muitas chaves guardadas, e a requisição de deposito com os limites e a
+contrapressão ligados (com taxas altas o bastante para nunca recusar) e
+desligados.
+
+    python -m benchmarks.limites --repeticoes 5000
+"""
+import argparse
+import time
+
+from .base import banco_temporario, configurar, percentis
+from .dados import criar_contas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=5000)
+    parser.add_argument(
+        "--chaves", type=int, default=100000, help="baldes já guardados na memória"
+    )
+    args = parser.parse_args()
+
+    configurar()
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+
+    from api.limites import Baldes, baldes
+
+    baldes_teste = Baldes()
+    for i in range(args.chaves):
+        baldes_teste.consumir(f"existente:{i}", 1e9, 1e9)
+    inicio = time.perf_counter()
+    for i in range(args.repeticoes):
+        baldes_teste.consumir(f"existente:{i}", 1e9, 1e9)
+    duracao = time.perf_counter() - inicio
+    print(
+        f"{len(baldes_teste)} baldes: "
+        f"{duracao / args.repeticoes * 1e9:.0f} ns por consumir"
+    )
+
+    with banco_temporario():
+        conta = criar_contas(1)[0]
+        url = reverse("deposito", kwargs={"id": conta})
+        client = Client()
+        for nome, limite, fila in (
+            ("sem limites", None, float("inf")),
+            ("com limites", (1e9, 1e9), 64),
+        ):
+            settings.LIMITE_CLIENTE = settings.LIMITE_CONTA = limite
+            settings.MOVIMENTACAO_FILA_MAXIMA = fila
+            latencias = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                client.post(url, data={"valor": "1"})
+                latencias.append(time.perf_counter() - inicio)
+            resultado = percentis(latencias)
+            print(
+                f"deposito {nome:<11} p50 {resultado['p50']:>7.3f} ms  "
+                f"p99 {resultado['p99']:>7.3f} ms"
+            )
+        baldes().limpar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Mede o pico de memória e o tempo até o primeiro byte da listagem de
+pessoas completa contra a listagem em streaming (?stream=1), para
+volumes crescentes de linhas.
+
+    python -m benchmarks.listagem --linhas 1000 10000 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+from .base import banco_temporario, configurar
+
+
+def medir(client, url: str, parametros: dict) -> tuple:
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    response = client.get(url, parametros)
+    if response.streaming:
+        conteudo = iter(response.streaming_content)
+        next(conteudo)
+        primeiro_byte = time.perf_counter() - inicio
+        for _ in conteudo:
+            pass
+    else:
+        primeiro_byte = time.perf_counter() - inicio
+    total = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico / 2 ** 20, primeiro_byte * 1000, total * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    configurar()
+    from django.test import Client
+    from django.urls import reverse
+
+    from api.models import Pessoa
+
+    client = Client()
+    url = reverse("pessoas")
+    with banco_temporario():
+        criadas = 0
+        for linhas in sorted(args.linhas):
+            Pessoa.objects.bulk_create(
+                (
+                    Pessoa(nome=f"Pessoa {i}", cpf=f"{i:011d}", dataNascimento="2000-01-01")
+                    for i in range(criadas, linhas)
+                ),
+                batch_size=1000,
+            )
+            criadas = linhas
+            for modo, parametros in (("completa", {}), ("stream", {"stream": 1})):
+                pico, primeiro_byte, total = medir(client, url, parametros)
+                print(
+                    f"{linhas:>9} linhas  {modo:<9} pico {pico:>8.1f} MiB  "
+                    f"primeiro byte {primeiro_byte:>9.1f} ms  total {total:>9.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
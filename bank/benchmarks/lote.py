@@ -0,0 +1,60 @@
+"""Mede a vazão do POST em transacoes/lote/ em operações por segundo,
+com o SQLite em modo WAL.
+
+    python -m benchmarks.lote --contas 1000 --operacoes 10000 --lotes 5
+"""
+import argparse
+import json
+import random
+import time
+
+from .base import banco_temporario, configurar
+from .dados import criar_contas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=1000)
+    parser.add_argument("--operacoes", type=int, default=10000, help="operações por lote")
+    parser.add_argument("--lotes", type=int, default=5)
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    url = reverse("transacoes-lote")
+    aleatorio = random.Random(42)
+    with banco_temporario():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        contas = criar_contas(args.contas)
+        # aquecimento: imports e caches da primeira requisição
+        client.post(url, data="[]", content_type="application/json")
+
+        for numero in range(1, args.lotes + 1):
+            corpo = json.dumps(
+                [
+                    {
+                        "conta": aleatorio.choice(contas),
+                        "tipo": aleatorio.choice(("saque", "deposito")),
+                        "valor": f"{aleatorio.randint(1, 50000) / 100:.2f}",
+                    }
+                    for _ in range(args.operacoes)
+                ]
+            )
+            inicio = time.perf_counter()
+            response = client.post(url, data=corpo, content_type="application/json")
+            duracao = time.perf_counter() - inicio
+            resultado = response.json()
+            print(
+                f"lote {numero}: {args.operacoes / duracao:>10.0f} ops/s  "
+                f"{duracao * 1000:>8.1f} ms  aceitas {resultado['aceitas']}  "
+                f"recusadas {resultado['recusadas']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
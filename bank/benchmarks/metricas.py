@@ -0,0 +1,110 @@
+"""Mede o custo do MetricasMiddleware: requisições pelo test client em
+rotas de leitura, sem o middleware e com amostragens de 100% e 10%,
+intercaladas em várias rodadas com a ordem dos cenários alternada. Cada
+cenário é representado pela rodada mais rápida, a menos afetada por ruído
+da máquina.
+
+Como o ruído entre rodadas desta comparação costuma ser maior que o custo
+medido, o custo isolado do middleware (chamado em volta de uma view vazia
+que faz uma consulta) também é impresso, em microssegundos por requisição.
+
+Com --depositos, um terço das requisições são depósitos; o fsync do commit
+no SQLite domina o tempo e o custo do middleware some no ruído.
+
+    python -m benchmarks.metricas --requisicoes 3000 --rodadas 5
+"""
+import argparse
+import time
+
+from .base import banco_temporario, configurar
+from .dados import criar_contas
+
+
+def custo_isolado(repeticoes: int) -> float:
+    """Microssegundos que o middleware acrescenta a uma requisição que faz
+    uma consulta ao banco"""
+    from django.db import connection
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve, reverse
+
+    from api.metricas import MetricasMiddleware
+
+    url = reverse("saldo", kwargs={"id": 1})
+    request = RequestFactory().get(url)
+    request.resolver_match = resolve(url)
+
+    def view(request):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return HttpResponse()
+
+    def medir(funcao) -> float:
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao(request)
+        return time.perf_counter() - inicio
+
+    sem = min(medir(view) for _ in range(3))
+    com = min(medir(MetricasMiddleware(view)) for _ in range(3))
+    return (com - sem) / repeticoes * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requisicoes", type=int, default=3000, help="por rodada")
+    parser.add_argument("--rodadas", type=int, default=5)
+    parser.add_argument("--depositos", action="store_true")
+    args = parser.parse_args()
+
+    configurar()
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    sem_middleware = [m for m in settings.MIDDLEWARE if m != "api.metricas.MetricasMiddleware"]
+    cenarios = {
+        "sem middleware": {"MIDDLEWARE": sem_middleware},
+        "amostragem 100%": {"METRICAS_AMOSTRAGEM": 1.0},
+        "amostragem 10%": {"METRICAS_AMOSTRAGEM": 0.1},
+    }
+
+    with banco_temporario():
+        conta = criar_contas(1)[0]
+        rotas = [
+            ("get", reverse("saldo", kwargs={"id": conta}), None),
+            ("get", reverse("conta-detail", kwargs={"id": conta}), None),
+            ("get", reverse("transacoes", kwargs={"id": conta}) + "?limite=20", None),
+        ]
+        if args.depositos:
+            rotas[1] = ("post", reverse("deposito", kwargs={"id": conta}), {"valor": "1"})
+        tempos = {nome: [] for nome in cenarios}
+        ordem = list(cenarios.items())
+        for rodada in range(args.rodadas):
+            deslocamento = rodada % len(ordem)
+            for nome, ajustes in ordem[deslocamento:] + ordem[:deslocamento]:
+                with override_settings(**ajustes):
+                    client = Client()
+                    inicio = time.perf_counter()
+                    for i in range(args.requisicoes):
+                        metodo, url, dados = rotas[i % len(rotas)]
+                        getattr(client, metodo)(url, data=dados)
+                    tempos[nome].append(time.perf_counter() - inicio)
+
+        for amostragem in (1.0, 0.1):
+            with override_settings(METRICAS_AMOSTRAGEM=amostragem):
+                print(
+                    f"custo isolado, amostragem {amostragem:.0%}: "
+                    f"{custo_isolado(args.requisicoes * 10):.1f} µs por requisição"
+                )
+        base = min(tempos["sem middleware"])
+        for nome, medidas in tempos.items():
+            melhor = min(medidas)
+            print(
+                f"{nome:<16} {args.requisicoes / melhor:>8.1f} req/s  "
+                f"custo {100 * (melhor - base) / base:>+6.2f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
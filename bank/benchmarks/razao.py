@@ -0,0 +1,76 @@
+"""Mede o custo do livro razão: a vazão de depósitos com as partidas
+gravadas junto e o tempo e a memória do comando verificar_razao sobre um
+razão grande, com e sem SaldoConsolidado.
+
+    python -m benchmarks.razao --contas 10000 --movimentos 200000
+"""
+import argparse
+import decimal
+import io
+import random
+import time
+import tracemalloc
+
+from .base import banco_temporario, configurar, executar_threads
+from .dados import criar_contas
+
+
+def verificar(**opcoes) -> None:
+    from django.core.management import call_command
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    call_command("verificar_razao", stdout=io.StringIO(), **opcoes)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nome = " ".join(f"--{opcao}" for opcao in opcoes) or "padrão"
+    print(f"verificar_razao {nome:<24} {duracao:>7.2f} s  pico {pico / 2 ** 20:>6.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=10000)
+    parser.add_argument("--movimentos", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--depositos", type=int, default=500, help="depósitos por thread")
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection
+
+    from api import ledger
+    from api.models import Lancamento
+
+    with banco_temporario():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        contas = criar_contas(args.contas)
+
+        valor = decimal.Decimal(1)
+        resultado = executar_threads(
+            lambda: ledger.depositar(contas[0], valor), args.threads, args.depositos
+        )
+        print(
+            f"depósitos com partidas {resultado['vazao']:>8.1f} ops/s  "
+            f"p99 {resultado['p99']:>6.2f} ms"
+        )
+
+        aleatorio = random.Random(42)
+        for _ in range(0, args.movimentos, 10000):
+            ledger.aplicar_lote(
+                [
+                    ledger.Operacao(aleatorio.choice(contas), "deposito", valor)
+                    for _ in range(10000)
+                ]
+            )
+        print(f"{Lancamento.objects.count()} partidas, {args.contas} contas")
+
+        verificar()
+        verificar(consolidar=True)
+        verificar()
+        verificar(completo=True)
+
+
+if __name__ == "__main__":
+    main()
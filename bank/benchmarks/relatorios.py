@@ -0,0 +1,90 @@
+"""Mede os relatórios de api/relatorios/ sobre um ano de transações: os
+agregados calculados no banco contra a mesma soma feita em Python sobre
+todas as linhas (como faziam os clientes), as estatísticas da carteira e
+a repetição de um período encerrado, servida do cache.
+
+    python -m benchmarks.relatorios --contas 1000 --transacoes 200000
+"""
+import argparse
+import collections
+import datetime
+import time
+
+from .base import banco_temporario, configurar
+from .dados import criar_contas, criar_transacoes
+
+
+def cronometrar(funcao, repeticoes: int) -> float:
+    """Menor duração, em ms, entre as repetições"""
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        duracoes.append(time.perf_counter() - inicio)
+    return min(duracoes) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=1000)
+    parser.add_argument("--transacoes", type=int, default=200000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    configurar()
+    from django.core.cache import caches
+    from django.conf import settings
+    from django.utils import timezone
+
+    from api import relatorios
+    from api.models import TransacaoHistorico
+
+    with banco_temporario():
+        contas = criar_contas(args.contas)
+        criar_transacoes(contas, args.transacoes)
+        data_final = timezone.localdate() - datetime.timedelta(days=1)
+        data_inicial = data_final - datetime.timedelta(days=364)
+
+        def no_cliente():
+            grupos = collections.defaultdict(lambda: [0, 0])
+            for conta, tipo, valor in TransacaoHistorico.objects.values_list(
+                "conta_id", "tipo", "valor"
+            ).iterator(chunk_size=settings.STREAM_CHUNK_SIZE):
+                grupo = grupos[conta, tipo]
+                grupo[0] += valor
+                grupo[1] += 1
+            return grupos
+
+        print(f"numpy: {'sim' if relatorios.numpy is not None else 'não'}")
+        for nome, funcao in (
+            ("soma em Python", no_cliente),
+            (
+                "agregados conta,tipo",
+                lambda: relatorios.agregados(data_inicial, data_final, ["conta", "tipo"]),
+            ),
+            (
+                "agregados mes,tipo",
+                lambda: relatorios.agregados(data_inicial, data_final, ["mes", "tipo"]),
+            ),
+            (
+                "estatisticas",
+                lambda: relatorios.estatisticas(data_inicial, data_final, 7),
+            ),
+        ):
+            print(f"{nome:<22} {cronometrar(funcao, args.repeticoes):>9.1f} ms")
+
+        cache = caches[settings.RELATORIOS_CACHE]
+        cache.clear()
+        partes = ("estatisticas", data_inicial, data_final, 7, None)
+
+        def estatisticas():
+            return relatorios.estatisticas(data_inicial, data_final, 7)
+
+        relatorios.em_cache(data_final, partes, estatisticas)
+        duracao = cronometrar(lambda: relatorios.em_cache(data_final, partes, estatisticas), 100)
+        print(f"{'estatisticas em cache':<22} {duracao:>9.3f} ms")
+        cache.clear()
+
+
+if __name__ == "__main__":
+    main()
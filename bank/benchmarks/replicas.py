@@ -0,0 +1,109 @@
+"""Mede a vazão de leituras (páginas de transações e de pessoas, pelo test
+client) enquanto outras threads fazem depósitos no default, com 0, 1 e 2
+réplicas de leitura. As réplicas são cópias do banco em arquivos SQLite
+separados, então as leituras nelas não esperam pelos locks das escritas.
+
+    python -m benchmarks.replicas --leitores 8 --escritores 2
+"""
+import argparse
+import decimal
+import io
+import os
+import random
+import threading
+
+from .base import banco_temporario, configurar, executar_threads
+from .dados import criar_contas, criar_transacoes
+
+
+def escrever(contas: list, parar: threading.Event, contagem: list) -> None:
+    from django.db import connection
+
+    from api import ledger
+
+    aleatorio = random.Random()
+    try:
+        while not parar.is_set():
+            try:
+                ledger.depositar(aleatorio.choice(contas), decimal.Decimal(1))
+                contagem[0] += 1
+            except Exception:
+                contagem[1] += 1
+    finally:
+        connection.close()
+
+
+def ler(contas: list, semente: int):
+    from django.test import Client
+
+    locais = threading.local()
+    aleatorio = random.Random(semente)
+
+    def requisicao():
+        if not hasattr(locais, "cliente"):
+            locais.cliente = Client()
+        if aleatorio.random() < 0.5:
+            caminho = f"/api/conta/{aleatorio.choice(contas)}/transacoes/?limite=50"
+        else:
+            caminho = "/api/pessoas/?limite=100"
+        response = locais.cliente.get(caminho)
+        if response.status_code != 200:
+            raise RuntimeError(f"{caminho}: {response.status_code}")
+
+    return requisicao
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=1000)
+    parser.add_argument("--transacoes", type=int, default=100000)
+    parser.add_argument("--leitores", type=int, default=8)
+    parser.add_argument("--escritores", type=int, default=2)
+    parser.add_argument("--leituras", type=int, default=300, help="por leitor")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[0, 1, 2])
+    args = parser.parse_args()
+
+    configurar()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    with banco_temporario():
+        contas = criar_contas(args.contas)
+        criar_transacoes(contas, args.transacoes)
+        pasta = os.path.dirname(connections.databases["default"]["NAME"])
+        for indice in range(1, max(args.replicas) + 1):
+            connections.databases[f"replica{indice}"] = {
+                **connections.databases["default"],
+                "NAME": os.path.join(pasta, f"replica{indice}.sqlite3"),
+            }
+        settings.REPLICAS = [f"replica{i}" for i in range(1, max(args.replicas) + 1)]
+        call_command("copiar_replicas", stdout=io.StringIO())
+
+        for quantidade in args.replicas:
+            settings.REPLICAS = [f"replica{i}" for i in range(1, quantidade + 1)]
+            parar = threading.Event()
+            contagem = [0, 0]
+            escritores = [
+                threading.Thread(target=escrever, args=(contas, parar, contagem))
+                for _ in range(args.escritores)
+            ]
+            for escritor in escritores:
+                escritor.start()
+            try:
+                resultado = executar_threads(ler(contas, 42), args.leitores, args.leituras)
+            finally:
+                parar.set()
+                for escritor in escritores:
+                    escritor.join()
+            print(
+                f"{quantidade} réplicas  leituras {resultado['vazao']:>7.1f} req/s  "
+                f"p50 {resultado['p50']:>7.2f} ms  p99 {resultado['p99']:>8.2f} ms  "
+                f"falhas {resultado['erros']}  "
+                f"depósitos {contagem[0] / resultado['duracao']:>6.1f} ops/s"
+            )
+        connections.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compara o custo de serialização dos ModelSerializers com o das
+projeções de leitura de api.serializers, por linha (listagens) e por
+requisição (resposta de deposito/saque).
+
+    python -m benchmarks.serializacao --linhas 20000
+"""
+import argparse
+import time
+
+from .base import banco_temporario, configurar
+from .dados import criar_contas, criar_transacoes
+
+
+def cronometrar(funcao, repeticoes: int = 1) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, default=20000)
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    args = parser.parse_args()
+
+    configurar()
+    from api.models import Conta, Pessoa, Transacao
+    from api.serializers import (
+        ContaSerializer,
+        PessoaSerializer,
+        TransacaoSerializer,
+        conta_leitura,
+        pessoa_leitura,
+        transacao_leitura,
+    )
+
+    with banco_temporario():
+        contas = criar_contas(args.linhas)
+        criar_transacoes(contas, args.linhas)
+
+        print(f"listagem completa ({args.linhas} linhas), em microssegundos por linha")
+        for nome, modelo, serializer_class, projecao in (
+            ("pessoas", Pessoa, PessoaSerializer, pessoa_leitura),
+            ("contas", Conta, ContaSerializer, conta_leitura),
+            ("transacoes", Transacao, TransacaoSerializer, transacao_leitura),
+        ):
+            antes = cronometrar(lambda: serializer_class(modelo.objects.all(), many=True).data)
+            depois = cronometrar(lambda: list(projecao.serializar_valores(modelo.objects.all())))
+            print(
+                f"  {nome:<11} serializer {antes / args.linhas * 1e6:>8.2f}  "
+                f"projeção {depois / args.linhas * 1e6:>8.2f}  ({antes / depois:.1f}x)"
+            )
+
+        conta = Conta.objects.get(pk=contas[0])
+        transacao = Transacao.objects.filter(conta=conta).first() or Transacao.objects.first()
+        antes = cronometrar(
+            lambda: (ContaSerializer(conta).data, TransacaoSerializer(transacao).data),
+            args.repeticoes,
+        )
+        depois = cronometrar(
+            lambda: (conta_leitura.serializar(conta), transacao_leitura.serializar(transacao)),
+            args.repeticoes,
+        )
+        print("resposta de deposito/saque, em microssegundos por requisição")
+        print(
+            f"  serializer {antes * 1e6:>8.2f}  projeção {depois * 1e6:>8.2f}  "
+            f"({antes / depois:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
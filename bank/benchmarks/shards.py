@@ -0,0 +1,95 @@
+"""Mede como a API escala com as contas distribuídas em 1, 2, 4 e 8 shards
+(arquivos SQLite separados, api.shards): o tempo do rebalanceamento a
+partir de um único banco, a vazão de depósitos concorrentes em contas
+sorteadas e a latência da listagem de contas, que lê todos os shards.
+
+    python -m benchmarks.shards --contas 5000 --threads 8
+"""
+import argparse
+import decimal
+import io
+import os
+import random
+import threading
+import time
+
+from .base import banco_temporario, configurar, executar_threads, percentis
+from .dados import criar_contas
+
+
+def depositar(contas: list, semente: int):
+    from api import ledger
+
+    locais = threading.local()
+
+    def operacao():
+        if not hasattr(locais, "aleatorio"):
+            locais.aleatorio = random.Random(semente + threading.get_ident())
+        ledger.depositar(locais.aleatorio.choice(contas), decimal.Decimal(1))
+
+    return operacao
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contas", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--depositos", type=int, default=300, help="por thread")
+    parser.add_argument("--paginas", type=int, default=200)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    configurar()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+    from django.test import Client
+
+    for quantidade in args.shards:
+        with banco_temporario():
+            settings.SHARDS = ["default"]
+            settings.SHARDS_ANTERIORES = []
+            contas = criar_contas(args.contas)
+            pasta = os.path.dirname(connections.databases["default"]["NAME"])
+            for indice in range(1, quantidade):
+                alias = f"shard{indice}"
+                connections.databases[alias] = {
+                    **connections.databases["default"],
+                    "NAME": os.path.join(pasta, f"{alias}.sqlite3"),
+                }
+                settings.SHARDS = [*settings.SHARDS, alias]
+                call_command("migrate", database=alias, verbosity=0)
+
+            inicio = time.perf_counter()
+            if quantidade > 1:
+                settings.SHARDS_ANTERIORES = ["default"]
+                call_command("rebalancear_shards", lote=500, stdout=io.StringIO())
+                settings.SHARDS_ANTERIORES = []
+            rebalanceamento = time.perf_counter() - inicio
+
+            escrita = executar_threads(depositar(contas, 42), args.threads, args.depositos)
+
+            client = Client()
+            latencias = []
+            for _ in range(args.paginas):
+                inicio = time.perf_counter()
+                response = client.get("/api/contas/", {"limite": 100})
+                latencias.append(time.perf_counter() - inicio)
+                assert response.status_code == 200, response.content
+            listagem = percentis(latencias)
+
+            print(
+                f"{quantidade} shards  rebalanceamento {rebalanceamento:>6.2f} s  "
+                f"depósitos {escrita['vazao']:>7.1f} ops/s  "
+                f"p99 {escrita['p99']:>7.2f} ms  falhas {escrita['erros']}  "
+                f"página de contas p50 {listagem['p50']:>6.2f} ms"
+            )
+            for alias in settings.SHARDS[1:]:
+                connections[alias].close()
+                del connections[alias]
+                del connections.databases[alias]
+    settings.SHARDS = ["default"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Suíte de benchmarks da API: popula o banco com volumes configuráveis e
+repete misturas de requisições realistas pelo test client do Django e,
+com --servidor, contra um servidor WSGI real. Os resultados (vazão e
+p50/p95/p99) são gravados em JSON e podem ser comparados com uma execução
+anterior, apontando regressões.
+
+    python -m benchmarks.suite --saida atual.json
+    python -m benchmarks.suite --saida novo.json --comparar atual.json
+
+As misturas:
+    leitura   90% saldo e 10% detalhe da conta, em contas sorteadas
+    rajada    rajadas de saques e depósitos em poucas contas, entre leituras
+    extrato   extratos de períodos sorteados no último ano
+
+Tudo é sorteado a partir de --semente, então duas execuções com os mesmos
+argumentos fazem as mesmas requisições sobre os mesmos dados. Cada cenário
+roda --rodadas vezes e o resultado gravado é a mediana de cada métrica.
+"""
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+
+from .base import banco_temporario, configurar, executar_threads
+from .carga import WSGI, disparar, servidor
+from .dados import criar_contas, criar_pessoas, criar_transacoes
+
+FORMULARIO = "application/x-www-form-urlencoded"
+
+# Métricas comparadas com --comparar: True quando maior é melhor
+COMPARADAS = {"vazao": True, "p50": False, "p95": False, "p99": False}
+
+
+class Mistura:
+    """Gera as requisições de uma mistura como (metodo, caminho, corpo)"""
+
+    def __init__(self, nome: str, contas: list, semente: int):
+        self.nome = nome
+        self.contas = contas
+        self.aleatorio = random.Random(semente)
+        self.quentes = self.aleatorio.sample(contas, min(5, len(contas)))
+        self.rajada = 0
+
+    def proxima(self) -> tuple:
+        return getattr(self, f"_{self.nome}")()
+
+    def _leitura(self) -> tuple:
+        conta = self.aleatorio.choice(self.contas)
+        if self.aleatorio.random() < 0.9:
+            return "GET", f"/api/conta/{conta}/saldo/", b""
+        return "GET", f"/api/conta/{conta}/", b""
+
+    def _rajada(self) -> tuple:
+        if not self.rajada and self.aleatorio.random() < 0.05:
+            self.rajada = self.aleatorio.randint(20, 50)
+        if not self.rajada:
+            return self._leitura()
+        self.rajada -= 1
+        conta = self.aleatorio.choice(self.quentes)
+        operacao = self.aleatorio.choice(("saque", "deposito"))
+        valor = self.aleatorio.randint(1, 100)
+        return "POST", f"/api/conta/{conta}/{operacao}/", f"valor={valor}".encode()
+
+    def _extrato(self) -> tuple:
+        conta = self.aleatorio.choice(self.contas)
+        hoje = datetime.date.today()
+        inicio = hoje - datetime.timedelta(days=self.aleatorio.randint(1, 365))
+        fim = min(hoje, inicio + datetime.timedelta(days=self.aleatorio.randint(1, 90)))
+        return (
+            "GET",
+            f"/api/conta/{conta}/extrato/?data_inicial={inicio}&data_final={fim}",
+            b"",
+        )
+
+
+MISTURAS = ("leitura", "rajada", "extrato")
+
+
+def pelo_cliente(nome: str, contas: list, args) -> dict:
+    """Roda a mistura pelo test client, com uma mistura e um cliente por thread"""
+    from django.test import Client
+
+    locais = threading.local()
+    sementes = iter(range(args.semente, args.semente + args.threads))
+    trava = threading.Lock()
+
+    def requisicao():
+        if not hasattr(locais, "cliente"):
+            with trava:
+                locais.mistura = Mistura(nome, contas, next(sementes))
+            locais.cliente = Client()
+        metodo, caminho, corpo = locais.mistura.proxima()
+        response = locais.cliente.generic(metodo, caminho, corpo, content_type=FORMULARIO)
+        if response.status_code >= 500:
+            raise RuntimeError(f"{metodo} {caminho}: {response.status_code}")
+
+    resultado = executar_threads(requisicao, args.threads, args.requisicoes // args.threads)
+    return {
+        "requisicoes": resultado["operacoes"],
+        "falhas": resultado["erros"],
+        "vazao": resultado["vazao"],
+        "p50": resultado["p50"],
+        "p95": resultado["p95"],
+        "p99": resultado["p99"],
+    }
+
+
+def mediana(rodadas: list) -> dict:
+    """Mediana de cada métrica entre as rodadas de um cenário"""
+    return {
+        metrica: statistics.median(rodada[metrica] for rodada in rodadas)
+        for metrica in rodadas[0]
+    }
+
+
+def pelo_servidor(nome: str, contas: list, banco: str, args) -> dict:
+    mistura = Mistura(nome, contas, args.semente)
+    with servidor(args.wsgi, banco) as porta:
+        return asyncio.run(
+            disparar(porta, mistura.proxima, args.concorrencia, args.requisicoes)
+        )
+
+
+def ambiente(args) -> dict:
+    import django
+    import sqlite3
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "maquina": platform.machine(),
+        "argumentos": {
+            chave: valor
+            for chave, valor in vars(args).items()
+            if chave not in ("saida", "comparar")
+        },
+    }
+
+
+def comparar(atual: dict, anterior: dict, tolerancia: float) -> list:
+    """Retorna as regressões de atual em relação a anterior, uma por linha"""
+    regressoes = []
+    for cenario, medidas in atual["resultados"].items():
+        base = anterior["resultados"].get(cenario)
+        if base is None:
+            continue
+        for metrica, maior_melhor in COMPARADAS.items():
+            antes, depois = base.get(metrica), medidas.get(metrica)
+            if not antes or depois is None:
+                continue
+            variacao = (depois - antes) / antes
+            if (-variacao if maior_melhor else variacao) > tolerancia:
+                regressoes.append(
+                    f"{cenario} {metrica}: {antes:.2f} -> {depois:.2f} ({variacao:+.1%})"
+                )
+    return regressoes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pessoas", type=int, default=0, help="pessoas além dos titulares")
+    parser.add_argument("--contas", type=int, default=1000)
+    parser.add_argument("--transacoes", type=int, default=100000)
+    parser.add_argument("--requisicoes", type=int, default=2000, help="por mistura")
+    parser.add_argument("--threads", type=int, default=4, help="threads do test client")
+    parser.add_argument("--concorrencia", type=int, default=50, help="conexões no servidor")
+    parser.add_argument("--misturas", nargs="+", choices=MISTURAS, default=list(MISTURAS))
+    parser.add_argument(
+        "--rodadas", type=int, default=3, help="rodadas por cenário; vale a mediana"
+    )
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--servidor", action="store_true", help="também contra o servidor WSGI")
+    parser.add_argument("--wsgi", default=WSGI, help="comando do servidor WSGI")
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument(
+        "--tolerancia",
+        type=float,
+        default=0.10,
+        help="piora relativa a partir da qual uma métrica é regressão",
+    )
+    args = parser.parse_args()
+
+    configurar()
+    from django.core.management import call_command
+    from django.db import connection
+
+    resultados = {}
+    with banco_temporario():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        contas = criar_contas(args.contas)
+        if args.pessoas:
+            criar_pessoas(args.pessoas, inicio=10 ** 9)
+        criar_transacoes(contas, args.transacoes, semente=args.semente)
+        call_command("gerar_saldos_diarios", stdout=io.StringIO())
+        banco = str(connection.settings_dict["NAME"])
+
+        for nome in args.misturas:
+            resultados[f"cliente:{nome}"] = mediana(
+                [pelo_cliente(nome, contas, args) for _ in range(args.rodadas)]
+            )
+            if args.servidor:
+                connection.close()
+                try:
+                    resultados[f"servidor:{nome}"] = mediana(
+                        [pelo_servidor(nome, contas, banco, args) for _ in range(args.rodadas)]
+                    )
+                except (OSError, RuntimeError) as erro:
+                    print(f"servidor:{nome}: {erro}", file=sys.stderr)
+
+    for cenario, medidas in resultados.items():
+        print(
+            f"{cenario:<18} {medidas['vazao']:>8.1f} req/s  p50 {medidas['p50']:>7.2f} ms  "
+            f"p95 {medidas['p95']:>7.2f} ms  p99 {medidas['p99']:>7.2f} ms  "
+            f"falhas {medidas['falhas']:.0f}"
+        )
+
+    atual = {"ambiente": ambiente(args), "resultados": resultados}
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            json.dump(atual, arquivo, indent=2)
+
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            regressoes = comparar(atual, json.load(arquivo), args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao}", file=sys.stderr)
+        if regressoes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
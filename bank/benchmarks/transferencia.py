@@ -0,0 +1,57 @@
+"""Transferências cruzadas entre um conjunto pequeno de contas quentes,
+em várias threads, com pares e sentidos sorteados. Mede vazão e latência
+e confere que a soma dos saldos não muda.
+
+    python -m benchmarks.transferencia --threads 8 --contas 4 --transferencias 200
+"""
+import argparse
+import decimal
+import random
+import threading
+
+from .base import banco_temporario, configurar, executar_threads
+from .dados import criar_contas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--contas", type=int, default=4, help="tamanho do conjunto quente")
+    parser.add_argument(
+        "--transferencias", type=int, default=200, help="transferências por thread"
+    )
+    args = parser.parse_args()
+
+    configurar()
+    from django.db import connection
+    from django.db.models import Sum
+
+    from api import ledger
+    from api.models import Conta
+
+    with banco_temporario():
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        contas = criar_contas(args.contas)
+        total_inicial = Conta.objects.aggregate(total=Sum("saldo"))["total"]
+        valor = decimal.Decimal(1)
+        locais = threading.local()
+
+        def transferir():
+            if not hasattr(locais, "aleatorio"):
+                locais.aleatorio = random.Random(threading.get_ident())
+            origem, destino = locais.aleatorio.sample(contas, 2)
+            ledger.transferir(origem, destino, valor)
+
+        resultado = executar_threads(transferir, args.threads, args.transferencias)
+        total_final = Conta.objects.aggregate(total=Sum("saldo"))["total"]
+        print(
+            f"{resultado['vazao']:>8.1f} transferências/s  "
+            f"p50 {resultado['p50']:>7.2f} ms  p99 {resultado['p99']:>7.2f} ms  "
+            f"erros {resultado['erros']}  "
+            f"soma dos saldos {'preservada' if total_final == total_inicial else 'ALTERADA'}"
+        )
+
+
+if __name__ == "__main__":
+    main()